@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark dark subtraction + column reduction: legacy NumPy path vs ColumnReducer
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Add src directory to path to import the reduction module
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root / 'src'))
+
+from reduction import ColumnReducer
+
+def legacy_reduce(raw_image: np.ndarray, dark_frame: np.ndarray, use_max: bool) -> np.ndarray:
+    """The original Spectrometer.process_spectrum arithmetic"""
+    raw_image = raw_image - dark_frame
+    raw_image = np.clip(raw_image, 0, None)
+    if use_max:
+        return np.max(raw_image, axis=0)
+    return np.mean(raw_image, axis=0)
+
+def frame_rate(func, repeats: int) -> float:
+    """Run func repeatedly and return calls per second"""
+    func()  # Warm up buffers and caches
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return repeats / (time.perf_counter() - start)
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark spectrum reduction")
+    parser.add_argument('--width', type=int, default=5496, help="Frame width (default: full sensor)")
+    parser.add_argument('--height', type=int, default=3672, help="Frame height (default: full sensor)")
+    parser.add_argument('--repeats', type=int, default=10, help="Frames per measurement")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 4096, size=(args.height, args.width), dtype=np.uint16)
+    dark = rng.integers(0, 512, size=(args.height, args.width), dtype=np.uint16)
+    reducer = ColumnReducer()
+
+    print(f"Frame: {args.width}x{args.height} uint16, {args.repeats} frames per measurement")
+    print(f"{'mode':<8}{'legacy fps':>12}{'fused fps':>12}{'speedup':>10}")
+    for mode in ('mean', 'max'):
+        use_max = (mode == 'max')
+        before = frame_rate(lambda: legacy_reduce(frame, dark, use_max), args.repeats)
+        after = frame_rate(lambda: reducer.reduce(frame, dark, mode=mode), args.repeats)
+        print(f"{mode:<8}{before:>12.2f}{after:>12.2f}{after / before:>9.2f}x")
+
+    # Average mode without per-pixel clipping: reduce, then subtract the dark's column mean
+    dark_spectrum = np.add.reduce(dark, axis=0, dtype=np.float64) / dark.shape[0]
+
+    def column_first():
+        spectrum = reducer.reduce(frame, mode='mean')
+        spectrum -= dark_spectrum
+        return np.maximum(spectrum, 0.0, out=spectrum)
+    before = frame_rate(lambda: reducer.reduce(frame, dark, mode='mean'), args.repeats)
+    after = frame_rate(column_first, args.repeats)
+    print(f"{'mean 1D':<8}{before:>12.2f}{after:>12.2f}{after / before:>9.2f}x  (fused 2D dark vs 1D dark spectrum)")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,12 @@
 // Configuration
 //const API_BASE_URL = 'http://localhost:8000';
 const API_BASE_URL = `http://${window.location.hostname}:8000`;
+const LIVE_STREAM_URL = `ws://${window.location.hostname}:8000/ws/spectrum`;
+
+// Binary live stream message layout (see src/streaming.py)
+const STREAM_HEADER_BYTES = 40;
+const STREAM_KIND_AXIS = 1;
+const STREAM_KIND_SPECTRUM = 2;
 const DEFAULT_HEADERS = {
     'Content-Type': 'application/json',
     'Accept': 'application/json'
@@ -19,9 +25,14 @@ const appState = {
     ramanShifts: null, // Added for Raman shift values
     plotLayout: null,
     imageData: null,  // Store the image data
+    previewEtag: null, // ETag of the preview currently shown
     displayMode: 'pixels', // 'wavelength' or 'raman' or 'pixels'
     baselineCorrected: false, // Whether baseline correction has been applied
     originalSpectrum: null, // Store original spectrum for reverting corrections
+    liveSocket: null, // WebSocket while live view is running
+    liveAxisId: null, // Id of the wavelength axis received on the live stream
+    liveSpectrum: null, // Newest spectrum from the live stream, not yet drawn
+    liveDrawPending: false, // Whether a live redraw is already scheduled
 };
 
 // DOM elements
@@ -77,6 +88,7 @@ const elements = {
     // Acquisition
     acquireSpectrumBtn: document.getElementById('acquire-spectrum-btn'),
     acquisitionStatus: document.getElementById('acquisition-status'),
+    liveViewBtn: document.getElementById('live-view-btn'),
     
     // Spectrum display
     spectrumPlot: document.getElementById('spectrum-plot'),
@@ -107,6 +119,7 @@ function initApp() {
     elements.setRoiBtn.addEventListener('click', setRoi);
     elements.setCalibrationBtn.addEventListener('click', setCalibration);
     elements.acquireSpectrumBtn.addEventListener('click', acquireSpectrum);
+    elements.liveViewBtn.addEventListener('click', toggleLiveView);
     elements.saveSpectrumBtn.addEventListener('click', saveSpectrum);
     elements.copyDataBtn.addEventListener('click', copyData);
     elements.clearLogBtn.addEventListener('click', clearLog);
@@ -1178,7 +1191,7 @@ async function acquireSpectrum() {
         const readoutMode = elements.readoutMode.value;
         
         // Build query params without including undefined values
-        let queryParams = `readout_mode=${readoutMode}&include_image=true`;
+        let queryParams = `readout_mode=${readoutMode}`;
         
         // Make the API request to acquire the spectrum
         const spectrumData = await apiRequest('/acquire/spectrum?' + queryParams, 'GET');
@@ -1197,14 +1210,8 @@ async function acquireSpectrum() {
         // Calculate Raman shifts if we have a laser wavelength
         appState.ramanShifts = calculateRamanShifts(appState.wavelengths);
         
-        // Store and display the image data if available
-        if (spectrumData.image_data) {
-            appState.imageData = spectrumData.image_data;
-            logMessage('Image data received from spectrum acquisition', 'info');
-            
-            // Display the image automatically
-            displayCachedImage();
-        }
+        // Fetch the camera preview separately; it is only downloaded when it changed
+        refreshPreviewImage();
         
         // Draw spectrum
         drawSpectrum(appState.wavelengths, appState.currentSpectrum);
@@ -1242,6 +1249,98 @@ async function acquireSpectrum() {
     }
 }
 
+// Start or stop the live spectrum stream
+function toggleLiveView() {
+    if (appState.liveSocket) {
+        stopLiveView();
+    } else {
+        startLiveView();
+    }
+}
+
+// Open the binary WebSocket stream and draw spectra as they arrive
+function startLiveView() {
+    const socket = new WebSocket(LIVE_STREAM_URL);
+    socket.binaryType = 'arraybuffer';
+    appState.liveSocket = socket;
+    appState.liveAxisId = null;
+    
+    elements.liveViewBtn.textContent = 'Stop Live';
+    elements.acquireSpectrumBtn.disabled = true;
+    elements.acquisitionStatus.textContent = 'Live';
+    elements.acquisitionStatus.classList.add('active');
+    
+    socket.onopen = () => logMessage('Live view started', 'info');
+    socket.onmessage = (event) => handleLiveMessage(event.data);
+    socket.onerror = () => logMessage('Live view connection error', 'error');
+    socket.onclose = () => {
+        if (appState.liveSocket === socket) {
+            appState.liveSocket = null;
+            resetLiveViewControls();
+            logMessage('Live view stopped', 'info');
+        }
+    };
+}
+
+// Close the live stream if it is running
+function stopLiveView() {
+    const socket = appState.liveSocket;
+    if (!socket) {
+        return;
+    }
+    appState.liveSocket = null;
+    socket.close();
+    resetLiveViewControls();
+    logMessage('Live view stopped', 'info');
+}
+
+// Restore the acquisition controls after live view ends
+function resetLiveViewControls() {
+    elements.liveViewBtn.textContent = 'Live View';
+    elements.acquireSpectrumBtn.disabled = !appState.connected;
+    elements.acquisitionStatus.textContent = '';
+    elements.acquisitionStatus.classList.remove('active', 'countdown');
+}
+
+// Decode one binary stream message (header + little-endian values)
+function handleLiveMessage(buffer) {
+    const view = new DataView(buffer);
+    const kind = view.getUint8(5);
+    const dtype = view.getUint8(6);
+    const count = view.getUint32(32, true);
+    const axisId = view.getUint32(36, true);
+    const values = dtype === 2
+        ? new Float64Array(buffer, STREAM_HEADER_BYTES, count)
+        : new Float32Array(buffer, STREAM_HEADER_BYTES, count);
+    
+    if (kind === STREAM_KIND_AXIS) {
+        // Sent once per calibration/ROI; spectra refer to it by id
+        appState.wavelengths = Array.from(values);
+        appState.ramanShifts = calculateRamanShifts(appState.wavelengths);
+        appState.liveAxisId = axisId;
+        return;
+    }
+    
+    if (kind !== STREAM_KIND_SPECTRUM || axisId !== appState.liveAxisId) {
+        return;
+    }
+    
+    // Redraw at most once per animation frame; intermediate spectra are skipped
+    appState.liveSpectrum = values;
+    if (!appState.liveDrawPending) {
+        appState.liveDrawPending = true;
+        requestAnimationFrame(() => {
+            appState.liveDrawPending = false;
+            appState.currentSpectrum = Array.from(appState.liveSpectrum);
+            appState.originalSpectrum = [...appState.currentSpectrum];
+            appState.baselineCorrected = false;
+            drawSpectrum(appState.wavelengths, appState.currentSpectrum);
+            elements.saveSpectrumBtn.disabled = false;
+            elements.copyDataBtn.disabled = false;
+        });
+    }
+}
+
 // Function to display cached image data
 function displayCachedImage() {
     if (!appState.imageData) {
@@ -1264,6 +1363,33 @@ function displayCachedImage() {
     elements.cameraImage.src = appState.imageData;
 }
 
+// Fetch the downsampled camera preview, revalidating with its ETag
+async function refreshPreviewImage() {
+    try {
+        // 'no-cache' makes the browser revalidate with If-None-Match
+        const response = await fetch(`${API_BASE_URL}/preview`, { cache: 'no-cache' });
+        if (!response.ok) {
+            logMessage(`Preview not available (HTTP ${response.status})`, 'warning');
+            return;
+        }
+        
+        const etag = response.headers.get('ETag');
+        if (etag && etag === appState.previewEtag) {
+            return;  // Unchanged since the last update
+        }
+        appState.previewEtag = etag;
+        
+        const blob = await response.blob();
+        if (appState.imageData && appState.imageData.startsWith('blob:')) {
+            URL.revokeObjectURL(appState.imageData);
+        }
+        appState.imageData = URL.createObjectURL(blob);
+        displayCachedImage();
+    } catch (error) {
+        logMessage(`Error fetching preview: ${error.message}`, 'warning');
+    }
+}
+
 // Draw spectrum using Plotly.js
 function drawSpectrum(wavelengths, intensities) {
     if (!wavelengths || !intensities || wavelengths.length === 0) {
@@ -1460,6 +1586,12 @@ function toggleUIElements(connected) {
     safeToggle(elements.setCalibrationBtn, !connected);
     safeToggle(elements.setProcessingBtn, !connected);
     safeToggle(elements.acquireSpectrumBtn, !connected);
+    safeToggle(elements.liveViewBtn, !connected);
+    
+    // Live view cannot outlive the connection
+    if (!connected) {
+        stopLiveView();
+    }
     
     // Reset acquisition status when disconnecting
     if (!connected && elements.acquisitionStatus) {
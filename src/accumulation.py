@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Streaming multi-frame accumulation with per-pixel statistics
+"""
+import logging
+import numpy as np
+from typing import Dict, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+class SpectrumAccumulator:
+    """
+    Running mean and variance of a series of spectra (Welford's algorithm)
+
+    Spectra are folded in one at a time in float64, so only three arrays of
+    the spectrum width are kept however many frames are accumulated.
+    Optionally, values that lie far above the running mean of their pixel
+    (cosmic-ray hits) are left out of that pixel's statistics; each pixel
+    then keeps its own sample count.
+    """
+
+    def __init__(self, width: int, reject_cosmic_rays: bool = False,
+                 sigma: float = 5.0, min_frames: int = 3, noise_floor: float = 1.0):
+        """
+        Initialize an empty accumulator
+
+        Args:
+            width: Number of pixels per spectrum
+            reject_cosmic_rays: Leave out positive outliers per pixel
+            sigma: Rejection threshold in standard deviations above the mean
+            min_frames: Samples a pixel needs before rejection starts
+            noise_floor: Smallest standard deviation (in counts) used for the
+                         threshold, so nearly constant pixels are not rejected
+                         for ordinary noise
+        """
+        self.width = int(width)
+        self.reject_cosmic_rays = reject_cosmic_rays
+        self.sigma = sigma
+        self.min_frames = max(2, min_frames)
+        self.noise_floor = noise_floor
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard all accumulated frames"""
+        self.count = np.zeros(self.width, dtype=np.int64)
+        self.mean = np.zeros(self.width, dtype=np.float64)
+        self._m2 = np.zeros(self.width, dtype=np.float64)
+        self._delta = np.empty(self.width, dtype=np.float64)
+        self.frames = 0
+        self.rejected = np.zeros(self.width, dtype=np.int64)
+
+    def add(self, spectrum: np.ndarray) -> int:
+        """
+        Fold one spectrum into the running statistics
+
+        Args:
+            spectrum: Spectrum of length width
+
+        Returns:
+            Number of pixels rejected as outliers in this spectrum
+        """
+        spectrum = np.asarray(spectrum, dtype=np.float64)
+        if spectrum.shape != (self.width,):
+            raise ValueError(f"Expected a spectrum of {self.width} pixels, got shape {spectrum.shape}")
+
+        delta = self._delta
+        np.subtract(spectrum, self.mean, out=delta)
+
+        rejected = 0
+        keep = None
+        if self.reject_cosmic_rays and self.frames >= self.min_frames:
+            threshold = np.maximum(self.std(), self.noise_floor)
+            threshold *= self.sigma
+            outliers = (delta > threshold) & (self.count >= self.min_frames)
+            rejected = int(np.count_nonzero(outliers))
+            if rejected:
+                self.rejected += outliers
+                keep = ~outliers
+
+        self._update(spectrum, delta, keep)
+        self.frames += 1
+        return rejected
+
+    def _update(self, spectrum: np.ndarray, delta: np.ndarray, keep: Optional[np.ndarray]) -> None:
+        """Welford step for all pixels, or only those in keep"""
+        if keep is None:
+            self.count += 1
+            self.mean += delta / self.count
+            # m2 += (x - old_mean) * (x - new_mean)
+            self._m2 += delta * (spectrum - self.mean)
+        else:
+            self.count[keep] += 1
+            count = self.count[keep]
+            d = delta[keep]
+            mean = self.mean[keep] + d / count
+            self.mean[keep] = mean
+            self._m2[keep] += d * (spectrum[keep] - mean)
+
+    def variance(self) -> np.ndarray:
+        """
+        Get the per-pixel sample variance
+
+        Returns:
+            Variance array (0 where a pixel has fewer than 2 samples)
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            var = np.where(self.count > 1, self._m2 / (self.count - 1), 0.0)
+        return var
+
+    def std(self) -> np.ndarray:
+        """
+        Get the per-pixel sample standard deviation
+
+        Returns:
+            Standard deviation array
+        """
+        return np.sqrt(self.variance())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get accumulation statistics
+
+        Returns:
+            Dictionary with frame and rejection counts
+        """
+        return {
+            "frames": self.frames,
+            "rejected_pixels": int(self.rejected.sum()),
+            "pixels_with_rejections": int(np.count_nonzero(self.rejected)),
+            "min_samples": int(self.count.min()) if self.width else 0
+        }
@@ -3,6 +3,7 @@
 REST API for the ASI183MM spectrometer
 """
 import os
+import asyncio
 import logging
 import time
 from pathlib import Path
@@ -10,15 +11,28 @@ from typing import Dict, List, Optional, Any, Union
 import base64
 from io import BytesIO
 import json
+import atexit
 
 import numpy as np
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Query, Body
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Query, Body, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import FileResponse, StreamingResponse, Response, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 
 from spectrometer import Spectrometer
+from calibration import CalibrationNotInvertibleError, calibration_hash
+from streaming import SpectrumStreamer, SpectrumBroadcaster, FLAG_DARK_SUBTRACTED as STREAM_FLAG_DARK_SUBTRACTED, FLAG_MAXIMUM_READOUT
+from streaming import FLAG_BASELINE_CORRECTED as STREAM_FLAG_BASELINE_CORRECTED
+from kinetics import KineticSeries
+from reprocessing import ReprocessingJob, ProcessingRecipe
+from hardware_executor import HardwareExecutor
+from preview import PreviewCache
+from display import DisplayNormalizer
+from frame_archive import FrameArchiveWriter, read_archive
+from spectrum_store import SpectrumWriter, read_store, export_csv, FLAG_MAXIMUM, FLAG_DARK_SUBTRACTED, FLAG_BASELINE_CORRECTED
+from spectra_catalog import SpectraCatalog, SORT_COLUMNS
 from settings_manager import settings_manager
+from metrics import registry as metrics_registry, HTTPMetricsMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Configure logging
 logging.basicConfig(
@@ -27,15 +41,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Settings changes (slider drags, etc.) are written to disk in the background, at most once per interval
+settings_manager.enable_write_behind(settings_manager.get_setting('server.settings_write_interval_ms', 500) / 1000.0)
+
 # Create output directory for spectra
 SPECTRA_DIR = Path("./spectra")
 SPECTRA_DIR.mkdir(exist_ok=True)
 
+JSON_RENDER_SECONDS = metrics_registry.histogram(
+    "spectrometer_json_render_seconds", "Time to encode JSON response bodies")
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that records how long encoding the body takes"""
+    
+    def render(self, content: Any) -> bytes:
+        with JSON_RENDER_SECONDS.time():
+            return super().render(content)
+
 # Initialize the app
 app = FastAPI(
     title="ASI183MM Spectrometer API",
     description="REST API for controlling the ASI183MM-based spectrometer",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=TimedJSONResponse
 )
 
 # Add CORS middleware for web clients
@@ -45,11 +73,95 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# Request counts and latencies by route, served at /metrics
+app.add_middleware(HTTPMetricsMiddleware, registry=metrics_registry)
+
 # Singleton spectrometer instance
 spectrometer: Optional[Spectrometer] = None
 
+# All camera SDK calls run on this thread so handlers never block the event loop
+hardware = HardwareExecutor()
+
+# Live spectrum streamer shared by all WebSocket clients
+streamer: Optional[SpectrumStreamer] = None
+
+# 8-bit display mapping shared by /acquire/image and the preview so both render a frame identically
+display_normalizer = DisplayNormalizer(
+    low_percentile=settings_manager.get_setting('display.stretch_low_percentile', 0.5),
+    high_percentile=settings_manager.get_setting('display.stretch_high_percentile', 99.5),
+    gamma=settings_manager.get_setting('display.gamma', 1.0),
+    log_scale=settings_manager.get_setting('display.log_scale', False)
+)
+
+# Saved spectra are appended to binary stores (.spx) by a background writer
+spectrum_writer = SpectrumWriter(
+    flush_interval_s=settings_manager.get_setting('storage.flush_interval_ms', 1000) / 1000.0,
+    compress=settings_manager.get_setting('storage.compress', True),
+    chunk_rows=settings_manager.get_setting('storage.chunk_rows', 64)
+)
+atexit.register(spectrum_writer.close)
+
+# Raw frames are archived (.raw with a .raw.idx index) by a background writer. Frames
+# archived alongside other captures are dropped rather than stall the capture when the
+# disk falls behind; /save/raw waits for the writer, at most this long per frame
+frame_archive_writer = FrameArchiveWriter(
+    max_pending=settings_manager.get_setting('storage.raw_max_pending', 4)
+)
+atexit.register(frame_archive_writer.close)
+RAW_SAVE_TIMEOUT_S = 30.0
+
+# Index of the saved spectra, opened on first use for the current SPECTRA_DIR
+spectra_catalog: Optional[SpectraCatalog] = None
+
+# Current (or last) kinetic series and the clients following it
+kinetic_series: Optional[KineticSeries] = None
+kinetic_store: Optional[str] = None
+kinetic_broadcaster = SpectrumBroadcaster()
+
+# Current (or last) batch reprocessing job
+reprocessing_job: Optional[ReprocessingJob] = None
+
+# Downsampled camera preview, fed by the acquisition paths and served by /preview
+preview = PreviewCache(
+    max_width=settings_manager.get_setting('preview.max_width', 1024),
+    max_height=settings_manager.get_setting('preview.max_height', 768),
+    min_interval_s=settings_manager.get_setting('preview.min_interval_ms', 500) / 1000.0,
+    quality=settings_manager.get_setting('preview.quality', 85),
+    normalizer=display_normalizer
+)
+
+# Queue and backlog levels, read when /metrics is scraped
+metrics_registry.gauge("spectrometer_hardware_queue_depth", "Jobs queued or running on the hardware thread",
+                       function=lambda: hardware.get_stats()["pending"])
+metrics_registry.gauge("spectrometer_raw_archive_pending", "Raw frames waiting to be written",
+                       function=lambda: frame_archive_writer.get_stats()["pending"])
+metrics_registry.gauge("spectrometer_settings_pending", "1 while settings changes wait to be written",
+                       function=lambda: int(settings_manager.pending))
+metrics_registry.gauge("spectrometer_stream_subscribers", "Clients of the live spectrum stream",
+                       function=lambda: streamer.get_stats().get("subscribers", 0) if streamer is not None else 0)
+
+def _apply_view_settings(snapshot, changed):
+    """Keep the display mapping and preview in step with the settings (e.g. after a reset)"""
+    if 'display' in changed:
+        display_normalizer.configure(
+            low_percentile=snapshot.get('display.stretch_low_percentile'),
+            high_percentile=snapshot.get('display.stretch_high_percentile'),
+            gamma=snapshot.get('display.gamma'),
+            log_scale=snapshot.get('display.log_scale')
+        )
+    interval_ms = snapshot.get('preview.min_interval_ms')
+    preview.configure(
+        max_width=snapshot.get('preview.max_width'),
+        max_height=snapshot.get('preview.max_height'),
+        min_interval_s=interval_ms / 1000.0 if interval_ms is not None else None,
+        quality=snapshot.get('preview.quality')
+    )
+
+settings_manager.subscribe(_apply_view_settings, categories=('display', 'preview'))
+
 # Data models
 class ROISettings(BaseModel):
     """Settings for Region of Interest"""
@@ -79,42 +191,240 @@ class ProcessingSettings(BaseModel):
     """Spectrum processing settings"""
     subtract_dark: Optional[bool] = Field(None, description="Whether to subtract dark frame")
     readout_mode: Optional[str] = Field(None, description="Readout mode: 'average' or 'maximum'")
+    baseline_correction: Optional[str] = Field(None, description="Baseline correction: 'none', 'linear', 'polynomial' or 'als'")
+    polynomial_degree: Optional[int] = Field(None, description="Degree of the polynomial baseline")
+    als_lambda: Optional[float] = Field(None, description="Smoothness of the ALS baseline")
+    als_asymmetry: Optional[float] = Field(None, description="Weight of points above the ALS baseline")
+    clip_dark_pixels: Optional[bool] = Field(None, description="Clip dark-corrected pixels at 0 before the reduction (average mode then subtracts the 2D dark instead of its column mean)")
+
+class ReadoutPlanRequest(BaseModel):
+    """Spectral band to plan the camera readout for"""
+    band_start_y: int = Field(..., description="First sensor row of the spectrum")
+    band_height: int = Field(..., description="Number of sensor rows the spectrum covers")
+    min_columns: Optional[int] = Field(None, description="Spectral pixels needed (default: full resolution)")
+    dynamic_range_bits: int = Field(12, description="Bits of dynamic range needed (8 or fewer allows RAW8)")
+    apply: bool = Field(False, description="Apply the plan to the camera")
+
+class PreviewSettings(BaseModel):
+    """Camera preview settings"""
+    max_width: Optional[int] = Field(None, ge=8, le=5496, description="Maximum preview width in pixels")
+    max_height: Optional[int] = Field(None, ge=8, le=3672, description="Maximum preview height in pixels")
+    min_interval_ms: Optional[int] = Field(None, ge=0, description="Minimum time between preview updates")
+    quality: Optional[int] = Field(None, ge=1, le=95, description="JPEG quality")
+
+class KineticSettings(BaseModel):
+    """Kinetic series settings"""
+    interval_ms: float = Field(..., gt=0, description="Time between spectra in milliseconds")
+    count: int = Field(0, ge=0, description="Number of spectra (0 runs until stopped)")
+    accumulate: int = Field(1, ge=1, le=1000, description="Frames averaged per spectrum")
+    subtract_dark: Optional[bool] = Field(None, description="Whether to subtract dark frame")
+    readout_mode: Optional[str] = Field(None, description="Readout mode: 'average' or 'maximum'")
+    filename: Optional[str] = Field(None, description="Spectrum store name (default: kinetic_<start time>)")
+
+class ReprocessSettings(BaseModel):
+    """Batch reprocessing job; unset processing options use the current settings"""
+    sources: List[str] = Field(..., description="Raw frame (.raw, .npy) and spectrum store (.spx) files in the spectra directory")
+    output: Optional[str] = Field(None, description="New spectrum store for the results (default: reprocessed_<start time>)")
+    readout_mode: Optional[str] = Field(None, description="Readout mode for raw frames: 'average' or 'maximum'")
+    dark: Optional[str] = Field(None, description="Dark frame (.npy) in the spectra directory")
+    baseline_correction: Optional[str] = Field(None, description="Baseline correction: 'none', 'linear', 'polynomial' or 'als'")
+    polynomial_degree: Optional[int] = Field(None, description="Degree of the polynomial baseline")
+    als_lambda: Optional[float] = Field(None, description="Smoothness of the ALS baseline")
+    als_asymmetry: Optional[float] = Field(None, description="Weight of points above the ALS baseline")
+    wavelength_coefficients: Optional[List[float]] = Field(None, description="Calibration for the new axis")
+    binning: Optional[int] = Field(None, ge=1, description="Binning of the stored data")
+    clip_dark_pixels: Optional[bool] = Field(None, description="Clip dark-corrected pixels at 0 before the reduction")
+    workers: Optional[int] = Field(None, ge=1, le=64, description="Worker processes (default: CPU count)")
 
 class SpectrumResponse(BaseModel):
     """Response model for spectrum data"""
     wavelengths: List[float] = Field(..., description="Wavelength values")
     intensities: List[float] = Field(..., description="Intensity values")
     timestamp: float = Field(..., description="Acquisition timestamp")
-    exposure_ms: int = Field(..., description="Exposure time used")
+    exposure_ms: float = Field(..., description="Exposure time used in milliseconds")
     gain: int = Field(..., description="Gain value used")
-    image_data: Optional[str] = Field(None, description="Base64 encoded image data")
+    image_data: Optional[str] = Field(None, description="Base64 encoded preview image (see /preview)")
+    frames: int = Field(1, description="Number of frames averaged")
+    std: Optional[List[float]] = Field(None, description="Per-pixel standard deviation over the averaged frames")
 
 # Helper functions
-def get_spectrometer() -> Spectrometer:
+async def get_spectrometer() -> Spectrometer:
     """Get or initialize the spectrometer instance"""
     global spectrometer
     if spectrometer is None:
         # Get SDK path from environment variable or use default
         sdk_path = os.getenv("ZWO_ASI_LIB")
-        spectrometer = Spectrometer(sdk_path)
+        spectrometer = await hardware.run(Spectrometer, sdk_path)
         
     if not spectrometer.connected:
-        if not spectrometer.connect():
+        if not await hardware.run(spectrometer.connect):
             raise HTTPException(status_code=500, detail="Failed to connect to spectrometer")
     
     return spectrometer
 
+def get_streamer(spectrometer: Spectrometer) -> SpectrumStreamer:
+    """Get the live spectrum streamer for the current spectrometer"""
+    global streamer
+    if streamer is None or streamer.spectrometer is not spectrometer:
+        streamer = SpectrumStreamer(spectrometer, executor=hardware, preview=preview)
+    return streamer
+
+def get_catalog() -> SpectraCatalog:
+    """Get the spectra catalog, building it from the spectra directory if it is new"""
+    global spectra_catalog
+    if spectra_catalog is None or spectra_catalog.directory != SPECTRA_DIR:
+        spectra_catalog = SpectraCatalog(SPECTRA_DIR)
+        if spectra_catalog.created:
+            spectrum_writer.flush()
+            spectra_catalog.rebuild()
+    return spectra_catalog
+
+def _capture_spectrum(spectrometer: Spectrometer, subtract_dark: Optional[bool],
+                      readout_mode: Optional[str], include_image: bool,
+                      accumulate: int = 1, reject_cosmic_rays: bool = False) -> Dict[str, Any]:
+    """
+    Capture and reduce one spectrum, or average several (runs on the hardware thread)
+    
+    The raw frame is offered to the preview cache, which renders a new
+    preview at most once per its minimum interval (always if include_image).
+    
+    Returns:
+        Dictionary with the axes, acquisition state and whether the dark
+        was subtracted
+    """
+    # Current settings come from the camera state cache (no camera queries)
+    state = spectrometer.camera.get_state()
+    
+    if accumulate > 1:
+        result = spectrometer.acquire_accumulated(
+            accumulate,
+            subtract_dark=subtract_dark,
+            readout_mode=readout_mode,
+            reject_cosmic_rays=reject_cosmic_rays,
+            keep_last_frame=include_image or preview.due()
+        )
+        if result["last_frame"] is not None:
+            preview.offer(result["last_frame"], force=include_image)
+        return {
+            "wavelengths": result["wavelengths"],
+            "intensities": result["intensities"],
+            "std": result["std"],
+            "frames": result["frames"],
+            "timestamp": time.time(),
+            "exposure_us": state.get("exposure_us", 0),
+            "gain": state.get("gain", 0),
+            "dark_subtracted": spectrometer.last_dark_subtracted
+        }
+    
+    # Capture into a pooled buffer; it goes back to the pool once reduced
+    with spectrometer.acquire_raw_frame() as frame:
+        wavelengths, intensities = spectrometer.process_spectrum(
+            frame.array,
+            subtract_dark=subtract_dark,
+            readout_mode=readout_mode
+        )
+        preview.offer(frame.array, force=include_image)
+    
+    return {
+        "wavelengths": wavelengths,
+        "intensities": intensities,
+        "std": None,
+        "frames": 1,
+        "timestamp": time.time(),
+        "exposure_us": state.get("exposure_us", 0),
+        "gain": state.get("gain", 0),
+        "dark_subtracted": spectrometer.last_dark_subtracted
+    }
+
+def _capture_preview(spectrometer: Spectrometer) -> None:
+    """Capture a frame for the preview only (runs on the hardware thread)"""
+    with spectrometer.acquire_raw_frame() as frame:
+        preview.offer(frame.array, force=True)
+
+def _archive_frame(path: str, frame: np.ndarray, state: Dict[str, Any], block: bool = False) -> bool:
+    """
+    Queue a raw frame for an archive with the readout state it was captured with
+    
+    With block set, waits (up to RAW_SAVE_TIMEOUT_S) for the writer instead
+    of dropping the frame when its queue is full.
+    """
+    return frame_archive_writer.append(
+        path, frame,
+        block=block,
+        timeout=RAW_SAVE_TIMEOUT_S,
+        timestamp=time.time(),
+        exposure_us=state.get("exposure_us", 0),
+        gain=state.get("gain", 0),
+        start_x=state.get("start_x", 0),
+        start_y=state.get("start_y", 0),
+        binning=state.get("binning", 1)
+    )
+
+def _capture_raw_frames(spectrometer: Spectrometer, path: str, count: int) -> Dict[str, int]:
+    """
+    Capture frames into an archive (runs on the hardware thread)
+    
+    Each pooled frame is copied into the archive writer's queue and released
+    at once. When the queue is full, capture waits for the writer, so every
+    requested frame is saved even if the disk is slower than the camera.
+    
+    Returns:
+        Dictionary with the number of frames queued and dropped (only if the
+        writer made no progress for RAW_SAVE_TIMEOUT_S)
+    """
+    state = spectrometer.camera.get_state()
+    queued = 0
+    for _ in range(count):
+        with spectrometer.acquire_raw_frame() as frame:
+            queued += _archive_frame(path, frame.array, state, block=True)
+    return {"queued": queued, "dropped": count - queued}
+
+def _capture_raw_image(spectrometer: Spectrometer, archive_path: Optional[str]) -> np.ndarray:
+    """Capture a raw frame, archiving it if a path is given (runs on the hardware thread)"""
+    raw_image = spectrometer.acquire_spectrum(return_raw=True)
+    if archive_path is not None:
+        _archive_frame(archive_path, raw_image, spectrometer.camera.get_state())
+    return raw_image
+
+def _render_roi_image(raw_image: np.ndarray, roi: Dict[str, Any]) -> BytesIO:
+    """Render a raw frame as a PNG with the ROI outlined in red"""
+    from PIL import Image, ImageDraw
+    img_rgb = Image.fromarray(display_normalizer.normalize(raw_image)).convert('RGB')
+    
+    # Draw ROI rectangle
+    draw = ImageDraw.Draw(img_rgb)
+    
+    # Define rectangle coordinates
+    left = roi["start_x"]
+    top = roi["start_y"]
+    right = left + (roi["width"] or 0) 
+    bottom = top + (roi["height"] or 0)
+    
+    # Draw red rectangle with 2px width
+    draw.rectangle([left, top, right-1, bottom-1], outline=(255, 0, 0), width=2)
+    
+    # Convert to PNG
+    buffer = BytesIO()
+    img_rgb.save(buffer, format="PNG")
+    buffer.seek(0)
+    return buffer
+
 # API Routes
 @app.get("/", tags=["General"])
 async def root():
     """API root endpoint"""
     return {"message": "ASI183MM Spectrometer API", "status": "online"}
 
+@app.get("/metrics", tags=["General"])
+async def get_metrics():
+    """Acquisition, processing and request metrics in the Prometheus text format"""
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/status", tags=["General"])
 async def get_status(spectrometer: Spectrometer = Depends(get_spectrometer)):
-    """Get spectrometer status"""
-    camera_info = spectrometer.camera.get_camera_info()
-    settings = spectrometer.camera.get_settings()
+    """Get spectrometer status (from cached camera state, never waits for the camera)"""
+    camera_info = spectrometer.camera.get_cached_info()
+    settings = dict(camera_info["current_settings"])
     
     # Include more explicit exposure settings
     # The ASI camera returns exposure in microseconds as "Exposure"
@@ -135,8 +445,19 @@ async def get_status(spectrometer: Spectrometer = Depends(get_spectrometer)):
             "subtract_dark": spectrometer.subtract_dark,
             "readout_mode": "maximum" if spectrometer.use_max else "average",
             "baseline_correction": spectrometer.baseline_correction,
-            "polynomial_degree": spectrometer.polynomial_degree
-        }
+            "polynomial_degree": spectrometer.polynomial_degree,
+            "baseline": spectrometer.baseline_corrector.get_stats(),
+            "dark": spectrometer.get_dark_status()
+        },
+        "streaming": streamer.get_stats() if streamer is not None else None,
+        "preview": preview.get_stats(),
+        "display": display_normalizer.get_info(),
+        "storage": spectrum_writer.get_stats(),
+        "raw_archive": frame_archive_writer.get_stats(),
+        "kinetics": kinetic_series.get_status() if kinetic_series is not None else None,
+        "reprocessing": reprocessing_job.get_status() if reprocessing_job is not None else None,
+        "hardware": hardware.get_stats(),
+        "settings_store": settings_manager.get_stats()
     }
 
 @app.post("/connect", tags=["Control"])
@@ -146,12 +467,12 @@ async def connect_spectrometer(background_tasks: BackgroundTasks):
     
     if spectrometer is None:
         sdk_path = os.getenv("ZWO_ASI_LIB")
-        spectrometer = Spectrometer(sdk_path)
+        spectrometer = await hardware.run(Spectrometer, sdk_path)
     
     if spectrometer.connected:
         return {"message": "Already connected"}
     
-    if spectrometer.connect():
+    if await hardware.run(spectrometer.connect):
         # Load and apply default settings from default_settings.json to the camera after connecting
         try:
             # Get default settings
@@ -168,14 +489,14 @@ async def connect_spectrometer(background_tasks: BackgroundTasks):
             
             # Set exposure and gain
             if exposure_ms is not None:
-                spectrometer.set_exposure(exposure_ms)
+                await hardware.run(spectrometer.set_exposure, exposure_ms)
             if gain is not None:
-                spectrometer.set_gain(gain)
+                await hardware.run(spectrometer.set_gain, gain)
                 
             # Apply ROI settings
             roi_settings = camera_settings.get('roi', {})
             if roi_settings:
-                spectrometer.set_roi(
+                await hardware.run(spectrometer.set_roi,
                     start_x=roi_settings.get('start_x', 0),
                     start_y=roi_settings.get('start_y', 0),
                     width=roi_settings.get('width', None),
@@ -189,12 +510,12 @@ async def connect_spectrometer(background_tasks: BackgroundTasks):
                 # Set wavelength calibration coefficients
                 wavelength_coeffs = calibration_settings.get('wavelength_coefficients')
                 if wavelength_coeffs:
-                    spectrometer.set_wavelength_calibration(wavelength_coeffs)
+                    await hardware.run(spectrometer.set_wavelength_calibration, wavelength_coeffs)
                 
                 # Set laser wavelength
                 laser_wavelength = calibration_settings.get('laser_wavelength')
                 if laser_wavelength:
-                    spectrometer.set_laser_wavelength(laser_wavelength)
+                    await hardware.run(spectrometer.set_laser_wavelength, laser_wavelength)
                     
             # Apply processing settings
             processing_settings = default_settings.get('processing', {})
@@ -204,10 +525,13 @@ async def connect_spectrometer(background_tasks: BackgroundTasks):
                 baseline_correction = processing_settings.get('baseline_correction')
                 polynomial_degree = processing_settings.get('polynomial_degree')
                 
-                spectrometer.set_processing_settings(
+                await hardware.run(spectrometer.set_processing_settings,
                     readout_mode=readout_mode,
                     baseline_correction=baseline_correction,
-                    polynomial_degree=polynomial_degree
+                    polynomial_degree=polynomial_degree,
+                    als_lambda=processing_settings.get('als_lambda'),
+                    als_asymmetry=processing_settings.get('als_asymmetry'),
+                    clip_dark_pixels=processing_settings.get('clip_dark_pixels')
                 )
                 
             logger.info("Successfully applied default settings from default_settings.json")
@@ -226,8 +550,10 @@ async def disconnect_spectrometer(background_tasks: BackgroundTasks):
     
     if spectrometer is None or not spectrometer.connected:
         return {"message": "Not connected"}
-    
-    spectrometer.disconnect()
+
+    if kinetic_series is not None and kinetic_series.running:
+        await asyncio.to_thread(kinetic_series.stop)
+    await hardware.run(spectrometer.disconnect)
     return {"message": "Disconnected successfully"}
 
 @app.post("/roi", tags=["Settings"])
@@ -237,7 +563,7 @@ async def set_roi(
 ):
     """Set the Region of Interest"""
     try:
-        spectrometer.set_roi(
+        await hardware.run(spectrometer.set_roi,
             start_x=roi.start_x,
             start_y=roi.start_y,
             width=roi.width,
@@ -258,12 +584,12 @@ async def set_exposure(
         # If both exposure and gain are provided, set exposure without saving settings yet
         if settings.gain is not None:
             # Set exposure first without saving settings
-            spectrometer.set_exposure(settings.exposure_ms, skip_save=True)
+            await hardware.run(spectrometer.set_exposure, settings.exposure_ms, skip_save=True)
             # Then set gain with saving settings (once for both changes)
-            spectrometer.set_gain(settings.gain)
+            await hardware.run(spectrometer.set_gain, settings.gain)
         else:
             # Only exposure is being changed, save settings after changing
-            spectrometer.set_exposure(settings.exposure_ms)
+            await hardware.run(spectrometer.set_exposure, settings.exposure_ms)
         
         return {"message": "Exposure settings updated", "settings": settings}
     except Exception as e:
@@ -276,16 +602,31 @@ async def set_calibration(
 ):
     """Set wavelength calibration coefficients"""
     try:
-        spectrometer.set_wavelength_calibration(calibration.coefficients)
+        await hardware.run(spectrometer.set_wavelength_calibration, calibration.coefficients)
         
         # Set laser wavelength if provided
         if calibration.laser_wavelength is not None:
-            spectrometer.set_laser_wavelength(calibration.laser_wavelength)
+            await hardware.run(spectrometer.set_laser_wavelength, calibration.laser_wavelength)
             
         return {"message": "Calibration updated", "calibration": calibration}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to set calibration: {str(e)}")
 
+@app.get("/calibration/pixels", tags=["Calibration"])
+async def wavelengths_to_pixels(
+    wavelength: List[float] = Query(..., description="Wavelengths in nm (repeat for several)"),
+    rounded: bool = Query(True, description="Round to the nearest pixel instead of fractional positions"),
+    spectrometer: Spectrometer = Depends(get_spectrometer)
+):
+    """Map wavelengths to pixel positions using the inverse calibration"""
+    try:
+        pixels = spectrometer.wavelength_to_pixel(np.asarray(wavelength), rounded=rounded)
+        return {"wavelengths": wavelength, "pixels": pixels.tolist()}
+    except CalibrationNotInvertibleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to map wavelengths: {str(e)}")
+
 @app.post("/processing", tags=["Settings"])
 async def set_processing(
     settings: ProcessingSettings,
@@ -296,208 +637,820 @@ async def set_processing(
         if settings.subtract_dark is not None:
             spectrometer.subtract_dark = settings.subtract_dark
             
-        # Handle readout_mode
-        if settings.readout_mode is not None:
-            spectrometer.set_processing_settings(
-                readout_mode=settings.readout_mode,
-                baseline_correction=None,
-                polynomial_degree=None
-            )
+        # Readout mode and baseline correction
+        processing = {
+            'readout_mode': settings.readout_mode,
+            'baseline_correction': settings.baseline_correction,
+            'polynomial_degree': settings.polynomial_degree,
+            'als_lambda': settings.als_lambda,
+            'als_asymmetry': settings.als_asymmetry,
+            'clip_dark_pixels': settings.clip_dark_pixels
+        }
+        processing = {key: value for key, value in processing.items() if value is not None}
+        if processing:
+            await hardware.run(spectrometer.set_processing_settings, **processing)
             
         return {
             "message": "Processing settings updated",
             "settings": {
                 "subtract_dark": spectrometer.subtract_dark,
-                "readout_mode": "maximum" if spectrometer.use_max else "average"
+                "readout_mode": "maximum" if spectrometer.use_max else "average",
+                "baseline_correction": spectrometer.baseline_correction,
+                "polynomial_degree": spectrometer.polynomial_degree,
+                "als_lambda": spectrometer.baseline_corrector.als_lambda,
+                "als_asymmetry": spectrometer.baseline_corrector.als_asymmetry,
+                "clip_dark_pixels": spectrometer.clip_dark_pixels
             }
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to set processing settings: {str(e)}")
 
 @app.post("/acquire/dark", tags=["Acquisition"])
-async def acquire_dark(spectrometer: Spectrometer = Depends(get_spectrometer)):
-    """Acquire a dark frame"""
+async def acquire_dark(
+    frames: int = Query(1, ge=1, le=1000, description="Number of frames to stack into the dark"),
+    method: str = Query("median", description="Stacking method: 'median' or 'sigma_clip'"),
+    save: bool = Query(False, description="Add the dark to the dark library"),
+    spectrometer: Spectrometer = Depends(get_spectrometer)
+):
+    """
+    Acquire a dark frame
+    
+    With frames > 1 the frames are combined into a master dark. Saved
+    darks are matched automatically to later acquisitions by exposure,
+    gain, ROI, binning and sensor temperature (see /darks).
+    """
     try:
-        dark_frame = spectrometer.acquire_dark_frame()
-        return {"message": "Dark frame acquired", "shape": list(dark_frame.shape)}
+        dark_frame = await hardware.run(spectrometer.acquire_dark_frame, frames, method, save)
+        return {
+            "message": "Dark frame acquired",
+            "shape": list(dark_frame.shape),
+            "dark": spectrometer.dark_frame_info
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Failed to acquire dark frame: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to acquire dark frame: {str(e)}")
 
+@app.get("/darks", tags=["Acquisition"])
+async def list_darks(spectrometer: Spectrometer = Depends(get_spectrometer)):
+    """List the master darks in the dark library and the current dark selection"""
+    return {
+        "darks": spectrometer.dark_library.entries(),
+        "status": spectrometer.get_dark_status()
+    }
+
+@app.delete("/darks/{dark_id}", tags=["Acquisition"])
+async def delete_dark(dark_id: str, spectrometer: Spectrometer = Depends(get_spectrometer)):
+    """Remove a master dark from the dark library"""
+    try:
+        removed = await asyncio.to_thread(spectrometer.dark_library.remove, dark_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to remove dark: {str(e)}")
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Dark {dark_id} not found")
+    return {"message": "Dark removed", "id": dark_id}
+
 @app.get("/acquire/spectrum", tags=["Acquisition"], response_model=SpectrumResponse)
 async def acquire_spectrum(
     subtract_dark: Optional[bool] = Query(None, description="Whether to subtract dark frame"),
     readout_mode: Optional[str] = Query(None, description="Readout mode: 'average' or 'maximum'"),
-    include_image: Optional[bool] = Query(True, description="Whether to include base64-encoded image data"),
+    include_image: Optional[bool] = Query(False, description="Whether to include the base64-encoded preview image (prefer /preview)"),
+    accumulate: int = Query(1, ge=1, le=10000, description="Number of frames to average"),
+    reject_cosmic_rays: bool = Query(False, description="Leave cosmic-ray outliers out of the average"),
     spectrometer: Spectrometer = Depends(get_spectrometer)
 ):
-    """Acquire a spectrum"""
+    """Acquire a spectrum, optionally averaged over several frames"""
     try:
-        # Get current settings before acquisition
-        settings = spectrometer.camera.get_settings()
-        
-        # Acquire raw image data first
-        raw_image = spectrometer.acquire_spectrum(return_raw=True)
-        
         # Handle "undefined" string value for subtract_dark
         if subtract_dark == "undefined":
             subtract_dark = None
         
-        # Process the spectrum using the raw image
-        wavelengths, intensities = spectrometer.process_spectrum(
-            raw_image,
-            subtract_dark=subtract_dark,
-            readout_mode=readout_mode
+        # Requests with the same parameters that arrive while an exposure is
+        # queued or running share its result instead of queuing another one
+        capture = await hardware.run_coalesced(
+            ("spectrum", subtract_dark, readout_mode, bool(include_image), accumulate, reject_cosmic_rays),
+            _capture_spectrum, spectrometer, subtract_dark, readout_mode, bool(include_image),
+            accumulate, reject_cosmic_rays
         )
         
         # Convert to lists for JSON serialization
         response_data = {
-            "wavelengths": wavelengths.tolist(),
-            "intensities": intensities.tolist(),
-            "timestamp": time.time(),
-            "exposure_ms": settings.get("Exposure", 0),
-            "gain": settings.get("Gain", 0),
-            "image_data": None
+            "wavelengths": capture["wavelengths"].tolist(),
+            "intensities": capture["intensities"].tolist(),
+            "timestamp": capture["timestamp"],
+            "exposure_ms": capture["exposure_us"] / 1000.0,
+            "gain": capture["gain"],
+            "image_data": None,
+            "frames": capture["frames"],
+            "std": capture["std"].tolist() if capture["std"] is not None else None
         }
         
-        # Include image data if requested
+        # The downsampled preview rendered from this frame (encoded off the event loop)
         if include_image:
-            # Convert the raw image to a displayable format
-            # Create a PIL Image from the raw data
-            img_min = np.min(raw_image)
-            img_max = np.max(raw_image)
-            if img_max > img_min:
-                img_norm = ((raw_image - img_min) / (img_max - img_min) * 255).astype(np.uint8)
-            else:
-                img_norm = np.zeros_like(raw_image, dtype=np.uint8)
-            
-            # Convert to PIL image and save as JPEG
-            from PIL import Image
-            img_pil = Image.fromarray(img_norm)
-            
-            # Save as JPEG to buffer
-            buffer = BytesIO()
-            img_pil.save(buffer, format="JPEG", quality=85)
-            buffer.seek(0)
-            
-            # Encode as base64
-            image_base64 = base64.b64encode(buffer.read()).decode("utf-8")
-            response_data["image_data"] = f"data:image/jpeg;base64,{image_base64}"
+            response_data["image_data"] = await asyncio.to_thread(preview.data_url)
         
         return response_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to acquire spectrum: {str(e)}")
 
+@app.websocket("/ws/spectrum")
+async def stream_spectrum(websocket: WebSocket):
+    """
+    Stream live spectra as binary messages
+    
+    Each message is a 40-byte little-endian header followed by the values
+    (see streaming.HEADER). The wavelength axis (float64) is sent first and
+    again whenever the calibration or ROI changes; every spectrum (float32
+    intensities) carries the id of the axis it belongs to.
+    
+    Refused with close code 1013 (try again later) while a kinetic series
+    is running, since both would compete for the camera.
+    """
+    await websocket.accept()
+    if kinetic_series is not None and kinetic_series.running:
+        logger.warning("Refusing spectrum stream while a kinetic series is running")
+        await websocket.close(code=1013)
+        return
+    try:
+        spectrometer = await get_spectrometer()
+    except Exception as e:
+        logger.error(f"Cannot start spectrum stream: {e}")
+        await websocket.close(code=1011)
+        return
+    
+    stream = get_streamer(spectrometer)
+    subscriber = stream.subscribe()
+    
+    async def forward():
+        while True:
+            message = await subscriber.get()
+            if message is None:
+                await websocket.close()
+                return
+            await websocket.send_bytes(message)
+    
+    async def wait_for_disconnect():
+        # Incoming messages are ignored; this only watches for the client leaving
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    
+    tasks = [asyncio.ensure_future(forward()), asyncio.ensure_future(wait_for_disconnect())]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() and not isinstance(task.exception(), WebSocketDisconnect):
+                logger.error(f"Spectrum stream error: {task.exception()}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await stream.unsubscribe(subscriber)
+
+@app.post("/kinetics/start", tags=["Acquisition"])
+async def start_kinetic_series(settings: KineticSettings, spectrometer: Spectrometer = Depends(get_spectrometer)):
+    """
+    Start a kinetic series: one spectrum every interval_ms, scheduled on the server
+    
+    Spectra are appended to a .spx store in the spectra directory and sent
+    to /ws/kinetics clients. Live streaming must be stopped first, since
+    both would compete for the camera.
+    """
+    global kinetic_series, kinetic_store
+    if kinetic_series is not None and kinetic_series.running:
+        raise HTTPException(status_code=409, detail="A kinetic series is already running")
+    if streamer is not None and streamer.running:
+        raise HTTPException(status_code=409, detail="Live streaming is active; close /ws/spectrum clients first")
+    if settings.readout_mode not in (None, "average", "maximum"):
+        raise HTTPException(status_code=400, detail=f"Invalid readout mode: {settings.readout_mode}")
+    
+    name = settings.filename or time.strftime("kinetic_%Y%m%d_%H%M%S")
+    clean_filename = "".join(c for c in name if c.isalnum() or c in "._- ")
+    if not clean_filename.endswith(".spx"):
+        clean_filename += ".spx"
+    filepath = str(SPECTRA_DIR / clean_filename)
+    
+    catalog = await asyncio.to_thread(get_catalog)
+    loop = asyncio.get_running_loop()
+    use_max = spectrometer.use_max if settings.readout_mode is None else settings.readout_mode == "maximum"
+    calibration = calibration_hash(spectrometer._wavelength_coeffs)
+    baseline_corrected = spectrometer.baseline_correction != 'none'
+    store_flags = (FLAG_MAXIMUM if use_max else 0) | (FLAG_BASELINE_CORRECTED if baseline_corrected else 0)
+    stream_flags = (FLAG_MAXIMUM_READOUT if use_max else 0) | \
+        (STREAM_FLAG_BASELINE_CORRECTED if baseline_corrected else 0)
+    catalog_rows: List[tuple] = []
+    
+    def store(result: Dict[str, Any]) -> None:
+        # Whether the dark was subtracted is decided per capture (the dark may not match)
+        dark_subtracted = result["dark_subtracted"]
+        index = spectrum_writer.append(
+            filepath, result["wavelengths"], result["intensities"],
+            timestamp=result["timestamp"], exposure_us=result["exposure_us"], gain=result["gain"],
+            frames=result["frames"], flags=store_flags | (FLAG_DARK_SUBTRACTED if dark_subtracted else 0),
+            calibration_hash=calibration
+        )
+        points = len(result["intensities"])
+        catalog_rows.append((clean_filename, index, "spx", result["timestamp"], result["exposure_us"],
+                             result["gain"], result["frames"], "maximum" if use_max else "average",
+                             dark_subtracted, f"{calibration:016x}", points, points * 4))
+        # Catalog commits are batched to keep them off the capture cadence
+        if len(catalog_rows) >= 64:
+            catalog.add_many(catalog_rows[:])
+            catalog_rows.clear()
+    
+    def publish(result: Dict[str, Any]) -> None:
+        loop.call_soon_threadsafe(
+            kinetic_broadcaster.broadcast, result["wavelengths"], result["intensities"],
+            result["timestamp"], result["exposure_us"] / 1000.0, result["gain"],
+            stream_flags | (STREAM_FLAG_DARK_SUBTRACTED if result["dark_subtracted"] else 0)
+        )
+    
+    def finish(series: KineticSeries) -> None:
+        if catalog_rows:
+            catalog.add_many(catalog_rows[:])
+            catalog_rows.clear()
+        spectrum_writer.flush(filepath)
+    
+    try:
+        series = KineticSeries(
+            spectrometer,
+            interval_s=settings.interval_ms / 1000.0,
+            count=settings.count,
+            accumulate=settings.accumulate,
+            subtract_dark=settings.subtract_dark,
+            readout_mode=settings.readout_mode,
+            executor=hardware,
+            on_spectrum=[store, publish],
+            on_finish=finish
+        )
+        series.start()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start kinetic series: {str(e)}")
+    
+    kinetic_series = series
+    kinetic_store = clean_filename
+    return {"message": "Kinetic series started", "filename": clean_filename, "status": series.get_status()}
+
+@app.post("/kinetics/stop", tags=["Acquisition"])
+async def stop_kinetic_series():
+    """Stop the running kinetic series after the capture in progress"""
+    if kinetic_series is None or not kinetic_series.running:
+        raise HTTPException(status_code=409, detail="No kinetic series is running")
+    await asyncio.to_thread(kinetic_series.stop)
+    return {"message": "Kinetic series stopped", "filename": kinetic_store, "status": kinetic_series.get_status()}
+
+@app.get("/kinetics", tags=["Acquisition"])
+async def get_kinetic_series():
+    """Get the state, progress and timing statistics of the current or last kinetic series"""
+    if kinetic_series is None:
+        return {"filename": None, "status": None}
+    return {"filename": kinetic_store, "status": kinetic_series.get_status()}
+
+@app.websocket("/ws/kinetics")
+async def stream_kinetic_series(websocket: WebSocket):
+    """
+    Follow kinetic series spectra as binary messages
+    
+    Uses the /ws/spectrum message format. Spectra are only sent while a
+    kinetic series is running; a slow client skips spectra, all of which
+    are kept in the series store.
+    """
+    await websocket.accept()
+    subscriber = kinetic_broadcaster.add_subscriber()
+    
+    async def forward():
+        while True:
+            message = await subscriber.get()
+            if message is None:
+                await websocket.close()
+                return
+            await websocket.send_bytes(message)
+    
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    
+    tasks = [asyncio.ensure_future(forward()), asyncio.ensure_future(wait_for_disconnect())]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() and not isinstance(task.exception(), WebSocketDisconnect):
+                logger.error(f"Kinetic stream error: {task.exception()}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        kinetic_broadcaster.remove_subscriber(subscriber)
+
+@app.post("/reprocess", tags=["Data"])
+async def start_reprocessing(settings: ReprocessSettings):
+    """
+    Reprocess stored raw frames and spectra with a new recipe
+    
+    Runs in a process pool and needs no connected camera. The results go
+    to a new .spx store in the spectra directory; follow the progress with
+    GET /reprocess.
+    """
+    global reprocessing_job
+    if reprocessing_job is not None and reprocessing_job.running:
+        raise HTTPException(status_code=409, detail="A reprocessing job is already running")
+    
+    sources = [_store_path(name) for name in settings.sources]
+    missing = [path.name for path in sources if not path.is_file()]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Not found: {', '.join(missing)}")
+    dark = _store_path(settings.dark) if settings.dark else None
+    if dark is not None and not dark.is_file():
+        raise HTTPException(status_code=404, detail=f"Dark frame not found: {settings.dark}")
+    
+    name = settings.output or time.strftime("reprocessed_%Y%m%d_%H%M%S")
+    clean_filename = "".join(c for c in name if c.isalnum() or c in "._- ")
+    if not clean_filename.endswith(".spx"):
+        clean_filename += ".spx"
+    output = SPECTRA_DIR / clean_filename
+    if output.exists():
+        raise HTTPException(status_code=400, detail=f"{clean_filename} already exists")
+    
+    def option(value, path, default):
+        return value if value is not None else settings_manager.get_setting(path, default)
+    
+    def finish(job: ReprocessingJob) -> None:
+        if output.exists():
+            get_catalog().index_file(clean_filename)
+    
+    try:
+        recipe = ProcessingRecipe(
+            readout_mode=option(settings.readout_mode, 'processing.readout_mode', 'average'),
+            dark_path=str(dark) if dark is not None else None,
+            baseline_correction=option(settings.baseline_correction, 'processing.baseline_correction', 'none'),
+            polynomial_degree=option(settings.polynomial_degree, 'processing.polynomial_degree', 3),
+            als_lambda=option(settings.als_lambda, 'processing.als_lambda', 1e5),
+            als_asymmetry=option(settings.als_asymmetry, 'processing.als_asymmetry', 0.01),
+            wavelength_coefficients=option(settings.wavelength_coefficients,
+                                           'calibration.wavelength_coefficients', None),
+            binning=option(settings.binning, 'camera.roi.binning', 1),
+            clip_dark_pixels=option(settings.clip_dark_pixels, 'processing.clip_dark_pixels', False)
+        )
+        job = ReprocessingJob([str(path) for path in sources], str(output), recipe,
+                              workers=settings.workers, on_finish=finish)
+        
+        def start() -> None:
+            # Stores and archives being written must be complete on disk before they are read
+            spectrum_writer.flush()
+            frame_archive_writer.flush()
+            job.start()
+        
+        await asyncio.to_thread(start)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start reprocessing: {str(e)}")
+    
+    reprocessing_job = job
+    return {"message": "Reprocessing started", "filename": clean_filename, "status": job.get_status()}
+
+@app.post("/reprocess/stop", tags=["Data"])
+async def stop_reprocessing():
+    """Stop the running reprocessing job after the blocks in progress"""
+    if reprocessing_job is None or not reprocessing_job.running:
+        raise HTTPException(status_code=409, detail="No reprocessing job is running")
+    await asyncio.to_thread(reprocessing_job.stop)
+    return {"message": "Reprocessing stopped", "status": reprocessing_job.get_status()}
+
+@app.get("/reprocess", tags=["Data"])
+async def get_reprocessing():
+    """Get the progress and throughput of the current or last reprocessing job"""
+    if reprocessing_job is None:
+        return {"filename": None, "status": None}
+    status = reprocessing_job.get_status()
+    return {"filename": status["output"], "status": status}
+
 @app.get("/acquire/image", tags=["Acquisition"])
-async def acquire_raw_image(spectrometer: Spectrometer = Depends(get_spectrometer)):
+async def acquire_raw_image(
+    archive: Optional[str] = Query(None, description="Also append the raw frame to this archive (.raw)"),
+    spectrometer: Spectrometer = Depends(get_spectrometer)
+):
     """Acquire a raw 2D image and return it as a base64-encoded PNG with ROI overlay"""
+    archive_path = None if archive is None else str(_raw_archive_path(archive))
     try:
         # Acquire raw image
-        raw_image = spectrometer.acquire_spectrum(return_raw=True)
-        
-        # Normalize to 8-bit for display
-        img_min = np.min(raw_image)
-        img_max = np.max(raw_image)
-        if img_max > img_min:
-            img_norm = ((raw_image - img_min) / (img_max - img_min) * 255).astype(np.uint8)
-        else:
-            img_norm = np.zeros_like(raw_image, dtype=np.uint8)
-        
-        # Convert to RGB for overlay
-        from PIL import Image, ImageDraw
-        img_rgb = Image.fromarray(img_norm).convert('RGB')
-        
-        # Get current ROI settings
-        roi = spectrometer.roi_settings
+        raw_image = await hardware.run(_capture_raw_image, spectrometer, archive_path)
         
-        # Draw ROI rectangle
-        draw = ImageDraw.Draw(img_rgb)
-        
-        # Define rectangle coordinates
-        left = roi["start_x"]
-        top = roi["start_y"]
-        right = left + (roi["width"] or 0) 
-        bottom = top + (roi["height"] or 0)
-        
-        # Draw red rectangle with 2px width
-        draw.rectangle([left, top, right-1, bottom-1], outline=(255, 0, 0), width=2)
-        
-        # Convert to PNG
-        buffer = BytesIO()
-        img_rgb.save(buffer, format="PNG")
-        buffer.seek(0)
+        # Normalize, draw the current ROI and encode off the event loop
+        roi = dict(spectrometer.roi_settings)
+        buffer = await asyncio.to_thread(_render_roi_image, raw_image, roi)
         
         # Return as streaming response
         return StreamingResponse(buffer, media_type="image/png")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Failed to acquire image: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to acquire image: {str(e)}")
 
+@app.get("/preview", tags=["Acquisition"])
+async def get_preview(
+    request: Request,
+    refresh: bool = Query(False, description="Capture a new frame if the preview interval has passed"),
+    spectrometer: Spectrometer = Depends(get_spectrometer)
+):
+    """
+    Get the latest downsampled camera preview as JPEG
+    
+    Previews are rendered from the frames of spectrum acquisitions and the
+    live stream. A frame is only captured for the preview itself when none
+    exists yet or on refresh, and then at most once per preview interval.
+    Clients can revalidate with If-None-Match.
+    """
+    try:
+        streaming = streamer is not None and streamer.running
+        if preview.seq == 0 or (refresh and preview.due() and not streaming):
+            await hardware.run_coalesced(("preview",), _capture_preview, spectrometer)
+        
+        result = await asyncio.to_thread(preview.get)
+        if result is None:
+            raise HTTPException(status_code=404, detail="No preview available")
+        content, etag = result
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=content, media_type="image/jpeg", headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get preview: {str(e)}")
+
+@app.post("/preview/settings", tags=["Settings"])
+async def set_preview_settings(settings: PreviewSettings):
+    """Set the preview size, update interval and JPEG quality"""
+    try:
+        preview.configure(
+            max_width=settings.max_width,
+            max_height=settings.max_height,
+            min_interval_s=settings.min_interval_ms / 1000.0 if settings.min_interval_ms is not None else None,
+            quality=settings.quality
+        )
+        settings_manager.update_settings({
+            'max_width': preview.max_width,
+            'max_height': preview.max_height,
+            'min_interval_ms': int(preview.min_interval_s * 1000),
+            'quality': preview.quality
+        }, 'preview')
+        return {"message": "Preview settings updated", "preview": preview.get_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to set preview settings: {str(e)}")
+
+@app.post("/readout/plan", tags=["Settings"])
+async def plan_readout(
+    request: ReadoutPlanRequest,
+    spectrometer: Spectrometer = Depends(get_spectrometer)
+):
+    """Plan (and optionally apply) the cheapest readout covering a spectral band"""
+    try:
+        plan = await hardware.run(
+            spectrometer.plan_readout,
+            request.band_start_y,
+            request.band_height,
+            min_columns=request.min_columns,
+            dynamic_range_bits=request.dynamic_range_bits
+        )
+        if request.apply:
+            await hardware.run(spectrometer.apply_readout_plan, plan)
+        return {"plan": plan, "applied": request.apply}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to plan readout: {str(e)}")
+
 @app.get("/roi", tags=["Settings"])
 async def get_roi(spectrometer: Spectrometer = Depends(get_spectrometer)):
     """Get the current ROI settings"""
     try:
         return {
             "roi": spectrometer.roi_settings,
-            "camera_info": spectrometer.camera.get_camera_info()
+            "camera_info": await hardware.run(spectrometer.camera.get_camera_info)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get ROI settings: {str(e)}")
 
+def _store_path(filename: str) -> Path:
+    """Path of a spectrum file in SPECTRA_DIR, rejecting anything outside it"""
+    clean_filename = os.path.basename(filename)
+    if not clean_filename or clean_filename != filename:
+        raise HTTPException(status_code=400, detail=f"Invalid spectrum file name: {filename}")
+    return SPECTRA_DIR / clean_filename
+
 @app.post("/save/spectrum", tags=["Data"])
 async def save_spectrum_data(
     filename: str = Query(..., description="Filename for the spectrum data"),
     readout_mode: Optional[str] = Query(None, description="Readout mode: 'average' or 'maximum'"),
+    format: str = Query("spx", description="'spx' appends to a binary spectrum store, 'csv' writes one CSV file"),
     spectrometer: Spectrometer = Depends(get_spectrometer)
 ):
-    """Acquire and save a spectrum to a CSV file"""
+    """
+    Acquire and save a spectrum
+    
+    With the default 'spx' format, spectra saved under the same name are
+    appended to one binary store, written in the background. Use
+    /spectra/{filename}/csv to export them as CSV.
+    """
+    if format not in ("spx", "csv"):
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}. Must be 'spx' or 'csv'.")
     try:
         # Make sure filename only has valid characters
         clean_filename = "".join(c for c in filename if c.isalnum() or c in "._- ")
-        if not clean_filename.endswith(".csv"):
-            clean_filename += ".csv"
+        extension = "." + format
+        if not clean_filename.endswith(extension):
+            clean_filename += extension
             
         filepath = SPECTRA_DIR / clean_filename
         
         # Acquire spectrum
-        wavelengths, intensities = spectrometer.acquire_spectrum(readout_mode=readout_mode)
+        result = await hardware.run(_capture_spectrum, spectrometer, None, readout_mode, False)
+        
+        use_max = spectrometer.use_max if readout_mode is None else readout_mode == "maximum"
+        dark_subtracted = result["dark_subtracted"]
+        calibration = calibration_hash(spectrometer._wavelength_coeffs)
+        points = len(result["intensities"])
+        catalog = await asyncio.to_thread(get_catalog)
         
-        # Save to file
-        spectrometer.save_spectrum(str(filepath), wavelengths, intensities)
+        if format == "csv":
+            await asyncio.to_thread(spectrometer.save_spectrum, str(filepath),
+                                    result["wavelengths"], result["intensities"])
+            await asyncio.to_thread(
+                catalog.add, clean_filename, 0, "csv",
+                timestamp=result["timestamp"], exposure_us=result["exposure_us"], gain=result["gain"],
+                frames=result["frames"], readout_mode="maximum" if use_max else "average",
+                dark_subtracted=dark_subtracted, calibration_hash=calibration,
+                points=points, size=filepath.stat().st_size
+            )
+            return {
+                "message": "Spectrum saved successfully",
+                "filename": clean_filename,
+                "path": str(filepath)
+            }
+        
+        flags = FLAG_MAXIMUM if use_max else 0
+        if dark_subtracted:
+            flags |= FLAG_DARK_SUBTRACTED
+        if spectrometer.baseline_correction != 'none':
+            flags |= FLAG_BASELINE_CORRECTED
+        # Opening an existing store reads it back, so this runs off the event loop
+        index = await asyncio.to_thread(
+            spectrum_writer.append, str(filepath), result["wavelengths"], result["intensities"],
+            timestamp=result["timestamp"],
+            exposure_us=result["exposure_us"],
+            gain=result["gain"],
+            frames=result["frames"],
+            flags=flags,
+            calibration_hash=calibration
+        )
+        await asyncio.to_thread(
+            catalog.add, clean_filename, index, "spx",
+            timestamp=result["timestamp"], exposure_us=result["exposure_us"], gain=result["gain"],
+            frames=result["frames"], readout_mode="maximum" if use_max else "average",
+            dark_subtracted=dark_subtracted, calibration_hash=calibration,
+            points=points, size=points * 4
+        )
         
         return {
             "message": "Spectrum saved successfully",
             "filename": clean_filename,
-            "path": str(filepath)
+            "path": str(filepath),
+            "index": index
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Failed to save spectrum: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save spectrum: {str(e)}")
 
-@app.get("/spectra", tags=["Data"])
-async def list_spectra():
-    """List all saved spectra"""
-    spectra_files = list(SPECTRA_DIR.glob("*.csv"))
+def _raw_archive_path(filename: str) -> Path:
+    """Archive path in SPECTRA_DIR for a user-supplied name, adding the .raw suffix"""
+    clean_filename = "".join(c for c in filename if c.isalnum() or c in "._- ")
+    if not clean_filename.endswith(".raw"):
+        clean_filename += ".raw"
+    return SPECTRA_DIR / clean_filename
+
+@app.post("/save/raw", tags=["Data"])
+async def save_raw_frames(
+    filename: str = Query(..., description="Archive name (.raw)"),
+    count: int = Query(1, ge=1, le=100000, description="Number of frames to capture"),
+    spectrometer: Spectrometer = Depends(get_spectrometer)
+):
+    """
+    Capture raw frames and append them to a raw frame archive
+    
+    Frames are written by a background writer; if it falls behind by more
+    than storage.raw_max_pending frames, capture waits for it, so all count
+    frames are saved. (Frames archived alongside /acquire/image are dropped
+    instead.) All frames in an archive must have the same shape.
+    """
+    filepath = _raw_archive_path(filename)
+    try:
+        result = await hardware.run(_capture_raw_frames, spectrometer, str(filepath), count)
+        await asyncio.to_thread(frame_archive_writer.flush, str(filepath))
+        info = frame_archive_writer.get_archive(str(filepath)).get_info()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Failed to save raw frames: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save raw frames: {str(e)}")
+    
     return {
-        "spectra": [
+        "message": "Raw frames saved successfully",
+        "filename": filepath.name,
+        "path": str(filepath),
+        "queued": result["queued"],
+        "dropped": result["dropped"],
+        "frames": info["frames"]
+    }
+
+@app.get("/raw/{filename}", tags=["Data"])
+async def get_raw_archive(
+    filename: str,
+    offset: int = Query(0, ge=0, description="First frame to list"),
+    limit: int = Query(100, ge=0, le=10000, description="Maximum number of frames to list")
+):
+    """Get the shape of a raw frame archive and the metadata of its frames"""
+    filepath = _store_path(filename)
+    if filepath.suffix != ".raw":
+        raise HTTPException(status_code=400, detail="Not a raw frame archive (.raw)")
+    await asyncio.to_thread(frame_archive_writer.flush, str(filepath))
+    if not filepath.exists():
+        raise HTTPException(status_code=404, detail=f"Raw frame archive {filename} not found")
+    try:
+        data = await asyncio.to_thread(read_archive, str(filepath))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Failed to read raw frame archive: {str(e)}")
+    
+    frames = data["frames"]
+    meta = data["meta"][offset:offset + limit]
+    return {
+        "filename": filepath.name,
+        "frames": len(frames),
+        "height": frames.shape[1],
+        "width": frames.shape[2],
+        "dtype": frames.dtype.name,
+        "offset": offset,
+        "meta": [
             {
-                "filename": f.name,
-                "path": str(f),
-                "size": f.stat().st_size,
-                "created": f.stat().st_mtime
+                "index": offset + i,
+                "timestamp": float(m["timestamp"]),
+                "exposure_ms": int(m["exposure_us"]) / 1000.0,
+                "gain": int(m["gain"]),
+                "temperature_c": None if np.isnan(m["temperature_c"]) else float(m["temperature_c"]),
+                "start_x": int(m["start_x"]),
+                "start_y": int(m["start_y"]),
+                "binning": int(m["binning"])
             }
-            for f in spectra_files
+            for i, m in enumerate(meta)
         ]
     }
 
+@app.get("/raw/{filename}/{index}", tags=["Data"])
+async def get_raw_frame(
+    filename: str,
+    index: int,
+    format: str = Query("png", description="'png' for a display image, 'npy' for the raw pixels")
+):
+    """
+    Get one frame of a raw frame archive
+    
+    The archive is memory-mapped, so only the requested frame is read.
+    """
+    if format not in ("png", "npy"):
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}. Must be 'png' or 'npy'.")
+    filepath = _store_path(filename)
+    if filepath.suffix != ".raw":
+        raise HTTPException(status_code=400, detail="Not a raw frame archive (.raw)")
+    await asyncio.to_thread(frame_archive_writer.flush, str(filepath))
+    if not filepath.exists():
+        raise HTTPException(status_code=404, detail=f"Raw frame archive {filename} not found")
+    
+    def encode() -> BytesIO:
+        frames = read_archive(str(filepath))["frames"]
+        if not -len(frames) <= index < len(frames):
+            raise IndexError(f"Frame {index} not in archive ({len(frames)} frames)")
+        frame = np.asarray(frames[index])
+        buffer = BytesIO()
+        if format == "npy":
+            np.save(buffer, frame, allow_pickle=False)
+        else:
+            from PIL import Image
+            Image.fromarray(display_normalizer.normalize(frame)).save(buffer, format="PNG")
+        buffer.seek(0)
+        return buffer
+    
+    try:
+        buffer = await asyncio.to_thread(encode)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Failed to read raw frame archive: {str(e)}")
+    
+    if format == "npy":
+        return StreamingResponse(buffer, media_type="application/octet-stream", headers={
+            "Content-Disposition": f'attachment; filename="{filepath.stem}_{index}.npy"'})
+    return StreamingResponse(buffer, media_type="image/png")
+
+@app.get("/spectra", tags=["Data"])
+async def list_spectra(
+    offset: int = Query(0, ge=0, description="Number of matching spectra to skip"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of spectra to return"),
+    sort: str = Query("timestamp", description=f"Sort key: {', '.join(SORT_COLUMNS)}"),
+    order: str = Query("desc", description="Sort order: 'asc' or 'desc'"),
+    start_time: Optional[float] = Query(None, description="Earliest acquisition time (Unix seconds)"),
+    end_time: Optional[float] = Query(None, description="Latest acquisition time (Unix seconds)"),
+    min_exposure_ms: Optional[float] = Query(None, ge=0, description="Minimum exposure time"),
+    max_exposure_ms: Optional[float] = Query(None, ge=0, description="Maximum exposure time"),
+    prefix: Optional[str] = Query(None, description="File name prefix"),
+    readout_mode: Optional[str] = Query(None, description="Readout mode: 'average' or 'maximum'")
+):
+    """
+    List saved spectra from the catalog
+    
+    Each spectrum in a .spx store and each CSV file is one entry. Results
+    are paged and come from an index, so listing does not scan the spectra
+    directory (see /spectra/reindex).
+    """
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail=f"Invalid order: {order}. Must be 'asc' or 'desc'.")
+    try:
+        catalog = await asyncio.to_thread(get_catalog)
+        result = await asyncio.to_thread(
+            catalog.query,
+            offset=offset,
+            limit=limit,
+            sort=sort,
+            descending=order == "desc",
+            start_time=start_time,
+            end_time=end_time,
+            min_exposure_us=None if min_exposure_ms is None else round(min_exposure_ms * 1000),
+            max_exposure_us=None if max_exposure_ms is None else round(max_exposure_ms * 1000),
+            prefix=prefix,
+            readout_mode=readout_mode
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to list spectra: {str(e)}")
+    
+    spectra = []
+    for entry in result["entries"]:
+        entry["path"] = str(SPECTRA_DIR / entry["filename"])
+        entry["created"] = entry["timestamp"]
+        spectra.append(entry)
+    return {
+        "total": result["total"],
+        "offset": offset,
+        "limit": limit,
+        "spectra": spectra
+    }
+
+@app.post("/spectra/reindex", tags=["Data"])
+async def reindex_spectra():
+    """Rebuild the spectra catalog from the files in the spectra directory"""
+    try:
+        await asyncio.to_thread(spectrum_writer.flush)
+        catalog = await asyncio.to_thread(get_catalog)
+        return await asyncio.to_thread(catalog.rebuild)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild spectra catalog: {str(e)}")
+
 @app.get("/spectra/{filename}", tags=["Data"])
 async def get_spectrum_file(filename: str):
     """Get a specific spectrum file"""
-    filepath = SPECTRA_DIR / filename
+    filepath = _store_path(filename)
+    if filepath.suffix == ".spx":
+        await asyncio.to_thread(spectrum_writer.flush, str(filepath))
     if not filepath.exists():
         raise HTTPException(status_code=404, detail=f"Spectrum file {filename} not found")
     
-    # Clean the filename to be safe
-    clean_filename = os.path.basename(filename)
+    return FileResponse(str(filepath), filename=filepath.name)
+
+@app.get("/spectra/{filename}/csv", tags=["Data"])
+async def export_spectrum_csv(
+    filename: str,
+    index: Optional[List[int]] = Query(None, description="Spectra to export (default: all)")
+):
+    """Export spectra from a binary store as CSV"""
+    filepath = _store_path(filename)
+    if filepath.suffix != ".spx":
+        raise HTTPException(status_code=400, detail="CSV export is only available for .spx stores")
+    await asyncio.to_thread(spectrum_writer.flush, str(filepath))
+    if not filepath.exists():
+        raise HTTPException(status_code=404, detail=f"Spectrum file {filename} not found")
+    
+    try:
+        data = await asyncio.to_thread(read_store, str(filepath))
+        text = export_csv(data, index)
+    except (ValueError, IndexError) as e:
+        raise HTTPException(status_code=400, detail=f"Failed to export spectra: {str(e)}")
     
-    return FileResponse(str(filepath), filename=clean_filename)
+    return Response(
+        content=text,
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filepath.stem}.csv"'}
+    )
 
 @app.post("/api/settings/load-defaults", tags=["Settings"])
 async def load_default_settings(background_tasks: BackgroundTasks):
@@ -506,7 +1459,7 @@ async def load_default_settings(background_tasks: BackgroundTasks):
     
     if spectrometer is None:
         sdk_path = os.getenv("ZWO_ASI_LIB")
-        spectrometer = Spectrometer(sdk_path)
+        spectrometer = await hardware.run(Spectrometer, sdk_path)
         
     if not spectrometer.connected:
         return {"success": False, "error": "Not connected to spectrometer"}
@@ -527,14 +1480,14 @@ async def load_default_settings(background_tasks: BackgroundTasks):
         
         # Set exposure and gain
         if exposure_ms is not None:
-            spectrometer.set_exposure(exposure_ms)
+            await hardware.run(spectrometer.set_exposure, exposure_ms)
         if gain is not None:
-            spectrometer.set_gain(gain)
+            await hardware.run(spectrometer.set_gain, gain)
             
         # Apply ROI settings
         roi_settings = camera_settings.get('roi', {})
         if roi_settings:
-            spectrometer.set_roi(
+            await hardware.run(spectrometer.set_roi,
                 start_x=roi_settings.get('start_x', 0),
                 start_y=roi_settings.get('start_y', 0),
                 width=roi_settings.get('width', None),
@@ -548,12 +1501,12 @@ async def load_default_settings(background_tasks: BackgroundTasks):
             # Set wavelength calibration coefficients
             wavelength_coeffs = calibration_settings.get('wavelength_coefficients')
             if wavelength_coeffs:
-                spectrometer.set_wavelength_calibration(wavelength_coeffs)
+                await hardware.run(spectrometer.set_wavelength_calibration, wavelength_coeffs)
             
             # Set laser wavelength
             laser_wavelength = calibration_settings.get('laser_wavelength')
             if laser_wavelength:
-                spectrometer.set_laser_wavelength(laser_wavelength)
+                await hardware.run(spectrometer.set_laser_wavelength, laser_wavelength)
                 
         # Apply processing settings
         processing_settings = default_settings.get('processing', {})
@@ -563,10 +1516,13 @@ async def load_default_settings(background_tasks: BackgroundTasks):
             baseline_correction = processing_settings.get('baseline_correction')
             polynomial_degree = processing_settings.get('polynomial_degree')
             
-            spectrometer.set_processing_settings(
+            await hardware.run(spectrometer.set_processing_settings,
                 readout_mode=readout_mode,
                 baseline_correction=baseline_correction,
-                polynomial_degree=polynomial_degree
+                polynomial_degree=polynomial_degree,
+                als_lambda=processing_settings.get('als_lambda'),
+                als_asymmetry=processing_settings.get('als_asymmetry'),
+                clip_dark_pixels=processing_settings.get('clip_dark_pixels')
             )
             
         logger.info("Successfully applied default settings from default_settings.json")
@@ -625,10 +1581,38 @@ async def get_default_settings():
 
 @app.post("/api/settings/display", tags=["Settings"])
 async def set_display_settings(
-    mode: Optional[str] = Body(None, description="Display mode: 'wavelength', 'raman', or 'pixels'")
+    mode: Optional[str] = Body(None, description="Display mode: 'wavelength', 'raman', or 'pixels'"),
+    stretch_low_percentile: Optional[float] = Body(None, ge=0, lt=100, description="Image percentile shown as black"),
+    stretch_high_percentile: Optional[float] = Body(None, gt=0, le=100, description="Image percentile shown as white"),
+    gamma: Optional[float] = Body(None, gt=0, description="Image display gamma"),
+    log_scale: Optional[bool] = Body(None, description="Logarithmic image display")
 ):
     """Set display settings"""
     try:
+        stretch = {
+            'stretch_low_percentile': stretch_low_percentile,
+            'stretch_high_percentile': stretch_high_percentile,
+            'gamma': gamma,
+            'log_scale': log_scale
+        }
+        stretch = {key: value for key, value in stretch.items() if value is not None}
+        if stretch:
+            try:
+                display_normalizer.configure(
+                    low_percentile=stretch_low_percentile,
+                    high_percentile=stretch_high_percentile,
+                    gamma=gamma,
+                    log_scale=log_scale
+                )
+            except ValueError as e:
+                return {
+                    "success": False,
+                    "error": str(e)
+                }
+            # The settings observer re-renders the preview with the new mapping
+            settings_manager.update_settings(stretch, 'display')
+            logger.info(f"Image display stretch updated: {stretch}")
+            
         if mode is not None:
             # Validate mode
             if mode not in ['wavelength', 'raman', 'pixels']:
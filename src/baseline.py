@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Baseline estimation and correction for spectra
+"""
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from scipy.linalg import solveh_banded
+from typing import Dict, Tuple, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("none", "linear", "polynomial", "als")
+
+class BaselineCorrector:
+    """
+    Estimates and subtracts spectral baselines
+
+    Methods:
+        linear: Straight line through the first and last pixel
+        polynomial: Iterative modified polynomial fit (Lieber & Mahadevan-Jansen):
+            fit, clamp the spectrum to the fit, refit until the fit settles, so
+            peaks are progressively excluded from the baseline
+        als: Asymmetric least squares (Eilers & Boelens): a smooth curve with
+            a second-difference penalty, weighted to lie below the peaks
+
+    The polynomial fit projects onto an orthonormal basis of the Vandermonde
+    matrix (a thin QR on pixel positions scaled to [-1, 1]), built once per
+    (width, degree); each iteration is then two matrix-vector products. The
+    ALS penalty is pentadiagonal and kept in banded form per (width, lambda),
+    so each reweighting is an O(width) banded Cholesky solve.
+    """
+
+    def __init__(self, max_iterations: int = 100, tolerance: float = 1e-3,
+                 als_lambda: float = 1e5, als_asymmetry: float = 0.01,
+                 als_iterations: int = 10, cache_size: int = 8):
+        """
+        Initialize the corrector
+
+        Args:
+            max_iterations: Iteration limit of the polynomial fit
+            tolerance: Relative change of the polynomial baseline at which to stop
+            als_lambda: ALS smoothness (larger is smoother)
+            als_asymmetry: ALS weight of points above the baseline (0 < p < 1)
+            als_iterations: Reweighting limit of ALS
+            cache_size: Number of precomputed bases/penalties to keep
+        """
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.als_lambda = als_lambda
+        self.als_asymmetry = als_asymmetry
+        self.als_iterations = als_iterations
+        self.cache_size = cache_size
+        self.configure(als_lambda=als_lambda, als_asymmetry=als_asymmetry)
+
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.last_iterations = 0
+
+    def configure(self, als_lambda: Optional[float] = None, als_asymmetry: Optional[float] = None,
+                  max_iterations: Optional[int] = None, tolerance: Optional[float] = None) -> None:
+        """
+        Change the fit parameters
+
+        Raises:
+            ValueError: If a parameter is out of range (nothing is changed)
+        """
+        if als_lambda is not None and als_lambda <= 0:
+            raise ValueError("ALS lambda must be positive")
+        if als_asymmetry is not None and not 0 < als_asymmetry < 1:
+            raise ValueError("ALS asymmetry must be between 0 and 1")
+        if max_iterations is not None and max_iterations < 1:
+            raise ValueError("max_iterations must be at least 1")
+
+        if als_lambda is not None:
+            self.als_lambda = float(als_lambda)
+        if als_asymmetry is not None:
+            self.als_asymmetry = float(als_asymmetry)
+        if max_iterations is not None:
+            self.max_iterations = int(max_iterations)
+        if tolerance is not None:
+            self.tolerance = float(tolerance)
+
+    @staticmethod
+    def validate(method: str, degree: int = 3) -> None:
+        """
+        Check a method name and polynomial degree
+
+        Raises:
+            ValueError: If the method is unknown or the degree out of range
+        """
+        if method not in METHODS:
+            raise ValueError(f"Invalid baseline correction: {method}. Must be one of {', '.join(METHODS)}.")
+        if method == "polynomial" and not 0 <= degree <= 15:
+            raise ValueError("Polynomial degree must be between 0 and 15")
+
+    def _cached(self, key: Tuple, build) -> np.ndarray:
+        """Return the cached array for key, building it if needed"""
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = build()
+        value.flags.writeable = False
+        with self._lock:
+            self._cache[key] = value
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return value
+
+    def _basis(self, width: int, degree: int) -> np.ndarray:
+        """Orthonormal basis of the polynomials of degree <= degree on width pixels"""
+        def build():
+            x = np.linspace(-1.0, 1.0, width)
+            q, _ = np.linalg.qr(np.vander(x, degree + 1, increasing=True))
+            return np.ascontiguousarray(q)
+        return self._cached(("polynomial", width, degree), build)
+
+    def _penalty(self, width: int, lam: float) -> np.ndarray:
+        """lambda * D'D for the second-difference operator D, in upper banded form"""
+        def build():
+            # Each row of D is (1, -2, 1) at columns k..k+2; summing the products
+            # of its entries per diagonal gives D'D, also for the shortest widths
+            row = np.diff(np.eye(3), 2, axis=0)[0]
+            rows = width - 2
+            band = np.zeros((3, width))
+            for offset in range(3):
+                for i in range(3 - offset):
+                    band[2 - offset, i + offset:i + offset + rows] += row[i] * row[i + offset]
+            return band * lam
+        return self._cached(("als", width, lam), build)
+
+    def _linear(self, y: np.ndarray) -> np.ndarray:
+        width = len(y)
+        if width < 2:
+            return y.copy()
+        return y[0] + (y[-1] - y[0]) / (width - 1) * np.arange(width)
+
+    def _polynomial(self, y: np.ndarray, degree: int) -> np.ndarray:
+        width = len(y)
+        degree = min(degree, width - 1)
+        q = self._basis(width, degree)
+        work = y.copy()
+        fit = q @ (q.T @ work)
+        iterations = 1
+        for iterations in range(2, self.max_iterations + 1):
+            np.minimum(work, fit, out=work)
+            previous = fit
+            fit = q @ (q.T @ work)
+            change = np.linalg.norm(fit - previous)
+            if change <= self.tolerance * (np.linalg.norm(previous) or 1.0):
+                break
+        self.last_iterations = iterations
+        return fit
+
+    def _als(self, y: np.ndarray) -> np.ndarray:
+        width = len(y)
+        if width < 3:
+            return self._linear(y)
+        penalty = self._penalty(width, self.als_lambda)
+        p = self.als_asymmetry
+        weights = np.ones(width)
+        band = np.empty_like(penalty)
+        z = y
+        iterations = 0
+        for iterations in range(1, self.als_iterations + 1):
+            band[:] = penalty
+            band[2] += weights
+            z = solveh_banded(band, weights * y, check_finite=False)
+            new_weights = np.where(y > z, p, 1.0 - p)
+            if np.array_equal(new_weights, weights):
+                break
+            weights = new_weights
+        self.last_iterations = iterations
+        return z
+
+    def baseline(self, spectrum: np.ndarray, method: str, degree: int = 3) -> np.ndarray:
+        """
+        Estimate the baseline of a spectrum
+
+        Args:
+            spectrum: 1D spectrum
+            method: One of METHODS
+            degree: Degree of the polynomial method
+
+        Returns:
+            Baseline as a float64 array (zeros for 'none')
+
+        Raises:
+            ValueError: If the method or degree is invalid
+        """
+        self.validate(method, degree)
+        y = np.asarray(spectrum, dtype=np.float64)
+        if method == "none" or len(y) == 0:
+            return np.zeros(len(y))
+        if method == "linear":
+            return self._linear(y)
+        if method == "polynomial":
+            return self._polynomial(y, int(degree))
+        return self._als(y)
+
+    def correct(self, spectrum: np.ndarray, method: str, degree: int = 3,
+                clip: bool = True) -> np.ndarray:
+        """
+        Subtract the baseline from a spectrum
+
+        Args:
+            spectrum: 1D spectrum
+            method: One of METHODS ('none' returns the spectrum unchanged)
+            degree: Degree of the polynomial method
+            clip: Clip negative values to 0, like the column reduction does
+
+        Returns:
+            Corrected spectrum (float64)
+        """
+        if method == "none":
+            self.validate(method)
+            return spectrum
+        corrected = np.asarray(spectrum, dtype=np.float64) - self.baseline(spectrum, method, degree)
+        if clip:
+            np.maximum(corrected, 0.0, out=corrected)
+        return corrected
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get parameters and cache statistics
+
+        Returns:
+            Dictionary with the ALS parameters, cache hits/misses and the
+            iterations used by the last fit
+        """
+        with self._lock:
+            return {
+                "als_lambda": self.als_lambda,
+                "als_asymmetry": self.als_asymmetry,
+                "cached": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "last_iterations": self.last_iterations
+            }
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Wavelength calibration helpers: polynomial evaluation and cached spectral axes
+"""
+import hashlib
+import logging
+import threading
+import numpy as np
+from typing import Dict, Tuple, Optional, Any, Sequence
+
+logger = logging.getLogger(__name__)
+
+def evaluate_polynomial(coefficients: Sequence[float], x: np.ndarray) -> np.ndarray:
+    """
+    Evaluate c0 + c1*x + c2*x^2 + ... with Horner's method
+
+    Args:
+        coefficients: Polynomial coefficients [c0, c1, c2, ...]
+        x: Points to evaluate at
+
+    Returns:
+        Array of polynomial values (float64)
+    """
+    x = np.asarray(x, dtype=float)
+    if len(coefficients) == 0:
+        return np.zeros_like(x)
+
+    result = np.full(x.shape, float(coefficients[-1]))
+    for coef in reversed(coefficients[:-1]):
+        result *= x
+        result += coef
+    return result
+
+def wavelength_to_wavenumber(wavelengths: np.ndarray) -> np.ndarray:
+    """
+    Convert wavelengths in nm to absolute wavenumbers in cm^-1
+
+    Args:
+        wavelengths: Wavelengths in nm
+
+    Returns:
+        Wavenumbers in cm^-1 (inf where the wavelength is 0)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1e7 / np.asarray(wavelengths, dtype=float)
+
+def wavelength_to_raman_shift(wavelengths: np.ndarray, laser_wavelength: float) -> np.ndarray:
+    """
+    Convert wavelengths in nm to Raman shifts in cm^-1
+
+    Args:
+        wavelengths: Scattered wavelengths in nm
+        laser_wavelength: Excitation wavelength in nm
+
+    Returns:
+        Raman shifts in cm^-1 (positive for Stokes lines)
+    """
+    return 1e7 / laser_wavelength - wavelength_to_wavenumber(wavelengths)
+
+def binned_pixel_centers(width: int, binning: int = 1) -> np.ndarray:
+    """
+    Unbinned pixel position of the centre of each binned pixel
+
+    The calibration polynomial is defined on unbinned ROI columns, so binned
+    column i sits at i * binning + (binning - 1) / 2.
+
+    Args:
+        width: Number of binned pixels
+        binning: Binning factor
+
+    Returns:
+        Array of unbinned pixel positions (float64)
+    """
+    return np.arange(width) * float(binning) + (binning - 1) / 2.0
+
+def calibration_hash(coefficients: Sequence[float]) -> int:
+    """
+    Stable 64-bit identifier of a set of calibration coefficients
+
+    Args:
+        coefficients: Polynomial coefficients [c0, c1, c2, ...]
+
+    Returns:
+        Unsigned 64-bit integer
+    """
+    data = np.asarray(coefficients, dtype='<f8').tobytes()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+class CalibrationNotInvertibleError(ValueError):
+    """Raised when a calibration polynomial is not monotone over the ROI"""
+
+class InverseCalibration:
+    """
+    Fast wavelength-to-pixel mapping for a polynomial calibration
+
+    Built once per calibration: the forward polynomial is tabulated at every
+    pixel and checked for strict monotonicity, so a wavelength can be located
+    with np.searchsorted, linearly interpolated, and then polished with a few
+    vectorized Newton steps on the exact polynomial. Wavelengths outside the
+    ROI are extrapolated linearly from the end pixels.
+    """
+
+    def __init__(self, coefficients: Sequence[float], width: int, newton_steps: int = 2):
+        """
+        Build the lookup table
+
+        Args:
+            coefficients: Polynomial coefficients [c0, c1, c2, ...]
+            width: Number of pixels in the ROI
+            newton_steps: Newton refinement iterations per lookup
+
+        Raises:
+            CalibrationNotInvertibleError: If the polynomial is not strictly
+                monotone over the pixel range
+        """
+        if width < 2:
+            raise CalibrationNotInvertibleError("Need at least 2 pixels to invert a calibration")
+
+        self.coefficients = [float(c) for c in coefficients]
+        self.derivative = [i * c for i, c in enumerate(self.coefficients)][1:]
+        self.width = int(width)
+        self.newton_steps = newton_steps
+
+        pixels = np.arange(self.width, dtype=float)
+        wavelengths = evaluate_polynomial(self.coefficients, pixels)
+        steps = np.diff(wavelengths)
+        slopes = evaluate_polynomial(self.derivative, pixels)
+        if np.all(steps > 0) and np.all(slopes > 0):
+            self.increasing = True
+        elif np.all(steps < 0) and np.all(slopes < 0):
+            self.increasing = False
+        else:
+            raise CalibrationNotInvertibleError(
+                "Wavelength calibration is not monotone over the ROI and cannot be inverted"
+            )
+
+        # searchsorted needs an ascending table
+        if self.increasing:
+            self._table_wavelengths = wavelengths
+            self._table_pixels = pixels
+        else:
+            self._table_wavelengths = wavelengths[::-1].copy()
+            self._table_pixels = pixels[::-1].copy()
+        self.wavelength_range = (self._table_wavelengths[0], self._table_wavelengths[-1])
+
+    def to_pixel(self, wavelengths: np.ndarray, rounded: bool = False) -> np.ndarray:
+        """
+        Convert wavelengths to pixel positions
+
+        Args:
+            wavelengths: Wavelengths in nm (any shape)
+            rounded: If True, round to the nearest integer pixel
+
+        Returns:
+            Fractional (float64) or rounded (int) pixel positions
+        """
+        w = np.asarray(wavelengths, dtype=float)
+        table_w = self._table_wavelengths
+        table_p = self._table_pixels
+
+        # Bracket each wavelength and interpolate linearly for the initial guess
+        idx = np.clip(np.searchsorted(table_w, w), 1, len(table_w) - 1)
+        w0, w1 = table_w[idx - 1], table_w[idx]
+        p0, p1 = table_p[idx - 1], table_p[idx]
+        pixels = p0 + (w - w0) * (p1 - p0) / (w1 - w0)
+
+        # Polish in-range points on the exact polynomial
+        inside = (w >= table_w[0]) & (w <= table_w[-1])
+        if self.newton_steps and np.any(inside):
+            p = pixels[inside]
+            target = w[inside]
+            for _ in range(self.newton_steps):
+                p -= (evaluate_polynomial(self.coefficients, p) - target) / \
+                     evaluate_polynomial(self.derivative, p)
+            pixels[inside] = p
+
+        if rounded:
+            return np.round(pixels).astype(int)
+        return pixels
+
+class CalibrationAxisCache:
+    """
+    Cache of the spectral axes for the current calibration and ROI
+
+    The wavelength axis is evaluated once per (coefficients, width, binning,
+    start_x) and handed out as a read-only array; Raman-shift and wavenumber
+    axes are derived from it and additionally keyed on the laser wavelength.
+    Each rebuild bumps a generation counter so consumers can tell when the
+    axis has changed.
+    """
+
+    def __init__(self):
+        """Initialize an empty cache"""
+        self._lock = threading.Lock()
+        self._key: Optional[Tuple] = None
+        self._axes: Dict[str, np.ndarray] = {}
+        self._laser_wavelength: Optional[float] = None
+        self._inverse_key: Optional[Tuple] = None
+        self._inverse: Optional[InverseCalibration] = None
+        self.generation = 0
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _readonly(array: np.ndarray) -> np.ndarray:
+        array.flags.writeable = False
+        return array
+
+    def invalidate(self) -> None:
+        """Drop all cached axes"""
+        with self._lock:
+            self._key = None
+            self._axes = {}
+            self._laser_wavelength = None
+            self._inverse_key = None
+            self._inverse = None
+
+    def _wavelength_axis(self, key: Tuple) -> np.ndarray:
+        """Return the cached wavelength axis for key, building it if needed (lock held)"""
+        if key == self._key:
+            self.hits += 1
+            return self._axes['wavelength']
+
+        self.misses += 1
+        coefficients, width, binning = key[0], key[1], key[2]
+        wavelengths = evaluate_polynomial(coefficients, binned_pixel_centers(width, binning))
+        self._key = key
+        self._axes = {'wavelength': self._readonly(wavelengths)}
+        self._laser_wavelength = None
+        self.generation += 1
+        logger.debug(f"Rebuilt wavelength axis (width {width}, generation {self.generation})")
+        return wavelengths
+
+    def get_wavelength_axis(self, coefficients: Sequence[float], width: int,
+                            binning: int = 1, start_x: int = 0) -> np.ndarray:
+        """
+        Get the wavelength axis for a calibration and ROI
+
+        Args:
+            coefficients: Polynomial coefficients [c0, c1, c2, ...]
+            width: Number of pixels in the spectrum
+            binning: Pixel binning factor of the ROI; the calibration is
+                     evaluated at the centre of each binned pixel
+            start_x: Starting X position of the ROI
+
+        Returns:
+            Read-only wavelength array of length width
+        """
+        key = (tuple(float(c) for c in coefficients), int(width), int(binning), int(start_x))
+        with self._lock:
+            return self._wavelength_axis(key)
+
+    def get_axes(self, coefficients: Sequence[float], width: int,
+                 laser_wavelength: float, binning: int = 1,
+                 start_x: int = 0) -> Dict[str, np.ndarray]:
+        """
+        Get the wavelength, wavenumber and Raman-shift axes
+
+        Args:
+            coefficients: Polynomial coefficients [c0, c1, c2, ...]
+            width: Number of pixels in the spectrum
+            laser_wavelength: Excitation wavelength in nm for the Raman axis
+            binning: Pixel binning factor of the ROI
+            start_x: Starting X position of the ROI
+
+        Returns:
+            Dictionary of read-only arrays keyed 'wavelength', 'wavenumber' and 'raman_shift'
+        """
+        key = (tuple(float(c) for c in coefficients), int(width), int(binning), int(start_x))
+        with self._lock:
+            wavelengths = self._wavelength_axis(key)
+            if 'wavenumber' not in self._axes:
+                self._axes['wavenumber'] = self._readonly(wavelength_to_wavenumber(wavelengths))
+            if self._laser_wavelength != laser_wavelength:
+                raman = 1e7 / laser_wavelength - self._axes['wavenumber']
+                self._axes['raman_shift'] = self._readonly(raman)
+                self._laser_wavelength = laser_wavelength
+            return dict(self._axes)
+
+    def get_inverse(self, coefficients: Sequence[float], width: int) -> InverseCalibration:
+        """
+        Get the inverse calibration for a calibration and ROI width
+
+        Args:
+            coefficients: Polynomial coefficients [c0, c1, c2, ...]
+            width: Number of pixels in the ROI
+
+        Returns:
+            InverseCalibration built once per (coefficients, width)
+
+        Raises:
+            CalibrationNotInvertibleError: If the polynomial is not monotone over the ROI
+        """
+        key = (tuple(float(c) for c in coefficients), int(width))
+        with self._lock:
+            if key != self._inverse_key:
+                self._inverse = InverseCalibration(key[0], key[1])
+                self._inverse_key = key
+            return self._inverse
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with hit/miss counts and the current generation
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "generation": self.generation,
+                "width": self._key[1] if self._key else None
+            }
@@ -5,47 +5,205 @@ ASI183MM Camera Interface module for spectrometer application
 import os
 import time
 import logging
-import zwoasi as asi
+import threading
 import numpy as np
-from typing import Dict, Tuple, Optional, Any, List
+from contextlib import contextmanager
+from typing import Dict, Tuple, Optional, Any, List, Iterator
+
+from frame_buffer import FrameRingBuffer, FramePool, PooledFrame
+from metrics import registry
 
 logger = logging.getLogger(__name__)
 
+# Acquisition metrics (served at /metrics)
+SDK_CALLS = registry.counter("asi_sdk_calls", "Camera SDK calls", ("method",))
+CAPTURE_STAGE_SECONDS = registry.histogram(
+    "asi_capture_stage_seconds",
+    "Snapshot capture time by stage: exposure (start and sleep), status_wait (polling past the exposure), "
+    "transfer (reading the frame) and total", ("stage",))
+EXPOSURE_RETRIES = registry.counter("asi_exposure_retries", "Snapshot exposures that failed and were retried")
+TRANSFERRED_BYTES = registry.counter("asi_transferred_bytes", "Frame data read from the camera", ("mode",))
+VIDEO_FRAMES = registry.counter("asi_video_frames", "Frames received in continuous capture")
+VIDEO_ERRORS = registry.counter("asi_video_errors", "Failed frame reads in continuous capture")
+VIDEO_DROPPED = registry.counter(
+    "asi_video_dropped_frames", "Continuous capture frames overwritten before anyone read them")
+
+_STAGE_EXPOSURE = CAPTURE_STAGE_SECONDS.labels("exposure")
+_STAGE_STATUS_WAIT = CAPTURE_STAGE_SECONDS.labels("status_wait")
+_STAGE_TRANSFER = CAPTURE_STAGE_SECONDS.labels("transfer")
+_STAGE_TOTAL = CAPTURE_STAGE_SECONDS.labels("total")
+_SNAPSHOT_BYTES = TRANSFERRED_BYTES.labels("snapshot")
+_VIDEO_BYTES = TRANSFERRED_BYTES.labels("video")
+
+class SDKCallCounter:
+    """
+    Proxy around a zwoasi Camera that counts the SDK methods called on it
+    
+    Counts are kept in total and, inside a track() block, per calling thread,
+    so a capture can report exactly which SDK calls it made.
+    """
+    
+    def __init__(self, camera: Any):
+        """
+        Wrap a camera object
+        
+        Args:
+            camera: zwoasi.Camera (or compatible) instance
+        """
+        self._camera = camera
+        self._counts: Dict[str, int] = {}
+        self._counts_lock = threading.Lock()
+        self._local = threading.local()
+    
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._camera, name)
+        if not callable(attr):
+            return attr
+        total = SDK_CALLS.labels(name)
+            
+        def counted(*args, **kwargs):
+            total.inc()
+            with self._counts_lock:
+                self._counts[name] = self._counts.get(name, 0) + 1
+            calls = getattr(self._local, 'calls', None)
+            if calls is not None:
+                calls[name] = calls.get(name, 0) + 1
+            return attr(*args, **kwargs)
+            
+        # Cache the wrapper so later lookups bypass __getattr__
+        setattr(self, name, counted)
+        return counted
+    
+    @contextmanager
+    def track(self) -> Iterator[Dict[str, int]]:
+        """
+        Count the SDK calls made by the current thread within the block
+        
+        Yields:
+            Dictionary of call counts by method name, filled in as calls are made
+        """
+        calls: Dict[str, int] = {}
+        previous = getattr(self._local, 'calls', None)
+        self._local.calls = calls
+        try:
+            yield calls
+        finally:
+            self._local.calls = previous
+    
+    def get_counts(self) -> Dict[str, int]:
+        """
+        Get the total number of calls per SDK method
+        
+        Returns:
+            Dictionary of call counts by method name
+        """
+        with self._counts_lock:
+            return dict(self._counts)
+
+SIMULATOR_SCHEME = "sim://"
+
+# The zwoasi module, imported when the real SDK is first selected so the
+# simulator runs without it installed
+asi: Any = None
+
+def load_sdk(sdk_path: str) -> Any:
+    """
+    Select the camera SDK backend for a library path
+    
+    Any object with the zwoasi module interface (init, get_num_cameras,
+    list_cameras, Camera and the ASI_* constants) can serve as a backend.
+    
+    Args:
+        sdk_path: Path to the ASI SDK library, or "sim://[?options]" for the
+                  simulated camera (see simulated_asi)
+    
+    Returns:
+        The zwoasi module or the simulated_asi module
+    """
+    global asi
+    if sdk_path.startswith(SIMULATOR_SCHEME):
+        import simulated_asi
+        return simulated_asi
+    if asi is None:
+        import zwoasi
+        asi = zwoasi
+    return asi
+
 class ASI183Camera:
     """Interface for the ASI183MM camera used in the spectrometer"""
     
+    # Interval between exposure status polls once the exposure time has elapsed
+    STATUS_POLL_INTERVAL = 0.005
+    
+    # Delay after a failed video frame read, doubled per consecutive failure up to the maximum
+    VIDEO_ERROR_BACKOFF = 0.01
+    VIDEO_ERROR_BACKOFF_MAX = 1.0
+    
     def __init__(self, sdk_path: Optional[str] = None):
         """
         Initialize the camera interface
         
         Args:
-            sdk_path: Path to the ASI SDK library file (.so or .dll)
+            sdk_path: Path to the ASI SDK library file (.so or .dll), or
+                     "sim://" for the simulated camera.
                      If None, will try to use ZWO_ASI_LIB environment variable
         """
         self.camera = None
         self.camera_info = None
         self.connected = False
         
+        # Control values read at connect time (and by get_settings and
+        # reconcile_state), for status reports
+        self.control_values: Dict[str, Any] = {}
+        self.control_values_read_at = 0.0
+        
+        # Continuous (video mode) acquisition state
+        self._video_ring: Optional[FrameRingBuffer] = None
+        self._video_thread: Optional[threading.Thread] = None
+        self._video_stop = threading.Event()
+        self._video_last_seq = -1
+        self._video_errors = 0
+        self._video_started_at = 0.0
+        self._video_timeout_ms = self._video_timeout_for(100000)
+        
+        # Reusable frame buffers for zero-copy captures
+        self.frame_pool = FramePool()
+        
+        # Authoritative cached readout state, updated only by the setters
+        self.state: Dict[str, Any] = {}
+        self._reconcile_thread: Optional[threading.Thread] = None
+        self._reconcile_stop = threading.Event()
+        
+        # USB bandwidth share set by setup_defaults (percent)
+        self.bandwidth_percent = 40
+        
+        # SDK call accounting for the most recent capture
+        self.last_capture_sdk_calls: Dict[str, int] = {}
+        self.exposure_retries = 0
+        
         # Initialize the ASI SDK
-        env_path = os.getenv('ZWO_ASI_LIB')
-        if sdk_path:
-            asi.init(sdk_path)
-        elif env_path:
-            asi.init(env_path)
-        else:
+        sdk_path = sdk_path or os.getenv('ZWO_ASI_LIB')
+        if not sdk_path:
             raise ValueError("SDK path not provided and ZWO_ASI_LIB environment variable not set")
+        self.sdk = load_sdk(sdk_path)
+        self.sdk.init(sdk_path)
             
         # Add a short delay after initialization to let the driver stabilize
-        time.sleep(1)
+        self._settle(1)
             
         # Check for cameras
-        num_cameras = asi.get_num_cameras()
+        num_cameras = self.sdk.get_num_cameras()
         if num_cameras == 0:
             raise RuntimeError("No ASI cameras found")
             
-        self.cameras_found = asi.list_cameras()
+        self.cameras_found = self.sdk.list_cameras()
         logger.info(f"Found {num_cameras} camera(s): {', '.join(self.cameras_found)}")
     
+    def _settle(self, seconds: float) -> None:
+        """Wait for the driver to stabilize (not needed with the simulated SDK)"""
+        if not getattr(self.sdk, 'SIMULATED', False):
+            time.sleep(seconds)
+    
     def connect(self, camera_id: int = 0) -> bool:
         """
         Connect to the camera
@@ -64,12 +222,12 @@ class ASI183Camera:
                 
             # Use the same approach that works in test_asi.py
             logger.debug(f"Opening camera {camera_id}")
-            self.camera = asi.Camera(camera_id)
+            self.camera = SDKCallCounter(self.sdk.Camera(camera_id))
             logger.debug(f"Successfully created camera object for ID {camera_id}")
             
             # Add delay after creating camera object
             logger.debug("Waiting after camera creation...")
-            time.sleep(1.0)
+            self._settle(1.0)
             
             # Get camera info
             logger.debug("Getting camera properties")
@@ -78,12 +236,16 @@ class ASI183Camera:
             
             # Additional delay
             logger.debug("Waiting after getting properties...")
-            time.sleep(0.5)
+            self._settle(0.5)
             
             # Set some default settings appropriate for spectroscopy
             logger.debug("Setting up default parameters")
             self.setup_defaults()
             
+            # Seed the cached state and control values from the hardware once
+            self.state = self._read_hardware_state()
+            self._read_control_values()
+            
             self.connected = True
             logger.info(f"Connected to {self.camera_info['Name']}")
             return True
@@ -106,15 +268,16 @@ class ASI183Camera:
             logger.debug(f"Available controls: {list(controls.keys())}")
             
             logger.debug("Setting bandwidth")
+            self.bandwidth_percent = controls['BandWidth']['MinValue']
             self.camera.set_control_value(
-                asi.ASI_BANDWIDTHOVERLOAD, 
-                controls['BandWidth']['MinValue']
+                self.sdk.ASI_BANDWIDTHOVERLOAD, 
+                self.bandwidth_percent
             )
             logger.debug("Bandwidth set successfully")
         
             # Set for monochrome imaging
             logger.debug("Setting image type to RAW16")
-            self.camera.set_image_type(asi.ASI_IMG_RAW16)  # 16-bit for better dynamic range
+            self.camera.set_image_type(self.sdk.ASI_IMG_RAW16)  # 16-bit for better dynamic range
             logger.debug("Image type set successfully")
         
             # Default settings - these should be configurable via the API
@@ -122,31 +285,31 @@ class ASI183Camera:
             
             # Set each parameter in a separate try block to continue even if one fails
             try:
-                self.camera.set_control_value(asi.ASI_GAIN, 0)  # Minimum gain for less noise
+                self.camera.set_control_value(self.sdk.ASI_GAIN, 0)  # Minimum gain for less noise
                 logger.debug("Gain set successfully")
             except Exception as e:
                 logger.warning(f"Failed to set gain: {e}")
                 
             try:
-                self.camera.set_control_value(asi.ASI_EXPOSURE, 100000)  # 100ms exposure
+                self.camera.set_control_value(self.sdk.ASI_EXPOSURE, 100000)  # 100ms exposure
                 logger.debug("Exposure set successfully")
             except Exception as e:
                 logger.warning(f"Failed to set exposure: {e}")
                 
             try:
-                self.camera.set_control_value(asi.ASI_GAMMA, 50)
+                self.camera.set_control_value(self.sdk.ASI_GAMMA, 50)
                 logger.debug("Gamma set successfully")
             except Exception as e:
                 logger.warning(f"Failed to set gamma: {e}")
                 
             try:
-                self.camera.set_control_value(asi.ASI_BRIGHTNESS, 50)
+                self.camera.set_control_value(self.sdk.ASI_BRIGHTNESS, 50)
                 logger.debug("Brightness set successfully")
             except Exception as e:
                 logger.warning(f"Failed to set brightness: {e}")
                 
             try:
-                self.camera.set_control_value(asi.ASI_FLIP, 0)
+                self.camera.set_control_value(self.sdk.ASI_FLIP, 0)
                 logger.debug("Flip set successfully")
             except Exception as e:
                 logger.warning(f"Failed to set flip: {e}")
@@ -161,7 +324,7 @@ class ASI183Camera:
             
             # Add a small delay after applying settings
             logger.debug("Waiting after setting parameters")
-            time.sleep(0.1)
+            self._settle(0.1)
             
             logger.debug("Default setup completed successfully")
             
@@ -179,7 +342,38 @@ class ASI183Camera:
         if not self.connected or not self.camera:
             raise RuntimeError("Camera not connected")
             
-        info = {
+        info = self._describe()
+        info["current_settings"] = self.get_settings()
+        
+        return info
+    
+    def get_cached_info(self) -> Dict[str, Any]:
+        """
+        Get camera information and settings without querying the camera
+        
+        Safe to call while an exposure is running: the properties and
+        control values are those read at connect time (or by the last
+        get_settings or reconcile_state call), with exposure and gain from
+        the cached state. 'settings_age_s' is the age of the control values.
+        
+        Returns:
+            Dictionary of camera information
+        """
+        if not self.connected or not self.camera:
+            raise RuntimeError("Camera not connected")
+            
+        info = self._describe()
+        settings = dict(self.control_values)
+        settings["Exposure"] = self.state.get("exposure_us", settings.get("Exposure"))
+        settings["Gain"] = self.state.get("gain", settings.get("Gain"))
+        info["current_settings"] = settings
+        info["settings_age_s"] = round(time.monotonic() - self.control_values_read_at, 1)
+        
+        return info
+    
+    def _describe(self) -> Dict[str, Any]:
+        """Static camera properties read at connect time"""
+        return {
             "name": self.camera_info['Name'],
             "camera_id": self.camera_info['CameraID'],
             "max_height": self.camera_info['MaxHeight'],
@@ -188,11 +382,8 @@ class ASI183Camera:
             "pixel_size": self.camera_info['PixelSize'],
             "mechanical_shutter": self.camera_info['MechanicalShutter'],
             "supported_bins": self.camera_info['SupportedBins'],
-            "supported_video_formats": self.camera_info['SupportedVideoFormat'],
-            "current_settings": self.get_settings()
+            "supported_video_formats": self.camera_info['SupportedVideoFormat']
         }
-        
-        return info
     
     def get_settings(self) -> Dict[str, Any]:
         """
@@ -204,7 +395,13 @@ class ASI183Camera:
         if not self.connected or not self.camera:
             raise RuntimeError("Camera not connected")
             
-        return self.camera.get_control_values()
+        return dict(self._read_control_values())
+    
+    def _read_control_values(self) -> Dict[str, Any]:
+        """Read all control values from the SDK into the status cache"""
+        self.control_values = self.camera.get_control_values()
+        self.control_values_read_at = time.monotonic()
+        return self.control_values
     
     def set_exposure(self, exposure_ms: int) -> None:
         """
@@ -222,23 +419,27 @@ class ASI183Camera:
         
         # Get current exposure to compare
         try:
-            current_exposure = self.camera.get_control_value(asi.ASI_EXPOSURE)[0]
+            current_exposure = self.camera.get_control_value(self.sdk.ASI_EXPOSURE)[0]
             logger.debug(f"Current exposure before setting: {current_exposure/1000:.2f}ms")
         except Exception as e:
             logger.warning(f"Failed to get current exposure: {e}")
             
         # Set new exposure
         try:
-            self.camera.set_control_value(asi.ASI_EXPOSURE, exposure_us)
+            self.camera.set_control_value(self.sdk.ASI_EXPOSURE, exposure_us)
             logger.debug(f"Exposure set to {exposure_ms}ms ({exposure_us}μs)")
             
             # Verify if the exposure was set correctly
-            new_exposure = self.camera.get_control_value(asi.ASI_EXPOSURE)[0]
+            new_exposure = self.camera.get_control_value(self.sdk.ASI_EXPOSURE)[0]
             logger.debug(f"Current exposure after setting: {new_exposure/1000:.2f}ms")
             
             # Check if there's a significant difference
             if abs(new_exposure - exposure_us) > 1000:  # Difference of more than 1ms
                 logger.warning(f"Exposure might not be set correctly: requested {exposure_us}μs, got {new_exposure}μs")
+            
+            # Cache the value the camera reports and keep the video timeout in step
+            self.state["exposure_us"] = new_exposure
+            self._video_timeout_ms = self._video_timeout_for(new_exposure)
         except Exception as e:
             logger.error(f"Failed to set exposure: {e}")
             raise
@@ -253,12 +454,39 @@ class ASI183Camera:
         if not self.connected or not self.camera:
             raise RuntimeError("Camera not connected")
             
-        self.camera.set_control_value(asi.ASI_GAIN, gain)
+        self.camera.set_control_value(self.sdk.ASI_GAIN, gain)
+        self.state["gain"] = gain
         logger.debug(f"Set gain to {gain}")
     
+    def get_temperature(self) -> Optional[float]:
+        """
+        Read the sensor temperature
+        
+        The reading also updates the cached control values served by
+        get_cached_info().
+        
+        Returns:
+            Temperature in °C, or None if the camera does not report one
+        """
+        if not self.connected or not self.camera:
+            raise RuntimeError("Camera not connected")
+        
+        control = getattr(self.sdk, "ASI_TEMPERATURE", None)
+        if control is None:
+            return None
+        try:
+            value = self.camera.get_control_value(control)[0]
+        except Exception as e:
+            logger.debug(f"Failed to read the sensor temperature: {e}")
+            return None
+        # Keep the status report's control values current
+        self.control_values["Temperature"] = value
+        # The SDK reports tenths of a degree
+        return value / 10.0
+    
     def set_roi(self, start_x: int = 0, start_y: int = 0, 
                 width: Optional[int] = None, height: Optional[int] = None,
-                binning: int = 1) -> None:
+                binning: int = 1, image_type: Optional[int] = None) -> None:
         """
         Set the Region of Interest (ROI) for the camera
         
@@ -268,6 +496,7 @@ class ASI183Camera:
             width: Width of ROI (default: max width)
             height: Height of ROI (default: max height)
             binning: Pixel binning factor (default 1)
+            image_type: ASI_IMG_* pixel format (default: keep the current one)
         """
         if not self.connected or not self.camera:
             raise RuntimeError("Camera not connected")
@@ -283,97 +512,447 @@ class ASI183Camera:
             supported = self.camera_info['SupportedBins']
             raise ValueError(f"Binning {binning} not supported. Supported values: {supported}")
             
+        # The frame geometry is fixed while video capture runs, so restart it around the change
+        was_continuous = self.is_continuous
+        if was_continuous:
+            ring_size = self._video_ring.size
+            self.stop_continuous()
+            
         self.camera.set_roi(start_x=start_x, start_y=start_y, 
-                           width=width, height=height, bins=binning)
+                           width=width, height=height, bins=binning,
+                           image_type=image_type)
         logger.debug(f"Set ROI: x={start_x}, y={start_y}, w={width}, h={height}, bin={binning}")
+        
+        # Cache the geometry the SDK actually applied
+        self.state.update(self._read_hardware_geometry())
+        
+        # Buffers sized for the previous geometry are no longer useful
+        self.frame_pool.clear(keep=self._frame_key()[0])
+        
+        if was_continuous:
+            self.start_continuous(ring_size=ring_size)
     
-    def capture_raw(self) -> np.ndarray:
+    def capture_raw(self, buffer_: Optional[bytearray] = None) -> np.ndarray:
         """
         Capture a raw frame from the camera
         
+        Args:
+            buffer_: Optional preallocated bytearray of the exact frame size.
+                     The SDK fills it in place and the returned array is a view on it.
+        
         Returns:
             NumPy array containing the raw image data
         """
         if not self.camera:
             raise RuntimeError("Camera not initialized")
             
+        # In continuous mode the producer thread is already streaming frames
+        if self.is_continuous:
+            if buffer_ is None:
+                return self.read_continuous_frame()
+            out = np.frombuffer(buffer_, dtype=self._video_ring.dtype).reshape(self._video_ring.shape)
+            return self.read_continuous_frame(out=out)
+            
         logger.debug("Beginning image capture process")
         
+        # Exposure and frame geometry come from the cached state, so a
+        # snapshot makes no control or ROI queries
+        exposure = self.state["exposure_us"]
+        shape = (self.state["height"], self.state["width"])
+        dtype = self._dtype_for(self.state["image_type"])
+        
         try:
-            # Get current exposure
-            try:
-                exposure = self.camera.get_control_value(asi.ASI_EXPOSURE)[0]
-                logger.debug(f"Current exposure: {exposure/1000:.2f}ms")
-            except Exception as e:
-                logger.warning(f"Failed to get exposure value: {e}")
-                exposure = 100000  # Default to 100ms if can't get current value
-                logger.debug(f"Using default exposure: {exposure/1000:.2f}ms")
-            
-            # Use capture method directly instead of start_exposure + get_data_after_exposure
-            # This is more efficient as it handles timing internally in the SDK
             logger.debug(f"Capturing image with {exposure/1000:.2f}ms exposure")
-            try:
-                # Try to use the more efficient capture method
-                data = self.camera.capture()
-                logger.debug("Image captured using direct capture method")
-            except Exception as e:
-                logger.warning(f"Direct capture failed, using exposure sequence: {e}")
-                # Fall back to manual exposure sequence
-                self.camera.start_exposure()
-                
-                # Calculate wait time with a smaller buffer
-                wait_time = (exposure / 1000.0) + 0.1  # Convert μs to s and add smaller buffer
-                logger.debug(f"Waiting {wait_time:.2f}s for exposure to complete")
-                time.sleep(wait_time)
-                
-                # Check status
+            started = time.perf_counter()
+            with self.camera.track() as calls:
+                data = self._expose(exposure, buffer_)
+            self.last_capture_sdk_calls = calls
+            _STAGE_TOTAL.observe(time.perf_counter() - started)
+            
+            # Convert data to numpy array with proper dimensions
+            return np.frombuffer(data, dtype=dtype).reshape(shape)
+            
+        except Exception as e:
+            logger.error(f"Error capturing image: {e}")
+            raise
+    
+    def _expose(self, exposure_us: int, buffer_: Optional[bytearray] = None) -> bytearray:
+        """
+        Run one exposure and read the data into buffer_
+        
+        Sleeps for the known exposure time, then polls the exposure status at
+        a short interval instead of waiting a fixed margin. A failed exposure
+        is retried once.
+        
+        Args:
+            exposure_us: Exposure time in microseconds
+            buffer_: Optional preallocated bytearray for the frame data
+            
+        Returns:
+            Bytearray holding the frame data
+        """
+        timeout = 2 * exposure_us / 1e6 + 0.5
+        status = None
+        for attempt in range(2):
+            started = time.perf_counter()
+            self.camera.start_exposure()
+            time.sleep(exposure_us / 1e6)
+            exposed = time.perf_counter()
+            _STAGE_EXPOSURE.observe(exposed - started)
+            
+            deadline = time.monotonic() + timeout
+            status = self.camera.get_exposure_status()
+            while status == self.sdk.ASI_EXP_WORKING and time.monotonic() < deadline:
+                time.sleep(self.STATUS_POLL_INTERVAL)
                 status = self.camera.get_exposure_status()
-                logger.debug(f"Exposure status: {status}")
+            ready = time.perf_counter()
+            _STAGE_STATUS_WAIT.observe(ready - exposed)
                 
-                if status != asi.ASI_EXP_SUCCESS:
-                    logger.warning(f"Exposure not complete (status: {status}), waiting a bit longer")
-                    time.sleep(0.3)  # Wait a bit longer, but not too long
-                    status = self.camera.get_exposure_status()
-                    logger.debug(f"Exposure status after additional wait: {status}")
+            if status == self.sdk.ASI_EXP_SUCCESS:
+                data = self.camera.get_data_after_exposure(buffer_)
+                _STAGE_TRANSFER.observe(time.perf_counter() - ready)
+                _SNAPSHOT_BYTES.inc(len(data))
+                return data
                 
-                # Get data
-                data = self.camera.get_data_after_exposure()
-            
-            # Convert data to numpy array with proper dimensions
-            if isinstance(data, (bytes, bytearray)):
-                logger.debug("Converting byte data to numpy array")
+            logger.warning(f"Exposure not successful (status: {status}), attempt {attempt + 1}")
+            self.exposure_retries += 1
+            EXPOSURE_RETRIES.inc()
+            if status == self.sdk.ASI_EXP_WORKING:
+                self.camera.stop_exposure()
                 
-                # Determine dimensions based on camera info
-                if hasattr(self, 'camera_info'):
-                    width = self.camera_info['MaxWidth']
-                    height = self.camera_info['MaxHeight']
-                    
-                    # Adjust for ROI if set
-                    if hasattr(self.camera, 'get_roi'):
-                        try:
-                            roi = self.camera.get_roi()
-                            width = roi[2]
-                            height = roi[3]
-                            logger.debug(f"Using ROI dimensions: {width}x{height}")
-                        except Exception as e:
-                            logger.debug(f"Using default dimensions: {width}x{height}")
-                    
-                    # Convert bytes to numpy array
-                    logger.debug("Converting to numpy array")
-                    array_data = np.frombuffer(data, dtype=np.uint16).reshape((height, width))
+        raise RuntimeError(f"Exposure failed (status: {status})")
+    
+    def _dtype_for(self, image_type: int) -> np.dtype:
+        """
+        Pixel data type for an SDK image type
+        
+        Args:
+            image_type: ASI_IMG_* constant
+            
+        Returns:
+            NumPy dtype of the frame data
+        """
+        if image_type in (self.sdk.ASI_IMG_RAW8, self.sdk.ASI_IMG_Y8):
+            return np.dtype(np.uint8)
+        return np.dtype(np.uint16)
+    
+    def _read_hardware_geometry(self) -> Dict[str, int]:
+        """
+        Query the ROI geometry and image type from the SDK
+        
+        Returns:
+            Dictionary with start_x, start_y, width, height, binning and image_type
+        """
+        width, height, binning, image_type = self.camera.get_roi_format()
+        start_x, start_y = self.camera.get_roi_start_position()
+        return {
+            "start_x": start_x,
+            "start_y": start_y,
+            "width": width,
+            "height": height,
+            "binning": binning,
+            "image_type": image_type
+        }
+    
+    def _read_hardware_state(self) -> Dict[str, Any]:
+        """
+        Query the full readout state from the SDK
+        
+        Returns:
+            Dictionary with the geometry plus exposure_us and gain
+        """
+        state = self._read_hardware_geometry()
+        state["exposure_us"] = self.camera.get_control_value(self.sdk.ASI_EXPOSURE)[0]
+        state["gain"] = self.camera.get_control_value(self.sdk.ASI_GAIN)[0]
+        return state
+    
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Get the cached readout state without querying the camera
+        
+        Returns:
+            Dictionary with ROI geometry, binning, image type, exposure_us and gain
+        """
+        if not self.connected or not self.camera:
+            raise RuntimeError("Camera not connected")
+            
+        return dict(self.state)
+    
+    def reconcile_state(self) -> Dict[str, Tuple[Any, Any]]:
+        """
+        Compare the cached state against the hardware and adopt the hardware values
+        
+        Returns:
+            Dictionary of fields that differed, as (cached, hardware) tuples
+        """
+        if not self.connected or not self.camera:
+            raise RuntimeError("Camera not connected")
+            
+        hardware = self._read_hardware_state()
+        self._read_control_values()
+        drift = {k: (self.state.get(k), v) for k, v in hardware.items() if self.state.get(k) != v}
+        if drift:
+            logger.warning(f"Camera state drifted from cache: {drift}")
+            self.state.update(hardware)
+        return drift
+    
+    def start_state_reconciler(self, interval_s: float = 30.0) -> None:
+        """
+        Periodically reconcile the cached state against the hardware
+        
+        Args:
+            interval_s: Seconds between reconciliations
+        """
+        if self._reconcile_thread is not None and self._reconcile_thread.is_alive():
+            return
+            
+        self._reconcile_stop.clear()
+        
+        def run():
+            while not self._reconcile_stop.wait(interval_s):
+                try:
+                    self.reconcile_state()
+                except Exception as e:
+                    logger.warning(f"State reconciliation failed: {e}")
                     
-                    return array_data
-                else:
-                    logger.warning("Camera info not available, returning raw data")
-                    return data
-            else:
-                # If already a numpy array, just return it
-                logger.debug(f"Data is already a numpy array with shape {data.shape}")
-                return data
+        self._reconcile_thread = threading.Thread(target=run, name="asi-state-reconciler", daemon=True)
+        self._reconcile_thread.start()
+    
+    def stop_state_reconciler(self) -> None:
+        """Stop the periodic state reconciliation"""
+        if self._reconcile_thread is None:
+            return
+        self._reconcile_stop.set()
+        self._reconcile_thread.join(timeout=5.0)
+        self._reconcile_thread = None
+    
+    def get_sdk_call_counts(self) -> Dict[str, Any]:
+        """
+        Get SDK call counters
+        
+        Returns:
+            Dictionary with total calls per SDK method and the calls made by
+            the most recent snapshot capture
+        """
+        if not self.camera:
+            raise RuntimeError("Camera not initialized")
+            
+        return {
+            "total": self.camera.get_counts(),
+            "last_capture": dict(self.last_capture_sdk_calls),
+            "exposure_retries": self.exposure_retries
+        }
+    
+    @property
+    def is_continuous(self) -> bool:
+        """Whether continuous (video mode) acquisition is running"""
+        return self._video_thread is not None and self._video_thread.is_alive()
+    
+    def _video_timeout_for(self, exposure_us: int) -> int:
+        """
+        Frame timeout for video mode as recommended by the SDK
+        
+        Args:
+            exposure_us: Exposure time in microseconds
             
+        Returns:
+            Timeout in milliseconds (twice the exposure plus 500ms)
+        """
+        return int(2 * exposure_us / 1000) + 500
+    
+    def start_continuous(self, ring_size: int = 4) -> None:
+        """
+        Start continuous acquisition using the SDK video capture mode
+        
+        A dedicated producer thread pulls frames from the camera into a bounded
+        ring of preallocated uint16 frames, so consecutive exposures run back to
+        back at sensor frame rate instead of one snapshot cycle per frame.
+        
+        Args:
+            ring_size: Number of preallocated frames in the ring buffer
+        """
+        if not self.connected or not self.camera:
+            raise RuntimeError("Camera not connected")
+        if self.is_continuous:
+            logger.debug("Continuous acquisition already running")
+            return
+            
+        width, height = self.state["width"], self.state["height"]
+        if self.state["image_type"] not in (self.sdk.ASI_IMG_RAW16, self.sdk.ASI_IMG_RAW8):
+            raise RuntimeError("Continuous acquisition requires the RAW16 or RAW8 image type")
+            
+        self._video_timeout_ms = self._video_timeout_for(self.state["exposure_us"])
+        
+        dtype = self._dtype_for(self.state["image_type"])
+        self._video_ring = FrameRingBuffer((height, width), size=ring_size, dtype=dtype)
+        self._video_last_seq = -1
+        self._video_errors = 0
+        self._video_stop.clear()
+        
+        self.camera.start_video_capture()
+        self._video_started_at = time.time()
+        self._video_thread = threading.Thread(
+            target=self._video_loop, name="asi-video-capture", daemon=True
+        )
+        self._video_thread.start()
+        logger.info(f"Started continuous acquisition: {width}x{height}, ring of {ring_size} frames")
+    
+    def _video_loop(self) -> None:
+        """Producer thread: fill ring buffer slots in place from the video stream"""
+        ring = self._video_ring
+        frame_bytes = ring.shape[0] * ring.shape[1] * ring.dtype.itemsize
+        consecutive_errors = 0
+        while not self._video_stop.is_set():
+            overwritten = ring.frames_overwritten
+            slot = ring.begin_write()
+            if ring.frames_overwritten != overwritten:
+                VIDEO_DROPPED.inc()
+            try:
+                # get_video_data fills our preallocated buffer directly; unlike
+                # capture_video_frame it doesn't re-query the ROI format per frame
+                self.camera.get_video_data(timeout=self._video_timeout_ms, buffer_=slot.buffer)
+            except Exception as e:
+                ring.abort_write(slot)
+                if self._video_stop.is_set():
+                    break
+                self._video_errors += 1
+                VIDEO_ERRORS.inc()
+                consecutive_errors += 1
+                # A disconnected camera fails at once: back off instead of spinning
+                backoff = min(self.VIDEO_ERROR_BACKOFF * 2 ** (consecutive_errors - 1),
+                              self.VIDEO_ERROR_BACKOFF_MAX)
+                logger.warning(f"Video frame capture failed ({consecutive_errors} in a row, "
+                               f"retrying in {backoff:.2f}s): {e}")
+                self._video_stop.wait(backoff)
+                continue
+            consecutive_errors = 0
+            ring.commit_write(slot)
+            VIDEO_FRAMES.inc()
+            _VIDEO_BYTES.inc(frame_bytes)
+        logger.debug("Video capture loop exited")
+    
+    def stop_continuous(self) -> None:
+        """Stop continuous acquisition and leave video capture mode"""
+        # Claim the producer first so concurrent stop calls only stop it once
+        thread, self._video_thread = self._video_thread, None
+        if thread is None:
+            return
+            
+        self._video_stop.set()
+        try:
+            self.camera.stop_video_capture()
         except Exception as e:
-            logger.error(f"Error capturing image: {e}")
+            logger.warning(f"Failed to stop video capture: {e}")
+            
+        # The producer may be blocked in get_video_data for up to one frame timeout
+        thread.join(timeout=self._video_timeout_ms / 1000.0 + 1.0)
+        if thread.is_alive():
+            logger.warning("Video capture thread did not exit in time")
+        self._video_ring.close()
+        logger.info("Stopped continuous acquisition")
+    
+    def read_continuous_frame(self, timeout: Optional[float] = None,
+                              latest: bool = False,
+                              out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Get the next frame from the continuous acquisition ring buffer
+        
+        Args:
+            timeout: Maximum time to wait in seconds (default: one frame timeout)
+            latest: If True, skip straight to the newest frame instead of the
+                    oldest one not yet returned by this method
+            out: Optional array to copy the frame into instead of allocating
+            
+        Returns:
+            Copy of the frame as a uint16 NumPy array
+        """
+        if not self.is_continuous:
+            raise RuntimeError("Continuous acquisition not running")
+            
+        if timeout is None:
+            timeout = self._video_timeout_ms / 1000.0
+            
+        if latest:
+            seq, _, frame = self._video_ring.read_latest(timeout=timeout, out=out)
+        else:
+            seq, _, frame = self._video_ring.read(after_seq=self._video_last_seq,
+                                                  timeout=timeout, out=out)
+        self._video_last_seq = seq
+        return frame
+    
+    def get_continuous_stats(self) -> Dict[str, Any]:
+        """
+        Get continuous acquisition statistics
+        
+        Returns:
+            Dictionary with frame counts, frame rate and error counts
+        """
+        if self._video_ring is None:
+            return {"running": False}
+            
+        stats = self._video_ring.get_stats()
+        elapsed = time.time() - self._video_started_at
+        stats.update({
+            "running": self.is_continuous,
+            "errors": self._video_errors,
+            "frame_rate": stats["frames_written"] / elapsed if elapsed > 0 else 0.0
+        })
+        
+        if self.is_continuous:
+            try:
+                stats["sdk_dropped_frames"] = self.camera.get_dropped_frames()
+            except Exception as e:
+                logger.debug(f"Failed to get dropped frame count: {e}")
+                
+        return stats
+    
+    def _frame_key(self) -> Tuple[Tuple[int, int, int, int], np.dtype]:
+        """
+        Frame pool key and pixel type for the current readout configuration
+        
+        Returns:
+            Tuple of ((width, height, binning, image_type), dtype)
+        """
+        state = self.state
+        key = (state["width"], state["height"], state["binning"], state["image_type"])
+        return key, self._dtype_for(state["image_type"])
+    
+    def get_frame_format(self) -> Tuple[Tuple[int, int], np.dtype]:
+        """
+        Shape and pixel type of the frames of the current readout (no camera queries)
+        
+        Returns:
+            Tuple of ((height, width), dtype)
+        """
+        if not self.connected or not self.camera:
+            raise RuntimeError("Camera not connected")
+            
+        key, dtype = self._frame_key()
+        return (key[1], key[0]), dtype
+    
+    def capture_pooled(self) -> PooledFrame:
+        """
+        Capture a raw frame into a reusable buffer from the frame pool
+        
+        The SDK writes straight into the pooled buffer, so no per-frame
+        allocation takes place. The caller must call release() on the returned
+        frame (or use it as a context manager) once done with the data.
+        
+        Returns:
+            PooledFrame whose .array holds the raw image data
+        """
+        if not self.camera:
+            raise RuntimeError("Camera not initialized")
+            
+        key, dtype = self._frame_key()
+        width, height = key[0], key[1]
+        frame = self.frame_pool.acquire(key, (height, width), dtype)
+        try:
+            self.capture_raw(buffer_=frame.buffer)
+        except Exception:
+            frame.release()
             raise
+        return frame
     
     def capture_spectrum(self) -> Tuple[np.ndarray, np.ndarray]:
         """
@@ -395,6 +974,8 @@ class ASI183Camera:
     
     def disconnect(self) -> None:
         """Close the camera connection"""
+        self.stop_continuous()
+        self.stop_state_reconciler()
         self.connected = False
         self.camera = None
         logger.info("Camera disconnected")
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Library of master dark frames matched to the acquisition settings
+"""
+import os
+import json
+import math
+import time
+import logging
+import tempfile
+import threading
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Tuple, Optional, Any, List
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.json"
+
+# How a stack of dark frames is combined
+STACK_METHODS = ("median", "sigma_clip")
+
+class DarkStacker:
+    """
+    Combines a series of dark frames into a master dark
+
+    Frames are spooled to a temporary file as they arrive, so the stack is
+    never held in memory. The combination then runs over blocks of rows
+    across all frames, with at most block_bytes of pixels loaded at a time:
+
+        median: per-pixel median (robust against cosmic rays and hot events)
+        sigma_clip: per-pixel mean of the values within sigma robust
+            standard deviations (1.4826 * MAD) of the median, which keeps
+            the lower noise of a mean while rejecting outliers
+
+    The master dark has the pixel type of the frames, rounded, so it can
+    be subtracted by the fused column reduction like a single frame.
+    """
+
+    def __init__(self, shape: Tuple[int, int], dtype: Any = np.uint16, method: str = "median",
+                 sigma: float = 3.0, directory: Optional[str] = None, block_bytes: int = 16 * 1024 * 1024):
+        """
+        Start an empty stack
+
+        Args:
+            shape: Frame shape (height, width)
+            dtype: Integer pixel type of the frames
+            method: One of STACK_METHODS
+            sigma: Clipping threshold of 'sigma_clip' in robust standard deviations
+            directory: Where to spool the frames (default: the system temporary directory)
+            block_bytes: Pixels (as float32) to combine at a time
+
+        Raises:
+            ValueError: If the method is unknown
+        """
+        if method not in STACK_METHODS:
+            raise ValueError(f"Invalid stack method: {method}. Must be one of {', '.join(STACK_METHODS)}.")
+        if sigma <= 0:
+            raise ValueError("Sigma must be positive")
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.dtype = np.dtype(dtype)
+        self.method = method
+        self.sigma = float(sigma)
+        self.block_bytes = block_bytes
+        self.frames = 0
+        self.rejected = 0
+        self._spool = tempfile.TemporaryFile(prefix="darkstack-", dir=directory)
+
+    def add(self, frame: np.ndarray) -> None:
+        """
+        Add a dark frame to the stack
+
+        Raises:
+            ValueError: If the frame does not match the stack shape or type
+        """
+        if frame.shape != self.shape or frame.dtype != self.dtype:
+            raise ValueError(f"Frame {frame.shape} {frame.dtype} does not match the stack "
+                             f"{self.shape} {self.dtype}")
+        self._spool.write(memoryview(np.ascontiguousarray(frame)).cast("B"))
+        self.frames += 1
+
+    def result(self) -> np.ndarray:
+        """
+        Combine the frames added so far
+
+        Returns:
+            Master dark (height x width) in the frame pixel type
+
+        Raises:
+            ValueError: If no frames were added
+        """
+        if self.frames == 0:
+            raise ValueError("No dark frames to combine")
+        self._spool.flush()
+        height, width = self.shape
+        stack = np.memmap(self._spool, dtype=self.dtype, mode="r", shape=(self.frames, height, width))
+        master = np.empty(self.shape, dtype=self.dtype)
+        info = np.iinfo(self.dtype)
+        rows = int(max(1, min(height, self.block_bytes // (self.frames * width * 4))))
+        self.rejected = 0
+
+        for start in range(0, height, rows):
+            stop = min(height, start + rows)
+            block = np.asarray(stack[:, start:stop], dtype=np.float32)
+            center = np.median(block, axis=0)
+            if self.method == "median" or self.frames < 3:
+                combined = center
+            else:
+                deviation = np.abs(block - center)
+                spread = np.median(deviation, axis=0) * 1.4826
+                # Integer pixels: a zero MAD must not reject values one count away
+                keep = deviation <= self.sigma * np.maximum(spread, 0.5)
+                self.rejected += int(keep.size - np.count_nonzero(keep))
+                combined = np.where(keep, block, 0.0).sum(axis=0) / keep.sum(axis=0)
+            np.clip(np.rint(combined), info.min, info.max, out=combined)
+            master[start:stop] = combined
+        del stack
+        return master
+
+    def close(self) -> None:
+        """Delete the spooled frames"""
+        self._spool.close()
+
+    def __enter__(self) -> "DarkStacker":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class DarkLibrary:
+    """
+    Master dark frames on disk, matched to the acquisition settings
+
+    Each master dark is a .npy file (memory-mapped when used, and usable as
+    a reprocessing dark) listed in index.json with the exposure, gain, ROI,
+    binning, pixel type and sensor temperature it was taken at.
+
+    match() finds the dark for a frame:
+        - gain, binning and pixel type must be equal, and the dark's ROI
+          must contain the frame's ROI (a larger dark is cropped, which is
+          a view of the memory map)
+        - darks whose temperature is known and further than
+          temperature_tolerance_c from the frame's are skipped; otherwise
+          the closest temperature is preferred
+        - an equal exposure is used as it is; otherwise, with darks at two
+          exposures the dark is interpolated per pixel (bias plus dark
+          current, linear in the exposure), and with one it is used if the
+          exposures differ by at most max_exposure_ratio
+    Matches are cached until the library changes.
+    """
+
+    def __init__(self, directory: str, temperature_tolerance_c: float = 2.0,
+                 max_exposure_ratio: float = 2.0, cache_size: int = 4):
+        """
+        Open a library; the directory is created when the first dark is added
+
+        Args:
+            directory: Directory holding the darks and their index
+            temperature_tolerance_c: Largest temperature difference to accept
+            max_exposure_ratio: Largest exposure ratio at which a single dark is
+                used for another exposure, and how far beyond the exposures in
+                the library interpolation may extrapolate
+            cache_size: Number of matches (and interpolated darks) to keep
+        """
+        self.directory = Path(directory)
+        self.temperature_tolerance_c = float(temperature_tolerance_c)
+        self.max_exposure_ratio = max(1.0, float(max_exposure_ratio))
+        self.cache_size = cache_size
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._cache: "OrderedDict[Tuple, Optional[Tuple[np.ndarray, Dict[str, Any]]]]" = OrderedDict()
+        self.version = 0
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+
+    @property
+    def index_path(self) -> Path:
+        """Path of the library index"""
+        return self.directory / INDEX_FILENAME
+
+    def _load_index(self) -> None:
+        """Read the index, dropping entries whose file is missing"""
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, "r") as f:
+                entries = json.load(f).get("darks", [])
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read dark library index {self.index_path}: {e}")
+            return
+        for entry in entries:
+            if (self.directory / entry["filename"]).exists():
+                self._entries[entry["id"]] = entry
+            else:
+                logger.warning(f"Dark {entry['filename']} is missing from {self.directory}")
+
+    def _write_index(self) -> None:
+        """Replace the index file atomically (lock held)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp_path = self.index_path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump({"darks": list(self._entries.values())}, f, indent=2)
+        os.replace(temp_path, self.index_path)
+
+    def _changed(self) -> None:
+        """Invalidate the cached matches (lock held)"""
+        self._cache.clear()
+        self.version += 1
+
+    def add(self, dark: np.ndarray, exposure_us: int, gain: int, start_x: int = 0, start_y: int = 0,
+            binning: int = 1, temperature_c: Optional[float] = None, frames: int = 1,
+            method: str = "median") -> Dict[str, Any]:
+        """
+        Store a master dark
+
+        A dark with the same settings (and a temperature within 0.5 °C)
+        is replaced.
+
+        Args:
+            dark: Master dark (height x width, integer pixels)
+            exposure_us: Exposure time in microseconds
+            gain: Gain value
+            start_x: ROI start column
+            start_y: ROI start row
+            binning: Binning factor
+            temperature_c: Sensor temperature (None if unknown)
+            frames: Number of frames stacked
+            method: How the frames were combined
+
+        Returns:
+            Library entry of the dark
+
+        Raises:
+            ValueError: If the dark is not a 2D integer frame
+        """
+        if dark.ndim != 2 or dark.dtype.kind not in "ui":
+            raise ValueError(f"A dark must be a 2D integer frame, not {dark.shape} {dark.dtype}")
+        height, width = dark.shape
+        temperature = None if temperature_c is None else round(float(temperature_c), 1)
+        dark_id = f"dark_{int(exposure_us)}us_g{int(gain)}_b{int(binning)}_{width}x{height}+{start_x}+{start_y}"
+        if temperature is not None:
+            dark_id += f"_{temperature:+.1f}C"
+        entry = {
+            "id": dark_id,
+            "filename": dark_id + ".npy",
+            "exposure_us": int(exposure_us),
+            "gain": int(gain),
+            "start_x": int(start_x),
+            "start_y": int(start_y),
+            "width": int(width),
+            "height": int(height),
+            "binning": int(binning),
+            "dtype": dark.dtype.str,
+            "temperature_c": temperature,
+            "frames": int(frames),
+            "method": method,
+            "mean": round(float(dark.mean()), 3),
+            "created": time.time()
+        }
+
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            replaced = [other for other in self._entries.values() if self._same_settings(entry, other)]
+            np.save(self.directory / entry["filename"], dark, allow_pickle=False)
+            for other in replaced:
+                del self._entries[other["id"]]
+                if other["filename"] != entry["filename"]:
+                    (self.directory / other["filename"]).unlink(missing_ok=True)
+            self._entries[dark_id] = entry
+            self._write_index()
+            self._changed()
+        logger.info(f"Added {dark_id} to the dark library ({frames} frames, {method})")
+        return dict(entry)
+
+    @staticmethod
+    def _same_settings(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+        """True if two entries describe the same acquisition settings"""
+        keys = ("exposure_us", "gain", "start_x", "start_y", "width", "height", "binning", "dtype")
+        if any(a[k] != b[k] for k in keys):
+            return False
+        if a["temperature_c"] is None or b["temperature_c"] is None:
+            return a["temperature_c"] is None and b["temperature_c"] is None
+        return abs(a["temperature_c"] - b["temperature_c"]) < 0.5
+
+    def remove(self, dark_id: str) -> bool:
+        """
+        Delete a dark
+
+        Returns:
+            True if the dark existed
+        """
+        with self._lock:
+            entry = self._entries.pop(dark_id, None)
+            if entry is None:
+                return False
+            (self.directory / entry["filename"]).unlink(missing_ok=True)
+            self._write_index()
+            self._changed()
+        return True
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """All darks, ordered by exposure"""
+        with self._lock:
+            return sorted((dict(e) for e in self._entries.values()),
+                          key=lambda e: (e["exposure_us"], e["gain"], e["binning"], e["id"]))
+
+    def load(self, dark_id: str) -> np.ndarray:
+        """
+        Memory-map a dark
+
+        Raises:
+            KeyError: If the dark is not in the library
+        """
+        with self._lock:
+            entry = self._entries[dark_id]
+        return np.load(self.directory / entry["filename"], mmap_mode="r", allow_pickle=False)
+
+    def match(self, shape: Tuple[int, int], dtype: Any, exposure_us: int, gain: int,
+              start_x: int = 0, start_y: int = 0, binning: int = 1,
+              temperature_c: Optional[float] = None) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+        """
+        Find the dark for a frame
+
+        Args:
+            shape: Frame shape (height, width)
+            dtype: Frame pixel type
+            exposure_us: Exposure time in microseconds
+            gain: Gain value
+            start_x: ROI start column
+            start_y: ROI start row
+            binning: Binning factor
+            temperature_c: Sensor temperature (None if unknown)
+
+        Returns:
+            Tuple of the read-only dark (frame shape) and a description of the
+            match ('match' is 'exact', 'nearest' or 'interpolated', 'darks'
+            the ids used), or None if no dark fits
+        """
+        height, width = int(shape[0]), int(shape[1])
+        temperature = None if temperature_c is None else round(float(temperature_c) * 2) / 2
+        key = (height, width, np.dtype(dtype).str, int(exposure_us), int(gain),
+               int(start_x), int(start_y), int(binning), temperature)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+            version = self.version
+            candidates = [e for e in self._entries.values()
+                          if self._fits(e, key[:3], *key[4:8], temperature_c)]
+
+        result = self._build(candidates, key, temperature_c) if candidates else None
+
+        with self._lock:
+            if version == self.version:
+                self._cache[key] = result
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+    def _fits(self, entry: Dict[str, Any], frame: Tuple[int, int, str], gain: int, start_x: int,
+              start_y: int, binning: int, temperature_c: Optional[float]) -> bool:
+        """True if a dark can be used for a frame at some exposure"""
+        height, width, dtype = frame
+        if (entry["gain"], entry["binning"], entry["dtype"]) != (gain, binning, dtype):
+            return False
+        if not (entry["start_x"] <= start_x and start_x + width <= entry["start_x"] + entry["width"] and
+                entry["start_y"] <= start_y and start_y + height <= entry["start_y"] + entry["height"]):
+            return False
+        if temperature_c is not None and entry["temperature_c"] is not None:
+            return abs(entry["temperature_c"] - temperature_c) <= self.temperature_tolerance_c
+        return True
+
+    def _build(self, candidates: List[Dict[str, Any]], key: Tuple,
+               temperature_c: Optional[float]) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+        """Crop, pick or interpolate the dark for a cache key"""
+        height, width, _, exposure_us, _, start_x, start_y, _, _ = key
+
+        def rank(entry):
+            distance = abs(math.log(max(entry["exposure_us"], 1) / max(exposure_us, 1)))
+            if temperature_c is None or entry["temperature_c"] is None:
+                warmth = self.temperature_tolerance_c
+            else:
+                warmth = abs(entry["temperature_c"] - temperature_c)
+            exact_roi = entry["start_x"] == start_x and entry["start_y"] == start_y and \
+                entry["width"] == width and entry["height"] == height
+            return (distance, warmth, not exact_roi, -entry["created"])
+
+        def crop(entry):
+            dark = self.load(entry["id"])
+            y, x = start_y - entry["start_y"], start_x - entry["start_x"]
+            return dark[y:y + height, x:x + width]
+
+        candidates = sorted(candidates, key=rank)
+        best = candidates[0]
+        description = {"exposure_us": exposure_us, "temperature_c": temperature_c}
+        if best["exposure_us"] == exposure_us:
+            return crop(best), dict(description, match="exact", darks=[best["id"]])
+
+        # The best dark at each other exposure
+        by_exposure: Dict[int, Dict[str, Any]] = {}
+        for entry in candidates:
+            by_exposure.setdefault(entry["exposure_us"], entry)
+        exposures = sorted(by_exposure)
+        if len(exposures) >= 2:
+            low = max([t for t in exposures if t < exposure_us], default=exposures[0])
+            high = min([t for t in exposures if t > exposure_us], default=exposures[-1])
+            if low == high:
+                # Outside the range: extrapolate from the two nearest exposures
+                pair = exposures[:2] if exposure_us < exposures[0] else exposures[-2:]
+                low, high = pair
+            within = exposures[0] / self.max_exposure_ratio <= exposure_us <= \
+                exposures[-1] * self.max_exposure_ratio
+            if within:
+                first = crop(by_exposure[low]).astype(np.float32)
+                second = crop(by_exposure[high]).astype(np.float32)
+                fraction = (exposure_us - low) / (high - low)
+                dark = first + (second - first) * np.float32(fraction)
+                info = np.iinfo(np.dtype(key[2]))
+                np.clip(np.rint(dark), info.min, info.max, out=dark)
+                dark = dark.astype(key[2])
+                dark.flags.writeable = False
+                return dark, dict(description, match="interpolated",
+                                  darks=[by_exposure[low]["id"], by_exposure[high]["id"]])
+
+        ratio = max(best["exposure_us"], exposure_us) / max(min(best["exposure_us"], exposure_us), 1)
+        if ratio <= self.max_exposure_ratio:
+            return crop(best), dict(description, match="nearest", darks=[best["id"]])
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get library statistics
+
+        Returns:
+            Dictionary with the directory, number of darks and match cache counters
+        """
+        with self._lock:
+            return {
+                "directory": str(self.directory),
+                "darks": len(self._entries),
+                "cached_matches": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "temperature_tolerance_c": self.temperature_tolerance_c,
+                "max_exposure_ratio": self.max_exposure_ratio
+            }
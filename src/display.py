@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+8-bit display normalization of raw frames through a lookup table
+"""
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Tuple, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+class DisplayNormalizer:
+    """
+    Maps raw frames to 8 bits for display with a percentile stretch
+
+    The stretch limits come from a histogram of a strided sample of the
+    frame, so a few hot pixels do not set the contrast. The mapping
+    (linear, gamma or log between the limits) is built once per set of
+    limits as a uint8 lookup table with one entry per raw value and applied
+    with a single np.take, so no float copy of the frame is ever made.
+    """
+
+    def __init__(self, low_percentile: float = 0.5, high_percentile: float = 99.5,
+                 gamma: float = 1.0, log_scale: bool = False,
+                 max_samples: int = 1 << 18, cache_size: int = 8):
+        """
+        Initialize the normalizer
+
+        Args:
+            low_percentile: Percentile mapped to 0
+            high_percentile: Percentile mapped to 255
+            gamma: Display gamma (output = x ** (1 / gamma) for x in 0..1)
+            log_scale: Use a logarithmic instead of a power-law curve
+            max_samples: Approximate number of pixels sampled for the histogram
+            cache_size: Number of lookup tables kept
+        """
+        self.max_samples = max_samples
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._luts: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self.low_percentile = 0.0
+        self.high_percentile = 100.0
+        self.gamma = 1.0
+        self.log_scale = False
+        self.configure(low_percentile, high_percentile, gamma, log_scale)
+
+        # Statistics
+        self.lut_builds = 0
+        self.lut_hits = 0
+        self.last_limits: Optional[Tuple[int, int]] = None
+
+    def configure(self, low_percentile: Optional[float] = None, high_percentile: Optional[float] = None,
+                  gamma: Optional[float] = None, log_scale: Optional[bool] = None) -> None:
+        """Change the stretch settings (None keeps a setting)"""
+        low = self.low_percentile if low_percentile is None else float(low_percentile)
+        high = self.high_percentile if high_percentile is None else float(high_percentile)
+        if not 0.0 <= low < high <= 100.0:
+            raise ValueError(f"Invalid percentile range {low}..{high}")
+        gamma = self.gamma if gamma is None else float(gamma)
+        if gamma <= 0:
+            raise ValueError("Gamma must be positive")
+        self.low_percentile = low
+        self.high_percentile = high
+        self.gamma = gamma
+        if log_scale is not None:
+            self.log_scale = bool(log_scale)
+
+    def histogram(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Histogram of a strided sample of the frame
+
+        Args:
+            frame: Raw 2D frame (uint8 or uint16)
+
+        Returns:
+            Counts per raw value (256 or 65536 bins)
+        """
+        bins = 1 << (8 * frame.dtype.itemsize)
+        step = max(1, int(np.sqrt(frame.size / self.max_samples)))
+        sample = frame[::step, ::step]
+        return np.bincount(sample.ravel(), minlength=bins)
+
+    def limits(self, frame: np.ndarray) -> Tuple[int, int]:
+        """
+        Raw values at the low and high percentiles
+
+        Args:
+            frame: Raw 2D frame
+
+        Returns:
+            Tuple of (low, high) raw values, with high > low
+        """
+        cumulative = np.cumsum(self.histogram(frame))
+        total = cumulative[-1]
+        lo = int(np.searchsorted(cumulative, total * self.low_percentile / 100.0, side='right'))
+        hi = int(np.searchsorted(cumulative, total * self.high_percentile / 100.0, side='left'))
+        hi = min(hi, len(cumulative) - 1)
+        if hi <= lo:
+            hi = lo + 1
+        return lo, hi
+
+    def lut(self, lo: int, hi: int, bins: int = 1 << 16) -> np.ndarray:
+        """
+        Lookup table mapping raw values to 8 bits between lo and hi
+
+        Args:
+            lo: Raw value mapped to 0
+            hi: Raw value mapped to 255
+            bins: Number of entries (256 for 8-bit frames, 65536 for 16-bit)
+
+        Returns:
+            uint8 array of length bins
+        """
+        key = (lo, hi, bins, self.gamma, self.log_scale)
+        with self._lock:
+            table = self._luts.get(key)
+            if table is not None:
+                self._luts.move_to_end(key)
+                self.lut_hits += 1
+                return table
+
+        x = np.clip((np.arange(bins, dtype=np.float64) - lo) / (hi - lo), 0.0, 1.0)
+        if self.log_scale:
+            x = np.log1p(1000.0 * x) / np.log1p(1000.0)
+        elif self.gamma != 1.0:
+            x = x ** (1.0 / self.gamma)
+        table = np.rint(x * 255.0).astype(np.uint8)
+
+        with self._lock:
+            self._luts[key] = table
+            while len(self._luts) > self.cache_size:
+                self._luts.popitem(last=False)
+            self.lut_builds += 1
+        return table
+
+    def lut_for(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Lookup table for a frame's percentile limits
+
+        Args:
+            frame: Raw 2D frame (uint8 or uint16)
+
+        Returns:
+            uint8 lookup table indexed by raw value
+        """
+        if frame.dtype not in (np.uint8, np.uint16):
+            raise ValueError(f"Display normalization needs uint8 or uint16 frames, got {frame.dtype}")
+        lo, hi = self.limits(frame)
+        self.last_limits = (lo, hi)
+        return self.lut(lo, hi, 1 << (8 * frame.dtype.itemsize))
+
+    def normalize(self, frame: np.ndarray, out: Optional[np.ndarray] = None,
+                  lut: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Map a raw frame to 8 bits
+
+        Args:
+            frame: Raw 2D frame (uint8 or uint16)
+            out: Optional uint8 array of the frame's shape for the result
+            lut: Lookup table to apply (default: the frame's own, from lut_for)
+
+        Returns:
+            uint8 image
+        """
+        if lut is None:
+            lut = self.lut_for(frame)
+        if out is None:
+            out = np.empty(frame.shape, dtype=np.uint8)
+        np.take(lut, frame, out=out)
+        return out
+
+    def get_info(self) -> Dict[str, Any]:
+        """
+        Get the settings and lookup table statistics
+
+        Returns:
+            Dictionary of settings and counters
+        """
+        return {
+            "low_percentile": self.low_percentile,
+            "high_percentile": self.high_percentile,
+            "gamma": self.gamma,
+            "log_scale": self.log_scale,
+            "last_limits": list(self.last_limits) if self.last_limits else None,
+            "lut_builds": self.lut_builds,
+            "lut_hits": self.lut_hits
+        }
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Append-only archive of raw camera frames with memory-mapped reads
+
+An archive is a pair of files:
+
+    name.raw      header (HEADER_SIZE bytes: MAGIC, format version, pixel
+                  dtype, height, width), then the frames back to back
+    name.raw.idx  index header (MAGIC_INDEX, format version), then one
+                  INDEX_DTYPE record per frame: its offset in the data file
+                  and the acquisition metadata
+
+All frames in an archive have the same shape and dtype, so frame i lives at
+a fixed offset and the whole run can be mapped as one (frames x height x
+width) array: reading a single frame of a multi-GB run only pages in that
+frame. The data header is padded to a page so the first frame is page
+aligned. A frame counts once its index record is on disk; data or index
+bytes past the last complete pair (a crash mid-write) are dropped when the
+archive is reopened.
+"""
+import os
+import time
+import struct
+import logging
+import threading
+from collections import deque
+import numpy as np
+from typing import Dict, Tuple, Optional, Any, List
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RAW1"
+MAGIC_INDEX = b"RIX1"
+FORMAT_VERSION = 1
+HEADER_SIZE = 4096
+# magic, version, reserved, pixel dtype (numpy type string), height, width
+DATA_HEADER = struct.Struct("<4sHH4sII")
+INDEX_HEADER = struct.Struct("<4sHH")
+
+INDEX_DTYPE = np.dtype([
+    ("offset", "<u8"),
+    ("timestamp", "<f8"),
+    ("exposure_us", "<u8"),
+    ("gain", "<i4"),
+    ("temperature_c", "<f4"),   # NaN if unknown
+    ("start_x", "<u4"),
+    ("start_y", "<u4"),
+    ("binning", "<u2"),
+    ("flags", "<u2"),
+])
+
+RAW_FRAMES = registry.counter("spectrometer_raw_archive_frames", "Frames offered to the raw frame archive",
+                              ("result",))
+RAW_BYTES = registry.counter("spectrometer_raw_archive_bytes", "Frame bytes written to raw frame archives")
+RAW_WRITE_SECONDS = registry.histogram("spectrometer_raw_archive_write_seconds",
+                                       "Time to append one frame to a raw frame archive")
+
+def index_path(path: str) -> str:
+    """Path of the index file of an archive"""
+    return str(path) + ".idx"
+
+def _read_header(path: str) -> Tuple[Tuple[int, int], np.dtype]:
+    """Frame shape and dtype from a data file header"""
+    with open(path, "rb") as f:
+        header = f.read(DATA_HEADER.size)
+    if len(header) < DATA_HEADER.size:
+        raise ValueError(f"{path} is not a raw frame archive")
+    magic, version, _, dtype, height, width = DATA_HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a raw frame archive")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"{path} uses archive format {version}, newer than {FORMAT_VERSION}")
+    return (height, width), np.dtype(dtype.rstrip(b"\0").decode("ascii"))
+
+def _count_frames(path: str, frame_bytes: int) -> int:
+    """Number of complete frames, limited by both the index and the data file"""
+    indexed = max(0, os.path.getsize(index_path(path)) - INDEX_HEADER.size) // INDEX_DTYPE.itemsize
+    stored = max(0, os.path.getsize(path) - HEADER_SIZE) // frame_bytes if frame_bytes else indexed
+    return min(indexed, stored)
+
+class FrameArchive:
+    """
+    One raw frame archive, opened for appending
+
+    append() writes through to the files; the FrameArchiveWriter calls it
+    from its own thread so the camera never waits for the disk.
+    """
+
+    def __init__(self, path: str, shape: Optional[Tuple[int, int]] = None, dtype: Any = np.uint16):
+        """
+        Open or create an archive
+
+        Args:
+            path: Data file path (.raw); the index is path + '.idx'
+            shape: Frame shape (height, width); required for a new archive
+            dtype: Integer pixel type of a new archive
+
+        Raises:
+            ValueError: If the archive exists with another shape or dtype,
+                or a new archive has no shape
+        """
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self.bytes_written = 0
+
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            self.shape, self.dtype = _read_header(self.path)
+            if shape is not None and tuple(shape) != self.shape:
+                raise ValueError(f"Frame shape {tuple(shape)} does not match the archive shape {self.shape}")
+            if shape is not None and np.dtype(dtype) != self.dtype:
+                raise ValueError(f"Frame type {np.dtype(dtype)} does not match the archive type {self.dtype}")
+            if not os.path.exists(index_path(self.path)):
+                raise ValueError(f"{self.path} has no index file")
+            self._recover()
+        else:
+            if shape is None:
+                raise ValueError("A new archive needs a frame shape")
+            self.shape = (int(shape[0]), int(shape[1]))
+            self.dtype = np.dtype(dtype).newbyteorder("<")
+            if self.dtype.kind not in "ui":
+                raise ValueError(f"Raw frames must be integer pixels, not {self.dtype}")
+            with open(self.path, "wb") as f:
+                f.write(DATA_HEADER.pack(MAGIC, FORMAT_VERSION, 0, self.dtype.str.encode("ascii"),
+                                         *self.shape).ljust(HEADER_SIZE, b"\0"))
+            with open(index_path(self.path), "wb") as f:
+                f.write(INDEX_HEADER.pack(MAGIC_INDEX, FORMAT_VERSION, 0))
+            self.count = 0
+
+        self._data = open(self.path, "ab")
+        self._index = open(index_path(self.path), "ab")
+
+    @property
+    def frame_bytes(self) -> int:
+        """Size of one frame in bytes"""
+        return self.shape[0] * self.shape[1] * self.dtype.itemsize
+
+    def _recover(self) -> None:
+        """Count the complete frames and drop a partial tail from either file"""
+        self.count = _count_frames(self.path, self.frame_bytes)
+        data_end = HEADER_SIZE + self.count * self.frame_bytes
+        index_end = INDEX_HEADER.size + self.count * INDEX_DTYPE.itemsize
+        for path, end in ((self.path, data_end), (index_path(self.path), index_end)):
+            if os.path.getsize(path) > end:
+                logger.warning(f"Dropping incomplete data at the end of {path}")
+                with open(path, "r+b") as f:
+                    f.truncate(end)
+
+    def append(self, frame: np.ndarray, timestamp: Optional[float] = None, exposure_us: int = 0,
+               gain: int = 0, temperature_c: float = float("nan"), start_x: int = 0, start_y: int = 0,
+               binning: int = 1, flags: int = 0) -> int:
+        """
+        Append a frame
+
+        Args:
+            frame: Raw frame (height x width)
+            timestamp: Acquisition time (default: now)
+            exposure_us: Exposure time in microseconds
+            gain: Gain value
+            temperature_c: Sensor temperature (NaN if unknown)
+            start_x: ROI start column on the sensor
+            start_y: ROI start row on the sensor
+            binning: Binning factor
+            flags: Caller-defined bits
+
+        Returns:
+            Index of the frame in the archive
+
+        Raises:
+            ValueError: If the frame does not match the archive shape or dtype
+        """
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match the archive shape {self.shape}")
+        if frame.dtype != self.dtype:
+            raise ValueError(f"Frame type {frame.dtype} does not match the archive type {self.dtype}")
+        record = np.array([(0, time.time() if timestamp is None else timestamp, exposure_us, gain,
+                            temperature_c, start_x, start_y, binning, flags)], dtype=INDEX_DTYPE)
+
+        with self._lock:
+            index = self.count
+            record["offset"] = HEADER_SIZE + index * self.frame_bytes
+            try:
+                # Data first: an index record never points past the frames on disk
+                self._data.write(memoryview(np.ascontiguousarray(frame)).cast("B"))
+                self._data.flush()
+                self._index.write(record.tobytes())
+            except Exception:
+                self._rollback()
+                raise
+            self.count += 1
+            self.bytes_written += self.frame_bytes
+        return index
+
+    def _rollback(self) -> None:
+        """
+        Cut both files back to the complete frames after a failed append (lock held)
+
+        Without this, stray bytes of the failed frame would shift every
+        later frame away from the offset its index record gives.
+        """
+        for f, end in ((self._data, HEADER_SIZE + self.count * self.frame_bytes),
+                       (self._index, INDEX_HEADER.size + self.count * INDEX_DTYPE.itemsize)):
+            try:
+                # Closing discards whatever of the failed frame is still buffered
+                f.close()
+            except OSError:
+                pass
+            try:
+                if os.path.getsize(f.name) > end:
+                    os.truncate(f.name, end)
+            except OSError as e:
+                logger.error(f"Failed to roll back {f.name} after a failed append: {e}")
+        self._data = open(self.path, "ab")
+        self._index = open(index_path(self.path), "ab")
+
+    def flush(self, sync: bool = False) -> None:
+        """
+        Push buffered index records to the OS
+
+        Args:
+            sync: Also fsync both files
+        """
+        with self._lock:
+            self._data.flush()
+            self._index.flush()
+            if sync:
+                os.fsync(self._data.fileno())
+                os.fsync(self._index.fileno())
+
+    def close(self) -> None:
+        """Flush and close the files"""
+        with self._lock:
+            if not self._data.closed:
+                self._data.close()
+                self._index.close()
+
+    def get_info(self) -> Dict[str, Any]:
+        """
+        Get archive information
+
+        Returns:
+            Dictionary with path, frame shape, dtype and count
+        """
+        return {
+            "path": self.path,
+            "height": self.shape[0],
+            "width": self.shape[1],
+            "dtype": self.dtype.name,
+            "frames": self.count,
+            "frame_bytes": self.frame_bytes,
+            "bytes_written": self.bytes_written
+        }
+
+def read_archive(path: str) -> Dict[str, Any]:
+    """
+    Map an archive for reading
+
+    Nothing is loaded: the frames are a read-only np.memmap, so indexing
+    one frame reads only its pages. Only frames with a complete index
+    record are included.
+
+    Args:
+        path: Data file path (.raw)
+
+    Returns:
+        Dictionary with 'frames' (frames x height x width array backed by
+        the file) and 'meta' (structured array with INDEX_DTYPE fields)
+
+    Raises:
+        ValueError: If the file is not an archive
+    """
+    path = str(path)
+    shape, dtype = _read_header(path)
+    with open(index_path(path), "rb") as f:
+        magic, version, _ = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size).ljust(INDEX_HEADER.size, b"\0"))
+    if magic != MAGIC_INDEX or version > FORMAT_VERSION:
+        raise ValueError(f"{index_path(path)} is not a raw frame index")
+
+    count = _count_frames(path, shape[0] * shape[1] * dtype.itemsize)
+    meta = np.fromfile(index_path(path), dtype=INDEX_DTYPE, count=count, offset=INDEX_HEADER.size)
+    if count == 0:
+        frames = np.empty((0,) + shape, dtype=dtype)
+    else:
+        frames = np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(count,) + shape)
+    return {"frames": frames, "meta": meta}
+
+class FrameArchiveWriter:
+    """
+    Background writer for raw frame archives
+
+    append() copies the frame into one of at most max_pending buffers and
+    returns; a worker thread writes the buffers out in order. If the disk
+    falls behind and all buffers are queued, new frames are dropped and
+    counted rather than stalling the capture loop or growing memory, unless
+    the caller asks to block until a buffer is free.
+    """
+
+    def __init__(self, max_pending: int = 4):
+        """
+        Initialize the writer
+
+        Args:
+            max_pending: Frames that may wait in memory
+        """
+        self.max_pending = max(1, int(max_pending))
+
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._archives: Dict[str, FrameArchive] = {}
+        self._queue: deque = deque()
+        self._free: List[np.ndarray] = []   # Copy buffers of the last frame shape, reused
+        self._busy = False
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+
+        # Statistics
+        self.appended = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    def get_archive(self, path: str, shape: Optional[Tuple[int, int]] = None,
+                    dtype: Any = np.uint16) -> FrameArchive:
+        """Get the open archive for a path, opening or creating it if needed"""
+        key = os.path.abspath(str(path))
+        with self._lock:
+            archive = self._archives.get(key)
+            if archive is None:
+                archive = FrameArchive(key, shape, dtype)
+                self._archives[key] = archive
+            return archive
+
+    def append(self, path: str, frame: np.ndarray, block: bool = False,
+               timeout: Optional[float] = None, **meta) -> bool:
+        """
+        Queue a copy of a frame for an archive
+
+        The caller may reuse the frame buffer as soon as this returns.
+
+        Args:
+            path: Archive data file path
+            frame: Raw frame
+            block: Wait for the writer to catch up instead of dropping the frame
+            timeout: Longest wait in seconds when blocking (None: no limit)
+            **meta: Frame metadata for FrameArchive.append
+
+        Returns:
+            True if the frame was queued, False if it was dropped because
+            max_pending frames are already waiting (after the timeout when
+            blocking)
+
+        Raises:
+            ValueError: If the frame does not match an existing archive
+        """
+        archive = self.get_archive(path, frame.shape, frame.dtype)
+        if frame.shape != archive.shape or frame.dtype != archive.dtype:
+            raise ValueError(f"Frame {frame.shape} {frame.dtype} does not match the archive "
+                             f"{archive.shape} {archive.dtype}")
+        with self._lock:
+            if block:
+                self._ready.wait_for(lambda: len(self._queue) < self.max_pending, timeout)
+            if len(self._queue) >= self.max_pending:
+                self.dropped += 1
+                RAW_FRAMES.labels("dropped").inc()
+                return False
+            buffer = None
+            while self._free:
+                candidate = self._free.pop()
+                if candidate.shape == frame.shape and candidate.dtype == frame.dtype:
+                    buffer = candidate
+                    break
+        if buffer is None:
+            buffer = np.empty_like(frame)
+        np.copyto(buffer, frame)
+
+        with self._lock:
+            self._queue.append((archive, buffer, meta))
+            self.appended += 1
+            self._ensure_running()
+            self._ready.notify_all()
+        return True
+
+    def _ensure_running(self) -> None:
+        """Start the worker thread on first use (lock held)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name="frame-archive-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        """Worker loop"""
+        while True:
+            with self._lock:
+                while not self._queue and not self._stop:
+                    self._ready.wait()
+                if not self._queue:
+                    return
+                archive, buffer, meta = self._queue.popleft()
+                self._busy = True
+            try:
+                with RAW_WRITE_SECONDS.time():
+                    archive.append(buffer, **meta)
+                self.written += 1
+                RAW_FRAMES.labels("written").inc()
+                RAW_BYTES.inc(buffer.nbytes)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                RAW_FRAMES.labels("error").inc()
+                logger.error(f"Failed to write a raw frame to {archive.path}: {e}")
+            with self._lock:
+                if len(self._free) < self.max_pending:
+                    self._free.append(buffer)
+                self._busy = False
+                self._ready.notify_all()
+
+    def flush(self, path: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the queued frames are written
+
+        Args:
+            path: Only wait for this archive (default: all archives)
+            timeout: Maximum time to wait in seconds
+
+        Returns:
+            True if everything requested was written within the timeout
+        """
+        key = None if path is None else os.path.abspath(str(path))
+
+        def waiting() -> bool:
+            if key is None:
+                return bool(self._queue) or self._busy
+            return self._busy or any(archive.path == key for archive, _, _ in self._queue)
+
+        with self._lock:
+            done = self._ready.wait_for(lambda: not waiting(), timeout)
+            archives = [a for k, a in self._archives.items() if key is None or k == key]
+        for archive in archives:
+            archive.flush()
+        return done
+
+    def close(self) -> None:
+        """Write everything still queued, stop the worker and close the archives"""
+        with self._lock:
+            self._stop = True
+            self._ready.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=30)
+        with self._lock:
+            self._thread = None
+            archives = list(self._archives.values())
+            self._archives.clear()
+            self._free.clear()
+        for archive in archives:
+            archive.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get writer statistics
+
+        Returns:
+            Dictionary with counters, queue depth and open archives
+        """
+        with self._lock:
+            archives = [archive.get_info() for archive in self._archives.values()]
+            pending = len(self._queue)
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "max_pending": self.max_pending,
+            "pending": pending,
+            "appended": self.appended,
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "archives": archives
+        }
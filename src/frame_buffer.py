@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Preallocated frame buffers for continuous camera acquisition
+"""
+import time
+import logging
+import threading
+import numpy as np
+from typing import Dict, Tuple, Optional, Any, List
+
+logger = logging.getLogger(__name__)
+
+class FrameSlot:
+    """A single preallocated frame: a bytearray for the SDK and a NumPy view on it"""
+
+    def __init__(self, index: int, shape: Tuple[int, int], dtype: Any = np.uint16):
+        """
+        Allocate the slot memory
+
+        Args:
+            index: Position of the slot in its ring
+            shape: Frame shape as (height, width)
+            dtype: Pixel data type
+        """
+        self.index = index
+        self.buffer = bytearray(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        self.array = np.frombuffer(self.buffer, dtype=dtype).reshape(shape)
+        self.seq = -1  # -1 marks a slot that holds no valid frame
+        self.timestamp = 0.0
+
+class FrameRingBuffer:
+    """
+    Bounded ring of preallocated frames shared by one producer and any number of readers
+
+    The producer fills the oldest slot in place and commits it with a sequence
+    number. Readers always get a copy (or a read-only view when they ask for it)
+    of a committed frame, so a slot being written is never visible.
+    """
+
+    def __init__(self, shape: Tuple[int, int], size: int = 4, dtype: Any = np.uint16):
+        """
+        Initialize the ring buffer
+
+        Args:
+            shape: Frame shape as (height, width)
+            size: Number of preallocated frames (at least 2)
+            dtype: Pixel data type
+        """
+        if size < 2:
+            raise ValueError("Ring buffer needs at least 2 slots")
+
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = [FrameSlot(i, self.shape, self.dtype) for i in range(size)]
+
+        self._cond = threading.Condition()
+        self._next_seq = 0
+        self._closed = False
+
+        # Statistics
+        self.frames_written = 0
+        self.frames_overwritten = 0  # Committed frames no reader picked up
+        self._read_seqs = set()
+
+    @property
+    def size(self) -> int:
+        """Number of slots in the ring"""
+        return len(self.slots)
+
+    @property
+    def frame_bytes(self) -> int:
+        """Size of one frame in bytes"""
+        return len(self.slots[0].buffer)
+
+    @property
+    def latest_seq(self) -> int:
+        """Sequence number of the newest committed frame (-1 if none)"""
+        return self._next_seq - 1
+
+    def begin_write(self) -> FrameSlot:
+        """
+        Claim the oldest slot for the producer to fill
+
+        Returns:
+            The slot to write into; it is invisible to readers until committed
+        """
+        with self._cond:
+            slot = min(self.slots, key=lambda s: s.seq)
+            if slot.seq >= 0 and slot.seq not in self._read_seqs:
+                self.frames_overwritten += 1
+            self._read_seqs.discard(slot.seq)
+            slot.seq = -1
+            return slot
+
+    def commit_write(self, slot: FrameSlot, timestamp: Optional[float] = None) -> int:
+        """
+        Publish a filled slot to readers
+
+        Args:
+            slot: Slot returned by begin_write
+            timestamp: Acquisition time (defaults to now)
+
+        Returns:
+            Sequence number assigned to the frame
+        """
+        with self._cond:
+            slot.seq = self._next_seq
+            slot.timestamp = time.time() if timestamp is None else timestamp
+            self._next_seq += 1
+            self.frames_written += 1
+            self._cond.notify_all()
+            return slot.seq
+
+    def abort_write(self, slot: FrameSlot) -> None:
+        """Give back a slot without publishing it (e.g. after a capture timeout)"""
+        with self._cond:
+            slot.seq = -1
+
+    def read(self, after_seq: int = -1, timeout: Optional[float] = None,
+             copy: bool = True, out: Optional[np.ndarray] = None) -> Tuple[int, float, np.ndarray]:
+        """
+        Read the oldest frame newer than after_seq, waiting for one if needed
+
+        Args:
+            after_seq: Sequence number of the last frame the caller has seen
+            timeout: Maximum time to wait in seconds (None waits forever)
+            copy: If False, return a read-only view that stays valid only
+                  until the producer wraps around the ring
+            out: Optional array of the frame shape to copy into (implies copy)
+
+        Returns:
+            Tuple of (sequence, timestamp, frame)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                candidates = [s for s in self.slots if s.seq >= 0 and s.seq > after_seq]
+                if candidates:
+                    slot = min(candidates, key=lambda s: s.seq)
+                    self._read_seqs.add(slot.seq)
+                    if out is not None:
+                        np.copyto(out, slot.array)
+                        frame = out
+                    elif copy:
+                        frame = slot.array.copy()
+                    else:
+                        frame = slot.array.view()
+                        frame.flags.writeable = False
+                    return slot.seq, slot.timestamp, frame
+
+                if self._closed:
+                    raise RuntimeError("Frame buffer closed")
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No new frame available")
+                self._cond.wait(remaining)
+
+    def read_latest(self, timeout: Optional[float] = None, copy: bool = True,
+                    out: Optional[np.ndarray] = None) -> Tuple[int, float, np.ndarray]:
+        """
+        Read the newest committed frame, waiting for the first one if needed
+
+        Args:
+            timeout: Maximum time to wait in seconds (None waits forever)
+            copy: If False, return a read-only view (see read)
+            out: Optional array of the frame shape to copy into
+
+        Returns:
+            Tuple of (sequence, timestamp, frame)
+        """
+        with self._cond:
+            latest = self.latest_seq
+        return self.read(after_seq=latest - 1, timeout=timeout, copy=copy, out=out)
+
+    def close(self) -> None:
+        """Wake up all waiting readers; further reads fail once the ring is drained"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get ring buffer statistics
+
+        Returns:
+            Dictionary of statistics
+        """
+        with self._cond:
+            return {
+                "size": self.size,
+                "frame_bytes": self.frame_bytes,
+                "frames_written": self.frames_written,
+                "frames_overwritten": self.frames_overwritten,
+                "latest_seq": self.latest_seq
+            }
+
+class PooledFrame:
+    """
+    A reusable frame buffer handed out by a FramePool
+
+    Call release() (or use the frame as a context manager) to give the
+    buffer back to the pool once the data is no longer needed.
+    """
+
+    def __init__(self, pool: 'FramePool', key: Tuple, shape: Tuple[int, int],
+                 dtype: Any, pooled: bool = True):
+        """
+        Allocate the frame memory
+
+        Args:
+            pool: Pool the frame belongs to
+            key: Pool key the frame was allocated for
+            shape: Frame shape as (height, width)
+            dtype: Pixel data type
+            pooled: False for overflow frames that are dropped on release
+        """
+        self.pool = pool
+        self.key = key
+        self.pooled = pooled
+        self.buffer = bytearray(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        self.array = np.frombuffer(self.buffer, dtype=dtype).reshape(shape)
+        self.in_use = False
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the frame buffer in bytes"""
+        return len(self.buffer)
+
+    def release(self) -> None:
+        """Return the buffer to its pool"""
+        self.pool.release(self)
+
+    def __enter__(self) -> 'PooledFrame':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+class FramePool:
+    """
+    Pool of preallocated frame buffers keyed by readout configuration
+
+    Keys are typically (width, height, binning, image_type). Up to
+    max_per_key buffers are kept per key; if all of them are in use an
+    overflow buffer is allocated and dropped again when released.
+    """
+
+    def __init__(self, max_per_key: int = 4):
+        """
+        Initialize the frame pool
+
+        Args:
+            max_per_key: Maximum number of buffers retained per key
+        """
+        self.max_per_key = max_per_key
+        self._lock = threading.Lock()
+        self._free: Dict[Tuple, List[PooledFrame]] = {}
+        self._allocated: Dict[Tuple, int] = {}
+        self._in_use: Dict[Tuple, int] = {}
+        self._frame_bytes: Dict[Tuple, int] = {}
+
+        # Statistics
+        self.allocations = 0
+        self.reuses = 0
+        self.overflows = 0
+
+    def acquire(self, key: Tuple, shape: Tuple[int, int], dtype: Any = np.uint16) -> PooledFrame:
+        """
+        Get a buffer for the given key, reusing a free one when possible
+
+        Args:
+            key: Readout configuration key
+            shape: Frame shape as (height, width)
+            dtype: Pixel data type
+
+        Returns:
+            A PooledFrame marked as in use
+        """
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            if free:
+                frame = free.pop()
+                self.reuses += 1
+            else:
+                pooled = self._allocated.get(key, 0) < self.max_per_key
+                frame = PooledFrame(self, key, shape, dtype, pooled=pooled)
+                self._frame_bytes[key] = frame.nbytes
+                self.allocations += 1
+                if pooled:
+                    self._allocated[key] = self._allocated.get(key, 0) + 1
+                else:
+                    self.overflows += 1
+                    logger.debug(f"Frame pool exhausted for {key}, allocating overflow buffer")
+
+            frame.in_use = True
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+            return frame
+
+    def release(self, frame: PooledFrame) -> None:
+        """
+        Give a buffer back to the pool (releasing twice is harmless)
+
+        Args:
+            frame: Frame previously returned by acquire
+        """
+        with self._lock:
+            if not frame.in_use:
+                return
+            frame.in_use = False
+            self._in_use[frame.key] -= 1
+
+            if not frame.pooled:
+                return
+            if frame.key in self._free:
+                self._free[frame.key].append(frame)
+            else:
+                # The key was cleared while the frame was out; drop the buffer
+                self._allocated[frame.key] -= 1
+
+    def clear(self, keep: Optional[Tuple] = None) -> None:
+        """
+        Drop free buffers for all keys except keep
+
+        Frames currently in use for a cleared key are discarded when released.
+
+        Args:
+            keep: Key whose buffers should be retained
+        """
+        with self._lock:
+            for key in list(self._free):
+                if key == keep:
+                    continue
+                self._allocated[key] -= len(self._free[key])
+                del self._free[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report pool occupancy
+
+        Returns:
+            Dictionary with per-key and total buffer counts and sizes
+        """
+        with self._lock:
+            keys = []
+            total_bytes = 0
+            for key in set(self._allocated) | set(self._in_use):
+                free = self._free.get(key, [])
+                allocated = self._allocated.get(key, 0)
+                in_use = self._in_use.get(key, 0)
+                if allocated == 0 and in_use == 0:
+                    continue
+                total_bytes += self._frame_bytes.get(key, 0) * allocated
+                keys.append({
+                    "key": list(key),
+                    "allocated": allocated,
+                    "in_use": in_use,
+                    "free": len(free),
+                    "frame_bytes": self._frame_bytes.get(key, 0)
+                })
+
+            return {
+                "keys": keys,
+                "allocated": sum(k["allocated"] for k in keys),
+                "in_use": sum(k["in_use"] for k in keys),
+                "free": sum(k["free"] for k in keys),
+                "bytes": total_bytes,
+                "allocations": self.allocations,
+                "reuses": self.reuses,
+                "overflows": self.overflows
+            }
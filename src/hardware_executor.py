@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Single-thread executor that owns all camera SDK calls
+"""
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Dict, Optional, Any, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+class HardwareExecutor(Executor):
+    """
+    Runs camera work on one dedicated thread
+
+    The SDK handle is only ever touched from this thread, so calls are
+    serialized in submission order and a long exposure blocks nothing but
+    other hardware work. Async code awaits the results with run() instead of
+    calling the blocking methods on the event loop. Identical requests that
+    arrive while one is already queued or running can share its result with
+    run_coalesced().
+    """
+
+    def __init__(self, name: str = "asi-hardware"):
+        """
+        Start the hardware thread
+
+        Args:
+            name: Thread name, shown in logs and debuggers
+        """
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._thread_id: Optional[int] = None
+        self._lock = threading.RLock()
+        self._inflight: Dict[Hashable, Future] = {}
+
+        # Statistics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.busy_s = 0.0
+        self._pending = 0
+
+    def on_hardware_thread(self) -> bool:
+        """True when called from the hardware thread itself"""
+        return threading.get_ident() == self._thread_id
+
+    def _call(self, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        """Run one job on the hardware thread and account for it"""
+        self._thread_id = threading.get_ident()
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.busy_s += time.perf_counter() - start
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Queue a call for the hardware thread
+
+        A call made from the hardware thread itself runs inline, so hardware
+        code can use the executor without deadlocking on its own queue.
+
+        Args:
+            fn: Callable to run
+            *args, **kwargs: Arguments for fn
+
+        Returns:
+            Future with the result of fn
+        """
+        if self.on_hardware_thread():
+            future = Future()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+
+        with self._lock:
+            self.submitted += 1
+            self._pending += 1
+        try:
+            future = self._pool.submit(self._call, fn, args, kwargs)
+        except BaseException:
+            self._finished(None)
+            raise
+        # Also runs for calls cancelled before they started
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future: Optional[Future]) -> None:
+        """Drop a call from the queue depth once it has completed or been cancelled"""
+        with self._lock:
+            self._pending -= 1
+
+    def submit_coalesced(self, key: Hashable, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Queue a call unless an identical one is already queued or running
+
+        Args:
+            key: Identifies equivalent requests (e.g. acquisition parameters)
+            fn: Callable to run if no request with this key is in flight
+            *args, **kwargs: Arguments for fn
+
+        Returns:
+            Future shared by all requests with this key until it completes
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None and not future.done():
+                self.coalesced += 1
+                return future
+
+            future = self.submit(fn, *args, **kwargs)
+            self._inflight[key] = future
+
+        def forget(done: Future) -> None:
+            with self._lock:
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+
+        future.add_done_callback(forget)
+        return future
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a call on the hardware thread and await its result
+
+        Args:
+            fn: Callable to run
+            *args, **kwargs: Arguments for fn
+
+        Returns:
+            Result of fn
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    async def run_coalesced(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Await a shared result for equivalent requests (see submit_coalesced)
+
+        A waiter that is cancelled (e.g. a client disconnecting) does not
+        cancel the call for the others.
+
+        Returns:
+            Result of fn, shared with the other waiters; treat it as read-only
+        """
+        future = self.submit_coalesced(key, fn, *args, **kwargs)
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        """Stop the hardware thread once queued calls have run"""
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get executor statistics
+
+        Returns:
+            Dictionary with call counts, queue depth and busy time
+        """
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "coalesced": self.coalesced,
+                "pending": self._pending,
+                "inflight_keys": len(self._inflight),
+                "busy_s": round(self.busy_s, 3)
+            }
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Kinetic series: spectra at a fixed cadence, scheduled on the server
+"""
+import time
+import logging
+import threading
+from concurrent.futures import Executor
+from typing import Dict, Optional, Any, Callable, List
+
+logger = logging.getLogger(__name__)
+
+class KineticSeries:
+    """
+    Acquires a spectrum every interval_s for count spectra (or until stopped)
+
+    Slot i is due at t0 + i * interval_s on the monotonic clock, so the
+    cadence does not drift with capture or processing time. The scheduler
+    thread sleeps until a slot is due and runs the capture on the hardware
+    executor; a capture therefore starts within the executor latency of its
+    deadline, and the only other jitter is the exposure itself. When a
+    capture overruns so far that whole slots have passed, those slots are
+    skipped and counted as missed rather than captured back to back.
+
+    Results are passed to the on_spectrum callbacks on the scheduler thread,
+    which must return quickly (queue to storage, hand to the event loop).
+    """
+
+    def __init__(self, spectrometer, interval_s: float, count: int = 0, accumulate: int = 1,
+                 subtract_dark: Optional[bool] = None, readout_mode: Optional[str] = None,
+                 executor: Optional[Executor] = None,
+                 on_spectrum: Optional[List[Callable[[Dict[str, Any]], None]]] = None,
+                 on_finish: Optional[Callable[["KineticSeries"], None]] = None,
+                 max_consecutive_errors: int = 5):
+        """
+        Initialize a series
+
+        Args:
+            spectrometer: Connected Spectrometer instance
+            interval_s: Time between spectrum deadlines
+            count: Number of spectra to acquire (0 runs until stopped)
+            accumulate: Frames averaged per spectrum
+            subtract_dark: Whether to subtract the dark frame (None uses the spectrometer setting)
+            readout_mode: 'average' or 'maximum' (None uses the spectrometer setting)
+            executor: Executor for the camera calls (None calls them on the scheduler thread)
+            on_spectrum: Callbacks receiving each result dictionary
+            on_finish: Called with the series once the scheduler thread ends
+            max_consecutive_errors: Failed captures in a row that abort the series
+        """
+        if interval_s <= 0:
+            raise ValueError("Interval must be positive")
+        if count < 0:
+            raise ValueError("Count must not be negative")
+        if accumulate < 1:
+            raise ValueError("Accumulate must be at least 1")
+
+        self.spectrometer = spectrometer
+        self.interval_s = float(interval_s)
+        self.count = int(count)
+        self.accumulate = int(accumulate)
+        self.subtract_dark = subtract_dark
+        self.readout_mode = readout_mode
+        self.executor = executor
+        self.on_spectrum = list(on_spectrum or [])
+        self.on_finish = on_finish
+        self.max_consecutive_errors = max_consecutive_errors
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.state = "idle"
+        self.started_at: Optional[float] = None
+        self._t0 = 0.0
+        self._elapsed = 0.0
+
+        # Statistics
+        self.captured = 0
+        self.missed = 0
+        self.overruns = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self._jitter_sum = 0.0
+        self.max_jitter_s = 0.0
+
+    @property
+    def running(self) -> bool:
+        """True while the scheduler thread is active"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the scheduler thread"""
+        if self.running:
+            return
+        if not self.spectrometer.connected:
+            raise RuntimeError("Spectrometer not connected")
+        self._stop.clear()
+        self.state = "running"
+        self._thread = threading.Thread(target=self._run, name="kinetic-series", daemon=True)
+        self._thread.start()
+        logger.info(f"Kinetic series started: every {self.interval_s * 1000:.1f} ms, "
+                    f"{self.count or 'unlimited'} spectra, {self.accumulate} frame(s) each")
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """
+        Stop the series after the capture in progress
+
+        Args:
+            timeout: Maximum time to wait for the scheduler thread
+        """
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the series to finish
+
+        Returns:
+            True if the series has finished
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running
+
+    def _acquire(self) -> Dict[str, Any]:
+        """Capture one spectrum (runs on the executor)"""
+        spectrometer = self.spectrometer
+        started = time.monotonic()
+        if self.accumulate > 1:
+            result = spectrometer.acquire_accumulated(self.accumulate, subtract_dark=self.subtract_dark,
+                                                      readout_mode=self.readout_mode)
+            wavelengths, intensities, frames = result["wavelengths"], result["intensities"], result["frames"]
+        else:
+            wavelengths, intensities = spectrometer.acquire_spectrum(subtract_dark=self.subtract_dark,
+                                                                     readout_mode=self.readout_mode)
+            frames = 1
+        state = spectrometer.camera.get_state()
+        return {
+            "wavelengths": wavelengths,
+            "intensities": intensities,
+            "frames": frames,
+            "started": started,
+            "finished": time.monotonic(),
+            "exposure_us": state.get("exposure_us", 0),
+            "gain": state.get("gain", 0),
+            "dark_subtracted": spectrometer.last_dark_subtracted
+        }
+
+    def _run(self) -> None:
+        """Scheduler loop"""
+        self._t0 = t0 = time.monotonic()
+        wall0 = time.time()
+        self.started_at = wall0
+        slot = 0
+        consecutive_errors = 0
+        try:
+            while not self._stop.is_set() and (self.count == 0 or self.captured < self.count):
+                deadline = t0 + slot * self.interval_s
+                now = time.monotonic()
+                if now < deadline:
+                    if self._stop.wait(deadline - now):
+                        break
+                elif now - deadline >= self.interval_s:
+                    # Whole slots have passed: skip them instead of catching up
+                    skipped = int((now - deadline) // self.interval_s)
+                    self.missed += skipped
+                    slot += skipped
+                    deadline = t0 + slot * self.interval_s
+
+                try:
+                    if self.executor is None:
+                        result = self._acquire()
+                    else:
+                        result = self.executor.submit(self._acquire).result()
+                    consecutive_errors = 0
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = str(e)
+                    consecutive_errors += 1
+                    logger.error(f"Kinetic series capture failed at slot {slot}: {e}")
+                    if consecutive_errors >= self.max_consecutive_errors:
+                        self.state = "failed"
+                        break
+                    slot += 1
+                    continue
+
+                jitter = result["started"] - deadline
+                self._jitter_sum += jitter
+                self.max_jitter_s = max(self.max_jitter_s, jitter)
+                if result["finished"] - deadline > self.interval_s:
+                    self.overruns += 1
+
+                result.update({
+                    "index": self.captured,
+                    "slot": slot,
+                    "elapsed_s": result["started"] - t0,
+                    "timestamp": wall0 + (result["started"] - t0),
+                    "jitter_ms": jitter * 1000.0
+                })
+                self.captured += 1
+                slot += 1
+                for callback in self.on_spectrum:
+                    try:
+                        callback(result)
+                    except Exception as e:
+                        logger.error(f"Kinetic series callback failed: {e}")
+        finally:
+            self._elapsed = time.monotonic() - t0
+            if self.state == "running":
+                self.state = "stopped" if self._stop.is_set() else "completed"
+            logger.info(f"Kinetic series {self.state}: {self.captured} spectra, {self.missed} missed")
+            if self.on_finish is not None:
+                try:
+                    self.on_finish(self)
+                except Exception as e:
+                    logger.error(f"Kinetic series finish callback failed: {e}")
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Get the state and timing statistics of the series
+
+        Returns:
+            Dictionary with settings, progress and jitter statistics
+        """
+        elapsed = time.monotonic() - self._t0 if self.running else self._elapsed
+        return {
+            "state": self.state,
+            "running": self.running,
+            "interval_ms": self.interval_s * 1000.0,
+            "count": self.count,
+            "accumulate": self.accumulate,
+            "started_at": self.started_at,
+            "elapsed_s": round(elapsed, 3),
+            "captured": self.captured,
+            "missed": self.missed,
+            "overruns": self.overruns,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "mean_jitter_ms": self._jitter_sum / self.captured * 1000.0 if self.captured else None,
+            "max_jitter_ms": self.max_jitter_s * 1000.0 if self.captured else None
+        }
@@ -39,6 +39,8 @@ def check_environment():
                 break
         else:
             logger.warning("Could not find ASI SDK library in common locations")
+    elif asi_lib.startswith('sim://'):
+        logger.info("Using the simulated ASI183MM camera")
     else:
         if os.path.exists(asi_lib):
             logger.info(f"ASI SDK library found at: {asi_lib}")
@@ -62,7 +64,7 @@ def main():
     parser.add_argument('--debug', action='store_true',
                         help='Enable debug mode')
     parser.add_argument('--sdk-path', type=str, default=None,
-                        help='Path to the ASI SDK library file (overrides ZWO_ASI_LIB)')
+                        help='Path to the ASI SDK library file, or sim:// for a simulated camera (overrides ZWO_ASI_LIB)')
     parser.add_argument('--reset-settings', action='store_true',
                         help='Reset settings to defaults')
     
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Lightweight in-process metrics served in the Prometheus text format
+"""
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any, Callable, Iterator, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds, from sub-millisecond numpy work to multi-second exposures
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+class _Metric:
+    """
+    Base class of the metric families
+
+    A family without label names has a single child, used through the
+    family's own methods. With label names, labels(...) returns the child
+    for one combination of values; hot paths should look the child up once
+    and keep it.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: Any, **kwargs: Any) -> Any:
+        """
+        Get the child for a combination of label values
+
+        Args:
+            values: Label values in labelnames order (or pass them as keywords)
+
+        Returns:
+            Child metric
+        """
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self) -> Iterator[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        """Lines of this family in the text exposition format"""
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return lines
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    """Monotonically increasing count (rendered with a _total suffix)"""
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase the counter (unlabelled families only)"""
+        self._default.inc(amount)
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            yield "_total", self.labelnames, key, child.value
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+class Gauge(_Metric):
+    """
+    Value that can go up and down
+
+    A gauge can also be computed when the metrics are rendered by passing
+    a function returning the value, or {label values tuple: value} for a
+    labelled gauge.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], Any]] = None):
+        self.function = function
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        """Set the value (unlabelled families only)"""
+        self._default.set(value)
+
+    def _samples(self):
+        if self.function is None:
+            for key, child in list(self._children.items()):
+                yield "", self.labelnames, key, child.value
+            return
+        try:
+            value = self.function()
+        except Exception as e:
+            logger.debug(f"Cannot collect {self.name}: {e}")
+            return
+        if value is None:
+            return
+        if isinstance(value, dict):
+            for key, v in value.items():
+                key = key if isinstance(key, tuple) else (key,)
+                yield "", self.labelnames, tuple(str(k) for k in key), float(v)
+        else:
+            yield "", self.labelnames, (), float(value)
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+class Histogram(_Metric):
+    """
+    Distribution of observations (durations, sizes) in fixed buckets
+
+    An observation is a binary search over the bucket bounds plus two
+    additions under an uncontended lock, cheap enough for per-frame use.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets if b != float("inf")))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float) -> None:
+        """Record an observation (unlabelled families only)"""
+        self._default.observe(value)
+
+    def time(self):
+        """Context manager recording the duration of the block in seconds"""
+        return self._default.time()
+
+    def _samples(self):
+        names = self.labelnames + ("le",)
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", names, key + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, key, total
+            yield "_count", self.labelnames, key, cumulative
+
+class MetricsRegistry:
+    """
+    Collection of metric families rendered together
+
+    The factory methods return the existing family when a name is registered
+    again, so modules can declare their metrics at import time.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry"""
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls: type, name: str, *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Get or create a counter (name without the _total suffix)"""
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              function: Optional[Callable[[], Any]] = None) -> Gauge:
+        """Get or create a gauge; function replaces the value source of an existing one"""
+        gauge = self._register(Gauge, name, documentation, labelnames, function=function)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Get or create a histogram"""
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        """Get a registered family by name"""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """
+        Render all metrics
+
+        Returns:
+            Text in the Prometheus exposition format (version 0.0.4)
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Process-wide registry served at /metrics
+registry = MetricsRegistry()
+
+class HTTPMetricsMiddleware:
+    """
+    ASGI middleware counting HTTP requests and timing them by route
+
+    Requests are labelled with the route template (/spectra/{filename}), not
+    the raw path, so the number of series stays bounded. WebSocket and
+    lifespan traffic passes through untouched.
+    """
+
+    def __init__(self, app: Callable, registry: MetricsRegistry = registry):
+        """
+        Wrap an ASGI application
+
+        Args:
+            app: ASGI application
+            registry: Registry to record into
+        """
+        self.app = app
+        self.requests = registry.counter(
+            "spectrometer_http_requests", "HTTP requests handled", ("method", "route", "status"))
+        self.duration = registry.histogram(
+            "spectrometer_http_request_duration_seconds",
+            "Time from request to the end of the response body", ("method", "route"))
+        self.response_bytes = registry.counter(
+            "spectrometer_http_response_bytes", "HTTP response body bytes sent", ("route",))
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        sent = 0
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            self.duration.labels(method, route).observe(time.perf_counter() - start)
+            self.requests.labels(method, route, status).inc()
+            self.response_bytes.labels(route).inc(sent)
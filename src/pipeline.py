@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Staged acquisition pipeline: capture -> correct -> reduce -> publish
+"""
+import time
+import queue
+import logging
+import threading
+import numpy as np
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+STAGE_NAMES = ("capture", "correct", "reduce", "publish")
+
+# How often blocked workers check for a stop request
+_POLL_INTERVAL = 0.05
+
+class PipelineStage:
+    """
+    One pipeline worker: takes items from its input queue, processes them and
+    hands them to the next stage's queue
+
+    Queues are bounded, so a slow stage blocks the stages before it
+    (backpressure) instead of letting frames pile up. The time spent blocked
+    on a full output queue is reported separately from processing time.
+    """
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+                 input_queue: Optional[queue.Queue], output_queue: Optional[queue.Queue],
+                 stop_event: threading.Event, on_drop: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 error_backoff_s: float = 0.5):
+        """
+        Initialize a stage
+
+        Args:
+            name: Stage name
+            func: Processing function; returns the item for the next stage, or
+                  None to drop it. A source stage (no input queue) is called
+                  with an empty dict to produce each item.
+            input_queue: Queue to take items from (None for the source stage)
+            output_queue: Queue to put results into (None for the last stage)
+            stop_event: Event that ends the worker loop
+            on_drop: Called with items that are discarded after an error or on stop
+            error_backoff_s: Delay before a source stage retries after an error
+        """
+        self.name = name
+        self.func = func
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.stop_event = stop_event
+        self.on_drop = on_drop
+        self.error_backoff_s = error_backoff_s
+        self._thread: Optional[threading.Thread] = None
+
+        # Statistics
+        self.processed = 0
+        self.errors = 0
+        self.busy_s = 0.0
+        self.blocked_s = 0.0
+        self._blocked_since: Optional[float] = None
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        """Start the worker thread"""
+        self._thread = threading.Thread(target=self._loop, name=f"pipeline-{self.name}", daemon=True)
+        self._thread.start()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the worker thread to exit
+
+        Returns:
+            True if the thread has exited
+        """
+        if self._thread is None:
+            return True
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _take(self) -> Optional[Dict[str, Any]]:
+        """Next input item, or None once stopped"""
+        if self.input_queue is None:
+            return {}
+        while not self.stop_event.is_set():
+            try:
+                return self.input_queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return None
+
+    def _put(self, item: Dict[str, Any]) -> bool:
+        """Hand an item to the next stage, waiting while its queue is full"""
+        start = self._blocked_since = time.perf_counter()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self.output_queue.put(item, timeout=_POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            self._blocked_since = None
+            self.blocked_s += time.perf_counter() - start
+
+    def _drop(self, item: Dict[str, Any]) -> None:
+        if self.on_drop is not None and item:
+            self.on_drop(item)
+
+    def _loop(self) -> None:
+        """Worker loop"""
+        while not self.stop_event.is_set():
+            item = self._take()
+            if item is None:
+                break
+
+            start = time.perf_counter()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                logger.error(f"Pipeline stage {self.name} failed: {e}")
+                self._drop(item)
+                if self.input_queue is None:
+                    # A failing source would otherwise spin; back off before retrying
+                    self.stop_event.wait(self.error_backoff_s)
+                continue
+            finally:
+                elapsed = time.perf_counter() - start
+                self.busy_s += elapsed
+                self.last_latency_ms = elapsed * 1000.0
+                self.max_latency_ms = max(self.max_latency_ms, self.last_latency_ms)
+
+            self.processed += 1
+            if result is None or self.output_queue is None:
+                continue
+            if not self._put(result):
+                self._drop(result)
+        logger.debug(f"Pipeline stage {self.name} exited")
+
+    def get_stats(self, elapsed_s: float) -> Dict[str, Any]:
+        """
+        Get stage statistics
+
+        Args:
+            elapsed_s: Time the pipeline has been running, for the utilization
+
+        Returns:
+            Dictionary with counts, latencies, blocked time, queue depth and utilization
+        """
+        blocked_s = self.blocked_s
+        since = self._blocked_since
+        if since is not None:
+            blocked_s += time.perf_counter() - since
+        return {
+            "processed": self.processed,
+            "errors": self.errors,
+            "last_latency_ms": round(self.last_latency_ms, 3),
+            "mean_latency_ms": round(self.busy_s / self.processed * 1000.0, 3) if self.processed else 0.0,
+            "max_latency_ms": round(self.max_latency_ms, 3),
+            "blocked_ms": round(blocked_s * 1000.0, 1),
+            "blocked": since is not None,
+            "queue_depth": self.input_queue.qsize() if self.input_queue is not None else None,
+            "utilization": round(self.busy_s / elapsed_s, 3) if elapsed_s > 0 else 0.0,
+            "last_error": self.last_error
+        }
+
+class AcquisitionPipeline:
+    """
+    Runs capture, dark correction, reduction and publishing on separate workers
+
+    The stages are connected by bounded queues, so the camera exposes frame
+    N+1 while frame N is being corrected, reduced and published. Raw frames
+    travel through the pipeline in pooled buffers (corrected in place) and go
+    back to the camera's frame pool once reduced. Camera calls go through the
+    given executor, so they stay on the hardware thread.
+    """
+
+    def __init__(self, spectrometer, publish: Callable[[Dict[str, Any]], None],
+                 executor: Optional[Executor] = None, queue_size: int = 2,
+                 use_continuous: bool = True, error_backoff_s: float = 0.5,
+                 preview=None):
+        """
+        Initialize the pipeline
+
+        Args:
+            spectrometer: Connected Spectrometer instance
+            publish: Called from the publish worker with each result: a dict
+                     with 'seq', 'timestamp', 'wavelengths', 'intensities',
+                     'dark_subtracted' and 'latency_ms' (capture start to publish)
+            executor: Executor for camera calls (None calls the camera directly)
+            queue_size: Capacity of each queue between stages
+            use_continuous: Start continuous capture for the run when possible
+            error_backoff_s: Delay before retrying after a failed capture
+            preview: Optional PreviewCache offered each raw frame as captured,
+                     before dark correction (it applies its own rate limit)
+        """
+        self.spectrometer = spectrometer
+        self.publish = publish
+        self.executor = executor
+        self.queue_size = max(1, int(queue_size))
+        self.use_continuous = use_continuous
+        self.error_backoff_s = error_backoff_s
+        self.preview = preview
+
+        self._stop = threading.Event()
+        self._queues: List[queue.Queue] = []
+        self.stages: List[PipelineStage] = []
+        self._started_continuous = False
+        self._started_at: Optional[float] = None
+        self._stopped_at: Optional[float] = None
+        self.seq = 0
+        self.published = 0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        """True while the stage workers are active"""
+        return bool(self.stages) and not self._stop.is_set()
+
+    def _call_camera(self, func: Callable, *args) -> Any:
+        """Run a camera call on the executor and wait for the result"""
+        if self.executor is None:
+            return func(*args)
+        return self.executor.submit(func, *args).result()
+
+    def start(self) -> None:
+        """Start continuous capture (if enabled and possible) and the stage workers"""
+        if self.running:
+            return
+        if not self.spectrometer.connected:
+            raise RuntimeError("Spectrometer not connected")
+
+        camera = self.spectrometer.camera
+        self._started_continuous = False
+        if self.use_continuous and not camera.is_continuous:
+            try:
+                self._call_camera(camera.start_continuous)
+                self._started_continuous = True
+            except RuntimeError as e:
+                logger.info(f"Pipeline using snapshot captures: {e}")
+
+        # Raw frames are held from capture until reduced: one per stage, plus the queues between
+        in_flight = 2 * self.queue_size + 3
+        camera.frame_pool.max_per_key = max(camera.frame_pool.max_per_key, in_flight)
+
+        self._stop.clear()
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in STAGE_NAMES[1:]]
+        functions = (self._capture, self._correct, self._reduce, self._publish)
+        inputs = [None] + self._queues
+        outputs = self._queues + [None]
+        self.stages = [
+            PipelineStage(name, func, inputs[i], outputs[i], self._stop,
+                          on_drop=self._release, error_backoff_s=self.error_backoff_s)
+            for i, (name, func) in enumerate(zip(STAGE_NAMES, functions))
+        ]
+        self.seq = 0
+        self.published = 0
+        self._started_at = time.perf_counter()
+        self._stopped_at = None
+        for stage in self.stages:
+            stage.start()
+        logger.info(f"Acquisition pipeline started (queue size {self.queue_size})")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Stop the workers, release queued frames and stop continuous capture
+        if the pipeline started it
+
+        Must not be called from the executor thread, since the capture worker
+        may be waiting for it.
+        """
+        if not self.stages or self._stop.is_set():
+            return
+        self._stop.set()
+        for stage in self.stages:
+            if not stage.join(timeout):
+                logger.warning(f"Pipeline stage {stage.name} did not exit in time")
+        self._stopped_at = time.perf_counter()
+
+        for q in self._queues:
+            while True:
+                try:
+                    self._release(q.get_nowait())
+                except queue.Empty:
+                    break
+
+        if self._started_continuous:
+            self._started_continuous = False
+            try:
+                self._call_camera(self.spectrometer.camera.stop_continuous)
+            except Exception as e:
+                logger.warning(f"Failed to stop continuous capture: {e}")
+        logger.info("Acquisition pipeline stopped")
+
+    @staticmethod
+    def _release(item: Dict[str, Any]) -> None:
+        """Return an item's raw frame to the pool"""
+        frame = item.get("frame")
+        if frame is not None:
+            item["frame"] = None
+            frame.release()
+
+    # Stages
+
+    def _capture(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Source stage: capture a frame and snapshot the processing settings"""
+        spectrometer = self.spectrometer
+        started = time.perf_counter()
+        frame = self._call_camera(spectrometer.acquire_raw_frame)
+        self.seq += 1
+        # The preview shows the raw frame, as single captures do, before it is corrected in place
+        if self.preview is not None:
+            self.preview.offer(frame.array)
+        # The dark matching the readout settings (dark frame or library master dark)
+        dark = spectrometer.select_dark(frame.array.shape, frame.array.dtype) if spectrometer.subtract_dark else None
+        use_max = spectrometer.use_max
+        # In average mode the dark's column mean is subtracted after the reduction instead
+        dark_spectrum = None
+        if dark is not None and dark.shape == frame.array.shape and spectrometer.dark_commutes(use_max):
+            dark_spectrum = spectrometer.dark_spectrum(dark)
+            dark = None
+        return {
+            "seq": self.seq,
+            "timestamp": time.time(),
+            "started": started,
+            "frame": frame,
+            "dark": dark,
+            "dark_spectrum": dark_spectrum,
+            "use_max": use_max,
+            "dark_subtracted": False
+        }
+
+    def _correct(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Subtract the dark frame in place, saturating at 0"""
+        dark = item["dark"]
+        if dark is None:
+            return item
+        raw = item["frame"].array
+        if dark.shape != raw.shape:
+            logger.warning("Dark frame shape mismatch, skipping subtraction")
+            item["dark"] = None
+        elif raw.dtype.kind == 'u' and dark.dtype == raw.dtype:
+            # max(raw, dark) - dark never wraps around
+            np.maximum(raw, dark, out=raw)
+            np.subtract(raw, dark, out=raw)
+            item["dark"] = None
+            item["dark_subtracted"] = True
+        # Otherwise the reduce stage subtracts it in signed arithmetic
+        return item
+
+    def _reduce(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Reduce the corrected frame to a spectrum and release the raw buffer"""
+        mode = 'max' if item["use_max"] else 'mean'
+        try:
+            raw = item["frame"].array
+            intensities = self.spectrometer.reducer.reduce(raw, dark=item["dark"], mode=mode, clip=True)
+        finally:
+            self._release(item)
+        dark_spectrum = item.pop("dark_spectrum")
+        if dark_spectrum is not None:
+            intensities -= dark_spectrum
+            np.maximum(intensities, 0.0, out=intensities)
+            self.spectrometer.count_dark_path('spectrum')
+        else:
+            self.spectrometer.count_dark_path('frame' if item["dark_subtracted"] or item["dark"] is not None
+                                              else 'none')
+        item["dark_subtracted"] = item["dark_subtracted"] or item["dark"] is not None or dark_spectrum is not None
+        item["dark"] = None
+        item["intensities"] = self.spectrometer.correct_baseline(intensities, item["use_max"])
+        item["wavelengths"] = self.spectrometer.get_wavelength_axis(len(intensities))
+        return item
+
+    def _publish(self, item: Dict[str, Any]) -> None:
+        """Hand the result to the consumer"""
+        latency_ms = (time.perf_counter() - item.pop("started")) * 1000.0
+        item["latency_ms"] = latency_ms
+        self.publish(item)
+        self.published += 1
+        self.last_latency_ms = latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get per-stage and end-to-end statistics
+
+        Returns:
+            Dictionary with 'stages' (per-stage latency, queue depth and
+            utilization), 'bottleneck' (busiest stage), published count,
+            throughput and end-to-end latency
+        """
+        if self._started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._stopped_at or time.perf_counter()) - self._started_at
+        stages = {stage.name: stage.get_stats(elapsed) for stage in self.stages}
+        bottleneck = max(stages, key=lambda name: stages[name]["utilization"]) if stages else None
+        return {
+            "running": self.running,
+            "queue_size": self.queue_size,
+            "continuous": self._started_continuous,
+            "published": self.published,
+            "fps": round(self.published / elapsed, 2) if elapsed > 0 else 0.0,
+            "last_latency_ms": round(self.last_latency_ms, 3),
+            "max_latency_ms": round(self.max_latency_ms, 3),
+            "bottleneck": bottleneck,
+            "stages": stages
+        }
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Downsampled camera preview, rate limited and cached for HTTP clients
+"""
+import os
+import time
+import base64
+import logging
+import threading
+import numpy as np
+from io import BytesIO
+from typing import Dict, Tuple, Optional, Any
+
+from display import DisplayNormalizer
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_STAGE_SECONDS = registry.histogram(
+    "spectrometer_preview_stage_seconds",
+    "Preview time by stage: render (downsample and LUT) and jpeg (encoding)", ("stage",))
+_STAGE_RENDER = PREVIEW_STAGE_SECONDS.labels("render")
+_STAGE_JPEG = PREVIEW_STAGE_SECONDS.labels("jpeg")
+
+def block_factor(height: int, width: int, max_width: int, max_height: int) -> int:
+    """
+    Smallest integer block size that fits a frame into the preview size
+
+    Args:
+        height, width: Frame size
+        max_width, max_height: Preview size limit
+
+    Returns:
+        Block size in pixels (1 if the frame already fits)
+    """
+    return max(1, -(-width // max_width), -(-height // max_height))
+
+def downsample_frame(frame: np.ndarray, max_width: int, max_height: int) -> np.ndarray:
+    """
+    Block-average a raw frame down to at most max_width x max_height
+
+    Blocks of f x f pixels are summed in uint32 and divided by f*f with
+    integer division, so no float copy of the frame is made. Rows and
+    columns that do not fill a whole block are dropped.
+
+    Args:
+        frame: Raw 2D frame (uint8 or uint16)
+        max_width: Maximum preview width
+        max_height: Maximum preview height
+
+    Returns:
+        Downsampled frame in the frame's dtype
+    """
+    height, width = frame.shape
+    f = block_factor(height, width, max_width, max_height)
+    if f == 1:
+        return frame
+    rows, cols = height // f, width // f
+    blocks = frame[:rows * f, :cols * f].reshape(rows, f, cols, f)
+    # Sum along the contiguous axis first, then across the block rows
+    sums = np.add.reduce(blocks, axis=3, dtype=np.uint32)
+    sums = np.add.reduce(sums, axis=1, dtype=np.uint32)
+    sums //= f * f
+    return sums.astype(frame.dtype)
+
+class PreviewCache:
+    """
+    Latest camera preview, downsampled to a bounded size
+
+    Acquisition paths offer their raw frames; a new preview is rendered at
+    most once per min_interval_s, independently of the spectrum rate, and
+    only downsampled frames are kept. The 8-bit stretch is the lookup table
+    of the full frame, so the preview matches the /acquire/image rendering
+    of the same frame. JPEG encoding happens once per preview,
+    when a client first asks for it. Each preview has an ETag so clients can
+    revalidate cheaply.
+    """
+
+    def __init__(self, max_width: int = 1024, max_height: int = 768,
+                 min_interval_s: float = 0.5, quality: int = 85,
+                 normalizer: Optional[DisplayNormalizer] = None):
+        """
+        Initialize the cache
+
+        Args:
+            max_width: Maximum preview width in pixels
+            max_height: Maximum preview height in pixels
+            min_interval_s: Minimum time between rendered previews
+            quality: JPEG quality
+            normalizer: 8-bit display mapping (default: a percentile stretch)
+        """
+        self.max_width = max_width
+        self.max_height = max_height
+        self.min_interval_s = min_interval_s
+        self.quality = quality
+        self.normalizer = normalizer or DisplayNormalizer()
+
+        self._lock = threading.Lock()
+        self._instance = os.urandom(4).hex()
+        self._image: Optional[np.ndarray] = None
+        self._encoded: Optional[bytes] = None
+        self._source_shape: Optional[Tuple[int, int]] = None
+        self.seq = 0
+        self.updated_at = 0.0
+        self._force_next = False
+
+        # Statistics
+        self.offered = 0
+        self.rendered = 0
+        self.encoded = 0
+
+    def configure(self, max_width: Optional[int] = None, max_height: Optional[int] = None,
+                  min_interval_s: Optional[float] = None, quality: Optional[int] = None) -> None:
+        """Change the preview settings; the next offered frame renders a new preview"""
+        with self._lock:
+            if max_width is not None:
+                self.max_width = max(1, int(max_width))
+            if max_height is not None:
+                self.max_height = max(1, int(max_height))
+            if min_interval_s is not None:
+                self.min_interval_s = max(0.0, float(min_interval_s))
+            if quality is not None:
+                self.quality = min(95, max(1, int(quality)))
+            self._force_next = True
+
+    def due(self) -> bool:
+        """True if a new preview may be rendered now"""
+        return self._force_next or time.monotonic() - self.updated_at >= self.min_interval_s
+
+    def offer(self, frame: np.ndarray, force: bool = False) -> bool:
+        """
+        Render a new preview from a frame if the rate limit allows it
+
+        The frame is only read during this call, so callers may pass pooled
+        buffers that are reused afterwards.
+
+        Args:
+            frame: Raw 2D frame
+            force: Render even if the last preview is more recent than min_interval_s
+
+        Returns:
+            True if a new preview was rendered
+        """
+        self.offered += 1
+        if not force and not self.due():
+            return False
+        with _STAGE_RENDER.time():
+            lut = self.normalizer.lut_for(frame)
+            image = self.normalizer.normalize(downsample_frame(frame, self.max_width, self.max_height), lut=lut)
+        with self._lock:
+            self._image = image
+            self._encoded = None
+            self._source_shape = frame.shape
+            self.seq += 1
+            self.updated_at = time.monotonic()
+            self._force_next = False
+            self.rendered += 1
+        return True
+
+    @property
+    def etag(self) -> Optional[str]:
+        """Entity tag of the current preview (None before the first one)"""
+        if self.seq == 0:
+            return None
+        return f'"{self._instance}-{self.seq}"'
+
+    def get(self) -> Optional[Tuple[bytes, str]]:
+        """
+        Get the current preview as JPEG
+
+        Returns:
+            Tuple of (JPEG bytes, ETag), or None if no preview exists yet
+        """
+        with self._lock:
+            if self._image is None:
+                return None
+            if self._encoded is None:
+                from PIL import Image
+                buffer = BytesIO()
+                with _STAGE_JPEG.time():
+                    Image.fromarray(self._image).save(buffer, format="JPEG", quality=self.quality)
+                self._encoded = buffer.getvalue()
+                self.encoded += 1
+            return self._encoded, self.etag
+
+    def data_url(self) -> Optional[str]:
+        """Current preview as a base64 JPEG data URL (None if no preview exists yet)"""
+        preview = self.get()
+        if preview is None:
+            return None
+        return "data:image/jpeg;base64," + base64.b64encode(preview[0]).decode("ascii")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get preview statistics
+
+        Returns:
+            Dictionary with settings, current preview size and counters
+        """
+        image = self._image
+        return {
+            "max_width": self.max_width,
+            "max_height": self.max_height,
+            "min_interval_s": self.min_interval_s,
+            "seq": self.seq,
+            "etag": self.etag,
+            "age_s": round(time.monotonic() - self.updated_at, 3) if self.seq else None,
+            "width": image.shape[1] if image is not None else None,
+            "height": image.shape[0] if image is not None else None,
+            "source_shape": list(self._source_shape) if self._source_shape else None,
+            "offered": self.offered,
+            "rendered": self.rendered,
+            "encoded": self.encoded
+        }
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Readout planning: the cheapest camera configuration that covers a spectral band
+"""
+import math
+import logging
+from typing import Dict, List, Optional, Any, Sequence
+
+logger = logging.getLogger(__name__)
+
+# SDK image types (same values as zwoasi.ASI_IMG_*)
+IMG_RAW8 = 0
+IMG_RAW16 = 2
+
+IMAGE_FORMATS = {IMG_RAW8: "RAW8", IMG_RAW16: "RAW16"}
+
+# Approximate ASI183MM readout model. The sensor reads rows at a fixed rate
+# (faster in the 10-bit mode used for RAW8); the frame then has to fit through
+# USB 3.0 at the configured bandwidth share.
+ROW_TIME_US = {IMG_RAW8: 14.3, IMG_RAW16: 28.6}
+USB_BYTES_PER_S = 380e6
+ADC_BITS = {IMG_RAW8: 8, IMG_RAW16: 12}
+
+class ReadoutPlanner:
+    """
+    Chooses ROI, binning and pixel format for a spectral band
+
+    Only the rows that hold the spectrum are read out (rounded to the SDK's
+    alignment rules), columns are binned as far as the requested spectral
+    resolution allows, and RAW8 is used when 8 bits of dynamic range are
+    enough. All positions passed in are unbinned sensor pixels; the plan's
+    ROI is in binned pixels, as the SDK expects.
+    """
+
+    def __init__(self, max_width: int, max_height: int,
+                 supported_bins: Sequence[int] = (1,),
+                 bandwidth_percent: float = 40.0,
+                 usb_bytes_per_s: float = USB_BYTES_PER_S,
+                 row_time_us: Optional[Dict[int, float]] = None):
+        """
+        Initialize the planner for a sensor
+
+        Args:
+            max_width: Sensor width in pixels
+            max_height: Sensor height in pixels
+            supported_bins: Binning factors the camera supports
+            bandwidth_percent: USB bandwidth share configured on the camera
+            usb_bytes_per_s: Raw USB throughput at 100% bandwidth
+            row_time_us: Row readout time per image type (defaults to ROW_TIME_US)
+        """
+        self.max_width = int(max_width)
+        self.max_height = int(max_height)
+        self.supported_bins = sorted(int(b) for b in supported_bins) or [1]
+        self.bandwidth_percent = bandwidth_percent
+        self.usb_bytes_per_s = usb_bytes_per_s
+        self.row_time_us = dict(ROW_TIME_US if row_time_us is None else row_time_us)
+
+    @staticmethod
+    def _bytes_per_pixel(image_type: int) -> int:
+        return 1 if image_type == IMG_RAW8 else 2
+
+    def estimate(self, width: int, height: int, binning: int = 1,
+                 image_type: int = IMG_RAW16, exposure_ms: float = 0.0) -> Dict[str, Any]:
+        """
+        Estimate transfer size and frame rate for a readout configuration
+
+        Args:
+            width: ROI width in binned pixels
+            height: ROI height in binned pixels
+            binning: Binning factor
+            image_type: IMG_RAW8 or IMG_RAW16
+            exposure_ms: Exposure time in milliseconds
+
+        Returns:
+            Dictionary with bytes_per_frame, readout_ms, transfer_ms,
+            frame_time_ms, frame_rate and the limiting factor ('bottleneck')
+        """
+        bytes_per_frame = width * height * self._bytes_per_pixel(image_type)
+        # Binning is done after readout, so every sensor row in the ROI is still read
+        readout_ms = height * binning * self.row_time_us.get(image_type, ROW_TIME_US[IMG_RAW16]) / 1000.0
+        throughput = self.usb_bytes_per_s * self.bandwidth_percent / 100.0
+        transfer_ms = bytes_per_frame / throughput * 1000.0
+
+        times = {"exposure": exposure_ms, "readout": readout_ms, "transfer": transfer_ms}
+        bottleneck = max(times, key=times.get)
+        frame_time_ms = times[bottleneck]
+        return {
+            "bytes_per_frame": bytes_per_frame,
+            "readout_ms": round(readout_ms, 3),
+            "transfer_ms": round(transfer_ms, 3),
+            "frame_time_ms": round(frame_time_ms, 3),
+            "frame_rate": round(1000.0 / frame_time_ms, 2) if frame_time_ms > 0 else None,
+            "bottleneck": bottleneck
+        }
+
+    @staticmethod
+    def _fit(start: int, size: int, limit: int, multiple: int) -> List[int]:
+        """Grow size to a multiple and shift start so the span stays inside [0, limit)"""
+        limit -= limit % multiple
+        size = min(limit, int(math.ceil(size / multiple)) * multiple)
+        start = max(0, min(start, limit - size))
+        return [start, size]
+
+    def _columns(self, column_start: int, column_width: int, binning: int) -> List[int]:
+        """Binned [start_x, width] covering the sensor columns of interest"""
+        first_col = column_start // binning
+        last_col = -(-(column_start + column_width) // binning)
+        return self._fit(first_col, last_col - first_col, self.max_width // binning, 8)
+
+    def plan(self, band_start_y: int, band_height: int,
+             min_columns: Optional[int] = None,
+             column_start: int = 0, column_width: Optional[int] = None,
+             dynamic_range_bits: int = 12,
+             exposure_ms: float = 0.0) -> Dict[str, Any]:
+        """
+        Plan the cheapest readout for a spectral band
+
+        Args:
+            band_start_y: First sensor row of the spectrum
+            band_height: Number of sensor rows the spectrum covers
+            min_columns: Spectral pixels needed across the column span
+                         (default: full resolution, no binning)
+            column_start: First sensor column of interest
+            column_width: Number of sensor columns of interest (default: to the edge)
+            dynamic_range_bits: Bits of dynamic range the measurement needs;
+                                8 or fewer allows RAW8
+            exposure_ms: Exposure time for the frame rate estimate
+
+        Returns:
+            Dictionary with 'roi' (start_x, start_y, width, height, binning in
+            binned pixels), 'image_type', 'image_format', 'spectral_pixels',
+            the estimate() figures and 'full_frame' figures for comparison
+        """
+        if band_height < 1 or band_start_y < 0 or band_start_y + band_height > self.max_height:
+            raise ValueError(f"Band rows {band_start_y}..{band_start_y + band_height} outside the sensor")
+        if column_width is None:
+            column_width = self.max_width - column_start
+        if column_width < 1 or column_start < 0 or column_start + column_width > self.max_width:
+            raise ValueError(f"Columns {column_start}..{column_start + column_width} outside the sensor")
+        if min_columns is None:
+            min_columns = column_width
+
+        # Largest binning that still leaves enough spectral pixels;
+        # the SDK needs width % 8 == 0 and height % 2 == 0 (in binned pixels)
+        binning = self.supported_bins[0]
+        start_x, width = self._columns(column_start, column_width, binning)
+        for candidate in self.supported_bins[1:]:
+            columns = self._columns(column_start, column_width, candidate)
+            if columns[1] >= min_columns:
+                binning, (start_x, width) = candidate, columns
+
+        first_row = band_start_y // binning
+        last_row = -(-(band_start_y + band_height) // binning)
+        start_y, height = self._fit(first_row, last_row - first_row, self.max_height // binning, 2)
+
+        image_type = IMG_RAW8 if dynamic_range_bits <= ADC_BITS[IMG_RAW8] else IMG_RAW16
+
+        plan = {
+            "roi": {
+                "start_x": start_x,
+                "start_y": start_y,
+                "width": width,
+                "height": height,
+                "binning": binning
+            },
+            "image_type": image_type,
+            "image_format": IMAGE_FORMATS[image_type],
+            "spectral_pixels": width
+        }
+        plan.update(self.estimate(width, height, binning, image_type, exposure_ms))
+        plan["full_frame"] = self.estimate(self.max_width, self.max_height, 1, IMG_RAW16, exposure_ms)
+        logger.debug(f"Readout plan: {plan['roi']} {plan['image_format']}, "
+                     f"{plan['bytes_per_frame']} bytes/frame, {plan['frame_rate']} fps")
+        return plan
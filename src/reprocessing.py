@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Batch reprocessing of stored raw frames and spectra with a new processing recipe
+"""
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Optional, Any, Sequence, Tuple
+
+import numpy as np
+
+from baseline import BaselineCorrector
+from calibration import evaluate_polynomial, binned_pixel_centers, calibration_hash
+from reduction import ColumnReducer
+from frame_archive import read_archive
+from spectrum_store import (SpectrumStore, read_store, count_spectra,
+                            FLAG_MAXIMUM, FLAG_DARK_SUBTRACTED, FLAG_BASELINE_CORRECTED)
+
+logger = logging.getLogger(__name__)
+
+# Source types by file suffix
+RAW_SUFFIXES = (".npy", ".raw")
+SPECTRA_SUFFIXES = (".spx",)
+
+class ProcessingRecipe:
+    """
+    How to turn stored data into spectra
+
+    Raw frames go through the full chain (dark, column reduction, baseline,
+    calibration); in average mode the dark's column mean is subtracted
+    after the reduction unless clip_dark_pixels asks for the 2D dark to be
+    clipped per pixel first. Stored spectra are already reduced, so they keep their
+    readout mode; the dark is applied as its column mean, which equals the
+    2D subtraction for average-mode spectra (maximum-mode spectra and those
+    already dark-subtracted are left as they are and counted), followed by
+    the baseline and, if coefficients are given, a new wavelength axis.
+    """
+
+    def __init__(self, readout_mode: str = "average", dark_path: Optional[str] = None,
+                 baseline_correction: str = "none", polynomial_degree: int = 3,
+                 als_lambda: float = 1e5, als_asymmetry: float = 0.01,
+                 wavelength_coefficients: Optional[Sequence[float]] = None, binning: int = 1,
+                 clip_dark_pixels: bool = False):
+        """
+        Define a recipe
+
+        Args:
+            readout_mode: 'average' or 'maximum' column reduction (raw frames)
+            dark_path: .npy file with the 2D dark frame to subtract (None: no dark)
+            baseline_correction: 'none', 'linear', 'polynomial' or 'als'
+            polynomial_degree: Degree of the polynomial baseline
+            als_lambda: Smoothness of the ALS baseline
+            als_asymmetry: Weight of points above the ALS baseline
+            wavelength_coefficients: Calibration for the new axis (None keeps the
+                stored axis of spectra; raw frames then get pixel numbers)
+            binning: Binning of the stored data, for evaluating the calibration
+            clip_dark_pixels: Subtract the 2D dark from raw frames with per-pixel
+                clipping at 0 in average mode too
+
+        Raises:
+            ValueError: If a setting is invalid
+        """
+        if readout_mode not in ("average", "maximum"):
+            raise ValueError(f"Invalid readout mode: {readout_mode}. Must be 'average' or 'maximum'.")
+        BaselineCorrector.validate(baseline_correction, polynomial_degree)
+        BaselineCorrector(als_lambda=als_lambda, als_asymmetry=als_asymmetry)
+        if binning < 1:
+            raise ValueError("Binning must be at least 1")
+
+        self.readout_mode = readout_mode
+        self.dark_path = dark_path
+        self.baseline_correction = baseline_correction
+        self.polynomial_degree = int(polynomial_degree)
+        self.als_lambda = float(als_lambda)
+        self.als_asymmetry = float(als_asymmetry)
+        self.wavelength_coefficients = None if wavelength_coefficients is None else \
+            [float(c) for c in wavelength_coefficients]
+        self.binning = int(binning)
+        self.clip_dark_pixels = bool(clip_dark_pixels)
+
+    def axis(self, width: int) -> Optional[np.ndarray]:
+        """New wavelength axis for width pixels (None if the recipe keeps the stored one)"""
+        if self.wavelength_coefficients is None:
+            return None
+        return evaluate_polynomial(self.wavelength_coefficients, binned_pixel_centers(width, self.binning))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Recipe as a dictionary"""
+        return {
+            "readout_mode": self.readout_mode,
+            "dark_path": self.dark_path,
+            "baseline_correction": self.baseline_correction,
+            "polynomial_degree": self.polynomial_degree,
+            "als_lambda": self.als_lambda,
+            "als_asymmetry": self.als_asymmetry,
+            "wavelength_coefficients": self.wavelength_coefficients,
+            "binning": self.binning,
+            "clip_dark_pixels": self.clip_dark_pixels
+        }
+
+def open_frames(path: str) -> np.ndarray:
+    """
+    Memory-map a stack of raw frames
+
+    Args:
+        path: Raw frame archive (.raw), or .npy file holding one frame
+              (height x width) or a stack (frames x height x width) of
+              integer pixels
+
+    Returns:
+        Read-only (frames x height x width) array backed by the file
+
+    Raises:
+        ValueError: If the file does not hold integer frames
+    """
+    if path.endswith(".raw"):
+        return read_archive(path)["frames"]
+    frames = np.load(path, mmap_mode="r", allow_pickle=False)
+    if frames.ndim == 2:
+        frames = frames[np.newaxis]
+    if frames.ndim != 3 or frames.dtype.kind not in "ui":
+        raise ValueError(f"{path} does not hold raw frames (shape {frames.shape}, dtype {frames.dtype})")
+    return frames
+
+# Tools of the current (worker) process, built on first use
+_reducer: Optional[ColumnReducer] = None
+_correctors: Dict[Tuple[float, float], BaselineCorrector] = {}
+_darks: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+def _tools(recipe: ProcessingRecipe) -> Tuple[ColumnReducer, BaselineCorrector,
+                                                 Optional[np.ndarray], Optional[np.ndarray]]:
+    """Reducer, baseline corrector, dark frame and dark column mean for a recipe"""
+    global _reducer
+    if _reducer is None:
+        _reducer = ColumnReducer()
+    key = (recipe.als_lambda, recipe.als_asymmetry)
+    corrector = _correctors.get(key)
+    if corrector is None:
+        corrector = _correctors[key] = BaselineCorrector(als_lambda=key[0], als_asymmetry=key[1])
+    dark = dark_mean = None
+    if recipe.dark_path is not None:
+        if recipe.dark_path not in _darks:
+            frame = open_frames(recipe.dark_path)[0]
+            _darks[recipe.dark_path] = (frame, np.add.reduce(frame, axis=0, dtype=np.float64) / frame.shape[0])
+        dark, dark_mean = _darks[recipe.dark_path]
+    return _reducer, corrector, dark, dark_mean
+
+def process_frames(path: str, start: int, stop: int, recipe: ProcessingRecipe) -> np.ndarray:
+    """
+    Reprocess raw frames [start, stop) of a frame file (runs in a worker)
+
+    Only the frames of this block are paged in from the memory map.
+
+    Returns:
+        (frames x width) float32 spectra
+    """
+    reducer, corrector, dark, dark_mean = _tools(recipe)
+    frames = open_frames(path)[start:stop]
+    mode = "max" if recipe.readout_mode == "maximum" else "mean"
+    result = np.empty((len(frames), frames.shape[2]), dtype=np.float32)
+    spectrum = np.empty(frames.shape[2], dtype=np.float64)
+    # The column mean of (frame - dark) is the frame's minus the dark's
+    column_first = dark is not None and mode == "mean" and not recipe.clip_dark_pixels
+    for i, frame in enumerate(frames):
+        if column_first:
+            reducer.reduce(frame, mode=mode, out=spectrum)
+            spectrum -= dark_mean
+            np.maximum(spectrum, 0.0, out=spectrum)
+        else:
+            reducer.reduce(frame, dark=dark, mode=mode, clip=True, out=spectrum)
+        result[i] = corrector.correct(spectrum, recipe.baseline_correction, recipe.polynomial_degree)
+    return result
+
+def process_spectra(intensities: np.ndarray, flags: np.ndarray,
+                    recipe: ProcessingRecipe) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reprocess stored spectra (runs in a worker)
+
+    Args:
+        intensities: (spectra x width) stored spectra
+        flags: Stored FLAG_* bits of each spectrum
+
+    Returns:
+        Tuple of the (spectra x width) float32 results and a boolean array
+        marking the spectra the dark was subtracted from
+    """
+    _, corrector, _, dark_mean = _tools(recipe)
+    result = np.empty(intensities.shape, dtype=np.float32)
+    dark_applied = np.zeros(len(intensities), dtype=bool)
+    if dark_mean is not None and dark_mean.shape[0] != intensities.shape[1]:
+        raise ValueError(f"Dark frame width {dark_mean.shape[0]} does not match spectrum width "
+                         f"{intensities.shape[1]}")
+    for i, row in enumerate(intensities):
+        spectrum = row.astype(np.float64)
+        if dark_mean is not None and not flags[i] & (FLAG_MAXIMUM | FLAG_DARK_SUBTRACTED):
+            spectrum -= dark_mean
+            np.maximum(spectrum, 0.0, out=spectrum)
+            dark_applied[i] = True
+        result[i] = corrector.correct(spectrum, recipe.baseline_correction, recipe.polynomial_degree)
+    return result, dark_applied
+
+class ReprocessingJob:
+    """
+    Applies a recipe to stored raw frames (.raw, .npy) and spectra (.spx) in parallel
+
+    Sources are cut into blocks that a process pool works on; raw frames are
+    memory-mapped in the workers, so only the block being processed is read
+    and nothing large is sent between processes. Results are appended to the
+    output store in source order by the job's own thread, which keeps a
+    bounded number of blocks in flight. No camera is needed.
+    """
+
+    def __init__(self, sources: Sequence[str], output_path: str, recipe: ProcessingRecipe,
+                 workers: Optional[int] = None, block_size: int = 64,
+                 executor: Optional[Executor] = None, on_finish=None):
+        """
+        Define a job
+
+        Args:
+            sources: Raw frame (.raw, .npy) and spectrum store (.spx) files
+            output_path: Spectrum store to append the results to
+            recipe: Processing to apply
+            workers: Worker processes (default: CPU count)
+            block_size: Frames or spectra per task
+            executor: Executor to use instead of a new process pool
+            on_finish: Called with the job once it has ended
+
+        Raises:
+            ValueError: If a source has an unsupported type or the output is a source
+        """
+        if not sources:
+            raise ValueError("No sources to reprocess")
+        for source in sources:
+            if not source.endswith(RAW_SUFFIXES + SPECTRA_SUFFIXES):
+                raise ValueError(f"Cannot reprocess {os.path.basename(source)}: "
+                                 f"must be a raw frame (.raw, .npy) or spectrum store (.spx) file")
+        if os.path.abspath(output_path) in {os.path.abspath(s) for s in sources}:
+            raise ValueError("The output store cannot be one of the sources")
+        if block_size < 1:
+            raise ValueError("Block size must be at least 1")
+
+        self.sources = list(sources)
+        self.output_path = output_path
+        self.recipe = recipe
+        self.workers = workers or os.cpu_count() or 1
+        self.block_size = int(block_size)
+        self.executor = executor
+        self.on_finish = on_finish
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.state = "idle"
+        self._started = 0.0
+        self._elapsed = 0.0
+
+        # Progress
+        self.total = 0
+        self.processed = 0
+        self.failed = 0
+        self.dark_skipped = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        """True while the job thread is active"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """
+        Count the work and start the job thread
+
+        Raises:
+            ValueError: If a source cannot be read or does not match the dark frame
+        """
+        if self.running:
+            return
+        total = 0
+        dark_shape = open_frames(self.recipe.dark_path).shape[1:] if self.recipe.dark_path else None
+        for source in self.sources:
+            if source.endswith(RAW_SUFFIXES):
+                frames = open_frames(source)
+                if dark_shape is not None and frames.shape[1:] != dark_shape:
+                    raise ValueError(f"Dark frame shape {dark_shape} does not match the frames "
+                                     f"of {os.path.basename(source)} {frames.shape[1:]}")
+                total += len(frames)
+            else:
+                total += count_spectra(source)
+        self.total = total
+        self._stop.clear()
+        self.state = "running"
+        self._thread = threading.Thread(target=self._run, name="reprocessing", daemon=True)
+        self._thread.start()
+        logger.info(f"Reprocessing {total} items from {len(self.sources)} files into {self.output_path}")
+
+    def stop(self, timeout: Optional[float] = 30.0) -> None:
+        """Stop after the blocks in progress"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the job to finish
+
+        Returns:
+            True if the job has finished
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running
+
+    def _tasks(self, executor: Executor, source: str):
+        """Yield (future, context) per block of a source, submitting lazily"""
+        recipe = self.recipe
+        if source.endswith(RAW_SUFFIXES):
+            # Archives carry per-frame metadata; .npy stacks only have the file time
+            meta = read_archive(source)["meta"] if source.endswith(".raw") else None
+            count = len(open_frames(source))
+            timestamp = os.path.getmtime(source)
+            for start in range(0, count, self.block_size):
+                stop = min(count, start + self.block_size)
+                yield executor.submit(process_frames, source, start, stop, recipe), \
+                    ("raw", stop - start, timestamp if meta is None else meta[start:stop])
+            return
+
+        data = read_store(source)
+        flags = data["meta"]["flags"]
+        for start in range(0, len(flags), self.block_size):
+            stop = min(len(flags), start + self.block_size)
+            yield executor.submit(process_spectra, data["intensities"][start:stop], flags[start:stop], recipe), \
+                ("spectra", stop - start, (data, start))
+
+    def _store_block(self, store: SpectrumStore, result: Any, context: Tuple) -> None:
+        """Append the results of one block to the output store"""
+        recipe = self.recipe
+        kind, rows, extra = context
+        baseline_flag = FLAG_BASELINE_CORRECTED if recipe.baseline_correction != "none" else 0
+        new_hash = None if recipe.wavelength_coefficients is None else \
+            calibration_hash(recipe.wavelength_coefficients)
+
+        if kind == "raw":
+            flags = (FLAG_MAXIMUM if recipe.readout_mode == "maximum" else 0) | \
+                (FLAG_DARK_SUBTRACTED if recipe.dark_path else 0) | baseline_flag
+            axis = recipe.axis(result.shape[1])
+            if axis is None:
+                # Without a calibration the axis is the pixel number
+                axis = np.arange(result.shape[1], dtype=np.float64)
+                new_hash = calibration_hash([0.0, 1.0])
+            for i, row in enumerate(result):
+                if isinstance(extra, np.ndarray):
+                    store.append(axis, row, timestamp=float(extra[i]["timestamp"]),
+                                 exposure_us=int(extra[i]["exposure_us"]), gain=int(extra[i]["gain"]),
+                                 flags=flags, calibration_hash=new_hash)
+                else:
+                    store.append(axis, row, timestamp=extra, flags=flags, calibration_hash=new_hash)
+            return
+
+        intensities, dark_applied = result
+        data, start = extra
+        axis = recipe.axis(intensities.shape[1])
+        if recipe.dark_path:
+            self.dark_skipped += int(np.count_nonzero(~dark_applied))
+        for i, row in enumerate(intensities):
+            meta = data["meta"][start + i]
+            flags = int(meta["flags"]) | baseline_flag | (FLAG_DARK_SUBTRACTED if dark_applied[i] else 0)
+            store.append(axis if axis is not None else data["axes"][data["axis_index"][start + i]], row,
+                         timestamp=float(meta["timestamp"]), exposure_us=int(meta["exposure_us"]),
+                         gain=int(meta["gain"]), frames=int(meta["frames"]), flags=flags,
+                         calibration_hash=new_hash if new_hash is not None else int(meta["calibration_hash"]))
+
+    def _run(self) -> None:
+        """Job loop"""
+        self._started = time.monotonic()
+        executor = self.executor
+        if executor is None:
+            # Spawned workers do not inherit the server's threads or camera handle
+            executor = ProcessPoolExecutor(max_workers=self.workers,
+                                           mp_context=multiprocessing.get_context("spawn"))
+        store = SpectrumStore(self.output_path, chunk_rows=self.block_size)
+        inflight = deque()
+        try:
+            tasks = (task for source in self.sources for task in self._tasks(executor, source))
+            exhausted = False
+            while not self._stop.is_set():
+                while not exhausted and len(inflight) < 2 * self.workers:
+                    try:
+                        inflight.append(next(tasks))
+                    except StopIteration:
+                        exhausted = True
+                if not inflight:
+                    break
+                future, context = inflight.popleft()
+                try:
+                    self._store_block(store, future.result(), context)
+                    store.flush()
+                    self.processed += context[1]
+                except Exception as e:
+                    self.failed += context[1]
+                    self.last_error = str(e)
+                    logger.error(f"Reprocessing block failed: {e}")
+            if self._stop.is_set():
+                self.state = "stopped"
+            else:
+                self.state = "failed" if self.failed and not self.processed else "completed"
+        except Exception as e:
+            self.state = "failed"
+            self.last_error = str(e)
+            logger.error(f"Reprocessing failed: {e}")
+        finally:
+            for future, _ in inflight:
+                future.cancel()
+            store.flush()
+            if self.executor is None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            self._elapsed = time.monotonic() - self._started
+            logger.info(f"Reprocessing {self.state}: {self.processed} of {self.total} items "
+                        f"in {self._elapsed:.1f} s")
+            if self.on_finish is not None:
+                try:
+                    self.on_finish(self)
+                except Exception as e:
+                    logger.error(f"Reprocessing finish callback failed: {e}")
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Get the progress and throughput of the job
+
+        Returns:
+            Dictionary with state, item counts, rate and estimated time left
+        """
+        elapsed = time.monotonic() - self._started if self.running else self._elapsed
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.processed - self.failed
+        return {
+            "state": self.state,
+            "running": self.running,
+            "sources": [os.path.basename(s) for s in self.sources],
+            "output": os.path.basename(self.output_path),
+            "recipe": self.recipe.to_dict(),
+            "workers": self.workers,
+            "total": self.total,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dark_skipped": self.dark_skipped,
+            "elapsed_s": round(elapsed, 3),
+            "items_per_s": round(rate, 1),
+            "eta_s": round(remaining / rate, 1) if rate > 0 and self.running else None,
+            "last_error": self.last_error
+        }
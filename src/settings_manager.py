@@ -4,19 +4,168 @@ Settings manager for handling default and current settings
 """
 import os
 import json
+import time
+import atexit
 import logging
+import tempfile
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, Optional, Union, Iterator, Callable, Iterable, Set, List, Tuple
+
+from metrics import registry
 
 logger = logging.getLogger(__name__)
 
+SETTINGS_SAVE_REQUESTS = registry.counter("spectrometer_settings_save_requests", "Requests to persist the settings")
+SETTINGS_WRITES = registry.counter("spectrometer_settings_writes", "Settings file writes", ("result",))
+SETTINGS_WRITE_SECONDS = registry.histogram("spectrometer_settings_write_seconds",
+                                            "Time to serialize and atomically write the settings file")
+
 # Default paths
 DEFAULT_SETTINGS_PATH = Path("config/default_settings.json")
 CURRENT_SETTINGS_PATH = Path("config/current_settings.json")
 
+class FrozenDict(dict):
+    """
+    Read-only dict used for settings snapshots
+    
+    It is a real dict, so lookups, iteration, json.dumps and isinstance
+    checks work unchanged; mutating methods raise TypeError. copy() returns
+    a plain (shallow) dict and copy.deepcopy a fully mutable copy.
+    """
+    __slots__ = ()
+    
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Settings snapshots are read-only; use SettingsManager.update_settings")
+    
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    update = pop = popitem = clear = setdefault = _readonly
+    
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+    
+    def __deepcopy__(self, memo):
+        return thaw(self)
+    
+    def __hash__(self):
+        return id(self)
+
+class FrozenList(list):
+    """Read-only list used for settings snapshots (see FrozenDict)"""
+    __slots__ = ()
+    
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Settings snapshots are read-only; use SettingsManager.update_settings")
+    
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = clear = sort = reverse = _readonly
+    
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+    
+    def __deepcopy__(self, memo):
+        return thaw(self)
+    
+    def __hash__(self):
+        return id(self)
+
+def freeze(value: Any) -> Any:
+    """
+    Read-only version of a settings value
+    
+    Already frozen containers are returned as they are, so unchanged
+    parts of the settings are shared between snapshots.
+    """
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return FrozenList(freeze(v) for v in value)
+    return value
+
+def thaw(value: Any) -> Any:
+    """Mutable deep copy of a (frozen) settings value"""
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [thaw(v) for v in value]
+    return value
+
+class SettingsSnapshot:
+    """
+    One immutable version of the settings
+    
+    Attributes:
+        version: Increases by one with every change
+        data: The settings (a FrozenDict)
+        timestamp: Time the version was created
+    """
+    __slots__ = ("version", "data", "timestamp")
+    
+    def __init__(self, version: int, data: FrozenDict):
+        self.version = version
+        self.data = data
+        self.timestamp = time.time()
+    
+    def get(self, path: str, default: Any = None) -> Any:
+        """Get a setting by dot-separated path (see SettingsManager.get_setting)"""
+        value = self.data
+        for key in path.split('.'):
+            if isinstance(value, dict) and key in value:
+                value = value[key]
+            else:
+                return default
+        return value
+
+SettingsObserver = Callable[[SettingsSnapshot, Set[str]], None]
+
+def write_json_atomic(path: Union[str, Path], data: Dict[str, Any]) -> None:
+    """
+    Write a JSON file so readers never see a partial file
+
+    The data goes to a temporary file in the same directory, which is
+    synced and then renamed over the target.
+
+    Args:
+        path: Target file
+        data: JSON-serializable data
+    """
+    _write_text_atomic(path, json.dumps(data, indent=4))
+
+def _write_text_atomic(path: Union[str, Path], text: str) -> None:
+    """Write text to a temporary file next to path, sync it and rename it over path"""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
 class SettingsManager:
     """
     Manager for loading, saving, and merging default and current settings
+    
+    The settings are held as immutable, versioned snapshots: every change
+    builds a new SettingsSnapshot (copying only the changed path) and swaps
+    it in under a lock, so readers get a consistent view in O(1) without
+    locking or copying. Observers registered with subscribe() are told
+    about each new version and which top-level categories changed.
+    
+    By default every change is written to the current settings file straight
+    away. In write-behind mode (enable_write_behind) changes only update the
+    settings in memory and a background thread writes the file at most once
+    per write interval. Changes made inside a batch() block are written
+    together when the outermost block exits, in either mode.
     """
     def __init__(
         self,
@@ -33,8 +182,29 @@ class SettingsManager:
         self.default_path = Path(default_path)
         self.current_path = Path(current_path)
         
-        # Initialize settings dictionary
-        self.settings = {}
+        # _write_lock orders file writes; it is always taken before _lock
+        self._lock = threading.RLock()
+        self._cond = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()
+        
+        # Current settings version and the observers of changes
+        self._snapshot = SettingsSnapshot(0, FrozenDict())
+        self._observers: List[Tuple[SettingsObserver, Optional[Set[str]]]] = []
+        
+        # Persistence state: the newest version to be saved and the last one written
+        self._batch_depth = 0
+        self._save_version = 0
+        self._saved_version = 0
+        self.write_interval_s: Optional[float] = None  # None: write immediately
+        self._writer: Optional[threading.Thread] = None
+        self._flush_at_exit = False
+        # Time of the last write attempt, successful or not
+        self._last_write = 0.0
+        
+        # Statistics
+        self.save_requests = 0
+        self.writes = 0
+        self.last_error: Optional[str] = None
         
         # Load the settings
         self.load_settings()
@@ -101,14 +271,85 @@ class SettingsManager:
                 
         return result
     
-    def get_settings(self) -> Dict[str, Any]:
+    @property
+    def settings(self) -> FrozenDict:
+        """The current settings (read-only; assigning replaces all settings)"""
+        return self._snapshot.data
+    
+    @settings.setter
+    def settings(self, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._publish(freeze(value))
+    
+    @property
+    def version(self) -> int:
+        """Version of the current settings"""
+        return self._snapshot.version
+    
+    def _publish(self, data: FrozenDict) -> SettingsSnapshot:
+        """
+        Make data the current settings and notify observers (with _lock held)
+        
+        Observers run on the updating thread, in version order.
+        """
+        old = self._snapshot
+        snapshot = SettingsSnapshot(old.version + 1, data)
+        self._snapshot = snapshot
+        
+        changed = {k for k in set(old.data) | set(data) if old.data.get(k) is not data.get(k)}
+        for callback, categories in list(self._observers):
+            if categories is not None and not categories & changed:
+                continue
+            try:
+                callback(snapshot, changed)
+            except Exception as e:
+                logger.error(f"Settings observer failed: {e}")
+        return snapshot
+    
+    def subscribe(self, callback: SettingsObserver,
+                  categories: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """
+        Call a function whenever the settings change
+        
+        The callback gets the new snapshot and the set of top-level
+        categories that changed. It runs on the thread that made the change,
+        with the settings lock held, so it should be quick; it may read the
+        settings but should not block on other threads that update them.
+        
+        Args:
+            callback: Function(snapshot, changed_categories)
+            categories: Only call for changes in these categories (default: all)
+            
+        Returns:
+            Function that removes the subscription
+        """
+        entry = (callback, set(categories) if categories is not None else None)
+        with self._lock:
+            self._observers.append(entry)
+        
+        def unsubscribe() -> None:
+            with self._lock:
+                if entry in self._observers:
+                    self._observers.remove(entry)
+        return unsubscribe
+    
+    def get_snapshot(self) -> SettingsSnapshot:
+        """
+        Get the current settings version
+        
+        Returns:
+            Immutable SettingsSnapshot (no copy is made)
+        """
+        return self._snapshot
+    
+    def get_settings(self) -> FrozenDict:
         """
         Get the current merged settings
         
         Returns:
-            Dictionary of settings
+            Read-only dictionary of settings (see thaw() for a mutable copy)
         """
-        return self.settings
+        return self._snapshot.data
     
     def get_setting(self, path: str, default: Any = None) -> Any:
         """
@@ -121,16 +362,7 @@ class SettingsManager:
         Returns:
             Setting value or default if not found
         """
-        keys = path.split('.')
-        value = self.settings
-        
-        for key in keys:
-            if isinstance(value, dict) and key in value:
-                value = value[key]
-            else:
-                return default
-                
-        return value
+        return self._snapshot.get(path, default)
     
     def update_setting(self, path: str, value: Any) -> bool:
         """
@@ -145,15 +377,15 @@ class SettingsManager:
         """
         keys = path.split('.')
         
-        # Navigate to the right level
-        current = self.settings
-        for i, key in enumerate(keys[:-1]):
-            if key not in current:
-                current[key] = {}
-            current = current[key]
-        
-        # Update the value
-        current[keys[-1]] = value
+        with self._lock:
+            # Copy the dictionaries along the path; everything else is shared
+            def assoc(node: Any, depth: int) -> FrozenDict:
+                node = dict(node) if isinstance(node, dict) else {}
+                key = keys[depth]
+                node[key] = freeze(value) if depth == len(keys) - 1 else assoc(node.get(key), depth + 1)
+                return FrozenDict(node)
+            
+            self._publish(assoc(self.settings, 0))
         
         # Save the updated settings
         return self.save_current_settings(self.settings)
@@ -169,12 +401,16 @@ class SettingsManager:
         Returns:
             True if successful, False otherwise
         """
-        if category:
-            if category not in self.settings:
-                self.settings[category] = {}
-            self.settings[category].update(new_settings)
-        else:
-            self.settings.update(new_settings)
+        with self._lock:
+            data = dict(self.settings)
+            if category:
+                section = data.get(category)
+                section = dict(section) if isinstance(section, dict) else {}
+                section.update(new_settings)
+                data[category] = section
+            else:
+                data.update(new_settings)
+            self._publish(freeze(data))
             
         # Save the updated settings
         return self.save_current_settings(self.settings)
@@ -183,20 +419,160 @@ class SettingsManager:
         """
         Save the current settings to the current settings file
         
+        Inside a batch() block, or in write-behind mode, the manager's own
+        settings are only marked for writing and True is returned straight
+        away.
+        
         Args:
             settings: Dictionary of settings to save
             
         Returns:
             True if successful, False otherwise
         """
-        try:
-            with open(self.current_path, 'w') as f:
-                json.dump(settings, f, indent=4)
-            logger.info(f"Saved current settings to {self.current_path}")
+        if settings is not self.settings:
+            # Some other dictionary: write it as is
+            with self._write_lock:
+                try:
+                    write_json_atomic(self.current_path, settings)
+                    self.writes += 1
+                    return True
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.error(f"Error saving current settings: {e}")
+                    return False
+        
+        with self._lock:
+            self.save_requests += 1
+            SETTINGS_SAVE_REQUESTS.inc()
+            self._save_version = self._snapshot.version
+            if self._batch_depth > 0:
+                return True
+            if self.write_interval_s is not None:
+                self._cond.notify_all()
+                return True
+        return self._write_current()
+    
+    def _write_current(self) -> bool:
+        """Write the settings file now if there are unsaved changes"""
+        with self._write_lock:
+            # Snapshots are immutable, so serializing needs no lock
+            snapshot = self._snapshot
+            if self._saved_version >= self._save_version:
+                return True
+            started = time.perf_counter()
+            try:
+                _write_text_atomic(self.current_path, json.dumps(snapshot.data, indent=4))
+            except Exception as e:
+                # The write-behind thread waits a full interval before retrying
+                self._last_write = time.monotonic()
+                self.last_error = str(e)
+                SETTINGS_WRITES.labels("error").inc()
+                logger.error(f"Error saving current settings: {e}")
+                return False
+            SETTINGS_WRITE_SECONDS.observe(time.perf_counter() - started)
+            SETTINGS_WRITES.labels("ok").inc()
+            self._saved_version = snapshot.version
+            self._last_write = time.monotonic()
+            self.writes += 1
+            logger.debug(f"Saved current settings to {self.current_path}")
             return True
-        except Exception as e:
-            logger.error(f"Error saving current settings: {e}")
-            return False
+    
+    @contextmanager
+    def batch(self) -> Iterator["SettingsManager"]:
+        """
+        Group several updates into one write
+        
+        Updates inside the block change the settings immediately; the file
+        is written (or, in write-behind mode, scheduled) once when the
+        outermost block exits. Blocks can be nested.
+        """
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                write_now = self._batch_depth == 0 and self.pending
+                if write_now and self.write_interval_s is not None:
+                    self._cond.notify_all()
+                    write_now = False
+            if write_now:
+                self._write_current()
+    
+    def enable_write_behind(self, interval_s: float = 0.5) -> None:
+        """
+        Write settings in the background, at most once per interval
+        
+        Pending changes are also written at interpreter exit and by flush().
+        
+        Args:
+            interval_s: Minimum time between writes of the settings file
+        """
+        with self._lock:
+            self.write_interval_s = max(0.0, float(interval_s))
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_behind_loop,
+                                                name="settings-writer", daemon=True)
+                self._writer.start()
+            if not self._flush_at_exit:
+                atexit.register(self.flush)
+                self._flush_at_exit = True
+            self._cond.notify_all()
+    
+    def disable_write_behind(self) -> None:
+        """Write pending changes and go back to writing every change immediately"""
+        with self._lock:
+            self.write_interval_s = None
+            self._cond.notify_all()
+        self._write_current()
+    
+    def _write_behind_loop(self) -> None:
+        """Background writer: waits for changes and writes them no more often than the interval"""
+        while True:
+            with self._lock:
+                if self.write_interval_s is None:
+                    self._writer = None
+                    return
+                if not self.pending or self._batch_depth > 0:
+                    self._cond.wait()
+                    continue
+                due = self._last_write + self.write_interval_s - time.monotonic()
+                if due > 0:
+                    self._cond.wait(due)
+                    continue
+            self._write_current()
+    
+    @property
+    def pending(self) -> bool:
+        """True if there are changes not yet written to the settings file"""
+        return self._saved_version < self._save_version
+    
+    def flush(self) -> bool:
+        """
+        Write pending changes now
+        
+        Returns:
+            True if successful (or nothing was pending), False otherwise
+        """
+        return self._write_current()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get persistence statistics
+        
+        Returns:
+            Dictionary with the write mode, pending state and counters
+        """
+        return {
+            "write_behind": self.write_interval_s is not None,
+            "write_interval_ms": self.write_interval_s * 1000.0 if self.write_interval_s is not None else None,
+            "version": self.version,
+            "pending": self.pending,
+            "save_requests": self.save_requests,
+            "writes": self.writes,
+            "last_error": self.last_error
+        }
             
     def save_as_default_settings(self) -> bool:
         """
@@ -207,11 +583,11 @@ class SettingsManager:
         """
         try:
             # Get current settings from the settings manager
-            current_settings = self.settings.copy()
+            current_settings = self.settings
             
             # Save them to the default settings file
-            with open(self.default_path, 'w') as f:
-                json.dump(current_settings, f, indent=4)
+            with self._write_lock:
+                write_json_atomic(self.default_path, current_settings)
                 
             logger.info(f"Current settings saved as defaults to {self.default_path}")
             return True
@@ -240,7 +616,7 @@ class SettingsManager:
             return False
         
         # Update settings
-        self.settings = default_settings.copy()
+        self.settings = default_settings
         
         # Save the updated settings
         return self.save_current_settings(self.settings)
@@ -255,6 +631,11 @@ class SettingsManager:
         Returns:
             True if successful, False otherwise
         """
+        with self.batch():
+            return self._load_default_settings(spectrometer)
+    
+    def _load_default_settings(self, spectrometer) -> bool:
+        """Body of load_default_settings, run inside a batch"""
         # First reset to defaults
         if not self.reset_to_defaults():
             return False
@@ -296,7 +677,9 @@ class SettingsManager:
                 spectrometer.set_processing_settings(
                     use_max=processing_settings.get('use_max', False),
                     baseline_correction=processing_settings.get('baseline_correction', 'none'),
-                    polynomial_degree=processing_settings.get('polynomial_degree', 4)
+                    polynomial_degree=processing_settings.get('polynomial_degree', 4),
+                    als_lambda=processing_settings.get('als_lambda'),
+                    als_asymmetry=processing_settings.get('als_asymmetry')
                 )
                 
                 # Apply spectrometer settings
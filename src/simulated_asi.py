@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+"""
+Simulated ZWO ASI SDK: a drop-in for the zwoasi module backed by a sensor model
+
+Selected with the library path "sim://" (e.g. ``main.py --sdk-path sim://``).
+Options are passed as a query string, for example
+``sim://?seed=1&lines=1200:4000,2600:12000:3&cosmic_rate=0.5``:
+
+- seed: random seed for noise, hot pixels and cosmic rays
+- lines: emission lines as column:rate[:fwhm] (rate in e-/s at the band centre)
+- continuum: continuum level in e-/s per pixel at the band centre
+- band_center, band_fwhm: sensor row and width (rows) of the spectrum
+- read_noise: read noise at gain 0 in electrons
+- dark_current: dark current in e-/s per pixel
+- hot_pixels: number of hot pixels on the sensor
+- cosmic_rate: cosmic-ray hits per cm^2 per second
+- usb_bytes_per_s: USB throughput at 100% bandwidth
+"""
+import math
+import time
+import logging
+import threading
+import numpy as np
+from urllib.parse import urlsplit, parse_qs
+from typing import Dict, List, Optional, Any, Tuple
+
+from readout_planner import ReadoutPlanner, USB_BYTES_PER_S
+
+logger = logging.getLogger(__name__)
+
+# Constants with the same values as the zwoasi module
+ASI_GAIN = 0
+ASI_EXPOSURE = 1
+ASI_GAMMA = 2
+ASI_BRIGHTNESS = 5
+ASI_OFFSET = 5
+ASI_BANDWIDTHOVERLOAD = 6
+ASI_TEMPERATURE = 8
+ASI_FLIP = 9
+ASI_HIGH_SPEED_MODE = 14
+
+ASI_IMG_RAW8 = 0
+ASI_IMG_RGB24 = 1
+ASI_IMG_RAW16 = 2
+ASI_IMG_Y8 = 3
+
+ASI_EXP_IDLE = 0
+ASI_EXP_WORKING = 1
+ASI_EXP_SUCCESS = 2
+ASI_EXP_FAILED = 3
+
+# Marks this module as a simulator for callers that skip hardware settle delays
+SIMULATED = True
+
+# ASI183MM sensor
+CAMERA_NAME = "ZWO ASI183MM Pro (simulated)"
+MAX_WIDTH = 5496
+MAX_HEIGHT = 3672
+PIXEL_SIZE_UM = 2.4
+SUPPORTED_BINS = [1, 2, 3, 4]
+ADC_MAX = 4095          # 12-bit ADC
+FULL_WELL_E = 15000.0
+E_PER_ADU_GAIN0 = 3.6   # Conversion gain at gain 0; gain is in 0.1 dB steps
+MIN_READ_NOISE_E = 1.6
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "seed": None,
+    # (column, e-/s at the band centre, FWHM in columns)
+    "lines": [(1100, 3000.0, 3.0), (2150, 9000.0, 2.5), (2260, 6000.0, 2.5),
+              (3900, 2000.0, 4.0), (4800, 1200.0, 3.0)],
+    "continuum": 40.0,
+    "band_center": MAX_HEIGHT / 2.0,
+    "band_fwhm": 40.0,
+    "read_noise": 3.0,
+    "dark_current": 0.05,
+    "hot_pixels": 200,
+    "cosmic_rate": 0.025,
+    "usb_bytes_per_s": USB_BYTES_PER_S
+}
+
+# (name, control type, min, max, default, writable)
+CONTROLS: List[Tuple[str, int, int, int, int, bool]] = [
+    ("Gain", ASI_GAIN, 0, 300, 0, True),
+    ("Exposure", ASI_EXPOSURE, 32, 2000000000, 10000, True),
+    ("Gamma", ASI_GAMMA, 1, 100, 50, True),
+    ("Offset", ASI_OFFSET, 0, 80, 10, True),
+    ("BandWidth", ASI_BANDWIDTHOVERLOAD, 40, 100, 50, True),
+    ("Temperature", ASI_TEMPERATURE, -500, 1000, 250, False),
+    ("Flip", ASI_FLIP, 0, 3, 0, True),
+    ("HighSpeedMode", ASI_HIGH_SPEED_MODE, 0, 1, 0, True)
+]
+
+class ZWO_Error(Exception):
+    """Base exception, as in zwoasi"""
+    pass
+
+class ZWO_IOError(ZWO_Error):
+    """SDK call failure, as in zwoasi"""
+
+    def __init__(self, message, error_code=None):
+        ZWO_Error.__init__(self, message)
+        self.error_code = error_code
+
+_config: Dict[str, Any] = dict(DEFAULT_CONFIG)
+
+def parse_options(library_file: Optional[str]) -> Dict[str, Any]:
+    """
+    Parse simulator options from a "sim://?key=value" library path
+
+    Args:
+        library_file: Library path passed to init()
+
+    Returns:
+        Complete configuration dictionary (defaults for missing options)
+    """
+    config = dict(DEFAULT_CONFIG)
+    if not library_file:
+        return config
+    query = parse_qs(urlsplit(library_file).query)
+    for key, values in query.items():
+        if key not in config:
+            raise ValueError(f"Unknown simulator option: {key}")
+        value = values[-1]
+        if key == "lines":
+            lines = []
+            for item in filter(None, value.split(",")):
+                parts = [float(p) for p in item.split(":")]
+                column, rate = parts[0], parts[1]
+                fwhm = parts[2] if len(parts) > 2 else 3.0
+                lines.append((column, rate, fwhm))
+            config[key] = lines
+        elif key in ("seed", "hot_pixels"):
+            config[key] = int(value)
+        else:
+            config[key] = float(value)
+    return config
+
+def init(library_file: Optional[str] = None) -> None:
+    """Configure the simulator (the real SDK loads its library here)"""
+    global _config
+    _config = parse_options(library_file)
+    logger.info(f"Simulated ASI SDK initialized with {len(_config['lines'])} emission lines")
+
+def get_num_cameras() -> int:
+    return 1
+
+def list_cameras() -> List[str]:
+    return [CAMERA_NAME]
+
+class SensorModel:
+    """
+    Photon and noise model of the ASI183MM behind the simulated camera
+
+    Frames are rendered only for the ROI, directly at the binned resolution:
+    the expected signal is a spectral band (Gaussian rows) carrying a
+    continuum plus Gaussian emission lines, with dark current and fixed hot
+    pixels on top. Shot and read noise are drawn as one Gaussian per pixel
+    (the normal approximation of Poisson noise), then cosmic-ray hits are
+    deposited and the result is clipped at full well and digitized by a
+    12-bit ADC. Binned pixels are the average of their sensor pixels.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Initialize the model
+
+        Args:
+            config: Simulator configuration (see DEFAULT_CONFIG)
+        """
+        self.config = config
+        self.rng = np.random.default_rng(config["seed"])
+        self.cosmic_rays = 0
+
+        hot_rng = np.random.default_rng(None if config["seed"] is None else config["seed"] + 1)
+        count = int(config["hot_pixels"])
+        self.hot_x = hot_rng.integers(0, MAX_WIDTH, count)
+        self.hot_y = hot_rng.integers(0, MAX_HEIGHT, count)
+        self.hot_rate = hot_rng.lognormal(mean=np.log(200.0), sigma=1.0, size=count)
+
+    def column_profile(self, start: int, size: int) -> np.ndarray:
+        """Signal in e-/s at the band centre for sensor columns start..start+size"""
+        columns = np.arange(start, start + size, dtype=np.float64)
+        profile = np.full(size, self.config["continuum"], dtype=np.float64)
+        for center, rate, fwhm in self.config["lines"]:
+            sigma = fwhm / 2.3548
+            near = np.abs(columns - center) < 8 * sigma
+            if near.any():
+                profile[near] += rate * np.exp(-0.5 * ((columns[near] - center) / sigma) ** 2)
+        return profile
+
+    def row_profile(self, start: int, size: int) -> np.ndarray:
+        """Relative band intensity (1 at the centre) for sensor rows start..start+size"""
+        rows = np.arange(start, start + size, dtype=np.float64)
+        sigma = self.config["band_fwhm"] / 2.3548
+        return np.exp(-0.5 * ((rows - self.config["band_center"]) / sigma) ** 2)
+
+    @staticmethod
+    def _bin(profile: np.ndarray, binning: int) -> np.ndarray:
+        return profile.reshape(-1, binning).mean(axis=1)
+
+    def render(self, start_x: int, start_y: int, width: int, height: int, binning: int,
+               exposure_us: int, gain: int, offset: int) -> np.ndarray:
+        """
+        Render one frame as 12-bit ADU values
+
+        Args:
+            start_x, start_y, width, height: ROI in binned pixels
+            binning: Binning factor
+            exposure_us: Exposure time in microseconds
+            gain: Gain control value (0.1 dB steps)
+            offset: Offset control value (ADU)
+
+        Returns:
+            float32 array (height, width) of ADU values in 0..ADC_MAX
+        """
+        b = binning
+        x0, y0 = start_x * b, start_y * b
+        t = exposure_us / 1e6
+
+        columns = self._bin(self.column_profile(x0, width * b), b).astype(np.float32)
+        rows = self._bin(self.row_profile(y0, height * b), b).astype(np.float32)
+        electrons = np.multiply.outer(rows * np.float32(t), columns)
+        electrons += np.float32(self.config["dark_current"] * t)
+
+        inside = ((self.hot_x >= x0) & (self.hot_x < x0 + width * b) &
+                  (self.hot_y >= y0) & (self.hot_y < y0 + height * b))
+        if inside.any():
+            np.add.at(electrons, ((self.hot_y[inside] - y0) // b, (self.hot_x[inside] - x0) // b),
+                      (self.hot_rate[inside] * t / (b * b)).astype(np.float32))
+
+        read_noise = max(MIN_READ_NOISE_E, self.config["read_noise"] - gain * 0.0052)
+        # Variance of an average of b*b pixels is (signal + read_noise^2) / b^2
+        noise = self.rng.standard_normal(electrons.shape, dtype=np.float32)
+        noise *= np.sqrt(electrons + np.float32(read_noise ** 2)) / np.float32(b)
+        electrons += noise
+
+        self._add_cosmic_rays(electrons, width * b * height * b, t, b)
+
+        np.clip(electrons, 0.0, FULL_WELL_E, out=electrons)
+        electrons *= np.float32(10 ** (gain / 200.0) / E_PER_ADU_GAIN0)
+        electrons += np.float32(offset)
+        np.clip(electrons, 0, ADC_MAX, out=electrons)
+        return electrons
+
+    def _add_cosmic_rays(self, electrons: np.ndarray, sensor_pixels: int,
+                         exposure_s: float, binning: int) -> None:
+        """Deposit short charge tracks at random positions"""
+        area_cm2 = sensor_pixels * (PIXEL_SIZE_UM * 1e-4) ** 2
+        hits = self.rng.poisson(self.config["cosmic_rate"] * area_cm2 * exposure_s)
+        height, width = electrons.shape
+        for _ in range(hits):
+            charge = self.rng.exponential(3000.0) + 500.0
+            length = int(self.rng.integers(1, 4))
+            angle = self.rng.uniform(0, math.pi)
+            y = self.rng.uniform(0, height)
+            x = self.rng.uniform(0, width)
+            for step in range(length):
+                py = int(y + step * math.sin(angle))
+                px = int(x + step * math.cos(angle))
+                if 0 <= py < height and 0 <= px < width:
+                    electrons[py, px] += charge / length / (binning * binning)
+        self.cosmic_rays += hits
+
+class Camera:
+    """
+    Simulated zwoasi.Camera
+
+    Implements the snapshot and video-mode calls the camera interface uses.
+    Timing follows the readout model of the ReadoutPlanner: a snapshot is
+    ready after exposure + sensor readout + USB transfer; in video mode
+    frames arrive every max(exposure, readout, transfer) and frames the
+    application does not collect in time are dropped.
+    """
+
+    def __init__(self, id_):
+        """
+        Open the simulated camera
+
+        Args:
+            id_: Camera index or model name
+        """
+        if isinstance(id_, str):
+            if id_ not in CAMERA_NAME:
+                raise ValueError(f"Could not find camera model {id_}")
+            id_ = 0
+        if id_ != 0:
+            raise IndexError('Invalid id')
+        self.id = id_
+        self.default_timeout = -1
+        self.closed = False
+        self.sensor = SensorModel(_config)
+        self.controls = {control: default for _, control, _, _, default, _ in CONTROLS}
+        self.roi_format = [MAX_WIDTH, MAX_HEIGHT, 1, ASI_IMG_RAW8]
+        self.start_position = [0, 0]
+        self.dark_subtract = True
+
+        self._lock = threading.Lock()
+        self._exposure_ready_at: Optional[float] = None
+        self._exposure_frame: Optional[np.ndarray] = None
+        self._video_running = False
+        self._video_stop = threading.Event()
+        self._video_next_at = 0.0
+        self._dropped_frames = 0
+
+    # Properties and controls
+
+    def get_camera_property(self) -> Dict[str, Any]:
+        return {
+            'Name': CAMERA_NAME, 'CameraID': self.id,
+            'MaxHeight': MAX_HEIGHT, 'MaxWidth': MAX_WIDTH,
+            'IsColorCam': False, 'BayerPattern': 0,
+            'SupportedBins': list(SUPPORTED_BINS),
+            'SupportedVideoFormat': [ASI_IMG_RAW8, ASI_IMG_RAW16, ASI_IMG_Y8],
+            'PixelSize': PIXEL_SIZE_UM, 'MechanicalShutter': False,
+            'ST4Port': False, 'IsCoolerCam': False, 'IsUSB3Host': True,
+            'IsUSB3Camera': True, 'ElecPerADU': E_PER_ADU_GAIN0, 'BitDepth': 12,
+            'IsTriggerCam': False
+        }
+
+    def get_controls(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                'Name': name, 'Description': name, 'MaxValue': maximum,
+                'MinValue': minimum, 'DefaultValue': default,
+                'IsAutoSupported': False, 'IsWritable': writable, 'ControlType': control
+            }
+            for name, control, minimum, maximum, default, writable in CONTROLS
+        }
+
+    def get_control_value(self, control_type: int) -> List[Any]:
+        if control_type not in self.controls:
+            raise ZWO_IOError('Invalid control type', 6)
+        return [self.controls[control_type], False]
+
+    def get_control_values(self) -> Dict[str, Any]:
+        return {name: self.controls[control] for name, control, *_ in CONTROLS}
+
+    def set_control_value(self, control_type: int, value: int, auto: bool = False) -> None:
+        for _, control, minimum, maximum, _, writable in CONTROLS:
+            if control == control_type:
+                if writable:
+                    # The SDK clamps out-of-range values
+                    self.controls[control] = int(min(max(value, minimum), maximum))
+                return
+        raise ZWO_IOError('Invalid control type', 6)
+
+    def disable_dark_subtract(self) -> None:
+        self.dark_subtract = False
+
+    # Geometry
+
+    def get_image_type(self) -> int:
+        return self.roi_format[3]
+
+    def set_image_type(self, image_type: int) -> None:
+        self.set_roi_format(*self.roi_format[:3], image_type)
+
+    def get_roi_format(self) -> List[int]:
+        return list(self.roi_format)
+
+    def set_roi_format(self, width: int, height: int, bins: int, image_type: int) -> None:
+        if self._video_running:
+            raise ZWO_IOError('Video mode active', 15)
+        if bins not in SUPPORTED_BINS:
+            raise ValueError('Illegal value for bins')
+        if image_type not in (ASI_IMG_RAW8, ASI_IMG_RAW16, ASI_IMG_Y8):
+            raise ValueError('Unsupported image type')
+        if width < 8:
+            raise ValueError('ROI width too small')
+        elif width > MAX_WIDTH // bins:
+            raise ValueError('ROI width larger than binned sensor width')
+        elif width % 8 != 0:
+            raise ValueError('ROI width must be multiple of 8')
+        if height < 2:
+            raise ValueError('ROI height too small')
+        elif height > MAX_HEIGHT // bins:
+            raise ValueError('ROI width larger than binned sensor height')
+        elif height % 2 != 0:
+            raise ValueError('ROI height must be multiple of 2')
+        self.roi_format = [int(width), int(height), int(bins), int(image_type)]
+        # Like the SDK, keep the start position inside the new format
+        self.start_position = [min(self.start_position[0], MAX_WIDTH // bins - width),
+                               min(self.start_position[1], MAX_HEIGHT // bins - height)]
+
+    def get_roi_start_position(self) -> List[int]:
+        return list(self.start_position)
+
+    def set_roi_start_position(self, start_x: int, start_y: int) -> None:
+        width, height, bins, _ = self.roi_format
+        if start_x < 0 or start_x + width > MAX_WIDTH // bins:
+            raise ValueError('ROI and start position larger than binned sensor width')
+        if start_y < 0 or start_y + height > MAX_HEIGHT // bins:
+            raise ValueError('ROI and start position larger than binned sensor height')
+        self.start_position = [int(start_x), int(start_y)]
+
+    def get_roi(self) -> List[int]:
+        return self.get_roi_start_position() + self.get_roi_format()[:2]
+
+    def set_roi(self, start_x=None, start_y=None, width=None, height=None, bins=None, image_type=None) -> None:
+        """Set the ROI with zwoasi semantics (binned coordinates, centred by default)"""
+        bins = self.roi_format[2] if bins is None else bins
+        if bins not in SUPPORTED_BINS:
+            raise ValueError('Illegal value for bins')
+        image_type = self.roi_format[3] if image_type is None else image_type
+        if width is None:
+            width = MAX_WIDTH // bins
+            width -= width % 8
+        if height is None:
+            height = MAX_HEIGHT // bins
+            height -= height % 2
+        if start_x is None:
+            start_x = (MAX_WIDTH // bins - width) // 2
+        if start_y is None:
+            start_y = (MAX_HEIGHT // bins - height) // 2
+        self.set_roi_format(width, height, bins, image_type)
+        self.set_roi_start_position(start_x, start_y)
+
+    # Timing and frame synthesis
+
+    def timing(self) -> Dict[str, Any]:
+        """
+        Readout timing for the current configuration
+
+        Returns:
+            ReadoutPlanner estimate (readout_ms, transfer_ms, frame_time_ms, ...)
+        """
+        width, height, bins, image_type = self.roi_format
+        planner = ReadoutPlanner(MAX_WIDTH, MAX_HEIGHT, SUPPORTED_BINS,
+                                 bandwidth_percent=self.controls[ASI_BANDWIDTHOVERLOAD],
+                                 usb_bytes_per_s=_config["usb_bytes_per_s"])
+        pixel_type = ASI_IMG_RAW8 if image_type in (ASI_IMG_RAW8, ASI_IMG_Y8) else ASI_IMG_RAW16
+        return planner.estimate(width, height, bins, pixel_type, self.controls[ASI_EXPOSURE] / 1000.0)
+
+    def _render(self) -> np.ndarray:
+        """Render a frame in the current image type"""
+        width, height, bins, image_type = self.roi_format
+        start_x, start_y = self.start_position
+        adu = self.sensor.render(start_x, start_y, width, height, bins,
+                                 self.controls[ASI_EXPOSURE], self.controls[ASI_GAIN],
+                                 self.controls[ASI_OFFSET])
+        flip = self.controls[ASI_FLIP]
+        if flip & 1:
+            adu = adu[:, ::-1]
+        if flip & 2:
+            adu = adu[::-1, :]
+        if image_type in (ASI_IMG_RAW8, ASI_IMG_Y8):
+            return (adu.astype(np.uint16) >> 4).astype(np.uint8)
+        # 12-bit data is left-aligned in RAW16
+        return adu.astype(np.uint16) << 4
+
+    @staticmethod
+    def _copy_out(frame: np.ndarray, buffer_: Optional[bytearray]) -> bytearray:
+        if buffer_ is None:
+            buffer_ = bytearray(frame.nbytes)
+        elif len(buffer_) != frame.nbytes:
+            raise ValueError('Supplied buffer has incorrect size')
+        np.frombuffer(buffer_, dtype=frame.dtype)[:] = frame.ravel()
+        return buffer_
+
+    # Snapshot mode
+
+    def start_exposure(self, is_dark: bool = False) -> None:
+        if self._video_running:
+            raise ZWO_IOError('Video mode active', 15)
+        timing = self.timing()
+        exposure_s = self.controls[ASI_EXPOSURE] / 1e6
+        with self._lock:
+            self._exposure_ready_at = (time.monotonic() + exposure_s +
+                                       (timing["readout_ms"] + timing["transfer_ms"]) / 1000.0)
+            self._exposure_frame = None
+
+    def stop_exposure(self) -> None:
+        with self._lock:
+            self._exposure_ready_at = None
+            self._exposure_frame = None
+
+    def get_exposure_status(self) -> int:
+        with self._lock:
+            if self._exposure_ready_at is None:
+                return ASI_EXP_IDLE if self._exposure_frame is None else ASI_EXP_SUCCESS
+            if time.monotonic() < self._exposure_ready_at:
+                return ASI_EXP_WORKING
+            return ASI_EXP_SUCCESS
+
+    def get_data_after_exposure(self, buffer_: Optional[bytearray] = None) -> bytearray:
+        if self.get_exposure_status() != ASI_EXP_SUCCESS:
+            raise ZWO_IOError('Exposure not complete', 18)
+        with self._lock:
+            self._exposure_ready_at = None
+        return self._copy_out(self._render(), buffer_)
+
+    # Video mode
+
+    def start_video_capture(self) -> None:
+        self._video_stop.clear()
+        self._video_running = True
+        self._video_next_at = time.monotonic() + self.timing()["frame_time_ms"] / 1000.0
+        self._dropped_frames = 0
+
+    def stop_video_capture(self) -> None:
+        self._video_running = False
+        self._video_stop.set()
+
+    def get_video_data(self, timeout: Optional[int] = None, buffer_: Optional[bytearray] = None) -> bytearray:
+        """Wait for the next frame of the video stream (timeout in ms, -1 for none)"""
+        if not self._video_running:
+            raise ZWO_IOError('Video mode not active', 13)
+        if timeout is None:
+            timeout = self.default_timeout
+        period = max(self.timing()["frame_time_ms"] / 1000.0, 1e-4)
+
+        now = time.monotonic()
+        if now > self._video_next_at + period:
+            # The camera kept exposing while nobody read; only the latest frame is kept
+            missed = int((now - self._video_next_at) / period)
+            self._dropped_frames += missed
+            self._video_next_at += missed * period
+
+        wait = self._video_next_at - now
+        if timeout is not None and timeout >= 0 and wait > timeout / 1000.0:
+            self._video_stop.wait(timeout / 1000.0)
+            raise ZWO_IOError('Timeout', 11)
+        if wait > 0 and self._video_stop.wait(wait):
+            raise ZWO_IOError('Video mode not active', 13)
+        self._video_next_at += period
+        return self._copy_out(self._render(), buffer_)
+
+    def get_dropped_frames(self) -> int:
+        return self._dropped_frames
+
+    def close(self) -> None:
+        self.stop_video_capture()
+        self.closed = True
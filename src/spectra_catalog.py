@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Persistent SQLite index of saved spectra
+"""
+import os
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Any, List
+
+from spectrum_store import read_store, FLAG_MAXIMUM, FLAG_DARK_SUBTRACTED
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILENAME = "catalog.sqlite"
+
+SORT_COLUMNS = ("timestamp", "filename", "exposure_us", "gain", "size")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spectra (
+    filename TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    format TEXT NOT NULL,
+    timestamp REAL,
+    exposure_us INTEGER,
+    gain INTEGER,
+    frames INTEGER,
+    readout_mode TEXT,
+    dark_subtracted INTEGER,
+    calibration_hash TEXT,
+    points INTEGER,
+    size INTEGER,
+    PRIMARY KEY (filename, idx)
+);
+CREATE INDEX IF NOT EXISTS spectra_timestamp ON spectra (timestamp);
+CREATE INDEX IF NOT EXISTS spectra_exposure ON spectra (exposure_us);
+"""
+
+_COLUMNS = ("filename", "idx", "format", "timestamp", "exposure_us", "gain", "frames",
+            "readout_mode", "dark_subtracted", "calibration_hash", "points", "size")
+
+class SpectraCatalog:
+    """
+    Index of the spectra saved in a directory
+
+    Every spectrum (a row of a .spx store or a single CSV file) has one
+    entry with its acquisition metadata. Entries are added as spectra are
+    saved, so listing is an indexed query whose cost does not depend on the
+    number of files; rebuild() rescans the directory when files were added
+    or removed behind the server's back.
+    """
+
+    def __init__(self, directory: str, db_path: Optional[str] = None):
+        """
+        Open or create the catalog
+
+        Args:
+            directory: Directory holding the spectrum files
+            db_path: Catalog database (default: catalog.sqlite in the directory)
+        """
+        self.directory = Path(directory)
+        self.db_path = str(db_path or self.directory / CATALOG_FILENAME)
+        self.created = not os.path.exists(self.db_path)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+
+    def add(self, filename: str, index: int = 0, format: str = "spx",
+            timestamp: Optional[float] = None, exposure_us: Optional[int] = None,
+            gain: Optional[int] = None, frames: Optional[int] = None,
+            readout_mode: Optional[str] = None, dark_subtracted: Optional[bool] = None,
+            calibration_hash: Optional[int] = None, points: Optional[int] = None,
+            size: Optional[int] = None) -> None:
+        """
+        Add or replace the entry of one spectrum
+
+        Args:
+            filename: File name within the directory
+            index: Spectrum index within the file (0 for CSV files)
+            format: 'spx' or 'csv'
+            timestamp: Acquisition time
+            exposure_us: Exposure time in microseconds
+            gain: Gain value
+            frames: Number of frames averaged
+            readout_mode: 'average' or 'maximum'
+            dark_subtracted: Whether the dark frame was subtracted
+            calibration_hash: Identifier of the calibration (calibration.calibration_hash)
+            points: Number of spectral points
+            size: Data size in bytes
+        """
+        self.add_many([(filename, index, format, timestamp, exposure_us, gain, frames,
+                        readout_mode, dark_subtracted,
+                        None if calibration_hash is None else f"{calibration_hash:016x}",
+                        points, size)])
+
+    def add_many(self, rows: List[tuple]) -> None:
+        """Insert or replace raw entries (tuples in catalog column order)"""
+        placeholders = ", ".join("?" * len(_COLUMNS))
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO spectra ({', '.join(_COLUMNS)}) VALUES ({placeholders})", rows)
+            self._conn.commit()
+
+    def remove(self, filename: str) -> int:
+        """
+        Remove all entries of a file
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM spectra WHERE filename = ?", (filename,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def _scan_file(self, path: Path) -> List[tuple]:
+        """Catalog entries for one spectrum file"""
+        info = path.stat()
+        if path.suffix == ".csv":
+            # CSV files carry no metadata beyond the file itself
+            return [(path.name, 0, "csv", info.st_mtime, None, None, None, None, None, None, None,
+                     info.st_size)]
+
+        data = read_store(str(path))
+        meta = data["meta"]
+        width = data["intensities"].shape[1]
+        return [
+            (path.name, i, "spx", float(row["timestamp"]), int(row["exposure_us"]), int(row["gain"]),
+             int(row["frames"]), "maximum" if row["flags"] & FLAG_MAXIMUM else "average",
+             bool(row["flags"] & FLAG_DARK_SUBTRACTED), f"{int(row['calibration_hash']):016x}",
+             width, width * 4)
+            for i, row in enumerate(meta)
+        ]
+
+    def index_file(self, filename: str) -> int:
+        """
+        Replace the entries of one file with a fresh scan of it
+
+        Args:
+            filename: File name within the directory
+
+        Returns:
+            Number of entries added
+        """
+        rows = self._scan_file(self.directory / filename)
+        placeholders = ", ".join("?" * len(_COLUMNS))
+        with self._lock:
+            self._conn.execute("DELETE FROM spectra WHERE filename = ?", (filename,))
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO spectra ({', '.join(_COLUMNS)}) VALUES ({placeholders})", rows)
+            self._conn.commit()
+        return len(rows)
+
+    def rebuild(self) -> Dict[str, Any]:
+        """
+        Rescan the directory and replace all entries
+
+        Unreadable files are skipped and reported.
+
+        Returns:
+            Dictionary with the number of files and spectra indexed and the
+            files that could not be read
+        """
+        rows: List[tuple] = []
+        files = 0
+        failed = []
+        for path in sorted(self.directory.glob("*.spx")) + sorted(self.directory.glob("*.csv")):
+            try:
+                rows.extend(self._scan_file(path))
+                files += 1
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cannot index {path}: {e}")
+                failed.append(path.name)
+
+        placeholders = ", ".join("?" * len(_COLUMNS))
+        with self._lock:
+            self._conn.execute("DELETE FROM spectra")
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO spectra ({', '.join(_COLUMNS)}) VALUES ({placeholders})", rows)
+            self._conn.commit()
+        logger.info(f"Spectra catalog rebuilt: {len(rows)} spectra in {files} files")
+        return {"files": files, "spectra": len(rows), "failed": failed}
+
+    def query(self, offset: int = 0, limit: int = 100, sort: str = "timestamp",
+              descending: bool = True, start_time: Optional[float] = None,
+              end_time: Optional[float] = None, min_exposure_us: Optional[int] = None,
+              max_exposure_us: Optional[int] = None, prefix: Optional[str] = None,
+              readout_mode: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Page through the catalog
+
+        Args:
+            offset: Number of matching entries to skip
+            limit: Maximum number of entries to return
+            sort: One of SORT_COLUMNS
+            descending: Sort order
+            start_time, end_time: Timestamp range (inclusive)
+            min_exposure_us, max_exposure_us: Exposure range (inclusive)
+            prefix: File name prefix
+            readout_mode: 'average' or 'maximum'
+
+        Returns:
+            Dictionary with 'total' (matching entries) and 'entries'
+
+        Raises:
+            ValueError: If sort is not a catalog column
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort}. Must be one of {', '.join(SORT_COLUMNS)}.")
+
+        conditions = []
+        params: List[Any] = []
+        for clause, value in (("timestamp >= ?", start_time), ("timestamp <= ?", end_time),
+                              ("exposure_us >= ?", min_exposure_us),
+                              ("exposure_us <= ?", max_exposure_us),
+                              ("readout_mode = ?", readout_mode)):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        if prefix:
+            escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append("filename LIKE ? ESCAPE '\\'")
+            params.append(escaped + "%")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "DESC" if descending else "ASC"
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM spectra {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT * FROM spectra {where} ORDER BY {sort} {order}, filename {order}, idx {order} "
+                f"LIMIT ? OFFSET ?", params + [max(0, int(limit)), max(0, int(offset))]).fetchall()
+
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry["index"] = entry.pop("idx")
+            entry["dark_subtracted"] = None if entry["dark_subtracted"] is None else bool(entry["dark_subtracted"])
+            entries.append(entry)
+        return {"total": total, "entries": entries}
+
+    def count(self) -> int:
+        """Number of cataloged spectra"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spectra").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database"""
+        with self._lock:
+            self._conn.close()
@@ -3,18 +3,41 @@
 Spectrometer module for processing camera data into spectra
 """
 import os
+import time
 import logging
 import numpy as np
 from typing import Dict, Tuple, List, Optional, Any, Union
 from scipy import signal
-from scipy import interpolate
 from PIL import Image
 
 from camera import ASI183Camera
+from frame_buffer import PooledFrame
+from reduction import ColumnReducer
+from calibration import CalibrationAxisCache, evaluate_polynomial
+from accumulation import SpectrumAccumulator
+from readout_planner import ReadoutPlanner
+from baseline import BaselineCorrector
+from dark_library import DarkLibrary, DarkStacker, STACK_METHODS
 from settings_manager import settings_manager
+from metrics import registry
 
 logger = logging.getLogger(__name__)
 
+PROCESSING_SECONDS = registry.histogram(
+    "spectrometer_processing_seconds",
+    "Spectrum processing time by stage: reduce (dark subtraction and column reduction, per frame) "
+    "baseline (baseline correction) and process_spectrum (all of it)", ("stage", "mode"))
+_REDUCE_SECONDS = {use_max: PROCESSING_SECONDS.labels("reduce", "maximum" if use_max else "average")
+                   for use_max in (False, True)}
+_BASELINE_SECONDS = {use_max: PROCESSING_SECONDS.labels("baseline", "maximum" if use_max else "average")
+                     for use_max in (False, True)}
+_PROCESS_SECONDS = {use_max: PROCESSING_SECONDS.labels("process_spectrum", "maximum" if use_max else "average")
+                    for use_max in (False, True)}
+DARK_CORRECTIONS = registry.counter(
+    "spectrometer_dark_corrections",
+    "Frames reduced by dark correction path: spectrum (1D dark column mean after the reduction), "
+    "frame (2D dark before the reduction) or none", ("path",))
+
 class Spectrometer:
     """
     Spectrometer class that controls the ASI183MM camera and processes
@@ -37,7 +60,7 @@ class Spectrometer:
         
         # Calibration settings
         calibration_settings = settings.get('calibration', {})
-        self._wavelength_coeffs = calibration_settings.get('wavelength_coefficients', [0.0, 1.0])
+        self._wavelength_coeffs = list(calibration_settings.get('wavelength_coefficients', [0.0, 1.0]))
         self.laser_wavelength = calibration_settings.get('laser_wavelength', 445.0)
         
         # ROI settings
@@ -57,6 +80,29 @@ class Spectrometer:
         
         # Background and dark frames
         self.dark_frame = None
+        # Readout settings the dark frame was taken with (None: use it for any frame of its shape)
+        self.dark_frame_state: Optional[Dict[str, Any]] = None
+        self.dark_frame_info: Optional[Dict[str, Any]] = None
+        
+        # Master darks on disk, matched to the readout settings when there is no current dark frame
+        dark_settings = settings.get('dark_library', {})
+        self.dark_library = DarkLibrary(
+            dark_settings.get('directory', 'darks'),
+            temperature_tolerance_c=dark_settings.get('temperature_tolerance_c', 2.0),
+            max_exposure_ratio=dark_settings.get('max_exposure_ratio', 2.0)
+        )
+        self.use_dark_library = dark_settings.get('enabled', True)
+        self.temperature_refresh_s = dark_settings.get('temperature_refresh_s', 60.0)
+        self.sensor_temperature: Optional[float] = None
+        self._temperature_read_at: Optional[float] = None
+        # (key, dark, description) of the last dark selection
+        self._dark_choice: Tuple[Any, Optional[np.ndarray], Dict[str, Any]] = (None, None, {"source": None})
+        # Whether the last reduced frame was dark-corrected
+        self.last_dark_subtracted = False
+        # (dark, column mean) of the last dark subtracted after the reduction
+        self._dark_spectrum: Tuple[Optional[np.ndarray], Optional[np.ndarray]] = (None, None)
+        self.last_dark_path = 'none'
+        self.dark_paths = {'spectrum': 0, 'frame': 0, 'none': 0}
         
         # Processing settings
         processing_settings = settings.get('processing', {})
@@ -69,8 +115,28 @@ class Spectrometer:
         if 'readout_mode' in processing_settings:
             self.use_max = (processing_settings.get('readout_mode') == 'maximum')
             
+        # Clip dark-corrected pixels at 0 before reducing (needs the 2D dark in average mode too)
+        self.clip_dark_pixels = processing_settings.get('clip_dark_pixels', False)
+            
         self.baseline_correction = processing_settings.get('baseline_correction', 'none')
         self.polynomial_degree = processing_settings.get('polynomial_degree', 4)
+        try:
+            BaselineCorrector.validate(self.baseline_correction, self.polynomial_degree)
+        except ValueError as e:
+            logger.warning(f"Ignoring stored baseline settings: {e}")
+            self.baseline_correction = 'none'
+        
+        # Server-side baseline correction of every processed spectrum
+        self.baseline_corrector = BaselineCorrector(
+            als_lambda=processing_settings.get('als_lambda', 1e5),
+            als_asymmetry=processing_settings.get('als_asymmetry', 0.01)
+        )
+        
+        # Single-pass dark subtraction and column reduction
+        self.reducer = ColumnReducer()
+        
+        # Spectral axes for the current calibration and ROI
+        self.axis_cache = CalibrationAxisCache()
     
     def connect(self) -> bool:
         """
@@ -99,15 +165,12 @@ class Spectrometer:
                 self.roi_settings["start_y"] = start_y
                 self.roi_settings["height"] = spectrum_height
             
-            # Apply ROI settings
-            self.set_roi(**self.roi_settings)
-            
-            # Apply exposure and gain settings
-            self.set_exposure(self.exposure_ms)
-            self.set_gain(self.gain)
-            
-            # Save updated settings
-            self._save_settings()
+            # Apply ROI, exposure and gain and save them with a single settings write
+            with settings_manager.batch():
+                self.set_roi(**self.roi_settings)
+                self.set_exposure(self.exposure_ms)
+                self.set_gain(self.gain)
+                self._save_settings()
             
             return True
         return False
@@ -116,48 +179,53 @@ class Spectrometer:
         """
         Save current settings to the settings manager
         """
-        # Update ROI settings
-        settings_manager.update_settings({
-            'roi': {
-                'start_x': self.roi_settings['start_x'],
-                'start_y': self.roi_settings['start_y'],
-                'width': self.roi_settings['width'],
-                'height': self.roi_settings['height'],
-                'binning': self.roi_settings['binning']
-            },
-            'exposure_ms': self.exposure_ms,
-            'gain': self.gain
-        }, 'camera')
-        
-        # Update calibration settings
-        settings_manager.update_settings({
-            'wavelength_coefficients': self._wavelength_coeffs,
-            'laser_wavelength': self.laser_wavelength
-        }, 'calibration')
-        
-        # Update processing settings
-        settings_manager.update_settings({
-            'readout_mode': 'maximum' if self.use_max else 'average',
-            'baseline_correction': self.baseline_correction,
-            'polynomial_degree': self.polynomial_degree
-        }, 'processing')
-        
-        # Update spectrometer settings
-        settings_manager.update_settings({
-            'subtract_dark': self.subtract_dark,
-            'subtract_background': False  # Keeping for compatibility
-        }, 'spectrometer')
-        
-        # We don't have direct access to the display mode here, but we can ensure
-        # the pixels_range is properly set based on the current ROI
-        if self.roi_settings['width'] is not None:
+        # One write for all categories
+        with settings_manager.batch():
+            # Update ROI settings
+            settings_manager.update_settings({
+                'roi': {
+                    'start_x': self.roi_settings['start_x'],
+                    'start_y': self.roi_settings['start_y'],
+                    'width': self.roi_settings['width'],
+                    'height': self.roi_settings['height'],
+                    'binning': self.roi_settings['binning']
+                },
+                'exposure_ms': self.exposure_ms,
+                'gain': self.gain
+            }, 'camera')
+        
+            # Update calibration settings
+            settings_manager.update_settings({
+                'wavelength_coefficients': self._wavelength_coeffs,
+                'laser_wavelength': self.laser_wavelength
+            }, 'calibration')
+        
+            # Update processing settings
+            settings_manager.update_settings({
+                'readout_mode': 'maximum' if self.use_max else 'average',
+                'baseline_correction': self.baseline_correction,
+                'polynomial_degree': self.polynomial_degree,
+                'als_lambda': self.baseline_corrector.als_lambda,
+                'als_asymmetry': self.baseline_corrector.als_asymmetry,
+                'clip_dark_pixels': self.clip_dark_pixels
+            }, 'processing')
+        
+            # Update spectrometer settings
             settings_manager.update_settings({
-                'pixels_range': [0, self.roi_settings['width'] - 1]
-            }, 'display')
+                'subtract_dark': self.subtract_dark,
+                'subtract_background': False  # Keeping for compatibility
+            }, 'spectrometer')
+        
+            # We don't have direct access to the display mode here, but we can ensure
+            # the pixels_range is properly set based on the current ROI
+            if self.roi_settings['width'] is not None:
+                settings_manager.update_settings({
+                    'pixels_range': [0, self.roi_settings['width'] - 1]
+                }, 'display')
     
     def set_roi(self, start_x: int = 0, start_y: int = 0, 
                 width: Optional[int] = None, height: Optional[int] = None,
-                binning: int = 1) -> None:
+                binning: int = 1, image_type: Optional[int] = None) -> None:
         """
         Set the Region of Interest for spectroscopy
         
@@ -167,6 +235,7 @@ class Spectrometer:
             width: Width of ROI
             height: Height of ROI
             binning: Pixel binning factor
+            image_type: Camera pixel format (None keeps the current one)
         """
         if not self.connected:
             raise RuntimeError("Spectrometer not connected")
@@ -181,11 +250,56 @@ class Spectrometer:
         }
         
         # Apply to camera
-        self.camera.set_roi(start_x, start_y, width, height, binning)
+        self.camera.set_roi(start_x, start_y, width, height, binning, image_type=image_type)
+        self.axis_cache.invalidate()
         
         # Save updated settings
         self._save_settings()
     
+    def plan_readout(self, band_start_y: int, band_height: int,
+                     min_columns: Optional[int] = None,
+                     dynamic_range_bits: int = 12) -> Dict[str, Any]:
+        """
+        Plan the cheapest camera readout that covers the spectral band
+        
+        Args:
+            band_start_y: First sensor row of the spectrum
+            band_height: Number of sensor rows the spectrum covers
+            min_columns: Spectral pixels needed (default: full resolution)
+            dynamic_range_bits: Bits of dynamic range needed (8 or fewer allows RAW8)
+            
+        Returns:
+            Readout plan (see ReadoutPlanner.plan) plus an estimate for the
+            current configuration under 'current'
+        """
+        if not self.connected:
+            raise RuntimeError("Spectrometer not connected")
+            
+        info = self.camera.camera_info
+        planner = ReadoutPlanner(
+            info['MaxWidth'], info['MaxHeight'],
+            supported_bins=info.get('SupportedBins', [1]),
+            bandwidth_percent=self.camera.bandwidth_percent
+        )
+        plan = planner.plan(band_start_y, band_height, min_columns=min_columns,
+                            dynamic_range_bits=dynamic_range_bits,
+                            exposure_ms=self.exposure_ms)
+        
+        state = self.camera.get_state()
+        plan["current"] = planner.estimate(state["width"], state["height"], state["binning"],
+                                           state["image_type"], self.exposure_ms)
+        return plan
+    
+    def apply_readout_plan(self, plan: Dict[str, Any]) -> None:
+        """
+        Apply a plan from plan_readout to the camera
+        
+        Args:
+            plan: Readout plan with 'roi' and 'image_type'
+        """
+        self.set_roi(**plan["roi"], image_type=plan["image_type"])
+        logger.info(f"Applied readout plan: {plan['roi']} {plan.get('image_format', '')}")
+    
     def set_exposure(self, exposure_ms: int, skip_save: bool = False) -> None:
         """
         Set camera exposure time
@@ -225,16 +339,32 @@ class Spectrometer:
     def set_processing_settings(self, use_max: Optional[bool] = None, 
                                 readout_mode: Optional[str] = None,
                                 baseline_correction: Optional[str] = None,
-                                polynomial_degree: Optional[int] = None) -> None:
+                                polynomial_degree: Optional[int] = None,
+                                als_lambda: Optional[float] = None,
+                                als_asymmetry: Optional[float] = None,
+                                clip_dark_pixels: Optional[bool] = None) -> None:
         """
         Update processing settings
         
         Args:
             use_max: Whether to use maximum instead of mean for spectrum extraction
             readout_mode: Readout mode: 'average' or 'maximum' (takes precedence over use_max if both provided)
-            baseline_correction: Baseline correction method ('none', 'linear', 'polynomial')
+            baseline_correction: Baseline correction method ('none', 'linear', 'polynomial', 'als')
             polynomial_degree: Degree for polynomial baseline correction
+            als_lambda: Smoothness of the 'als' baseline
+            als_asymmetry: Weight of points above the 'als' baseline
+            clip_dark_pixels: Clip dark-corrected pixels at 0 before the reduction
+                              (average mode then subtracts the full 2D dark)
+            
+        Raises:
+            ValueError: If a baseline setting is invalid (nothing is changed)
         """
+        BaselineCorrector.validate(
+            baseline_correction if baseline_correction is not None else self.baseline_correction,
+            polynomial_degree if polynomial_degree is not None else self.polynomial_degree
+        )
+        self.baseline_corrector.configure(als_lambda=als_lambda, als_asymmetry=als_asymmetry)
+        
         # Handle readout_mode parameter (preferred) or use_max
         if readout_mode is not None:
             self.use_max = (readout_mode == 'maximum')
@@ -247,6 +377,9 @@ class Spectrometer:
         if polynomial_degree is not None:
             self.polynomial_degree = polynomial_degree
             
+        if clip_dark_pixels is not None:
+            self.clip_dark_pixels = bool(clip_dark_pixels)
+            
         # Save updated settings
         self._save_settings()
     
@@ -260,6 +393,7 @@ class Spectrometer:
                          wavelength = c0 + c1*pixel + c2*pixel^2 + ...
         """
         self._wavelength_coeffs = list(coefficients)
+        self.axis_cache.invalidate()
         
         # Save updated settings
         self._save_settings()
@@ -276,19 +410,202 @@ class Spectrometer:
         # Save updated settings
         self._save_settings()
     
-    def acquire_dark_frame(self) -> np.ndarray:
+    def acquire_dark_frame(self, n_frames: int = 1, method: str = 'median',
+                           save: bool = False) -> np.ndarray:
         """
         Acquire a dark frame (with shutter closed or light blocked)
         
+        Several frames are combined into a master dark by a DarkStacker,
+        which spools them to disk, so memory use does not grow with n_frames.
+        The dark is used for frames taken with the same readout settings;
+        saved darks are also picked for later sessions and other settings.
+        
+        Args:
+            n_frames: Number of frames to stack
+            method: 'median' or 'sigma_clip'
+            save: Also add the dark to the dark library
+            
         Returns:
             Dark frame as NumPy array
         """
         if not self.connected:
             raise RuntimeError("Spectrometer not connected")
+        if n_frames < 1:
+            raise ValueError("n_frames must be at least 1")
+        if method not in STACK_METHODS:
+            raise ValueError(f"Invalid stack method: {method}. Must be one of {', '.join(STACK_METHODS)}.")
             
-        # Acquire dark frame
-        self.dark_frame = self.camera.capture_raw()
-        return self.dark_frame
+        self._refresh_temperature(force=True)
+        state = self._readout_state()
+        if n_frames == 1:
+            dark = self.camera.capture_raw()
+        else:
+            shape, dtype = self.camera.get_frame_format()
+            started_continuous = False
+            if not self.camera.is_continuous:
+                try:
+                    self.camera.start_continuous()
+                    started_continuous = True
+                except RuntimeError as e:
+                    logger.info(f"Stacking darks from snapshot captures: {e}")
+            try:
+                with DarkStacker(shape, dtype, method=method) as stacker:
+                    for _ in range(n_frames):
+                        with self.camera.capture_pooled() as frame:
+                            stacker.add(frame.array)
+                    dark = stacker.result()
+            finally:
+                if started_continuous:
+                    self.camera.stop_continuous()
+                    
+        entry = None
+        if save:
+            entry = self.dark_library.add(dark, temperature_c=self.sensor_temperature, frames=n_frames,
+                                          method=method if n_frames > 1 else 'single', **state)
+        self.dark_frame = dark
+        self.dark_frame_state = state
+        self.dark_frame_info = dict(state, temperature_c=self.sensor_temperature, frames=n_frames,
+                                    method=method if n_frames > 1 else 'single',
+                                    library_id=entry["id"] if entry else None)
+        return dark
+    
+    def _refresh_temperature(self, force: bool = False) -> None:
+        """Re-read the sensor temperature at most every temperature_refresh_s (hardware thread)"""
+        now = time.monotonic()
+        if force or self._temperature_read_at is None or \
+                now - self._temperature_read_at >= self.temperature_refresh_s:
+            self._temperature_read_at = now
+            self.sensor_temperature = self.camera.get_temperature()
+    
+    def _readout_state(self) -> Dict[str, Any]:
+        """Exposure, gain and ROI position of the current readout (no camera queries)"""
+        if self.connected:
+            state = self.camera.get_state()
+            return {
+                "exposure_us": state.get("exposure_us", 0),
+                "gain": state.get("gain", 0),
+                "start_x": state.get("start_x", 0),
+                "start_y": state.get("start_y", 0),
+                "binning": state.get("binning", 1)
+            }
+        return {
+            "exposure_us": int(round(self.exposure_ms * 1000)),
+            "gain": self.gain,
+            "start_x": self.roi_settings["start_x"],
+            "start_y": self.roi_settings["start_y"],
+            "binning": self.roi_settings["binning"]
+        }
+    
+    def select_dark(self, shape: Tuple[int, int], dtype: Any) -> Optional[np.ndarray]:
+        """
+        Choose the dark for a frame of the current readout
+        
+        The acquired dark frame is used if it has the frame's shape and was
+        taken with the current settings; otherwise the dark library is
+        asked for the closest master dark. The choice is cached until the
+        settings, sensor temperature, dark frame or library change.
+        
+        Args:
+            shape: Frame shape (height, width)
+            dtype: Frame pixel type
+            
+        Returns:
+            Dark of the frame's shape, or None if none fits
+        """
+        state = self._readout_state()
+        key = (tuple(shape), np.dtype(dtype).str, tuple(state.values()), self.sensor_temperature,
+               id(self.dark_frame), self.dark_library.version, self.use_dark_library)
+        choice = self._dark_choice
+        if choice[0] == key:
+            return choice[1]
+            
+        dark, info = None, {"source": None}
+        frame = self.dark_frame
+        if frame is not None and frame.shape == tuple(shape) and \
+                (self.dark_frame_state is None or self.dark_frame_state == state):
+            dark, info = frame, {"source": "frame"}
+        elif self.use_dark_library:
+            match = self.dark_library.match(shape, dtype, temperature_c=self.sensor_temperature, **state)
+            if match is not None:
+                dark, info = match[0], dict(match[1], source="library")
+        if dark is None and frame is not None:
+            logger.warning("Dark frame does not match the current readout and no library dark fits, "
+                           "skipping subtraction")
+        self._dark_choice = (key, dark, info)
+        return dark
+    
+    def dark_commutes(self, use_max: bool) -> bool:
+        """
+        Check whether the dark can be subtracted after the column reduction
+        
+        The column mean of (frame - dark) is the frame's column mean minus
+        the dark's, so in average mode the dark is subtracted from the
+        reduced spectrum as a precomputed 1D dark spectrum: width operations
+        per frame instead of width x height. This holds only without
+        per-pixel clipping; maximum mode and clip_dark_pixels need the 2D dark.
+        
+        Args:
+            use_max: Whether the frame is reduced with the column maximum
+            
+        Returns:
+            True if the 1D dark spectrum can be used
+        """
+        return not use_max and not self.clip_dark_pixels
+    
+    def dark_spectrum(self, dark: np.ndarray) -> np.ndarray:
+        """
+        Column mean of a dark, computed once per dark
+        
+        Args:
+            dark: Dark from select_dark
+            
+        Returns:
+            Read-only float64 spectrum of the dark's width
+        """
+        cached_dark, spectrum = self._dark_spectrum
+        if cached_dark is not dark:
+            spectrum = np.add.reduce(dark, axis=0, dtype=np.float64) / max(dark.shape[0], 1)
+            spectrum.flags.writeable = False
+            self._dark_spectrum = (dark, spectrum)
+        return spectrum
+    
+    def count_dark_path(self, path: str) -> None:
+        """Record the dark correction path of a reduced frame ('spectrum', 'frame' or 'none')"""
+        self.last_dark_path = path
+        self.dark_paths[path] += 1
+        DARK_CORRECTIONS.labels(path).inc()
+    
+    def dark_available(self) -> bool:
+        """
+        Check whether frames of the current readout would be dark-corrected
+        
+        Returns:
+            True if select_dark finds a dark for the current frame format
+        """
+        if not self.connected:
+            return self.dark_frame is not None
+        shape, dtype = self.camera.get_frame_format()
+        return self.select_dark(shape, dtype) is not None
+    
+    def get_dark_status(self) -> Dict[str, Any]:
+        """
+        Get the dark correction state
+        
+        Returns:
+            Dictionary with the acquired dark frame, the last dark selection,
+            the sensor temperature and dark library statistics
+        """
+        return {
+            "subtract_dark": self.subtract_dark,
+            "dark_frame": self.dark_frame_info if self.dark_frame is not None else None,
+            "selected": dict(self._dark_choice[2]),
+            "sensor_temperature_c": self.sensor_temperature,
+            "clip_dark_pixels": self.clip_dark_pixels,
+            "path": self.last_dark_path,
+            "paths": dict(self.dark_paths),
+            "use_library": self.use_dark_library,
+            "library": self.dark_library.get_stats()
+        }
     
     def acquire_spectrum(self, 
                          subtract_dark: Optional[bool] = None,
@@ -320,34 +637,113 @@ class Spectrometer:
         if readout_mode is not None:
             use_max = (readout_mode == 'maximum')
             
+        self._refresh_temperature()
+            
         # Acquire raw image
-        raw_image = self.camera.capture_raw()
-        
         if return_raw:
-            return raw_image
-            
-        # Apply dark frame correction if needed
-        if subtract_dark and self.dark_frame is not None:
-            if raw_image.shape == self.dark_frame.shape:
-                raw_image = raw_image - self.dark_frame
-                raw_image = np.clip(raw_image, 0, None)  # Prevent negative values
-            else:
-                logger.warning("Dark frame shape mismatch, skipping subtraction")
-                
-        # Extract spectrum based on user preference
-        if use_max:
-            # Get maximum value of each column for full ADC range
-            spectrum = np.max(raw_image, axis=0)
-        else:
-            # Get mean value of each column (default)
-            spectrum = np.mean(raw_image, axis=0)
+            return self.camera.capture_raw()
+            
+        # Capture into a pooled buffer; it goes back to the pool once reduced
+        with self.camera.capture_pooled() as frame:
+            spectrum = self._reduce_frame(frame.array, subtract_dark, use_max)
+        spectrum = self.correct_baseline(spectrum, use_max)
         
-        # Create wavelength mapping just once (more efficient than per-pixel conversion)
-        pixel_positions = np.arange(len(spectrum))
-        wavelengths = self.pixel_to_wavelength(pixel_positions)
+        # Wavelength axis is cached until the calibration or ROI changes
+        wavelengths = self.get_wavelength_axis(len(spectrum))
         
         return wavelengths, spectrum
     
+    def acquire_accumulated(self, n_frames: int,
+                            subtract_dark: Optional[bool] = None,
+                            readout_mode: Optional[str] = None,
+                            reject_cosmic_rays: bool = False,
+                            sigma: float = 5.0,
+                            keep_last_frame: bool = False) -> Dict[str, Any]:
+        """
+        Acquire n_frames spectra and average them
+        
+        Frames come from continuous capture (started for the duration if it
+        is not already running and the readout allows it) and are folded into
+        running per-pixel statistics one at a time, so memory use does not
+        grow with n_frames.
+        
+        Args:
+            n_frames: Number of frames to accumulate
+            subtract_dark: Whether to subtract dark frame (None uses default setting)
+            readout_mode: 'average' or 'maximum' (None uses default setting)
+            reject_cosmic_rays: Leave positive per-pixel outliers out of the average
+            sigma: Outlier threshold in standard deviations
+            keep_last_frame: Also return a copy of the last raw frame
+            
+        Returns:
+            Dictionary with 'wavelengths', 'intensities' (mean), 'std' (per-pixel
+            sample standard deviation), 'frames', 'rejected_pixels' and
+            'last_frame' (None unless keep_last_frame)
+        """
+        if not self.connected:
+            raise RuntimeError("Spectrometer not connected")
+        if n_frames < 1:
+            raise ValueError("n_frames must be at least 1")
+        self._refresh_temperature()
+            
+        if subtract_dark is None:
+            subtract_dark = self.subtract_dark
+        use_max = self.use_max
+        if readout_mode is not None:
+            use_max = (readout_mode == 'maximum')
+            
+        started_continuous = False
+        if n_frames > 1 and not self.camera.is_continuous:
+            try:
+                self.camera.start_continuous()
+                started_continuous = True
+            except RuntimeError as e:
+                logger.info(f"Accumulating from snapshot captures: {e}")
+                
+        accumulator = None
+        last_frame = None
+        spectrum = None
+        try:
+            for i in range(n_frames):
+                with self.camera.capture_pooled() as frame:
+                    spectrum = self._reduce_frame(frame.array, subtract_dark, use_max, out=spectrum)
+                    if keep_last_frame and i == n_frames - 1:
+                        last_frame = frame.array.copy()
+                if accumulator is None:
+                    accumulator = SpectrumAccumulator(len(spectrum), reject_cosmic_rays, sigma)
+                accumulator.add(spectrum)
+        finally:
+            if started_continuous:
+                self.camera.stop_continuous()
+                
+        stats = accumulator.get_stats()
+        logger.debug(f"Accumulated {stats['frames']} frames, {stats['rejected_pixels']} pixels rejected")
+        
+        return {
+            "wavelengths": self.get_wavelength_axis(accumulator.width),
+            "intensities": self.correct_baseline(accumulator.mean, use_max),
+            "std": accumulator.std(),
+            "frames": stats["frames"],
+            "rejected_pixels": stats["rejected_pixels"],
+            "last_frame": last_frame
+        }
+    
+    def acquire_raw_frame(self) -> PooledFrame:
+        """
+        Acquire a raw frame into a reusable buffer from the camera frame pool
+        
+        The caller owns the frame until it calls release() on it (or leaves
+        a with block), after which the buffer may be overwritten.
+        
+        Returns:
+            PooledFrame whose .array holds the raw image
+        """
+        if not self.connected:
+            raise RuntimeError("Spectrometer not connected")
+            
+        self._refresh_temperature()
+        return self.camera.capture_pooled()
+    
     def process_spectrum(self, raw_image: np.ndarray, 
                        subtract_dark: Optional[bool] = None,
                        readout_mode: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
@@ -362,9 +758,7 @@ class Spectrometer:
         Returns:
             Tuple of (wavelengths, intensities) as NumPy arrays
         """
-        if not self.connected:
-            raise RuntimeError("Spectrometer not connected")
-            
+        # Processing touches no hardware, so it also works while disconnected
         # Use instance defaults if not specified
         if subtract_dark is None:
             subtract_dark = self.subtract_dark
@@ -374,28 +768,61 @@ class Spectrometer:
         if readout_mode is not None:
             use_max = (readout_mode == 'maximum')
             
-        # Apply dark frame correction if needed
-        if subtract_dark and self.dark_frame is not None:
-            if raw_image.shape == self.dark_frame.shape:
-                raw_image = raw_image - self.dark_frame
-                raw_image = np.clip(raw_image, 0, None)  # Prevent negative values
-            else:
-                logger.warning("Dark frame shape mismatch, skipping subtraction")
-                
-        # Extract spectrum based on user preference
-        if use_max:
-            # Get maximum value of each column for full ADC range
-            spectrum = np.max(raw_image, axis=0)
-        else:
-            # Get mean value of each column (default)
-            spectrum = np.mean(raw_image, axis=0)
+        with _PROCESS_SECONDS[use_max].time():
+            spectrum = self._reduce_frame(raw_image, subtract_dark, use_max)
+            spectrum = self.correct_baseline(spectrum, use_max)
             
-        # Create wavelength mapping just once (more efficient than per-pixel conversion)
-        pixel_positions = np.arange(len(spectrum))
-        wavelengths = self.pixel_to_wavelength(pixel_positions)
+            # Wavelength axis is cached until the calibration or ROI changes
+            wavelengths = self.get_wavelength_axis(len(spectrum))
         
         return wavelengths, spectrum
     
+    def correct_baseline(self, spectrum: np.ndarray, use_max: bool = False) -> np.ndarray:
+        """
+        Apply the configured baseline correction
+        
+        Args:
+            spectrum: Reduced spectrum
+            use_max: Readout mode the spectrum was reduced with (for the metrics)
+            
+        Returns:
+            Corrected spectrum (the input itself when the method is 'none')
+        """
+        if self.baseline_correction == 'none':
+            return spectrum
+        with _BASELINE_SECONDS[use_max].time():
+            return self.baseline_corrector.correct(spectrum, self.baseline_correction, self.polynomial_degree)
+    
+    def _reduce_frame(self, raw_image: np.ndarray, subtract_dark: bool, use_max: bool,
+                      out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Dark-correct and reduce a raw image to a spectrum in one pass
+        
+        Args:
+            raw_image: Raw 2D image data
+            subtract_dark: Whether to subtract the dark frame
+            use_max: Use the column maximum instead of the column mean
+            out: Optional float64 array of the frame width to reuse for the result
+            
+        Returns:
+            Spectrum as a float64 array
+        """
+        dark = self.select_dark(raw_image.shape, raw_image.dtype) if subtract_dark else None
+        self.last_dark_subtracted = dark is not None
+                
+        mode = 'max' if use_max else 'mean'
+        with _REDUCE_SECONDS[use_max].time():
+            if dark is not None and self.dark_commutes(use_max):
+                # Reduce, then subtract the dark's column mean; negative columns are clipped to 0
+                spectrum = self.reducer.reduce(raw_image, mode=mode, out=out)
+                spectrum -= self.dark_spectrum(dark)
+                np.maximum(spectrum, 0.0, out=spectrum)
+                self.count_dark_path('spectrum')
+                return spectrum
+            # Negative dark-corrected pixels are clipped to 0 as before
+            self.count_dark_path('frame' if dark is not None else 'none')
+            return self.reducer.reduce(raw_image, dark=dark, mode=mode, clip=True, out=out)
+    
     def pixel_to_wavelength(self, pixel_positions: np.ndarray) -> np.ndarray:
         """
         Convert pixel positions to wavelengths using calibration
@@ -407,42 +834,80 @@ class Spectrometer:
             Array of corresponding wavelengths
         """
         # Apply polynomial calibration
-        wavelengths = np.zeros_like(pixel_positions, dtype=float)
-        for i, coef in enumerate(self._wavelength_coeffs):
-            wavelengths += coef * (pixel_positions ** i)
+        return evaluate_polynomial(self._wavelength_coeffs, pixel_positions)
+    
+    def get_wavelength_axis(self, width: Optional[int] = None) -> np.ndarray:
+        """
+        Get the cached wavelength axis for the current calibration and ROI
+        
+        Args:
+            width: Number of pixels (default: ROI width)
             
-        return wavelengths
+        Returns:
+            Read-only array of wavelengths, one per pixel
+        """
+        if width is None:
+            width = self.roi_settings["width"] or 0
+        return self.axis_cache.get_wavelength_axis(
+            self._wavelength_coeffs, width,
+            binning=self.roi_settings["binning"],
+            start_x=self.roi_settings["start_x"]
+        )
     
-    def wavelength_to_pixel(self, wavelengths: np.ndarray) -> np.ndarray:
+    def get_spectral_axes(self, width: Optional[int] = None) -> Dict[str, np.ndarray]:
         """
-        Convert wavelengths to nearest pixel positions
+        Get the cached wavelength, wavenumber and Raman-shift axes
+        
+        Args:
+            width: Number of pixels (default: ROI width)
+            
+        Returns:
+            Dictionary of read-only arrays keyed 'wavelength', 'wavenumber' and 'raman_shift'
+        """
+        if width is None:
+            width = self.roi_settings["width"] or 0
+        return self.axis_cache.get_axes(
+            self._wavelength_coeffs, width, self.laser_wavelength,
+            binning=self.roi_settings["binning"],
+            start_x=self.roi_settings["start_x"]
+        )
+    
+    def wavelength_to_pixel(self, wavelengths: np.ndarray, rounded: bool = True) -> np.ndarray:
+        """
+        Convert wavelengths to pixel positions
         
         Args:
             wavelengths: Array of wavelengths
+            rounded: If True (default), return the nearest integer pixels;
+                     otherwise return fractional pixel positions
             
         Returns:
-            Array of nearest corresponding pixel positions
+            Array of corresponding pixel positions
         """
         if len(self._wavelength_coeffs) <= 1:
             raise ValueError("Wavelength calibration not set properly")
             
+        # Trailing zero coefficients don't change the order of the calibration
+        coeffs = list(self._wavelength_coeffs)
+        while len(coeffs) > 2 and coeffs[-1] == 0:
+            coeffs.pop()
+            
         # For simple linear calibration
-        if len(self._wavelength_coeffs) == 2:
+        binning = self.roi_settings["binning"] or 1
+        if len(coeffs) == 2:
             # wavelength = c0 + c1 * pixel
             # pixel = (wavelength - c0) / c1
-            pixels = (wavelengths - self._wavelength_coeffs[0]) / self._wavelength_coeffs[1]
-            return np.round(pixels).astype(int)
+            pixels = (np.asarray(wavelengths, dtype=float) - coeffs[0]) / coeffs[1]
+        else:
+            # For higher-order calibrations use the cached inverse lookup table,
+            # which raises CalibrationNotInvertibleError for non-monotone calibrations
+            width = (self.roi_settings["width"] or 1000) * binning
+            pixels = self.axis_cache.get_inverse(coeffs, width).to_pixel(wavelengths)
             
-        # For higher-order calibrations, we need to use interpolation
-        # Create a dense mapping of pixel positions to wavelengths
-        dense_pixels = np.arange(0, self.roi_settings["width"] or 1000)
-        dense_wavelengths = self.pixel_to_wavelength(dense_pixels)
-        
-        # Create interpolator from wavelength to pixel
-        interpolator = interpolate.interp1d(dense_wavelengths, dense_pixels, 
-                                          bounds_error=False, fill_value="extrapolate")
-        
-        return np.round(interpolator(wavelengths)).astype(int)
+        # The calibration is in unbinned pixels; convert to binned ROI columns
+        if binning > 1:
+            pixels = (pixels - (binning - 1) / 2.0) / binning
+        return np.round(pixels).astype(int) if rounded else pixels
     
     def save_spectrum(self, filename: str, 
                      wavelengths: np.ndarray, 
@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Append-only binary spectrum store with a background writer
+
+A store file (.spx) holds a series of spectra that share a wavelength axis:
+
+    file header   MAGIC (4 bytes), format version (u16), reserved (u16)
+    chunk         header (CHUNK_HEADER) followed by the payload
+
+An AXIS chunk carries the float64 wavelength axis that applies to the rows
+after it; it is only written again when the axis changes (recalibration).
+A ROWS chunk carries up to chunk_rows spectra: a structured metadata array
+(ROW_DTYPE) followed by the float32 intensity rows. Payloads can be
+compressed with zlib after a byte shuffle of the float data, which groups
+the exponent bytes together and compresses far better than raw floats.
+Every chunk carries the CRC32 of its payload, so a chunk cut short by a
+crash is detected and dropped when the store is reopened.
+"""
+import io
+import os
+import time
+import zlib
+import struct
+import logging
+import threading
+import numpy as np
+from typing import Dict, Tuple, Optional, Any, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SPX1"
+FORMAT_VERSION = 1
+FILE_HEADER = struct.Struct("<4sHH")
+# tag, codec, rows, width, raw payload size, stored payload size, CRC32 of the stored payload
+CHUNK_HEADER = struct.Struct("<4sB3xIIIII")
+
+TAG_AXIS = b"AXIS"
+TAG_ROWS = b"ROWS"
+CODEC_NONE = 0
+CODEC_ZLIB_SHUFFLE = 1
+
+FLAG_MAXIMUM = 1        # Rows reduced with the maximum instead of the average
+FLAG_DARK_SUBTRACTED = 2
+FLAG_BASELINE_CORRECTED = 4
+
+ROW_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("exposure_us", "<u8"),
+    ("gain", "<i4"),
+    ("frames", "<u4"),
+    ("flags", "<u4"),
+    ("calibration_hash", "<u8"),
+])
+
+def _shuffle(data: bytes, itemsize: int) -> bytes:
+    """Group byte k of every item together"""
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, itemsize).T.tobytes()
+
+def _unshuffle(data: bytes, itemsize: int) -> bytes:
+    """Inverse of _shuffle"""
+    return np.frombuffer(data, dtype=np.uint8).reshape(itemsize, -1).T.tobytes()
+
+class SpectrumStore:
+    """
+    One .spx file, opened for appending and reading
+
+    append() only validates the spectrum and queues a copy in memory;
+    flush() does the file I/O, so a SpectrumWriter can keep disk writes off
+    the acquisition path. All rows in a store have the same width.
+    """
+
+    def __init__(self, path: str, compress: bool = True, chunk_rows: int = 64,
+                 compression_level: int = 1):
+        """
+        Open or create a store
+
+        Args:
+            path: Store file path
+            compress: Compress new chunks
+            chunk_rows: Maximum number of spectra per ROWS chunk
+            compression_level: zlib level for new chunks
+        """
+        self.path = str(path)
+        self.compress = compress
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.compression_level = compression_level
+
+        self._lock = threading.Lock()      # Pending entries and counters
+        self._io_lock = threading.Lock()   # Serializes flushes so chunks stay in order
+        self._pending: List[Tuple[str, Any]] = []
+        self._pending_rows = 0
+        self.width: Optional[int] = None
+        self.rows = 0                      # Rows on disk plus pending rows
+        self._axis: Optional[np.ndarray] = None
+        self.bytes_written = 0
+
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            self._recover()
+        else:
+            with open(self.path, "wb") as f:
+                f.write(FILE_HEADER.pack(MAGIC, FORMAT_VERSION, 0))
+
+    def _recover(self) -> None:
+        """Read the existing chunks and drop a truncated or corrupt tail"""
+        end = FILE_HEADER.size
+        for tag, codec, rows, width, payload, offset in _iter_chunks(self.path):
+            if tag == TAG_AXIS:
+                self._axis = np.frombuffer(_decode(codec, payload, 8), dtype="<f8")
+                self.width = width
+            elif tag == TAG_ROWS:
+                self.rows += rows
+                self.width = width
+            end = offset
+        if end < os.path.getsize(self.path):
+            logger.warning(f"Dropping incomplete data at the end of {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+
+    @property
+    def pending_rows(self) -> int:
+        """Number of rows not yet written to disk"""
+        return self._pending_rows
+
+    def append(self, wavelengths: np.ndarray, intensities: np.ndarray,
+               timestamp: Optional[float] = None, exposure_us: int = 0, gain: int = 0,
+               frames: int = 1, flags: int = 0, calibration_hash: int = 0) -> int:
+        """
+        Queue a spectrum for writing
+
+        Args:
+            wavelengths: Wavelength axis
+            intensities: Intensity values
+            timestamp: Acquisition time (default: now)
+            exposure_us: Exposure time in microseconds
+            gain: Gain value
+            frames: Number of frames averaged
+            flags: FLAG_* bits
+            calibration_hash: Identifier of the calibration (calibration.calibration_hash)
+
+        Returns:
+            Index of the spectrum in the store
+
+        Raises:
+            ValueError: If the spectrum does not match the store width
+        """
+        intensities = np.asarray(intensities)
+        width = len(intensities)
+        if len(wavelengths) != width:
+            raise ValueError(f"Wavelength axis has {len(wavelengths)} points, spectrum has {width}")
+        meta = (time.time() if timestamp is None else timestamp,
+                exposure_us, gain, frames, flags, calibration_hash)
+
+        with self._lock:
+            if self.width is not None and width != self.width:
+                raise ValueError(f"Spectrum width {width} does not match the store width {self.width}")
+            # The calibration cache hands out the same array until the axis changes,
+            # so the identity check usually avoids the comparison
+            if self._axis is None or (wavelengths is not self._axis and
+                                      not np.array_equal(wavelengths, self._axis)):
+                self._axis = wavelengths
+                self._pending.append(("axis", np.asarray(wavelengths, dtype="<f8").copy()))
+            self._pending.append(("row", (meta, intensities.astype("<f4"))))
+            self._pending_rows += 1
+            self.width = width
+            index = self.rows
+            self.rows += 1
+        return index
+
+    def _encode(self, tag: bytes, rows: int, raw: bytes, itemsize: int, prefix: bytes = b"") -> bytes:
+        """Build a chunk; prefix bytes are stored unshuffled before the shuffled data"""
+        codec = CODEC_NONE
+        payload = prefix + raw
+        if self.compress:
+            codec = CODEC_ZLIB_SHUFFLE
+            payload = zlib.compress(prefix + _shuffle(raw, itemsize), self.compression_level)
+        header = CHUNK_HEADER.pack(tag, codec, rows, self.width, len(prefix) + len(raw),
+                                   len(payload), zlib.crc32(payload))
+        return header + payload
+
+    def flush(self) -> int:
+        """
+        Write all pending spectra to disk
+
+        If the write fails, the file is truncated back to its previous
+        size and the spectra stay queued for the next flush, so the indices
+        returned by append() remain valid.
+
+        Returns:
+            Number of spectra written
+
+        Raises:
+            OSError: If the spectra cannot be written
+        """
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                pending_rows, self._pending_rows = self._pending_rows, 0
+            if not pending:
+                return 0
+            try:
+                return self._write(pending)
+            except Exception:
+                with self._lock:
+                    self._pending = pending + self._pending
+                    self._pending_rows += pending_rows
+                raise
+
+    def _write(self, pending: List[Tuple[str, Any]]) -> int:
+        """Encode and append pending entries (I/O lock held); a failed write leaves the file as it was"""
+        chunks = []
+        batch: List[Tuple[tuple, np.ndarray]] = []
+
+        def close_batch():
+            if batch:
+                meta = np.array([m for m, _ in batch], dtype=ROW_DTYPE)
+                data = np.stack([row for _, row in batch])
+                chunks.append(self._encode(TAG_ROWS, len(batch), data.tobytes(), 4, meta.tobytes()))
+                batch.clear()
+
+        written = 0
+        for kind, entry in pending:
+            if kind == "axis":
+                close_batch()
+                chunks.append(self._encode(TAG_AXIS, 1, entry.tobytes(), 8))
+            else:
+                batch.append(entry)
+                written += 1
+                if len(batch) >= self.chunk_rows:
+                    close_batch()
+        close_batch()
+
+        data = b"".join(chunks)
+        size = os.path.getsize(self.path)
+        try:
+            with open(self.path, "ab") as f:
+                f.write(data)
+        except Exception:
+            # A torn chunk would hide every chunk appended after it on reopen
+            try:
+                with open(self.path, "r+b") as f:
+                    f.truncate(size)
+            except OSError as e:
+                logger.error(f"Failed to truncate {self.path} after a failed write: {e}")
+            raise
+        self.bytes_written += len(data)
+        return written
+
+    def get_info(self) -> Dict[str, Any]:
+        """
+        Get store information
+
+        Returns:
+            Dictionary with path, width, row counts and compression
+        """
+        return {
+            "path": self.path,
+            "width": self.width,
+            "rows": self.rows,
+            "pending_rows": self._pending_rows,
+            "compress": self.compress,
+            "bytes_written": self.bytes_written
+        }
+
+def _decode(codec: int, payload: bytes, itemsize: int, prefix_size: int = 0) -> bytes:
+    """Undo the chunk encoding of a payload"""
+    if codec == CODEC_NONE:
+        return payload
+    if codec != CODEC_ZLIB_SHUFFLE:
+        raise ValueError(f"Unknown spectrum store codec {codec}")
+    raw = zlib.decompress(payload)
+    return raw[:prefix_size] + _unshuffle(raw[prefix_size:], itemsize)
+
+def _iter_chunks(path: str):
+    """
+    Yield (tag, codec, rows, width, payload, end offset) for each intact chunk
+
+    Stops at the first truncated or corrupt chunk.
+    """
+    with open(path, "rb") as f:
+        header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            raise ValueError(f"{path} is not a spectrum store")
+        magic, version, _ = FILE_HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a spectrum store")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{path} uses store format {version}, newer than {FORMAT_VERSION}")
+        while True:
+            header = f.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                return
+            tag, codec, rows, width, _, size, crc = CHUNK_HEADER.unpack(header)
+            payload = f.read(size)
+            if len(payload) < size or zlib.crc32(payload) != crc or tag not in (TAG_AXIS, TAG_ROWS):
+                return
+            yield tag, codec, rows, width, payload, f.tell()
+
+def read_store(path: str) -> Dict[str, Any]:
+    """
+    Load all spectra in a store
+
+    Args:
+        path: Store file path
+
+    Returns:
+        Dictionary with 'axes' (list of wavelength axes), 'axis_index' (axis
+        of each spectrum), 'intensities' (spectra x width, float32) and
+        'meta' (structured array with ROW_DTYPE fields)
+    """
+    axes: List[np.ndarray] = []
+    axis_index: List[int] = []
+    metas: List[np.ndarray] = []
+    blocks: List[np.ndarray] = []
+    width = 0
+    for tag, codec, rows, width, payload, _ in _iter_chunks(path):
+        if tag == TAG_AXIS:
+            axes.append(np.frombuffer(_decode(codec, payload, 8), dtype="<f8"))
+            continue
+        meta_size = rows * ROW_DTYPE.itemsize
+        raw = _decode(codec, payload, 4, meta_size)
+        metas.append(np.frombuffer(raw[:meta_size], dtype=ROW_DTYPE))
+        blocks.append(np.frombuffer(raw[meta_size:], dtype="<f4").reshape(rows, width))
+        axis_index.extend([len(axes) - 1] * rows)
+
+    return {
+        "axes": axes,
+        "axis_index": np.array(axis_index, dtype=np.int64),
+        "intensities": np.concatenate(blocks) if blocks else np.empty((0, width), dtype="<f4"),
+        "meta": np.concatenate(metas) if metas else np.empty(0, dtype=ROW_DTYPE)
+    }
+
+def count_spectra(path: str) -> int:
+    """
+    Number of spectra in a store, from the chunk headers (nothing is decoded)
+
+    Args:
+        path: Store file path
+
+    Returns:
+        Number of intact spectrum rows
+    """
+    return sum(rows for tag, _, rows, _, _, _ in _iter_chunks(path) if tag == TAG_ROWS)
+
+def export_csv(data: Dict[str, Any], indices: Optional[Sequence[int]] = None) -> str:
+    """
+    Export spectra from read_store() as CSV text
+
+    A single spectrum uses the 'Wavelength,Intensity' layout of
+    Spectrometer.save_spectrum; several spectra become one intensity
+    column each, labelled with their index.
+
+    Args:
+        data: Result of read_store()
+        indices: Spectra to export (default: all)
+
+    Returns:
+        CSV text
+
+    Raises:
+        ValueError: If no spectra are selected or they use different axes
+    """
+    count = len(data["intensities"])
+    if indices is None:
+        indices = range(count)
+    indices = [int(i) for i in indices]
+    if not indices:
+        raise ValueError("No spectra to export")
+    for i in indices:
+        if not -count <= i < count:
+            raise IndexError(f"Spectrum {i} not in store ({count} spectra)")
+    axis_ids = set(int(data["axis_index"][i]) for i in indices)
+    if len(axis_ids) > 1:
+        raise ValueError("Selected spectra have different wavelength axes; export them separately")
+
+    wavelengths = data["axes"][axis_ids.pop()]
+    columns = np.column_stack([wavelengths] + [data["intensities"][i] for i in indices])
+    if len(indices) == 1:
+        header = "Wavelength,Intensity"
+    else:
+        header = "Wavelength," + ",".join(f"Intensity_{i}" for i in indices)
+    buffer = io.StringIO()
+    np.savetxt(buffer, columns, delimiter=',', header=header, comments='')
+    return buffer.getvalue()
+
+class SpectrumWriter:
+    """
+    Background writer for spectrum stores
+
+    Spectra are queued in memory by append() and written by a worker thread
+    once a store has a full chunk pending or flush_interval_s has passed.
+    Readers call flush() for a store before reading it.
+    """
+
+    def __init__(self, flush_interval_s: float = 1.0, compress: bool = True, chunk_rows: int = 64):
+        """
+        Initialize the writer
+
+        Args:
+            flush_interval_s: Maximum time a spectrum stays in memory
+            compress: Compress chunks of newly created stores
+            chunk_rows: Spectra per chunk
+        """
+        self.flush_interval_s = flush_interval_s
+        self.compress = compress
+        self.chunk_rows = chunk_rows
+
+        self._lock = threading.Lock()
+        self._stores: Dict[str, SpectrumStore] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Statistics
+        self.appended = 0
+        self.written = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    def get_store(self, path: str) -> SpectrumStore:
+        """Get the open store for a path, opening it if needed"""
+        key = os.path.abspath(str(path))
+        with self._lock:
+            store = self._stores.get(key)
+            if store is None:
+                store = SpectrumStore(key, compress=self.compress, chunk_rows=self.chunk_rows)
+                self._stores[key] = store
+            return store
+
+    def append(self, path: str, wavelengths: np.ndarray, intensities: np.ndarray, **meta) -> int:
+        """
+        Queue a spectrum for a store
+
+        Args:
+            path: Store file path
+            wavelengths: Wavelength axis
+            intensities: Intensity values
+            **meta: Row metadata for SpectrumStore.append
+
+        Returns:
+            Index of the spectrum in the store
+        """
+        store = self.get_store(path)
+        index = store.append(wavelengths, intensities, **meta)
+        self.appended += 1
+        self._ensure_running()
+        if store.pending_rows >= store.chunk_rows:
+            self._wake.set()
+        return index
+
+    def _ensure_running(self) -> None:
+        """Start the worker thread on first use"""
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stop.clear()
+                    self._thread = threading.Thread(target=self._run, name="spectrum-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        """Worker loop"""
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self, path: Optional[str] = None) -> int:
+        """
+        Write pending spectra now
+
+        Args:
+            path: Only flush this store (default: all stores)
+
+        Returns:
+            Number of spectra written
+        """
+        if path is not None:
+            with self._lock:
+                store = self._stores.get(os.path.abspath(str(path)))
+            stores = [store] if store is not None else []
+        else:
+            with self._lock:
+                stores = list(self._stores.values())
+
+        written = 0
+        for store in stores:
+            try:
+                written += store.flush()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                logger.error(f"Failed to write spectra to {store.path}: {e}")
+        self.written += written
+        return written
+
+    def close(self) -> None:
+        """Stop the worker thread and write everything still pending"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get writer statistics
+
+        Returns:
+            Dictionary with counters and open stores
+        """
+        with self._lock:
+            stores = [store.get_info() for store in self._stores.values()]
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "appended": self.appended,
+            "written": self.written,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "stores": stores
+        }
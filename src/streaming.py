@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Binary live spectrum streaming for WebSocket clients
+"""
+import time
+import struct
+import asyncio
+import logging
+import numpy as np
+from concurrent.futures import Executor
+from typing import Dict, Tuple, Optional, Any, Set
+
+from pipeline import AcquisitionPipeline
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+STREAM_DROPPED = registry.counter(
+    "spectrometer_stream_dropped_spectra", "Spectra replaced before a slow WebSocket client took them")
+
+# Message layout (all little-endian):
+#   magic 'SPEC', version, kind, dtype, flags, sequence (uint64),
+#   timestamp (float64, Unix time), exposure_ms (float32), gain (int32),
+#   value count (uint32), axis id (uint32), followed by the values.
+# The 40-byte header keeps the payload 8-byte aligned for typed-array views.
+HEADER = struct.Struct('<4sBBBBQdfiII')
+MAGIC = b'SPEC'
+VERSION = 1
+
+# Message kinds
+KIND_AXIS = 1
+KIND_SPECTRUM = 2
+
+# Payload data types
+DTYPE_CODES = {np.dtype('<f4'): 1, np.dtype('<f8'): 2}
+DTYPES = {code: dtype for dtype, code in DTYPE_CODES.items()}
+
+# Spectrum flags
+FLAG_DARK_SUBTRACTED = 0x01
+FLAG_MAXIMUM_READOUT = 0x02
+FLAG_BASELINE_CORRECTED = 0x04
+
+def _encode(kind: int, values: np.ndarray, dtype: np.dtype, seq: int, timestamp: float,
+            exposure_ms: float, gain: int, axis_id: int, flags: int) -> bytes:
+    """Pack a header and the values converted to dtype"""
+    payload = np.ascontiguousarray(values, dtype=dtype)
+    header = HEADER.pack(MAGIC, VERSION, kind, DTYPE_CODES[dtype], flags, seq,
+                         timestamp, exposure_ms, gain, payload.size, axis_id)
+    return header + payload.tobytes()
+
+def encode_spectrum_message(intensities: np.ndarray, seq: int, axis_id: int,
+                            timestamp: Optional[float] = None,
+                            exposure_ms: float = 0.0, gain: int = 0,
+                            flags: int = 0) -> bytes:
+    """
+    Encode a spectrum as a binary message with float32 intensities
+
+    Args:
+        intensities: Spectrum values, one per pixel
+        seq: Frame sequence number
+        axis_id: Id of the axis message the intensities belong to
+        timestamp: Acquisition time (defaults to now)
+        exposure_ms: Exposure time in milliseconds
+        gain: Gain value
+        flags: Combination of the FLAG_* bits
+
+    Returns:
+        Message bytes
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    return _encode(KIND_SPECTRUM, intensities, np.dtype('<f4'), seq, timestamp,
+                   exposure_ms, gain, axis_id, flags)
+
+def encode_axis_message(wavelengths: np.ndarray, axis_id: int,
+                        timestamp: Optional[float] = None) -> bytes:
+    """
+    Encode a wavelength axis as a binary message with float64 values
+
+    Args:
+        wavelengths: Wavelength in nm for each pixel
+        axis_id: Id that following spectrum messages refer to
+        timestamp: Time the axis was built (defaults to now)
+
+    Returns:
+        Message bytes
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    return _encode(KIND_AXIS, wavelengths, np.dtype('<f8'), 0, timestamp,
+                   0.0, 0, axis_id, 0)
+
+def decode_message(message: bytes) -> Tuple[Dict[str, Any], np.ndarray]:
+    """
+    Decode a binary stream message
+
+    Args:
+        message: Bytes produced by encode_spectrum_message or encode_axis_message
+
+    Returns:
+        Tuple of (header dictionary, values array)
+    """
+    if len(message) < HEADER.size:
+        raise ValueError("Message shorter than the header")
+
+    (magic, version, kind, dtype_code, flags, seq, timestamp,
+     exposure_ms, gain, count, axis_id) = HEADER.unpack_from(message)
+    if magic != MAGIC:
+        raise ValueError("Not a spectrum stream message")
+    if version != VERSION:
+        raise ValueError(f"Unsupported stream message version {version}")
+    if dtype_code not in DTYPES:
+        raise ValueError(f"Unknown payload dtype code {dtype_code}")
+
+    values = np.frombuffer(message, dtype=DTYPES[dtype_code], count=count, offset=HEADER.size)
+    header = {
+        "kind": kind,
+        "flags": flags,
+        "seq": seq,
+        "timestamp": timestamp,
+        "exposure_ms": exposure_ms,
+        "gain": gain,
+        "count": count,
+        "axis_id": axis_id
+    }
+    return header, values
+
+class StreamSubscriber:
+    """
+    Mailbox for one stream client
+
+    Holds at most one pending axis message and the latest spectrum. A slow
+    client therefore skips spectra instead of building up a backlog, but it
+    never misses an axis change.
+    """
+
+    def __init__(self):
+        """Initialize an empty mailbox"""
+        self._axis: Optional[bytes] = None
+        self._spectrum: Optional[bytes] = None
+        self._event = asyncio.Event()
+        self.closed = False
+
+        # Statistics
+        self.delivered = 0
+        self.dropped = 0
+
+    def push_axis(self, message: bytes) -> None:
+        """Queue an axis message; a pending spectrum for the old axis is discarded"""
+        if self._spectrum is not None:
+            self._spectrum = None
+            self.dropped += 1
+            STREAM_DROPPED.inc()
+        self._axis = message
+        self._event.set()
+
+    def push_spectrum(self, message: bytes) -> None:
+        """Queue a spectrum message, replacing one the client has not taken yet"""
+        if self._spectrum is not None:
+            self.dropped += 1
+            STREAM_DROPPED.inc()
+        self._spectrum = message
+        self._event.set()
+
+    def close(self) -> None:
+        """Wake up the client; get() returns None once the mailbox is drained"""
+        self.closed = True
+        self._event.set()
+
+    async def get(self) -> Optional[bytes]:
+        """
+        Wait for the next message
+
+        Returns:
+            Message bytes, or None when the subscriber has been closed
+        """
+        while True:
+            if self._axis is not None:
+                message, self._axis = self._axis, None
+            elif self._spectrum is not None:
+                message, self._spectrum = self._spectrum, None
+            elif self.closed:
+                return None
+            else:
+                self._event.clear()
+                await self._event.wait()
+                continue
+            self.delivered += 1
+            return message
+
+class SpectrumBroadcaster:
+    """
+    Fans spectra out to stream subscribers as binary messages
+
+    Tracks the wavelength axis: it is sent to each new subscriber and again
+    whenever a spectrum arrives with a different axis array.
+    """
+
+    def __init__(self):
+        """Initialize with no subscribers"""
+        self._subscribers: Set[StreamSubscriber] = set()
+        self._axis_source: Optional[np.ndarray] = None
+        self._axis_message: Optional[bytes] = None
+        self.axis_id = 0
+        self.seq = 0
+
+    def add_subscriber(self) -> StreamSubscriber:
+        """
+        Register a client (on the event loop)
+
+        Returns:
+            Subscriber mailbox to read messages from
+        """
+        subscriber = StreamSubscriber()
+        if self._axis_message is not None:
+            subscriber.push_axis(self._axis_message)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def remove_subscriber(self, subscriber: StreamSubscriber) -> None:
+        """Close and remove a client"""
+        subscriber.close()
+        self._subscribers.discard(subscriber)
+
+    def close_subscribers(self) -> None:
+        """Close and remove all clients"""
+        for subscriber in list(self._subscribers):
+            subscriber.close()
+        self._subscribers.clear()
+
+    def broadcast(self, wavelengths: np.ndarray, intensities: np.ndarray,
+                  timestamp: Optional[float] = None, exposure_ms: float = 0.0,
+                  gain: int = 0, flags: int = 0) -> None:
+        """
+        Encode one spectrum (and the axis, if it changed) for all subscribers
+
+        Must be called from the event loop.
+        """
+        # The axis cache hands out the same array until the calibration or ROI changes
+        if wavelengths is not self._axis_source:
+            self.axis_id += 1
+            self._axis_source = wavelengths
+            self._axis_message = encode_axis_message(wavelengths, self.axis_id)
+            for subscriber in self._subscribers:
+                subscriber.push_axis(self._axis_message)
+
+        self.seq += 1
+        message = encode_spectrum_message(intensities, self.seq, self.axis_id, timestamp=timestamp,
+                                          exposure_ms=exposure_ms, gain=gain, flags=flags)
+        for subscriber in self._subscribers:
+            subscriber.push_spectrum(message)
+
+class SpectrumStreamer(SpectrumBroadcaster):
+    """
+    Acquires spectra while clients are subscribed and fans them out as binary messages
+
+    One acquisition task runs for all subscribers. It starts when the first
+    client subscribes and stops when the last one leaves. If the camera can
+    stream (RAW16), continuous capture is started for the duration so spectra
+    arrive at sensor rate; capture and processing overlap in an
+    AcquisitionPipeline. The wavelength axis is sent to each new client and
+    again whenever the calibration or ROI changes it.
+    """
+
+    def __init__(self, spectrometer, executor: Optional[Executor] = None,
+                 error_backoff_s: float = 0.5, queue_size: int = 2, preview=None):
+        """
+        Initialize the streamer
+
+        Args:
+            spectrometer: Connected Spectrometer instance
+            executor: Executor for the blocking camera calls (None uses the
+                      event loop's default executor)
+            error_backoff_s: Delay before retrying after a failed acquisition
+            queue_size: Capacity of the queues between pipeline stages
+            preview: Optional PreviewCache kept up to date from the streamed frames
+        """
+        super().__init__()
+        self.spectrometer = spectrometer
+        self.executor = executor
+        self.error_backoff_s = error_backoff_s
+        self.queue_size = queue_size
+        self.preview = preview
+        self.pipeline: Optional[AcquisitionPipeline] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Statistics (frames counts the current run)
+        self.frames = 0
+        self.errors = 0
+        self._started_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        """True while the acquisition task is active"""
+        return self._task is not None and not self._task.done()
+
+    def subscribe(self) -> StreamSubscriber:
+        """
+        Register a client and start streaming if needed
+
+        Must be called from the event loop.
+
+        Returns:
+            Subscriber mailbox to read messages from
+        """
+        subscriber = self.add_subscriber()
+        if not self.running:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return subscriber
+
+    async def unsubscribe(self, subscriber: StreamSubscriber) -> None:
+        """
+        Remove a client, stopping the acquisition task after the last one
+
+        Args:
+            subscriber: Mailbox returned by subscribe
+        """
+        self.remove_subscriber(subscriber)
+        if not self._subscribers and self.running:
+            self._wake.set()
+            # Shielded: a cancelled client handler must not cancel the shared task
+            await asyncio.shield(self._task)
+
+    async def stop(self) -> None:
+        """Close all subscribers and wait for the acquisition task to finish"""
+        self.close_subscribers()
+        if self.running:
+            self._wake.set()
+            await asyncio.shield(self._task)
+
+    def _publish(self, wavelengths: np.ndarray, intensities: np.ndarray,
+                 timestamp: Optional[float] = None, dark_subtracted: Optional[bool] = None) -> None:
+        """Publish one spectrum with the current acquisition settings"""
+        spectrometer = self.spectrometer
+        state = spectrometer.camera.get_state()
+        if dark_subtracted is None:
+            dark_subtracted = spectrometer.subtract_dark and spectrometer.dark_available()
+        flags = 0
+        if dark_subtracted:
+            flags |= FLAG_DARK_SUBTRACTED
+        if spectrometer.use_max:
+            flags |= FLAG_MAXIMUM_READOUT
+        if spectrometer.baseline_correction != 'none':
+            flags |= FLAG_BASELINE_CORRECTED
+
+        self.broadcast(wavelengths, intensities, timestamp=timestamp,
+                       exposure_ms=state.get("exposure_us", 0) / 1000.0,
+                       gain=state.get("gain", 0), flags=flags)
+        self.frames += 1
+
+    async def _run(self) -> None:
+        """
+        Streaming task; runs while there are subscribers
+
+        Frames are captured, corrected and reduced by an AcquisitionPipeline
+        on worker threads, so the next exposure overlaps the processing of the
+        current frame. Results are handed to the event loop for encoding.
+        """
+        loop = asyncio.get_running_loop()
+        self._started_at = time.time()
+        self.frames = 0
+
+        def deliver(result: Dict[str, Any]) -> None:
+            # Called on the publish worker; subscribers live on the event loop
+            loop.call_soon_threadsafe(self._deliver, result)
+
+        self.pipeline = AcquisitionPipeline(self.spectrometer, deliver, executor=self.executor,
+                                            queue_size=self.queue_size,
+                                            error_backoff_s=self.error_backoff_s,
+                                            preview=self.preview)
+        await asyncio.to_thread(self.pipeline.start)
+        logger.info("Spectrum streaming started")
+        try:
+            while self._subscribers:
+                if not self.spectrometer.connected:
+                    logger.info("Spectrometer disconnected, closing spectrum stream")
+                    self.close_subscribers()
+                    break
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=0.25)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Started straight away in a worker thread, so it also completes if this task is cancelled;
+            # not on the executor, since the capture worker may be waiting for it
+            stopping = asyncio.ensure_future(asyncio.to_thread(self.pipeline.stop))
+            try:
+                await asyncio.shield(stopping)
+            except asyncio.CancelledError:
+                pass
+            logger.info("Spectrum streaming stopped")
+
+    def _deliver(self, result: Dict[str, Any]) -> None:
+        """Publish a pipeline result on the event loop"""
+        if not self._subscribers:
+            return
+        try:
+            self._publish(result["wavelengths"], result["intensities"],
+                          timestamp=result["timestamp"], dark_subtracted=result["dark_subtracted"])
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error publishing spectrum: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get streaming statistics
+
+        Returns:
+            Dictionary of statistics
+        """
+        elapsed = time.time() - self._started_at if self._started_at else 0.0
+        return {
+            "running": self.running,
+            "subscribers": len(self._subscribers),
+            "frames": self.frames,
+            "errors": self.errors,
+            "axis_id": self.axis_id,
+            "dropped": sum(s.dropped for s in self._subscribers),
+            "fps": self.frames / elapsed if self.running and elapsed > 0 else 0.0,
+            "pipeline": self.pipeline.get_stats() if self.pipeline is not None else None
+        }
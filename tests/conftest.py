@@ -0,0 +1,226 @@
+"""
+Shared pytest fixtures for the spectrometer tests
+"""
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add the src directory to the path, as the standalone test scripts do
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root / 'src'))
+
+
+class FakeASICamera:
+    """Minimal stand-in for zwoasi.Camera that produces synthetic RAW16 (or RAW8) frames"""
+
+    def __init__(self, module, id_):
+        self.module = module
+        self.id = id_
+        self.roi_format = [module.MAX_WIDTH, module.MAX_HEIGHT, 1, module.ASI_IMG_RAW16]
+        self.start_position = [0, 0]
+        self.controls = {module.ASI_EXPOSURE: 1000, module.ASI_GAIN: 0}
+        self.video_running = False
+        self.frame_counter = 0
+        self.calls = 0
+
+    def get_camera_property(self):
+        return {
+            'Name': 'ZWO ASI183MM Pro', 'CameraID': self.id,
+            'MaxHeight': self.module.MAX_HEIGHT, 'MaxWidth': self.module.MAX_WIDTH,
+            'IsColorCam': False, 'PixelSize': 2.4, 'MechanicalShutter': False,
+            'SupportedBins': [1, 2, 3, 4], 'SupportedVideoFormat': [0, 2]
+        }
+
+    def get_controls(self):
+        return {
+            'BandWidth': {'MinValue': 40, 'ControlType': self.module.ASI_BANDWIDTHOVERLOAD},
+            'Exposure': {'MinValue': 32, 'ControlType': self.module.ASI_EXPOSURE},
+            'Gain': {'MinValue': 0, 'ControlType': self.module.ASI_GAIN},
+        }
+
+    def get_control_value(self, control_type):
+        self.calls += 1
+        return [self.controls.get(control_type, 0), False]
+
+    def set_control_value(self, control_type, value, auto=False):
+        self.controls[control_type] = value
+
+    def get_control_values(self):
+        return {'Exposure': self.controls[self.module.ASI_EXPOSURE],
+                'Gain': self.controls[self.module.ASI_GAIN]}
+
+    def set_image_type(self, image_type):
+        self.roi_format[3] = image_type
+
+    def disable_dark_subtract(self):
+        pass
+
+    def get_roi_format(self):
+        self.calls += 1
+        return list(self.roi_format)
+
+    def set_roi(self, start_x=None, start_y=None, width=None, height=None, bins=None, image_type=None):
+        if self.video_running:
+            raise self.module.ZWO_IOError('Video mode active')
+        bins = bins or self.roi_format[2]
+        self.roi_format = [width, height, bins, self.roi_format[3] if image_type is None else image_type]
+        self.start_position = [start_x, start_y]
+
+    def get_roi(self):
+        self.calls += 1
+        return self.start_position + self.roi_format[:2]
+
+    def _frame(self):
+        width, height = self.roi_format[:2]
+        self.frame_counter += 1
+        if self.roi_format[3] in (self.module.ASI_IMG_RAW8, self.module.ASI_IMG_Y8):
+            return np.full((height, width), self.frame_counter % 256, dtype=np.uint8)
+        return np.full((height, width), self.frame_counter % 65536, dtype=np.uint16)
+
+    def get_roi_start_position(self):
+        self.calls += 1
+        return list(self.start_position)
+
+    def start_exposure(self, is_dark=False):
+        self.exposure_started = time.monotonic()
+
+    def stop_exposure(self):
+        pass
+
+    def get_exposure_status(self):
+        elapsed = time.monotonic() - self.exposure_started
+        if elapsed < self.controls[self.module.ASI_EXPOSURE] / 1e6:
+            return self.module.ASI_EXP_WORKING
+        return self.module.ASI_EXP_SUCCESS
+
+    def get_data_after_exposure(self, buffer_=None):
+        frame = self._frame()
+        if buffer_ is None:
+            buffer_ = bytearray(frame.nbytes)
+        np.frombuffer(buffer_, dtype=frame.dtype)[:] = frame.ravel()
+        return buffer_
+
+    def start_video_capture(self):
+        self.video_running = True
+
+    def stop_video_capture(self):
+        self.video_running = False
+
+    def get_video_data(self, timeout=None, buffer_=None):
+        if not self.video_running:
+            raise self.module.ZWO_IOError('Video mode not active')
+        threading.Event().wait(self.controls[self.module.ASI_EXPOSURE] / 1e6)
+        frame = self._frame()
+        if buffer_ is None:
+            buffer_ = bytearray(frame.nbytes)
+        np.frombuffer(buffer_, dtype=frame.dtype)[:] = frame.ravel()
+        return buffer_
+
+    def get_dropped_frames(self):
+        return 0
+
+
+class FakeZWOASI:
+    """Namespace mimicking the parts of the zwoasi module the camera uses"""
+    ASI_IMG_RAW8 = 0
+    ASI_IMG_RAW16 = 2
+    ASI_IMG_Y8 = 3
+    ASI_GAIN = 0
+    ASI_EXPOSURE = 1
+    ASI_GAMMA = 2
+    ASI_BRIGHTNESS = 5
+    ASI_BANDWIDTHOVERLOAD = 6
+    ASI_FLIP = 9
+    ASI_EXP_WORKING = 1
+    ASI_EXP_SUCCESS = 2
+    MAX_WIDTH = 64
+    MAX_HEIGHT = 32
+
+    class ZWO_IOError(Exception):
+        pass
+
+    def __init__(self):
+        self.cameras = []
+
+    def init(self, library_file=None):
+        pass
+
+    def get_num_cameras(self):
+        return 1
+
+    def list_cameras(self):
+        return ['ZWO ASI183MM Pro']
+
+    def Camera(self, id_):
+        camera = FakeASICamera(self, id_)
+        self.cameras.append(camera)
+        return camera
+
+
+@pytest.fixture
+def fake_asi(monkeypatch):
+    """Replace the zwoasi module used by camera.py with a synthetic one"""
+    import camera
+    module = FakeZWOASI()
+    monkeypatch.setattr(camera, 'asi', module)
+    return module
+
+
+@pytest.fixture
+def connected_camera(fake_asi, monkeypatch):
+    """An ASI183Camera connected to the fake SDK (driver settle delays skipped)"""
+    import camera
+    with monkeypatch.context() as m:
+        m.setattr(camera.time, 'sleep', lambda seconds: None)
+        cam = camera.ASI183Camera(sdk_path='fake')
+        assert cam.connect()
+    yield cam
+    cam.disconnect()
+
+
+@pytest.fixture
+def sdk_path():
+    """SDK library for the hardware test script; skipped when no camera SDK is configured"""
+    path = os.getenv('ZWO_ASI_LIB')
+    if not path or not os.path.exists(path):
+        pytest.skip("ZWO_ASI_LIB not set; hardware camera test skipped")
+    return path
+
+
+@pytest.fixture
+def isolated_settings(tmp_path, monkeypatch):
+    """The global settings manager, redirected to copies of the config files in tmp_path"""
+    import shutil
+    from settings_manager import settings_manager
+    default_path = tmp_path / 'default_settings.json'
+    shutil.copy(project_root / 'config' / 'default_settings.json', default_path)
+    monkeypatch.setattr(settings_manager, 'default_path', default_path)
+    monkeypatch.setattr(settings_manager, 'current_path', tmp_path / 'current_settings.json')
+    monkeypatch.setattr(settings_manager, 'settings', {})
+    settings_manager.load_settings()
+    yield settings_manager
+    # Write pending changes before the paths are restored
+    settings_manager.flush()
+
+
+@pytest.fixture
+def spectrometer(fake_asi, isolated_settings, monkeypatch):
+    """A Spectrometer connected to the fake SDK with a sensor-sized ROI and 1ms exposure"""
+    import camera
+    from spectrometer import Spectrometer
+    isolated_settings.update_settings({
+        'exposure_ms': 1,
+        'roi': {'start_x': 0, 'start_y': 0, 'width': fake_asi.MAX_WIDTH,
+                'height': fake_asi.MAX_HEIGHT, 'binning': 1}
+    }, 'camera')
+    with monkeypatch.context() as m:
+        m.setattr(camera.time, 'sleep', lambda seconds: None)
+        spec = Spectrometer(sdk_path='fake')
+        assert spec.connect()
+    yield spec
+    spec.disconnect()
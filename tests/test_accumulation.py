@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Tests for multi-frame accumulation"""
+import numpy as np
+import pytest
+
+from accumulation import SpectrumAccumulator
+
+
+def test_running_statistics_match_numpy():
+    rng = np.random.default_rng(1)
+    frames = rng.normal(1000.0, 25.0, size=(50, 128))
+    accumulator = SpectrumAccumulator(128)
+    for frame in frames:
+        accumulator.add(frame)
+
+    np.testing.assert_allclose(accumulator.mean, frames.mean(axis=0))
+    np.testing.assert_allclose(accumulator.std(), frames.std(axis=0, ddof=1))
+    assert accumulator.get_stats()["frames"] == 50
+
+
+def test_cosmic_ray_is_left_out_of_its_pixel_only():
+    rng = np.random.default_rng(2)
+    frames = rng.normal(500.0, 5.0, size=(20, 64))
+    frames[10, 7] += 4000.0  # cosmic-ray hit
+
+    plain = SpectrumAccumulator(64)
+    rejecting = SpectrumAccumulator(64, reject_cosmic_rays=True, sigma=6.0, noise_floor=5.0)
+    for frame in frames:
+        plain.add(frame)
+        rejecting.add(frame)
+
+    clean = np.delete(frames[:, 7], 10)
+    assert rejecting.count[7] == 19
+    assert rejecting.mean[7] == pytest.approx(clean.mean())
+    assert rejecting.std()[7] == pytest.approx(clean.std(ddof=1))
+    assert plain.mean[7] > rejecting.mean[7] + 150
+    assert rejecting.get_stats()["rejected_pixels"] == 1
+
+    # All other pixels keep every frame
+    others = np.delete(np.arange(64), 7)
+    np.testing.assert_allclose(rejecting.mean[others], frames[:, others].mean(axis=0))
+
+
+def test_rejects_wrong_width():
+    with pytest.raises(ValueError):
+        SpectrumAccumulator(10).add(np.zeros(11))
+
+
+def test_spectrometer_accumulates_from_stream(spectrometer):
+    result = spectrometer.acquire_accumulated(5, keep_last_frame=True)
+
+    assert result["frames"] == 5
+    width = spectrometer.roi_settings["width"]
+    assert result["intensities"].shape == (width,)
+    assert result["wavelengths"].shape == (width,)
+    # Fake frames are uniform and count up, so every pixel sees the same series
+    assert np.all(result["std"] > 0)
+    assert np.ptp(result["std"]) == 0
+    assert result["last_frame"].max() >= result["intensities"][0]
+    # Continuous capture is only running while accumulating
+    assert not spectrometer.camera.is_continuous
+
+
+def test_accumulate_query_parameter(spectrometer, monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    monkeypatch.setattr(api, "spectrometer", spectrometer)
+    client = TestClient(api.app)
+    body = client.get("/acquire/spectrum?accumulate=4&include_image=false").json()
+    assert body["frames"] == 4
+    assert len(body["std"]) == len(body["intensities"])
+
+    single = client.get("/acquire/spectrum?include_image=false").json()
+    assert single["frames"] == 1
+    assert single["std"] is None
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Tests for baseline correction"""
+import numpy as np
+import pytest
+
+from baseline import BaselineCorrector
+
+
+def synthetic(width=2000):
+    x = np.arange(width, dtype=float)
+    background = 500 + 0.2 * x + 1e-4 * (x - width / 3) ** 2
+    peaks = sum(400 * np.exp(-((x - c) / 6) ** 2) for c in (width * 0.2, width * 0.5, width * 0.8))
+    noise = np.random.default_rng(1).normal(0, 2, width)
+    return background, background + peaks + noise
+
+
+def test_linear_removes_a_sloped_background():
+    corrector = BaselineCorrector()
+    spectrum = 100 + 0.5 * np.arange(100)
+    spectrum[50] += 40
+    corrected = corrector.correct(spectrum, "linear")
+    assert np.allclose(np.delete(corrected, 50), 0)
+    assert corrected[50] == pytest.approx(40)
+
+
+@pytest.mark.parametrize("method", ["polynomial", "als"])
+def test_curved_background_is_recovered_under_peaks(method):
+    corrector = BaselineCorrector(als_lambda=1e6)
+    background, spectrum = synthetic()
+    baseline = corrector.baseline(spectrum, method, degree=3)
+    assert np.sqrt(np.mean((baseline - background) ** 2)) < 15
+    corrected = corrector.correct(spectrum, method, degree=3)
+    assert corrected.max() > 350
+
+
+def test_precomputed_matrices_are_cached_per_width():
+    corrector = BaselineCorrector()
+    _, spectrum = synthetic()
+    corrector.baseline(spectrum, "polynomial", degree=3)
+    corrector.baseline(spectrum, "polynomial", degree=3)
+    corrector.baseline(spectrum[:1000], "polynomial", degree=3)
+    stats = corrector.get_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+@pytest.mark.parametrize("width", [3, 4, 5, 9])
+def test_als_penalty_matches_the_second_difference_operator(width):
+    band = BaselineCorrector()._penalty(width, 1.0)
+    d = np.diff(np.eye(width), 2, axis=0)
+    expected = d.T @ d
+    for offset in range(3):
+        assert np.allclose(band[2 - offset, offset:], np.diag(expected, offset))
+
+
+def test_invalid_settings_are_rejected(spectrometer):
+    with pytest.raises(ValueError):
+        BaselineCorrector().correct(np.ones(10), "spline")
+    with pytest.raises(ValueError):
+        spectrometer.set_processing_settings(baseline_correction="polynomial", polynomial_degree=40)
+    with pytest.raises(ValueError):
+        spectrometer.set_processing_settings(baseline_correction="als", als_asymmetry=2.0)
+    assert spectrometer.baseline_correction == "none"
+
+
+def test_process_spectrum_applies_the_setting(spectrometer):
+    frame = np.tile(np.arange(64, dtype=np.uint16) * 10 + 100, (32, 1))
+    _, plain = spectrometer.process_spectrum(frame, subtract_dark=False)
+    assert plain[0] == 100
+
+    spectrometer.set_processing_settings(baseline_correction="linear")
+    _, corrected = spectrometer.process_spectrum(frame, subtract_dark=False)
+    assert np.allclose(corrected, 0)
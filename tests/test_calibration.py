@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Tests for calibration polynomial evaluation and the spectral axis cache"""
+import numpy as np
+import pytest
+
+from calibration import (
+    CalibrationAxisCache, CalibrationNotInvertibleError, InverseCalibration, evaluate_polynomial
+)
+
+
+def test_horner_matches_power_series():
+    coefficients = [400.0, 0.5, -1e-5, 3e-9]
+    pixels = np.arange(100)
+    expected = sum(c * pixels ** i for i, c in enumerate(coefficients))
+    np.testing.assert_allclose(evaluate_polynomial(coefficients, pixels), expected)
+    assert evaluate_polynomial([], pixels).shape == pixels.shape
+
+
+def test_axis_cache_reuses_read_only_axis():
+    cache = CalibrationAxisCache()
+    first = cache.get_wavelength_axis([400.0, 0.5], 10)
+    second = cache.get_wavelength_axis([400.0, 0.5], 10)
+    assert first is second
+    assert not first.flags.writeable
+    with pytest.raises(ValueError):
+        first[0] = 0
+
+    # Any change to the calibration or ROI geometry rebuilds the axis
+    assert cache.get_wavelength_axis([400.0, 0.5], 10, start_x=8) is not first
+    assert cache.get_stats()["generation"] == 2
+
+
+def test_axis_cache_derived_axes():
+    cache = CalibrationAxisCache()
+    axes = cache.get_axes([500.0, 1.0], 5, laser_wavelength=500.0)
+    np.testing.assert_allclose(axes["wavenumber"], 1e7 / axes["wavelength"])
+    assert axes["raman_shift"][0] == pytest.approx(0.0)
+    assert np.all(np.diff(axes["raman_shift"]) > 0)
+
+    shifted = cache.get_axes([500.0, 1.0], 5, laser_wavelength=400.0)
+    assert shifted["wavelength"] is axes["wavelength"]
+    assert shifted["raman_shift"][0] == pytest.approx(1e7 / 400.0 - 1e7 / 500.0)
+
+
+def test_spectrometer_axis_follows_calibration_and_roi(spectrometer):
+    wavelengths, intensities = spectrometer.acquire_spectrum()
+    assert len(wavelengths) == len(intensities) == 64
+    assert spectrometer.get_wavelength_axis() is wavelengths
+
+    spectrometer.set_wavelength_calibration([400.0, 0.5])
+    wavelengths, _ = spectrometer.acquire_spectrum()
+    assert wavelengths[2] == pytest.approx(401.0)
+
+    spectrometer.set_roi(0, 0, 32, 8, 1)
+    wavelengths, intensities = spectrometer.acquire_spectrum()
+    assert len(wavelengths) == len(intensities) == 32
+
+
+def test_inverse_calibration_round_trip():
+    coefficients = [400.0, 0.05, 2e-6, -1e-10]
+    inverse = InverseCalibration(coefficients, 5496)
+    pixels = np.random.default_rng(2).uniform(0, 5495, size=10000)
+    recovered = inverse.to_pixel(evaluate_polynomial(coefficients, pixels))
+    np.testing.assert_allclose(recovered, pixels, atol=1e-6)
+    assert inverse.to_pixel([evaluate_polynomial(coefficients, [10.4])[0]], rounded=True)[0] == 10
+
+
+def test_inverse_calibration_decreasing_and_extrapolated():
+    inverse = InverseCalibration([900.0, -0.1, -1e-6], 1000)
+    assert not inverse.increasing
+    np.testing.assert_allclose(inverse.to_pixel([900.0, 900.1]), [0.0, -1.0], atol=1e-3)
+
+
+def test_inverse_calibration_rejects_non_monotone():
+    with pytest.raises(CalibrationNotInvertibleError):
+        InverseCalibration([400.0, 1.0, -0.001], 1000)  # Turns over at pixel 500
+
+
+def test_spectrometer_wavelength_to_pixel(spectrometer):
+    spectrometer.set_wavelength_calibration([400.0, 0.5, 1e-4])
+    wavelengths = spectrometer.pixel_to_wavelength(np.array([3, 17]))
+    np.testing.assert_array_equal(spectrometer.wavelength_to_pixel(wavelengths), [3, 17])
+    inverse = spectrometer.axis_cache.get_inverse([400.0, 0.5, 1e-4], 64)
+    assert spectrometer.axis_cache.get_inverse([400.0, 0.5, 1e-4], 64) is inverse
+
+    spectrometer.set_wavelength_calibration([400.0, 1.0, -0.05])
+    with pytest.raises(CalibrationNotInvertibleError):
+        spectrometer.wavelength_to_pixel(np.array([405.0]))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Tests for continuous (video mode) acquisition against a simulated zwoasi module"""
+import time
+
+import numpy as np
+import pytest
+
+from frame_buffer import FrameRingBuffer
+
+
+def test_ring_buffer_sequential_reads():
+    ring = FrameRingBuffer((2, 3), size=3)
+    for value in range(5):
+        slot = ring.begin_write()
+        slot.array[:] = value
+        ring.commit_write(slot)
+
+    # Only the newest three frames survive; the two oldest were never read
+    seq, _, frame = ring.read(after_seq=-1, timeout=0)
+    assert seq == 2 and np.all(frame == 2)
+    seq, _, frame = ring.read(after_seq=seq, timeout=0)
+    assert seq == 3 and np.all(frame == 3)
+    assert ring.get_stats()["frames_overwritten"] == 2
+
+    seq, _, frame = ring.read_latest(timeout=0)
+    assert seq == 4 and np.all(frame == 4)
+    with pytest.raises(TimeoutError):
+        ring.read(after_seq=4, timeout=0.01)
+
+
+def test_ring_buffer_hides_slot_being_written():
+    ring = FrameRingBuffer((2, 2), size=2)
+    for _ in range(2):
+        ring.commit_write(ring.begin_write())
+    ring.begin_write()  # Producer now owns the slot holding seq 0
+    seq, _, _ = ring.read(after_seq=-1, timeout=0)
+    assert seq == 1
+
+
+def test_ring_buffer_view_is_read_only():
+    ring = FrameRingBuffer((2, 2), size=2)
+    ring.commit_write(ring.begin_write())
+    _, _, frame = ring.read(copy=False, timeout=0)
+    with pytest.raises(ValueError):
+        frame[0, 0] = 1
+
+
+def test_continuous_capture_streams_distinct_frames(connected_camera):
+    cam = connected_camera
+    cam.set_roi(0, 0, 16, 8, 1)
+    cam.start_continuous(ring_size=3)
+    assert cam.is_continuous
+
+    first = cam.capture_raw()
+    second = cam.capture_raw()
+    assert first.shape == (8, 16) and first.dtype == np.uint16
+    assert second[0, 0] > first[0, 0]
+
+    stats = cam.get_continuous_stats()
+    assert stats["running"] and stats["frames_written"] >= 2
+
+    cam.stop_continuous()
+    assert not cam.is_continuous
+
+
+def test_continuous_capture_restarts_on_roi_change(connected_camera):
+    cam = connected_camera
+    cam.start_continuous()
+    cam.set_roi(0, 0, 32, 4, 1)
+    assert cam.is_continuous
+    assert cam.read_continuous_frame(latest=True).shape == (4, 32)
+
+
+def test_failing_video_reads_back_off(connected_camera, fake_asi):
+    cam = connected_camera
+    cam.set_roi(0, 0, 16, 8, 1)
+    cam.start_continuous()
+    cam.capture_raw()
+    # An unplugged camera fails every read immediately
+    fake_asi.cameras[-1].video_running = False
+    time.sleep(0.3)
+    errors = cam.get_continuous_stats()["errors"]
+    assert 1 <= errors <= 10
+
+    fake_asi.cameras[-1].video_running = True
+    assert cam.read_continuous_frame(timeout=3).shape == (8, 16)
+    cam.stop_continuous()
+
+
+def test_continuous_capture_runs_at_sensor_rate(connected_camera):
+    cam = connected_camera
+    cam.set_roi(0, 0, 16, 8, 1)
+    cam.set_exposure(1)
+    cam.start_continuous()
+    start = time.monotonic()
+    for _ in range(20):
+        cam.capture_raw()
+    elapsed = time.monotonic() - start
+    # 1ms exposures back to back, with no per-frame snapshot overhead
+    assert elapsed < 1.0
+
+
+def test_snapshot_capture_uses_cached_state(connected_camera, fake_asi):
+    cam = connected_camera
+    cam.set_roi(0, 0, 16, 8, 1)
+    cam.set_exposure(1)
+    cam.set_gain(5)
+    assert cam.get_state()["exposure_us"] == 1000 and cam.get_state()["gain"] == 5
+
+    sdk = fake_asi.cameras[0]
+    queries_before = sdk.calls
+    frame = cam.capture_raw()
+    assert frame.shape == (8, 16)
+    # No control value or ROI queries on the per-frame path
+    assert sdk.calls == queries_before
+    calls = cam.get_sdk_call_counts()["last_capture"]
+    assert calls["start_exposure"] == 1 and calls["get_data_after_exposure"] == 1
+    assert "get_control_value" not in calls and "get_roi_format" not in calls
+
+
+def test_reconcile_state_adopts_hardware_values(connected_camera, fake_asi):
+    cam = connected_camera
+    fake_asi.cameras[0].controls[fake_asi.ASI_GAIN] = 42
+    drift = cam.reconcile_state()
+    assert drift == {"gain": (0, 42)}
+    assert cam.get_state()["gain"] == 42
+    assert cam.reconcile_state() == {}
+
+    # Status reports say how old the control values are; reconciling refreshes them
+    cam.control_values_read_at -= 100
+    assert cam.get_cached_info()["settings_age_s"] >= 100
+    cam.reconcile_state()
+    assert cam.get_cached_info()["settings_age_s"] < 1
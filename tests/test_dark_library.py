@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Tests for master dark stacking and the dark library"""
+import numpy as np
+import pytest
+
+from dark_library import DarkStacker, DarkLibrary
+
+
+def test_stacking_rejects_outliers_in_blocks():
+    rng = np.random.default_rng(0)
+    frames = rng.normal(100, 3, size=(9, 20, 12)).round().astype(np.uint16)
+    frames[4, 5, 5] = 60000   # Cosmic-ray hit
+    for method in ("median", "sigma_clip"):
+        # Two rows per block
+        with DarkStacker((20, 12), np.uint16, method=method, block_bytes=9 * 12 * 4 * 2) as stacker:
+            for frame in frames:
+                stacker.add(frame)
+            master = stacker.result()
+        assert master.dtype == np.uint16
+        assert abs(int(master[5, 5]) - 100) < 10
+        if method == "median":
+            np.testing.assert_array_equal(master, np.rint(np.median(frames, axis=0)))
+    assert stacker.rejected >= 1
+
+    with pytest.raises(ValueError):
+        DarkStacker((20, 12), method="mean")
+
+
+def test_library_matching(tmp_path):
+    library = DarkLibrary(tmp_path, temperature_tolerance_c=2.0, max_exposure_ratio=2.0)
+    short = np.full((10, 20), 100, dtype=np.uint16)
+    long = np.full((10, 20), 300, dtype=np.uint16)
+    library.add(short, exposure_us=1000, gain=10, temperature_c=-10.0)
+    library.add(long, exposure_us=3000, gain=10, temperature_c=-10.0)
+
+    dark, info = library.match((10, 20), np.uint16, exposure_us=1000, gain=10, temperature_c=-10.4)
+    assert info["match"] == "exact" and (dark == 100).all()
+    # Between the two exposures the dark is interpolated per pixel
+    dark, info = library.match((10, 20), np.uint16, exposure_us=2000, gain=10)
+    assert info["match"] == "interpolated" and (dark == 200).all()
+    # A smaller ROI inside a dark's ROI is a crop of it
+    dark, info = library.match((4, 6), np.uint16, exposure_us=1000, gain=10, start_x=3, start_y=2)
+    assert dark.shape == (4, 6) and info["match"] == "exact"
+
+    assert library.match((10, 20), np.uint16, exposure_us=1000, gain=20) is None
+    assert library.match((10, 20), np.uint16, exposure_us=1000, gain=10, temperature_c=0.0) is None
+    assert library.match((10, 20), np.uint16, exposure_us=1000, gain=10, start_x=5) is None
+    assert library.match((10, 20), np.uint16, exposure_us=100000, gain=10) is None
+
+    # The library is read back from disk; adding the same settings replaces the dark
+    reopened = DarkLibrary(tmp_path)
+    assert len(reopened.entries()) == 2
+    reopened.add(short + 1, exposure_us=1000, gain=10, temperature_c=-10.2)
+    assert len(reopened.entries()) == 2
+    assert reopened.remove(reopened.entries()[0]["id"]) and len(DarkLibrary(tmp_path).entries()) == 1
+
+
+def test_processing_picks_the_library_dark(spectrometer, tmp_path):
+    spectrometer.dark_library = DarkLibrary(tmp_path)
+    spectrometer.subtract_dark = True
+    frame = np.full((32, 64), 500, dtype=np.uint16)
+
+    # Stacked from the fake camera's frames (values 1..5), saved for this exposure
+    dark = spectrometer.acquire_dark_frame(n_frames=5, method="median", save=True)
+    assert (dark == 3).all() and spectrometer.dark_frame_info["library_id"]
+    _, spectrum = spectrometer.process_spectrum(frame)
+    assert np.allclose(spectrum, 497)
+
+    # After an exposure change the acquired dark no longer applies; a library dark does
+    spectrometer.dark_library.add(np.full((32, 64), 40, dtype=np.uint16), exposure_us=2000, gain=0)
+    spectrometer.set_exposure(2, skip_save=True)
+    _, spectrum = spectrometer.process_spectrum(frame)
+    assert np.allclose(spectrum, 460)
+    assert spectrometer.get_dark_status()["selected"]["source"] == "library"
+    assert spectrometer.dark_available()
+
+    spectrometer.set_gain(100, skip_save=True)
+    _, spectrum = spectrometer.process_spectrum(frame)
+    assert np.allclose(spectrum, 500) and not spectrometer.dark_available()
+
+
+def test_average_mode_subtracts_the_dark_spectrum(spectrometer):
+    rng = np.random.default_rng(2)
+    frame = rng.integers(200, 4000, size=(32, 64), dtype=np.uint16)
+    spectrometer.dark_frame = rng.integers(0, 200, size=(32, 64), dtype=np.uint16)
+    spectrometer.subtract_dark = True
+    expected = (frame.astype(float) - spectrometer.dark_frame).mean(axis=0)
+
+    # The dark's column mean is computed once and subtracted after the reduction
+    _, spectrum = spectrometer.process_spectrum(frame)
+    np.testing.assert_allclose(spectrum, expected)
+    assert spectrometer.get_dark_status()["path"] == "spectrum"
+    dark = spectrometer.select_dark(frame.shape, frame.dtype)
+    assert spectrometer.dark_spectrum(dark) is spectrometer.dark_spectrum(dark)
+
+    # Per-pixel clipping and maximum mode need the 2D dark
+    spectrometer.dark_frame[0] = 60000
+    spectrometer.set_processing_settings(clip_dark_pixels=True)
+    _, spectrum = spectrometer.process_spectrum(frame)
+    clipped = np.clip(frame.astype(float) - spectrometer.dark_frame, 0, None).mean(axis=0)
+    np.testing.assert_allclose(spectrum, clipped)
+    spectrometer.set_processing_settings(readout_mode="maximum", clip_dark_pixels=False)
+    spectrometer.process_spectrum(frame)
+    status = spectrometer.get_dark_status()
+    assert status["path"] == "frame" and status["paths"] == {"spectrum": 1, "frame": 2, "none": 0}
+
+
+def test_captures_report_whether_the_dark_was_subtracted(spectrometer):
+    import api
+    from kinetics import KineticSeries
+
+    spectrometer.subtract_dark = True
+    # A dark for another ROI is not used, so the spectra must not be flagged
+    spectrometer.dark_frame = np.full((16, 16), 2, dtype=np.uint16)
+    assert not api._capture_spectrum(spectrometer, None, None, False)["dark_subtracted"]
+    spectrometer.dark_frame = np.full((32, 64), 2, dtype=np.uint16)
+    assert api._capture_spectrum(spectrometer, None, None, False)["dark_subtracted"]
+    assert api._capture_spectrum(spectrometer, False, None, False, accumulate=2)["dark_subtracted"] is False
+    assert KineticSeries(spectrometer, interval_s=1.0)._acquire()["dark_subtracted"]
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Tests for the lookup-table display normalization"""
+import numpy as np
+import pytest
+
+from display import DisplayNormalizer
+
+
+def test_percentile_stretch_ignores_hot_pixels():
+    frame = np.tile(np.arange(1000, 2000, dtype=np.uint16), (100, 1))
+    frame[::10, ::10] = 65535
+    normalizer = DisplayNormalizer(low_percentile=1, high_percentile=98)
+
+    image = normalizer.normalize(frame)
+
+    assert image.dtype == np.uint8 and image.shape == frame.shape
+    lo, hi = normalizer.last_limits
+    assert 1000 <= lo < 1020 and 1960 < hi < 2000
+    assert image[1, 0] == 0 and image[1, -1] == 255
+    # A min/max stretch would have squeezed the real signal into a few grey levels
+    assert len(np.unique(image[1])) > 200
+
+
+def test_lut_is_monotonic_and_cached():
+    normalizer = DisplayNormalizer(gamma=2.2)
+    lut = normalizer.lut(100, 4000)
+    assert lut.shape == (65536,) and lut.dtype == np.uint8
+    assert lut[100] == 0 and lut[4000] == 255 and lut[-1] == 255
+    assert np.all(np.diff(lut.astype(np.int16)) >= 0)
+    # Gamma lifts the mid tones above the linear mapping
+    assert lut[2050] > 128
+
+    assert normalizer.lut(100, 4000) is lut
+    assert normalizer.get_info()["lut_hits"] == 1
+    normalizer.configure(log_scale=True)
+    assert normalizer.lut(100, 4000) is not lut
+
+
+def test_uint8_frames_and_flat_frames():
+    normalizer = DisplayNormalizer()
+    flat = np.full((8, 8), 7, dtype=np.uint8)
+    assert normalizer.lut_for(flat).shape == (256,)
+    assert not normalizer.normalize(flat).any()
+
+    out = np.empty((8, 8), dtype=np.uint8)
+    assert normalizer.normalize(flat, out=out) is out
+
+
+def test_invalid_settings_are_rejected():
+    with pytest.raises(ValueError):
+        DisplayNormalizer(low_percentile=90, high_percentile=10)
+    with pytest.raises(ValueError):
+        DisplayNormalizer(gamma=0)
+    with pytest.raises(ValueError):
+        DisplayNormalizer().lut_for(np.zeros((2, 2), dtype=np.float32))
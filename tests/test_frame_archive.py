@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Tests for the raw frame archive"""
+import io
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from frame_archive import FrameArchive, FrameArchiveWriter, read_archive, index_path, HEADER_SIZE
+
+
+def make_frames(count, shape=(8, 16), seed=0):
+    return np.random.default_rng(seed).integers(0, 4096, size=(count,) + shape, dtype=np.uint16)
+
+
+def test_round_trip_is_memory_mapped(tmp_path):
+    frames = make_frames(5)
+    archive = FrameArchive(tmp_path / "run.raw", shape=frames.shape[1:])
+    for i, frame in enumerate(frames):
+        assert archive.append(frame, timestamp=10.0 + i, exposure_us=2000, gain=50, binning=2) == i
+    archive.close()
+
+    data = read_archive(tmp_path / "run.raw")
+    assert isinstance(data["frames"], np.memmap)
+    np.testing.assert_array_equal(data["frames"], frames)
+    assert list(data["meta"]["timestamp"]) == [10.0 + i for i in range(5)]
+    assert list(data["meta"]["offset"]) == [HEADER_SIZE + i * frames[0].nbytes for i in range(5)]
+    assert set(data["meta"]["binning"]) == {2} and np.isnan(data["meta"]["temperature_c"]).all()
+
+    # Reopening appends after the existing frames and keeps the shape
+    archive = FrameArchive(tmp_path / "run.raw")
+    assert archive.count == 5 and archive.shape == (8, 16)
+    with pytest.raises(ValueError):
+        archive.append(np.zeros((4, 4), dtype=np.uint16))
+    with pytest.raises(ValueError):
+        FrameArchive(tmp_path / "run.raw", shape=(4, 4))
+    archive.close()
+
+
+def test_incomplete_tail_is_dropped(tmp_path):
+    frames = make_frames(3)
+    archive = FrameArchive(tmp_path / "run.raw", shape=frames.shape[1:])
+    for frame in frames:
+        archive.append(frame)
+    archive.close()
+    # A crash after writing part of a frame, and after a frame without its index record
+    with open(tmp_path / "run.raw", "ab") as f:
+        f.write(frames[0].tobytes() + b"\1" * 10)
+    with open(index_path(tmp_path / "run.raw"), "ab") as f:
+        f.write(b"\0" * 7)
+
+    assert len(read_archive(tmp_path / "run.raw")["frames"]) == 3
+    archive = FrameArchive(tmp_path / "run.raw")
+    assert archive.count == 3
+    assert os.path.getsize(tmp_path / "run.raw") == HEADER_SIZE + 3 * frames[0].nbytes
+    archive.append(frames[1])
+    archive.close()
+    np.testing.assert_array_equal(read_archive(tmp_path / "run.raw")["frames"][3], frames[1])
+
+
+def test_failed_append_leaves_no_stray_bytes(tmp_path):
+    frames = make_frames(3)
+    archive = FrameArchive(tmp_path / "run.raw", shape=frames.shape[1:])
+    archive.append(frames[0])
+
+    class FullDisk:
+        """Writes part of a frame, then fails like a full disk"""
+        def __init__(self, f):
+            self.f = f
+        def write(self, data):
+            self.f.write(bytes(data)[:100])
+            self.f.flush()
+            raise OSError("No space left on device")
+        def __getattr__(self, name):
+            return getattr(self.f, name)
+
+    archive._data = FullDisk(archive._data)
+    with pytest.raises(OSError):
+        archive.append(frames[1])
+    # The next frame lands at the offset its index record gives
+    assert archive.append(frames[2]) == 1
+    archive.close()
+    data = read_archive(tmp_path / "run.raw")
+    np.testing.assert_array_equal(data["frames"], frames[[0, 2]])
+    assert data["meta"]["offset"][1] == HEADER_SIZE + frames[0].nbytes
+
+
+def test_writer_copies_frames_and_drops_when_full(tmp_path):
+    frames = make_frames(6)
+    writer = FrameArchiveWriter(max_pending=2)
+    path = str(tmp_path / "run.raw")
+    gate = threading.Event()
+    writing = threading.Event()
+    archive = writer.get_archive(path, frames.shape[1:])
+    original_append = archive.append
+
+    def slow_append(*args, **kwargs):
+        writing.set()
+        gate.wait(5)
+        return original_append(*args, **kwargs)
+    archive.append = slow_append
+
+    buffer = frames[0].copy()
+    results = []
+    for i, frame in enumerate(frames):
+        buffer[:] = frame     # The caller reuses its buffer right away
+        results.append(writer.append(path, buffer, timestamp=1.0))
+        if i == 0:
+            assert writing.wait(5)
+    # One frame is being written, two wait, the rest are dropped
+    assert results == [True, True, True, False, False, False]
+    gate.set()
+    assert writer.flush(path, timeout=5)
+
+    stats = writer.get_stats()
+    assert stats["written"] == results.count(True) and stats["dropped"] == results.count(False)
+    written = read_archive(path)["frames"]
+    np.testing.assert_array_equal(written, frames[np.array(results)])
+
+    # A blocking append waits for the writer instead of dropping
+    gate.clear()
+    writing.clear()
+    assert writer.append(path, frames[0])
+    assert writing.wait(5)
+    assert writer.append(path, frames[1]) and writer.append(path, frames[2])
+    assert not writer.append(path, frames[3], block=True, timeout=0.05)
+    threading.Timer(0.1, gate.set).start()
+    assert writer.append(path, frames[4], block=True, timeout=5)
+    assert writer.flush(path, timeout=5)
+    np.testing.assert_array_equal(read_archive(path)["frames"][len(written):], frames[[0, 1, 2, 4]])
+    writer.close()
+
+
+def test_archive_endpoints(spectrometer, tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    monkeypatch.setattr(api, "spectrometer", spectrometer)
+    monkeypatch.setattr(api, "SPECTRA_DIR", tmp_path)
+    # A one-frame queue: the explicit save must wait for the writer rather than drop
+    monkeypatch.setattr(api, "frame_archive_writer", FrameArchiveWriter(max_pending=1))
+    client = TestClient(api.app)
+
+    body = client.post("/save/raw?filename=run&count=3").json()
+    assert body["filename"] == "run.raw" and body["frames"] == body["queued"] == 3
+    assert body["dropped"] == 0
+    assert client.get("/acquire/image?archive=run").status_code == 200
+
+    info = client.get("/raw/run.raw").json()
+    assert (info["frames"], info["height"], info["width"]) == (4, 32, 64)
+    assert info["meta"][0]["exposure_ms"] == 1.0
+
+    response = client.get("/raw/run.raw/3?format=npy")
+    assert response.status_code == 200
+    frame = np.load(io.BytesIO(response.content))
+    np.testing.assert_array_equal(frame, read_archive(tmp_path / "run.raw")["frames"][3])
+    assert client.get("/raw/run.raw/0").headers["content-type"] == "image/png"
+    assert client.get("/raw/run.raw/9").status_code == 404
+    assert client.get("/raw/missing.raw").status_code == 404
+    api.frame_archive_writer.close()
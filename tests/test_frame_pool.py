@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Tests for the preallocated frame buffer pool"""
+import numpy as np
+
+from frame_buffer import FramePool
+
+
+def test_pool_reuses_released_buffers():
+    pool = FramePool(max_per_key=2)
+    key = (8, 4, 1, 2)
+    frame = pool.acquire(key, (4, 8))
+    buffer_id = id(frame.buffer)
+    frame.release()
+
+    with pool.acquire(key, (4, 8)) as again:
+        assert id(again.buffer) == buffer_id
+        assert again.array.shape == (4, 8) and again.array.dtype == np.uint16
+        stats = pool.get_stats()
+        assert stats["in_use"] == 1 and stats["free"] == 0
+    assert pool.get_stats()["free"] == 1
+    assert pool.reuses == 1 and pool.allocations == 1
+
+
+def test_pool_overflow_and_clear():
+    pool = FramePool(max_per_key=1)
+    key = (8, 4, 1, 2)
+    first = pool.acquire(key, (4, 8))
+    second = pool.acquire(key, (4, 8))
+    assert pool.overflows == 1
+    first.release()
+    second.release()
+    second.release()  # Double release is harmless
+    stats = pool.get_stats()
+    assert stats["allocated"] == 1 and stats["free"] == 1 and stats["bytes"] == 64
+
+    pool.clear()
+    assert pool.get_stats()["allocated"] == 0
+
+
+def test_camera_captures_into_pooled_buffers(connected_camera):
+    cam = connected_camera
+    cam.set_roi(0, 0, 16, 8, 1)
+    with cam.capture_pooled() as frame:
+        first_buffer = frame.buffer
+        first_value = int(frame.array[0, 0])
+        assert frame.array.shape == (8, 16)
+
+    with cam.capture_pooled() as frame:
+        assert frame.buffer is first_buffer
+        assert int(frame.array[0, 0]) == first_value + 1
+
+    cam.start_continuous()
+    with cam.capture_pooled() as frame:
+        assert frame.buffer is first_buffer
+        assert frame.array.shape == (8, 16)
+    assert cam.frame_pool.get_stats()["in_use"] == 0
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Tests for the hardware executor and non-blocking API handlers"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from hardware_executor import HardwareExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = HardwareExecutor(name="test-hardware")
+    yield executor
+    executor.shutdown()
+
+
+def test_calls_run_in_order_on_one_thread(executor):
+    threads, order = set(), []
+
+    def job(i):
+        threads.add(threading.current_thread().name)
+        order.append(i)
+        return i * 2
+
+    futures = [executor.submit(job, i) for i in range(20)]
+    assert [f.result() for f in futures] == [i * 2 for i in range(20)]
+    assert order == list(range(20))
+    assert len(threads) == 1 and threads.pop().startswith("test-hardware")
+    assert executor.get_stats()["pending"] == 0
+
+
+def test_nested_submit_runs_inline(executor):
+    def outer():
+        return executor.submit(lambda: threading.get_ident()).result(timeout=1)
+
+    assert executor.submit(outer).result(timeout=1) == executor._thread_id
+
+
+def test_coalesced_requests_share_one_call(executor):
+    release = threading.Event()
+    calls = []
+
+    def capture():
+        calls.append(1)
+        release.wait(1)
+        return object()
+
+    first = executor.submit_coalesced("frame", capture)
+    second = executor.submit_coalesced("frame", capture)
+    assert first is second
+    release.set()
+    assert first.result(timeout=1) is second.result(timeout=1)
+    assert len(calls) == 1
+    assert executor.get_stats()["coalesced"] == 1
+
+    # Once the shared call has completed, a new request starts a new one
+    assert executor.submit_coalesced("frame", capture).result(timeout=1) is not first.result()
+    assert len(calls) == 2
+
+
+def test_failures_propagate_to_awaiting_coroutine(executor):
+    def broken():
+        raise RuntimeError("Camera not connected")
+
+    with pytest.raises(RuntimeError, match="not connected"):
+        asyncio.run(executor.run(broken))
+    assert executor.get_stats()["failed"] == 1
+
+
+def test_status_stays_responsive_during_exposure(spectrometer, monkeypatch):
+    import httpx
+    import api
+
+    hardware = HardwareExecutor()
+    monkeypatch.setattr(api, "hardware", hardware)
+    monkeypatch.setattr(api, "spectrometer", spectrometer)
+    spectrometer.set_exposure(400, skip_save=True)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            url = "/acquire/spectrum?include_image=false"
+            acquisitions = [asyncio.ensure_future(client.get(url)) for _ in range(3)]
+            await asyncio.sleep(0.05)
+
+            start = time.perf_counter()
+            status = await client.get("/status")
+            status_latency = time.perf_counter() - start
+            assert status.status_code == 200
+            assert not any(task.done() for task in acquisitions)
+
+            responses = await asyncio.gather(*acquisitions)
+            return status_latency, status.json(), responses
+
+    status_latency, status, responses = asyncio.run(scenario())
+    assert status_latency < 0.2
+    assert status["settings"]["Exposure"] == 400000 and status["settings"]["exposure_ms"] == 400
+    assert all(r.status_code == 200 for r in responses)
+    bodies = [r.json() for r in responses]
+    assert len({b["timestamp"] for b in bodies}) == 1
+    assert all(b["exposure_ms"] == 400 for b in bodies)
+    assert hardware.get_stats()["coalesced"] == 2
+    hardware.shutdown()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Tests for the kinetic series scheduler"""
+import time
+
+import numpy as np
+import pytest
+
+from hardware_executor import HardwareExecutor
+from kinetics import KineticSeries
+
+
+def run_series(spectrometer, **kwargs):
+    results = []
+    executor = HardwareExecutor()
+    series = KineticSeries(spectrometer, executor=executor, on_spectrum=[results.append], **kwargs)
+    try:
+        series.start()
+        assert series.wait(10)
+    finally:
+        executor.shutdown()
+    return series, results
+
+
+def test_series_keeps_a_fixed_cadence(spectrometer):
+    series, results = run_series(spectrometer, interval_s=0.03, count=8)
+
+    status = series.get_status()
+    assert status["state"] == "completed"
+    assert status["captured"] == 8 and status["missed"] == 0
+    assert [r["index"] for r in results] == list(range(8))
+    # Captures start on their slot deadlines, so there is no accumulated drift
+    for r in results:
+        assert abs(r["elapsed_s"] - r["slot"] * 0.03) < 0.02
+    assert status["max_jitter_ms"] < 20
+    assert np.all(np.diff([r["timestamp"] for r in results]) > 0)
+
+
+def test_overrunning_captures_skip_missed_slots(spectrometer, monkeypatch):
+    original = spectrometer.acquire_spectrum
+
+    def slow(**kwargs):
+        time.sleep(0.05)
+        return original(**kwargs)
+
+    monkeypatch.setattr(spectrometer, "acquire_spectrum", slow)
+    series, results = run_series(spectrometer, interval_s=0.02, count=4)
+
+    status = series.get_status()
+    assert status["captured"] == 4
+    assert status["missed"] >= 4 and status["overruns"] >= 3
+    slots = [r["slot"] for r in results]
+    assert slots == sorted(set(slots)) and slots[-1] >= 6
+
+
+def test_stop_and_accumulation(spectrometer):
+    executor = HardwareExecutor()
+    results = []
+    series = KineticSeries(spectrometer, interval_s=0.01, accumulate=3, executor=executor,
+                           on_spectrum=[results.append])
+    try:
+        series.start()
+        time.sleep(0.2)
+        series.stop()
+    finally:
+        executor.shutdown()
+    assert series.get_status()["state"] == "stopped"
+    assert results and all(r["frames"] == 3 for r in results)
+
+    with pytest.raises(ValueError):
+        KineticSeries(spectrometer, interval_s=0)
+
+
+def test_kinetic_endpoints_store_and_stream(spectrometer, tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+    from spectrum_store import SpectrumWriter, read_store
+    from streaming import decode_message, KIND_AXIS, KIND_SPECTRUM
+
+    monkeypatch.setattr(api, "spectrometer", spectrometer)
+    monkeypatch.setattr(api, "SPECTRA_DIR", tmp_path)
+    monkeypatch.setattr(api, "spectrum_writer", SpectrumWriter(flush_interval_s=60))
+    monkeypatch.setattr(api, "spectra_catalog", None)
+    monkeypatch.setattr(api, "kinetic_series", None)
+    # One event loop for all requests, as under uvicorn
+    with TestClient(api.app) as client, client.websocket_connect("/ws/kinetics") as ws:
+        response = client.post("/kinetics/start", json={"interval_ms": 20, "count": 5, "filename": "reaction"})
+        assert response.status_code == 200
+        assert client.post("/kinetics/start", json={"interval_ms": 20}).status_code == 409
+
+        header, _ = decode_message(ws.receive_bytes())
+        assert header["kind"] == KIND_AXIS
+        header, values = decode_message(ws.receive_bytes())
+        assert header["kind"] == KIND_SPECTRUM and len(values) == spectrometer.camera.state["width"]
+
+        assert api.kinetic_series.wait(5)
+
+    status = client.get("/kinetics").json()
+    assert status["filename"] == "reaction.spx"
+    assert status["status"]["captured"] == 5
+    data = read_store(tmp_path / "reaction.spx")
+    assert len(data["intensities"]) == 5
+    assert client.get("/spectra?prefix=reaction").json()["total"] == 5
+    api.spectrum_writer.close()
+
+
+def test_live_stream_is_refused_during_a_series(spectrometer, monkeypatch):
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    from starlette.websockets import WebSocketDisconnect
+    import api
+
+    monkeypatch.setattr(api, "spectrometer", spectrometer)
+    monkeypatch.setattr(api, "streamer", None)
+    monkeypatch.setattr(api, "kinetic_series", SimpleNamespace(running=True))
+    with TestClient(api.app).websocket_connect("/ws/spectrum") as ws:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_bytes()
+    assert closed.value.code == 1013
+    # No pipeline was started, so the camera stays in snapshot mode
+    assert api.streamer is None and not spectrometer.camera.is_continuous
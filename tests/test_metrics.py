@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Tests for the metrics registry and the /metrics endpoint"""
+import re
+
+from metrics import MetricsRegistry
+
+
+def sample(text, name, **labels):
+    """Value of one sample in a text exposition (None if absent)"""
+    label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    pattern = "^" + re.escape(name + (f"{{{label_text}}}" if labels else "")) + r" (\S+)$"
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_render_counters_gauges_and_histograms():
+    registry = MetricsRegistry()
+    calls = registry.counter("sdk_calls", "SDK calls", ("method",))
+    calls.labels("start_exposure").inc()
+    calls.labels(method="start_exposure").inc(2)
+    assert registry.counter("sdk_calls", "SDK calls", ("method",)) is calls
+
+    registry.gauge("queue_depth", "Queue depth", function=lambda: 3)
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        latency.observe(value)
+
+    text = registry.render()
+    assert "# TYPE sdk_calls counter" in text
+    assert sample(text, "sdk_calls_total", method="start_exposure") == 3
+    assert sample(text, "queue_depth") == 3
+    # Buckets are cumulative and end with +Inf
+    assert sample(text, "latency_seconds_bucket", le="0.1") == 1
+    assert sample(text, "latency_seconds_bucket", le="1") == 3
+    assert sample(text, "latency_seconds_bucket", le="+Inf") == 4
+    assert sample(text, "latency_seconds_count") == 4
+    assert sample(text, "latency_seconds_sum") == 6.05
+
+
+def test_metrics_endpoint_reports_acquisition_stages(spectrometer, monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    monkeypatch.setattr(api, "spectrometer", spectrometer)
+    client = TestClient(api.app)
+    before = sample(client.get("/metrics").text, "asi_capture_stage_seconds_count", stage="transfer") or 0
+    assert client.get("/acquire/spectrum?include_image=false").status_code == 200
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert sample(text, "asi_capture_stage_seconds_count", stage="transfer") == before + 1
+    assert sample(text, "asi_sdk_calls_total", method="get_data_after_exposure") >= 1
+    assert sample(text, "asi_transferred_bytes_total", mode="snapshot") >= 64 * 32 * 2
+    assert sample(text, "spectrometer_processing_seconds_count", stage="reduce", mode="average") >= 1
+    assert sample(text, "spectrometer_http_requests_total",
+                  method="GET", route="/acquire/spectrum", status="200") >= 1
+    assert sample(text, "spectrometer_json_render_seconds_count") >= 1
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Tests for the staged acquisition pipeline"""
+import threading
+import time
+
+import numpy as np
+
+from pipeline import AcquisitionPipeline, STAGE_NAMES
+
+
+def collect(spectrometer, count, delay_s=0.0, **kwargs):
+    """Run a pipeline until count results are published"""
+    results = []
+    done = threading.Event()
+
+    def publish(result):
+        time.sleep(delay_s)
+        results.append(result)
+        if len(results) >= count:
+            done.set()
+
+    pipeline = AcquisitionPipeline(spectrometer, publish, **kwargs)
+    start = time.perf_counter()
+    pipeline.start()
+    try:
+        assert done.wait(5)
+        elapsed = time.perf_counter() - start
+    finally:
+        pipeline.stop()
+    return pipeline, results[:count], elapsed
+
+
+def test_results_are_dark_corrected_and_in_order(spectrometer):
+    height, width = spectrometer.camera.state["height"], spectrometer.camera.state["width"]
+    spectrometer.dark_frame = np.full((height, width), 3, dtype=np.uint16)
+    spectrometer.subtract_dark = True
+
+    pipeline, results, _ = collect(spectrometer, 5)
+
+    assert [r["seq"] for r in results] == [1, 2, 3, 4, 5]
+    # Average mode subtracts the dark's column mean after the reduction
+    assert spectrometer.get_dark_status()["paths"]["spectrum"] >= 5
+    for result in results:
+        assert result["dark_subtracted"]
+        assert result["intensities"].shape == (width,)
+        assert result["wavelengths"] is spectrometer.get_wavelength_axis(width)
+        # Fake frames are uniform, so every pixel is the frame value minus the dark level
+        assert np.ptp(result["intensities"]) == 0
+        assert result["latency_ms"] > 0
+    # Continuous capture only runs while the pipeline does, and every buffer is returned
+    assert not spectrometer.camera.is_continuous
+    assert all(k["in_use"] == 0 for k in spectrometer.camera.frame_pool.get_stats()["keys"])
+
+
+def test_preview_gets_the_uncorrected_frame(spectrometer):
+    height, width = spectrometer.camera.state["height"], spectrometer.camera.state["width"]
+    spectrometer.dark_frame = np.full((height, width), 3, dtype=np.uint16)
+    spectrometer.subtract_dark = True
+    spectrometer.use_max = True     # The dark is subtracted from the frame in place
+
+    class Preview:
+        offered = []
+
+        def offer(self, frame):
+            self.offered.append(int(frame.max()))
+
+    _, results, _ = collect(spectrometer, 3, preview=Preview())
+    # Fake frames are uniform: the preview sees the raw value, the spectrum the corrected one
+    assert {int(r["intensities"][0]) + 3 for r in results} <= set(Preview.offered)
+
+
+def test_capture_overlaps_slow_publishing(spectrometer):
+    spectrometer.set_exposure(20, skip_save=True)
+
+    pipeline, results, elapsed = collect(spectrometer, 10, delay_s=0.02)
+
+    # Back to back, capture + publish would take 40 ms per spectrum
+    assert elapsed < 10 * 0.04 * 0.8
+    stats = pipeline.get_stats()
+    assert set(stats["stages"]) == set(STAGE_NAMES)
+    assert stats["stages"]["publish"]["mean_latency_ms"] >= 20
+
+
+def test_full_queues_hold_back_capture(spectrometer):
+    release = threading.Event()
+    pipeline = AcquisitionPipeline(spectrometer, lambda result: release.wait(5), queue_size=1)
+    pipeline.start()
+    try:
+        time.sleep(0.3)
+        stats = pipeline.get_stats()
+        # At most one item per stage and per queue; capture waits for room
+        assert stats["stages"]["capture"]["processed"] <= 4 + 3
+        assert stats["stages"]["capture"]["blocked_ms"] > 100
+        assert stats["stages"]["publish"]["queue_depth"] == 1
+    finally:
+        release.set()
+        pipeline.stop()
+
+    assert pipeline.get_stats()["published"] >= 1
+    assert all(k["in_use"] == 0 for k in spectrometer.camera.frame_pool.get_stats()["keys"])
+
+
+def test_capture_errors_are_counted_and_retried(spectrometer, monkeypatch):
+    calls = []
+    original = spectrometer.acquire_raw_frame
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("Exposure failed")
+        return original()
+
+    monkeypatch.setattr(spectrometer, "acquire_raw_frame", flaky)
+    pipeline, results, _ = collect(spectrometer, 2, error_backoff_s=0.01)
+
+    assert len(results) == 2
+    assert pipeline.get_stats()["stages"]["capture"]["errors"] == 1
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Tests for the downsampled preview cache and endpoint"""
+import numpy as np
+
+from display import DisplayNormalizer
+from preview import PreviewCache, block_factor, downsample_frame
+
+
+def test_downsample_averages_whole_blocks():
+    frame = np.arange(12 * 20, dtype=np.uint16).reshape(12, 20)
+    small = downsample_frame(frame, max_width=8, max_height=8)
+
+    assert block_factor(12, 20, 8, 8) == 3
+    assert small.shape == (4, 6)
+    assert small.dtype == np.uint16
+    expected = frame[:12, :18].reshape(4, 3, 6, 3).mean(axis=(1, 3))
+    np.testing.assert_array_equal(small, np.floor(expected))
+
+
+def test_full_sensor_preview_fits_the_limit():
+    frame = np.full((3672, 5496), 4095 << 4, dtype=np.uint16)
+    small = downsample_frame(frame, 1024, 768)
+    assert small.shape[0] <= 768 and small.shape[1] <= 1024
+    # Sums of full-scale pixels must not overflow
+    assert np.all(small == 4095 << 4)
+
+
+def test_preview_uses_the_full_frame_stretch():
+    frame = np.random.default_rng(1).integers(0, 4096, (64, 64), dtype=np.uint16)
+    frame[0, 0] = 65535
+    normalizer = DisplayNormalizer()
+    cache = PreviewCache(max_width=16, max_height=16, normalizer=normalizer)
+
+    assert cache.offer(frame)
+    lut = normalizer.lut_for(frame)
+    np.testing.assert_array_equal(cache._image, lut[downsample_frame(frame, 16, 16)])
+
+
+def test_cache_rate_limits_and_changes_etag():
+    cache = PreviewCache(max_width=16, max_height=16, min_interval_s=60)
+    frame = np.random.default_rng(0).integers(0, 4096, (64, 64), dtype=np.uint16)
+    assert cache.get() is None
+
+    assert cache.offer(frame)
+    jpeg, etag = cache.get()
+    assert jpeg[:2] == b"\xff\xd8"
+    assert not cache.offer(frame)
+    assert cache.get() == (jpeg, etag)
+    assert cache.get_stats()["encoded"] == 1
+
+    assert cache.offer(frame, force=True)
+    assert cache.get()[1] != etag
+    assert cache.get_stats()["width"] == 16
+
+
+def test_preview_endpoint_revalidates_with_etag(spectrometer, monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    monkeypatch.setattr(api, "spectrometer", spectrometer)
+    monkeypatch.setattr(api, "preview", PreviewCache(max_width=16, max_height=16, min_interval_s=60))
+    client = TestClient(api.app)
+
+    # Spectrum responses no longer carry an image unless asked for
+    body = client.get("/acquire/spectrum").json()
+    assert body["image_data"] is None
+
+    response = client.get("/preview")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    etag = response.headers["etag"]
+
+    assert client.get("/preview", headers={"If-None-Match": etag}).status_code == 304
+    # Within the preview interval a refresh does not capture a new frame
+    assert client.get("/preview?refresh=true").headers["etag"] == etag
+
+    body = client.get("/acquire/spectrum?include_image=true").json()
+    assert body["image_data"].startswith("data:image/jpeg;base64,")
+    assert client.get("/preview", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Tests for the readout planner"""
+import numpy as np
+import pytest
+
+from readout_planner import IMG_RAW16, ReadoutPlanner
+
+
+@pytest.fixture
+def planner():
+    # ASI183MM geometry
+    return ReadoutPlanner(5496, 3672, supported_bins=[1, 2, 3, 4])
+
+
+def test_reads_only_the_band_rows(planner):
+    plan = planner.plan(1800, 100, exposure_ms=1)
+    assert plan["roi"] == {"start_x": 0, "start_y": 1800, "width": 5496, "height": 100, "binning": 1}
+    assert plan["image_type"] == IMG_RAW16
+    assert plan["bytes_per_frame"] == 5496 * 100 * 2
+    assert plan["frame_rate"] > 20 * plan["full_frame"]["frame_rate"]
+
+
+def test_bins_as_far_as_the_resolution_allows(planner):
+    plan = planner.plan(1801, 3, min_columns=1300)
+    roi = plan["roi"]
+    assert roi["binning"] == 4
+    assert roi["width"] % 8 == 0 and roi["width"] >= 1300
+    assert roi["height"] % 2 == 0
+    # The binned rows still cover sensor rows 1801..1803
+    assert roi["start_y"] * 4 <= 1801
+    assert (roi["start_y"] + roi["height"]) * 4 >= 1804
+
+    # Asking for more columns than bin 4 can give falls back to bin 3
+    assert planner.plan(1800, 10, min_columns=1400)["roi"]["binning"] == 3
+
+
+def test_raw8_when_dynamic_range_allows(planner):
+    raw16 = planner.plan(0, 64)
+    raw8 = planner.plan(0, 64, dynamic_range_bits=8)
+    assert raw8["image_format"] == "RAW8"
+    assert raw8["bytes_per_frame"] * 2 == raw16["bytes_per_frame"]
+    assert raw8["frame_time_ms"] < raw16["frame_time_ms"]
+
+
+def test_band_at_sensor_edge_and_invalid_band(planner):
+    roi = planner.plan(3671, 1)["roi"]
+    assert roi["start_y"] + roi["height"] == 3672
+    with pytest.raises(ValueError):
+        planner.plan(3600, 100)
+
+
+def test_spectrometer_applies_plan(spectrometer, fake_asi):
+    plan = spectrometer.plan_readout(8, 6, min_columns=32, dynamic_range_bits=8)
+    assert plan["roi"]["binning"] == 2
+    assert plan["current"]["bytes_per_frame"] == fake_asi.MAX_WIDTH * fake_asi.MAX_HEIGHT * 2
+
+    spectrometer.apply_readout_plan(plan)
+    state = spectrometer.camera.get_state()
+    assert state["image_type"] == fake_asi.ASI_IMG_RAW8
+    assert (state["width"], state["height"], state["binning"]) == (32, 4, 2)
+
+    wavelengths, intensities = spectrometer.acquire_spectrum()
+    assert intensities.shape == (32,)
+    # Binned columns are calibrated at their centre in unbinned pixels
+    coeffs = spectrometer._wavelength_coeffs
+    expected = np.polyval(coeffs[::-1], np.arange(32) * 2 + 0.5)
+    np.testing.assert_allclose(wavelengths, expected)
+    np.testing.assert_allclose(spectrometer.wavelength_to_pixel(wavelengths, rounded=False), np.arange(32))
+
+    # Continuous capture works with RAW8 frames too
+    spectrometer.camera.start_continuous()
+    frame = spectrometer.camera.read_continuous_frame(timeout=1)
+    assert frame.dtype == np.uint8 and frame.shape == (4, 32)
+    spectrometer.camera.stop_continuous()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Tests for the fused dark-subtract + column reduction kernel"""
+import numpy as np
+import pytest
+
+from reduction import ColumnReducer
+
+
+@pytest.fixture
+def frames():
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 65535, size=(53, 40), dtype=np.uint16)
+    dark = rng.integers(0, 65535, size=(53, 40), dtype=np.uint16)
+    return frame, dark
+
+
+@pytest.mark.parametrize("mode,reference", [
+    ("mean", lambda a: a.mean(axis=0)),
+    ("max", lambda a: a.max(axis=0)),
+    ("sum", lambda a: a.sum(axis=0)),
+])
+@pytest.mark.parametrize("clip", [True, False])
+def test_reduce_matches_reference(frames, mode, reference, clip):
+    frame, dark = frames
+    corrected = frame.astype(np.int64) - dark
+    if clip:
+        corrected = np.clip(corrected, 0, None)
+    # A small block size forces many blocks, including a partial last one
+    reducer = ColumnReducer(block_bytes=40 * 2 * 7)
+    np.testing.assert_allclose(reducer.reduce(frame, dark, mode=mode, clip=clip), reference(corrected))
+
+
+def test_reduce_without_dark_and_into_out(frames):
+    frame, _ = frames
+    reducer = ColumnReducer()
+    out = np.empty(frame.shape[1])
+    result = reducer.reduce(frame, mode="mean", out=out)
+    assert result is out
+    np.testing.assert_allclose(out, frame.mean(axis=0))
+    np.testing.assert_array_equal(reducer.reduce(frame, mode="max"), frame.max(axis=0))
+    # Integer column sums are exact
+    np.testing.assert_array_equal(reducer.reduce(frame, mode="sum"), frame.sum(axis=0, dtype=np.int64))
+
+
+def test_reduce_rejects_bad_input(frames):
+    frame, dark = frames
+    reducer = ColumnReducer()
+    with pytest.raises(ValueError):
+        reducer.reduce(frame, dark[:-1])
+    with pytest.raises(ValueError):
+        reducer.reduce(frame, mode="median")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Tests for batch reprocessing"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from reprocessing import ReprocessingJob, ProcessingRecipe
+from spectrum_store import (SpectrumStore, read_store, FLAG_MAXIMUM, FLAG_DARK_SUBTRACTED,
+                            FLAG_BASELINE_CORRECTED)
+
+
+def make_frames(tmp_path, count=5):
+    rng = np.random.default_rng(3)
+    frames = rng.integers(100, 200, size=(count, 8, 16), dtype=np.uint16)
+    dark = np.full((8, 16), 50, dtype=np.uint16)
+    np.save(tmp_path / "frames.npy", frames)
+    np.save(tmp_path / "dark.npy", dark)
+    return frames, dark
+
+
+def run(job):
+    job.start()
+    assert job.wait(30)
+    return job.get_status()
+
+
+def test_raw_frames_get_the_full_recipe(tmp_path):
+    frames, dark = make_frames(tmp_path)
+    recipe = ProcessingRecipe(dark_path=str(tmp_path / "dark.npy"), baseline_correction="linear",
+                              wavelength_coefficients=[400.0, 0.5])
+    with ThreadPoolExecutor(2) as executor:
+        status = run(ReprocessingJob([str(tmp_path / "frames.npy")], str(tmp_path / "out.spx"), recipe,
+                                     workers=2, block_size=2, executor=executor))
+    assert status["state"] == "completed"
+    assert status["processed"] == status["total"] == 5 and status["failed"] == 0
+
+    data = read_store(str(tmp_path / "out.spx"))
+    reduced = (frames.astype(float) - dark).mean(axis=1)
+    ramp = np.arange(16) / 15.0
+    expected = reduced - (reduced[:, :1] + (reduced[:, -1:] - reduced[:, :1]) * ramp)
+    assert np.allclose(data["intensities"], np.maximum(expected, 0), atol=1e-3)
+    assert np.allclose(data["axes"][0], 400.0 + 0.5 * np.arange(16))
+    assert all(flags == FLAG_DARK_SUBTRACTED | FLAG_BASELINE_CORRECTED for flags in data["meta"]["flags"])
+
+
+def test_stored_spectra_keep_their_metadata(tmp_path):
+    _, dark = make_frames(tmp_path)
+    store = SpectrumStore(str(tmp_path / "run.spx"))
+    axis = np.arange(16, dtype=float)
+    store.append(axis, np.full(16, 80.0), timestamp=10.0, exposure_us=1000, gain=5)
+    store.append(axis, np.full(16, 80.0), timestamp=11.0, exposure_us=1000, gain=5, flags=FLAG_MAXIMUM)
+    store.flush()
+
+    recipe = ProcessingRecipe(dark_path=str(tmp_path / "dark.npy"))
+    with ThreadPoolExecutor(1) as executor:
+        status = run(ReprocessingJob([str(tmp_path / "run.spx")], str(tmp_path / "out.spx"), recipe,
+                                     workers=1, executor=executor))
+    # The dark cannot be taken out of a maximum-mode spectrum
+    assert status["processed"] == 2 and status["dark_skipped"] == 1
+
+    data = read_store(str(tmp_path / "out.spx"))
+    assert np.allclose(data["intensities"][0], 30.0) and np.allclose(data["intensities"][1], 80.0)
+    assert list(data["meta"]["timestamp"]) == [10.0, 11.0]
+    assert list(data["meta"]["flags"]) == [FLAG_DARK_SUBTRACTED, FLAG_MAXIMUM]
+    assert np.array_equal(data["axes"][0], axis)
+
+
+def test_process_pool_and_validation(tmp_path):
+    make_frames(tmp_path, count=40)
+    recipe = ProcessingRecipe(readout_mode="maximum", baseline_correction="als")
+    status = run(ReprocessingJob([str(tmp_path / "frames.npy")], str(tmp_path / "out.spx"), recipe,
+                                 workers=2, block_size=8))
+    assert status["processed"] == 40 and status["items_per_s"] > 0
+    assert read_store(str(tmp_path / "out.spx"))["meta"]["flags"][0] == FLAG_MAXIMUM | FLAG_BASELINE_CORRECTED
+
+    with pytest.raises(ValueError):
+        ProcessingRecipe(baseline_correction="spline")
+    with pytest.raises(ValueError):
+        ReprocessingJob([str(tmp_path / "frames.npy")], str(tmp_path / "frames.npy"), recipe)
+    np.save(tmp_path / "small_dark.npy", np.zeros((4, 4), dtype=np.uint16))
+    job = ReprocessingJob([str(tmp_path / "frames.npy")], str(tmp_path / "out2.spx"),
+                          ProcessingRecipe(dark_path=str(tmp_path / "small_dark.npy")))
+    with pytest.raises(ValueError):
+        job.start()
+
+
+def test_reprocess_endpoint_needs_no_camera(tmp_path, isolated_settings, monkeypatch):
+    from fastapi.testclient import TestClient
+    from spectrum_store import SpectrumWriter
+    import api
+
+    make_frames(tmp_path)
+    monkeypatch.setattr(api, "spectrometer", None)
+    monkeypatch.setattr(api, "SPECTRA_DIR", tmp_path)
+    monkeypatch.setattr(api, "spectrum_writer", SpectrumWriter(flush_interval_s=60))
+    monkeypatch.setattr(api, "spectra_catalog", None)
+    monkeypatch.setattr(api, "reprocessing_job", None)
+    client = TestClient(api.app)
+
+    body = client.post("/reprocess", json={"sources": ["frames.npy"], "dark": "dark.npy",
+                                           "output": "redo", "workers": 1}).json()
+    assert body["filename"] == "redo.spx"
+    assert api.reprocessing_job.wait(30)
+    status = client.get("/reprocess").json()["status"]
+    assert status["state"] == "completed" and status["processed"] == 5
+
+    listing = client.get("/spectra?prefix=redo").json()
+    assert listing["total"] == 5
+    assert client.post("/reprocess", json={"sources": ["missing.npy"]}).status_code == 404
+    assert client.post("/reprocess", json={"sources": ["frames.npy"], "output": "redo"}).status_code == 400
+    api.spectrum_writer.close()
+
+
+def test_raw_archive_frames_keep_their_metadata(tmp_path):
+    from frame_archive import FrameArchive
+
+    frames, _ = make_frames(tmp_path, count=3)
+    archive = FrameArchive(tmp_path / "run.raw", shape=frames.shape[1:])
+    for i, frame in enumerate(frames):
+        archive.append(frame, timestamp=20.0 + i, exposure_us=3000, gain=7)
+    archive.close()
+
+    with ThreadPoolExecutor(1) as executor:
+        status = run(ReprocessingJob([str(tmp_path / "run.raw")], str(tmp_path / "out.spx"),
+                                     ProcessingRecipe(), workers=1, block_size=2, executor=executor))
+    assert status["processed"] == 3
+    data = read_store(str(tmp_path / "out.spx"))
+    assert np.allclose(data["intensities"], frames.mean(axis=1), atol=1e-3)
+    assert list(data["meta"]["timestamp"]) == [20.0, 21.0, 22.0]
+    assert set(data["meta"]["exposure_us"]) == {3000} and set(data["meta"]["gain"]) == {7}
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Tests for settings persistence"""
+import copy
+import json
+import threading
+import time
+
+import pytest
+
+from settings_manager import SettingsManager
+
+
+def make_manager(tmp_path):
+    default_path = tmp_path / "default_settings.json"
+    default_path.write_text(json.dumps({"camera": {"gain": 0, "exposure_ms": 100}}))
+    return SettingsManager(default_path, tmp_path / "current_settings.json")
+
+
+def saved(manager):
+    return json.loads(manager.current_path.read_text())
+
+
+def test_batch_writes_once(tmp_path):
+    manager = make_manager(tmp_path)
+    writes = manager.writes
+
+    with manager.batch():
+        manager.update_settings({"gain": 5}, "camera")
+        with manager.batch():
+            manager.update_setting("camera.exposure_ms", 20)
+        assert manager.writes == writes
+        # Readers see the change before it is written
+        assert manager.get_setting("camera.gain") == 5
+
+    assert manager.writes == writes + 1
+    assert saved(manager)["camera"] == {"gain": 5, "exposure_ms": 20}
+
+
+def test_write_behind_coalesces_and_flushes(tmp_path):
+    manager = make_manager(tmp_path)
+    manager.enable_write_behind(0.2)
+    writes = manager.writes
+    try:
+        for gain in range(50):
+            assert manager.update_settings({"gain": gain}, "camera")
+        # The first change is written straight away, the rest within one interval
+        time.sleep(0.4)
+        assert saved(manager)["camera"]["gain"] == 49
+        assert 1 <= manager.writes - writes <= 2
+        assert manager.get_stats()["save_requests"] >= 50
+
+        manager.update_setting("camera.gain", 99)
+        assert manager.get_stats()["pending"] or saved(manager)["camera"]["gain"] == 99
+        assert manager.flush()
+        assert saved(manager)["camera"]["gain"] == 99
+    finally:
+        manager.disable_write_behind()
+
+
+def test_failed_writes_wait_for_the_interval(tmp_path, monkeypatch):
+    import atexit
+    import settings_manager
+
+    registered = []
+    monkeypatch.setattr(atexit, "register", registered.append)
+    manager = make_manager(tmp_path)
+    manager.enable_write_behind(0.2)
+    manager.disable_write_behind()
+    manager.enable_write_behind(0.2)
+    assert len(registered) == 1
+
+    attempts = []
+
+    def full_disk(path, text):
+        attempts.append(time.monotonic())
+        raise OSError("No space left on device")
+    monkeypatch.setattr(settings_manager, "_write_text_atomic", full_disk)
+    try:
+        manager.update_settings({"gain": 7}, "camera")
+        time.sleep(0.5)
+        # One attempt per interval, not a retry loop
+        assert 1 <= len(attempts) <= 4
+        assert manager.pending and "No space" in manager.get_stats()["last_error"]
+    finally:
+        monkeypatch.undo()
+        manager.disable_write_behind()
+    assert saved(manager)["camera"]["gain"] == 7
+
+
+def test_writes_are_atomic(tmp_path, monkeypatch):
+    manager = make_manager(tmp_path)
+    manager.update_settings({"gain": 1}, "camera")
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    # A failed write leaves the previous file intact and no temporary files behind
+    monkeypatch.setattr("settings_manager.os.replace", fail)
+    assert not manager.update_settings({"gain": 2}, "camera")
+    assert saved(manager)["camera"]["gain"] == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["current_settings.json", "default_settings.json"]
+    assert manager.get_stats()["pending"]
+
+    monkeypatch.undo()
+    assert manager.flush()
+    assert saved(manager)["camera"]["gain"] == 2
+
+
+def test_snapshots_are_versioned_and_immutable(tmp_path):
+    manager = make_manager(tmp_path)
+    manager.update_setting("display.mode", "raman")
+    before = manager.get_snapshot()
+
+    manager.update_setting("camera.gain", 7)
+    after = manager.get_snapshot()
+
+    assert after.version == before.version + 1 == manager.version
+    assert before.get("camera.gain") == 0 and after.get("camera.gain") == 7
+    # Unchanged categories are shared between versions
+    assert after.data["display"] is before.data["display"]
+
+    with pytest.raises(TypeError):
+        after.data["camera"]["gain"] = 1
+    with pytest.raises(TypeError):
+        manager.get_settings().update({"camera": {}})
+    thawed = copy.deepcopy(after.data)
+    thawed["camera"]["gain"] = 1
+    assert manager.get_setting("camera.gain") == 7
+
+
+def test_observers_see_changed_categories(tmp_path):
+    manager = make_manager(tmp_path)
+    seen = []
+    unsubscribe = manager.subscribe(lambda snapshot, changed: seen.append((snapshot.version, changed)),
+                                    categories=["display"])
+
+    manager.update_settings({"gain": 3}, "camera")
+    manager.update_settings({"mode": "pixels"}, "display")
+    assert seen == [(manager.version, {"display"})]
+
+    unsubscribe()
+    manager.update_settings({"mode": "raman"}, "display")
+    assert len(seen) == 1
+
+
+def test_concurrent_updates_are_not_lost(tmp_path):
+    manager = make_manager(tmp_path)
+    manager.enable_write_behind(0.05)
+    start = manager.version
+    try:
+        def worker(n):
+            for i in range(50):
+                manager.update_setting(f"worker{n}.value", i)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        manager.disable_write_behind()
+
+    assert manager.version == start + 200
+    assert all(manager.get_setting(f"worker{n}.value") == 49 for n in range(4))
+    assert all(saved(manager)[f"worker{n}"]["value"] == 49 for n in range(4))
+
+
+def test_status_keeps_the_camera_settings(spectrometer, monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    monkeypatch.setattr(api, "spectrometer", spectrometer)
+    status = TestClient(api.app).get("/status").json()
+    # The UI reads the camera controls from "settings"
+    assert {"Exposure", "Gain", "exposure_ms"} <= set(status["settings"])
+    assert "version" in status["settings_store"]
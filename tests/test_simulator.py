@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Tests for the simulated ASI SDK backend"""
+import sys
+import time
+
+import numpy as np
+import pytest
+
+import simulated_asi
+from camera import ASI183Camera
+
+
+@pytest.fixture
+def sim_camera():
+    def connect(options=""):
+        cam = ASI183Camera(sdk_path="sim://?seed=7" + options)
+        assert cam.connect()
+        opened.append(cam)
+        return cam
+
+    opened = []
+    yield connect
+    for cam in opened:
+        cam.disconnect()
+
+
+def test_options_are_parsed_from_library_path():
+    config = simulated_asi.parse_options("sim://?seed=3&lines=100:500,2000:9000:4&cosmic_rate=1.5")
+    assert config["seed"] == 3
+    assert config["lines"] == [(100.0, 500.0, 3.0), (2000.0, 9000.0, 4.0)]
+    assert config["cosmic_rate"] == 1.5
+    assert config["read_noise"] == simulated_asi.DEFAULT_CONFIG["read_noise"]
+    with pytest.raises(ValueError):
+        simulated_asi.parse_options("sim://?no_such_option=1")
+
+
+def test_camera_selects_simulator_for_sim_scheme(sim_camera):
+    cam = sim_camera()
+    assert cam.sdk is simulated_asi
+    assert cam.camera_info["MaxWidth"] == 5496
+    assert cam.state["image_type"] == simulated_asi.ASI_IMG_RAW16
+    # Temperature readings keep the status report current
+    cam.control_values["Temperature"] = 0
+    temperature = cam.get_temperature()
+    assert cam.get_cached_info()["current_settings"]["Temperature"] == round(temperature * 10)
+
+
+def test_simulator_does_not_need_zwoasi(sim_camera, monkeypatch):
+    import camera
+    monkeypatch.setitem(sys.modules, "zwoasi", None)
+    monkeypatch.setattr(camera, "asi", None)
+    cam = sim_camera("&cosmic_rate=0")
+    cam.set_roi(0, 0, 64, 8)
+    assert cam.capture_raw().dtype == np.uint16
+    # Only the real SDK needs the package
+    with pytest.raises(ImportError):
+        camera.load_sdk("/usr/lib/libASICamera2.so")
+
+
+def test_emission_lines_appear_in_the_band(sim_camera):
+    cam = sim_camera("&lines=1000:20000,3000:8000&hot_pixels=0&cosmic_rate=0")
+    cam.set_exposure(20)
+    cam.set_roi(0, 1800 // 2, 2744, 36, binning=2)
+
+    frame = cam.capture_raw()
+    assert frame.shape == (36, 2744)
+    assert frame.dtype == np.uint16
+    # 12-bit samples are left-aligned in RAW16
+    assert not np.any(frame & 0xF)
+
+    profile = frame.astype(np.float64).mean(axis=0)
+    # Lines at sensor columns 1000 and 3000 land on binned columns 500 and 1500
+    assert abs(np.argmax(profile[:1000]) - 500) <= 1
+    assert abs(1000 + np.argmax(profile[1000:]) - 1500) <= 1
+    assert profile[500] > profile[1500] > np.median(profile) + 100
+
+
+def test_signal_and_shot_noise_follow_the_sensor_model(sim_camera):
+    continuum = 100000.0  # e-/s, so 100 ms gives 10000 e- per pixel
+    cam = sim_camera(f"&lines=&continuum={continuum}&band_fwhm=1e9"
+                     "&hot_pixels=0&cosmic_rate=0&dark_current=0")
+    cam.set_exposure(100)
+    cam.set_roi(0, 0, 256, 64)
+
+    adu = cam.capture_raw().astype(np.float64) / 16
+    electrons = continuum * 0.1
+    offset = cam.camera.get_control_value(simulated_asi.ASI_OFFSET)[0]
+    expected_mean = electrons / simulated_asi.E_PER_ADU_GAIN0 + offset
+    expected_std = np.sqrt(electrons + 3.0 ** 2) / simulated_asi.E_PER_ADU_GAIN0
+    assert adu.mean() == pytest.approx(expected_mean, rel=0.01)
+    assert adu.std() == pytest.approx(expected_std, rel=0.1)
+
+
+def test_hot_pixels_are_fixed_and_cosmic_rays_are_not(sim_camera):
+    cam = sim_camera("&lines=&continuum=0&hot_pixels=0&cosmic_rate=20000")
+    cam.set_exposure(100)
+    cam.set_roi(0, 0, 1368, 918, binning=4)
+    sensor = cam.camera._camera.sensor
+
+    first, second = cam.capture_raw().copy(), cam.capture_raw()
+    assert sensor.cosmic_rays > 0
+    # Hits land in different places every frame
+    assert not np.array_equal(first > 2000, second > 2000)
+
+    cam = sim_camera("&lines=&continuum=0&hot_pixels=20&cosmic_rate=0")
+    cam.set_exposure(1000)
+    cam.set_roi(0, 0, 1368, 918, binning=4)
+    first, second = cam.capture_raw().copy(), cam.capture_raw()
+    hot = (first > np.median(first) + 200) & (second > np.median(second) + 200)
+    assert np.count_nonzero(hot) >= 10
+
+
+def test_readout_geometry_is_validated_like_the_sdk(sim_camera):
+    cam = sim_camera()
+    with pytest.raises(ValueError, match="multiple of 8"):
+        cam.set_roi(0, 0, 100, 64)
+    with pytest.raises(ValueError, match="bins"):
+        cam.camera.set_roi(0, 0, 64, 64, bins=5)
+
+    cam.set_roi(8, 10, 64, 32, binning=3, image_type=simulated_asi.ASI_IMG_RAW8)
+    assert cam.capture_raw().shape == (32, 64)
+    assert cam.capture_raw().dtype == np.uint8
+
+
+def test_timing_models_exposure_readout_and_usb(sim_camera):
+    cam = sim_camera()
+    sdk = cam.camera._camera
+
+    # A full RAW16 frame at the minimum bandwidth is limited by the USB link
+    cam.set_exposure(1)
+    timing = sdk.timing()
+    assert timing["bottleneck"] == "transfer"
+    sdk.set_control_value(simulated_asi.ASI_BANDWIDTHOVERLOAD, 100)
+    assert sdk.timing()["transfer_ms"] < timing["transfer_ms"]
+
+    cam.set_roi(0, 1800, 512, 64)
+    cam.set_exposure(50)
+    start = time.perf_counter()
+    cam.capture_raw()
+    assert time.perf_counter() - start >= 0.05
+
+
+def test_video_mode_drops_frames_nobody_collects(sim_camera):
+    cam = sim_camera()
+    cam.set_roi(0, 1800, 512, 64)
+    cam.set_exposure(5)
+    sdk = cam.camera._camera
+    buffer_ = bytearray(512 * 64 * 2)
+
+    sdk.start_video_capture()
+    try:
+        sdk.get_video_data(timeout=1000, buffer_=buffer_)
+        time.sleep(0.1)
+        sdk.get_video_data(timeout=1000, buffer_=buffer_)
+        assert sdk.get_dropped_frames() >= 10
+    finally:
+        sdk.stop_video_capture()
+    with pytest.raises(simulated_asi.ZWO_IOError):
+        sdk.get_video_data(timeout=10, buffer_=buffer_)
+
+
+def test_main_accepts_simulator_path(tmp_path, monkeypatch):
+    pytest.importorskip("uvicorn")
+    import main
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("ZWO_ASI_LIB", "sim://")
+    assert main.check_environment()
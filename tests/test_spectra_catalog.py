@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Tests for the SQLite spectra catalog"""
+import numpy as np
+
+from spectra_catalog import SpectraCatalog
+from spectrum_store import SpectrumStore, FLAG_MAXIMUM
+
+
+def fill(catalog, count=20):
+    for i in range(count):
+        catalog.add(f"{'dark' if i % 4 == 0 else 'run'}_{i:02d}.spx", 0,
+                    timestamp=1000.0 + i, exposure_us=(i % 5 + 1) * 1000, gain=100,
+                    readout_mode="average", calibration_hash=7, points=64, size=256)
+
+
+def test_query_pages_sorts_and_filters(tmp_path):
+    catalog = SpectraCatalog(tmp_path)
+    fill(catalog)
+
+    page = catalog.query(offset=0, limit=5)
+    assert page["total"] == 20
+    assert [e["timestamp"] for e in page["entries"]] == [1019.0, 1018.0, 1017.0, 1016.0, 1015.0]
+    assert catalog.query(offset=18, limit=5)["entries"][-1]["timestamp"] == 1000.0
+
+    ascending = catalog.query(sort="exposure_us", descending=False, limit=20)["entries"]
+    assert [e["exposure_us"] for e in ascending] == sorted(e["exposure_us"] for e in ascending)
+
+    window = catalog.query(start_time=1005, end_time=1009, min_exposure_us=2000, max_exposure_us=4000)
+    assert sorted(e["timestamp"] for e in window["entries"]) == [1006.0, 1007.0, 1008.0]
+
+    darks = catalog.query(prefix="dark")
+    assert darks["total"] == 5
+    assert darks["entries"][0]["calibration_hash"] == "0000000000000007"
+    # LIKE wildcards in the prefix are literal
+    assert catalog.query(prefix="run%")["total"] == 0
+
+
+def test_catalog_persists_and_rebuilds(tmp_path):
+    catalog = SpectraCatalog(tmp_path)
+    assert catalog.created
+    fill(catalog, 3)
+    catalog.close()
+    catalog = SpectraCatalog(tmp_path)
+    assert not catalog.created and catalog.count() == 3
+
+    store = SpectrumStore(tmp_path / "series.spx")
+    for i in range(4):
+        store.append(np.arange(32.0), np.ones(32), timestamp=2000.0 + i, exposure_us=500,
+                     flags=FLAG_MAXIMUM)
+    store.flush()
+    (tmp_path / "old.csv").write_text("Wavelength,Intensity\n1,2\n")
+    (tmp_path / "broken.spx").write_bytes(b"nope")
+
+    result = catalog.rebuild()
+    assert result == {"files": 2, "spectra": 5, "failed": ["broken.spx"]}
+    entries = catalog.query(prefix="series", descending=False)["entries"]
+    assert [e["index"] for e in entries] == [0, 1, 2, 3]
+    assert entries[0]["readout_mode"] == "maximum" and entries[0]["points"] == 32
+    assert catalog.query(prefix="old")["entries"][0]["format"] == "csv"
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Tests for the binary spectrum store"""
+import os
+
+import numpy as np
+import pytest
+
+from spectrum_store import (SpectrumStore, SpectrumWriter, read_store, export_csv,
+                            FLAG_MAXIMUM, CHUNK_HEADER)
+
+
+def make_spectra(count, width=256, seed=0):
+    rng = np.random.default_rng(seed)
+    wavelengths = np.linspace(400.0, 700.0, width)
+    return wavelengths, rng.normal(1000, 30, (count, width)).round().astype(np.float32)
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_round_trip_with_metadata(tmp_path, compress):
+    wavelengths, spectra = make_spectra(10)
+    store = SpectrumStore(tmp_path / "run.spx", compress=compress, chunk_rows=4)
+    for i, row in enumerate(spectra):
+        assert store.append(wavelengths, row, timestamp=100.0 + i, exposure_us=5000,
+                            gain=120, flags=FLAG_MAXIMUM, calibration_hash=42) == i
+    assert store.flush() == 10
+
+    data = read_store(store.path)
+    np.testing.assert_array_equal(data["intensities"], spectra)
+    assert len(data["axes"]) == 1
+    np.testing.assert_array_equal(data["axes"][0], wavelengths)
+    assert list(data["meta"]["timestamp"]) == [100.0 + i for i in range(10)]
+    assert set(data["meta"]["gain"]) == {120} and set(data["meta"]["calibration_hash"]) == {42}
+    assert data["meta"]["flags"][0] & FLAG_MAXIMUM
+
+
+def test_compressed_store_is_smaller_than_csv(tmp_path):
+    wavelengths, spectra = make_spectra(100, width=2048)
+    store = SpectrumStore(tmp_path / "run.spx")
+    for row in spectra:
+        store.append(wavelengths, row)
+    store.flush()
+
+    csv_size = sum(len(export_csv(read_store(store.path), [i])) for i in range(100))
+    assert os.path.getsize(store.path) < spectra.nbytes < csv_size / 2
+
+
+def test_axis_changes_and_width_checks(tmp_path):
+    wavelengths, spectra = make_spectra(3)
+    store = SpectrumStore(tmp_path / "run.spx")
+    store.append(wavelengths, spectra[0])
+    store.append(wavelengths + 1.0, spectra[1])
+    with pytest.raises(ValueError):
+        store.append(wavelengths[:10], spectra[2][:10])
+    store.flush()
+
+    data = read_store(store.path)
+    assert list(data["axis_index"]) == [0, 1]
+    with pytest.raises(ValueError):
+        export_csv(data)
+
+    # A single spectrum exports in the legacy CSV layout
+    lines = export_csv(data, [1]).splitlines()
+    assert lines[0] == "Wavelength,Intensity" and len(lines) == 257
+    assert float(lines[1].split(",")[0]) == 401.0
+
+
+def test_reopen_appends_and_drops_a_torn_chunk(tmp_path):
+    wavelengths, spectra = make_spectra(6)
+    path = tmp_path / "run.spx"
+    store = SpectrumStore(path, chunk_rows=2)
+    for row in spectra[:4]:
+        store.append(wavelengths, row)
+    store.flush()
+    # Simulate a crash in the middle of writing a chunk
+    with open(path, "ab") as f:
+        f.write(CHUNK_HEADER.pack(b"ROWS", 1, 2, 256, 100, 100, 0) + b"\0" * 10)
+
+    store = SpectrumStore(path)
+    assert store.rows == 4 and store.width == 256
+    assert store.append(wavelengths, spectra[4]) == 4
+    store.flush()
+    data = read_store(path)
+    np.testing.assert_array_equal(data["intensities"], spectra[:5])
+    # The axis did not change, so it is not written again
+    assert len(data["axes"]) == 1
+
+
+def test_failed_flush_keeps_the_spectra_queued(tmp_path, monkeypatch):
+    import builtins
+    import errno
+    import spectrum_store
+
+    wavelengths, spectra = make_spectra(6)
+    store = SpectrumStore(tmp_path / "run.spx", compress=False)
+    for row in spectra[:3]:
+        store.append(wavelengths, row)
+    store.flush()
+    for row in spectra[3:]:
+        store.append(wavelengths, row)
+
+    class FullDisk:
+        """Writes half of the data, then fails like a full disk"""
+        def __init__(self, f):
+            self.f = f
+        def write(self, data):
+            self.f.write(data[:len(data) // 2])
+            raise OSError(errno.ENOSPC, "No space left on device")
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc):
+            self.f.close()
+
+    def full_disk_open(path, mode="r", *args, **kwargs):
+        f = builtins.open(path, mode, *args, **kwargs)
+        return FullDisk(f) if mode == "ab" else f
+
+    size = os.path.getsize(store.path)
+    monkeypatch.setattr(spectrum_store, "open", full_disk_open, raising=False)
+    with pytest.raises(OSError):
+        store.flush()
+    # The torn chunk is gone and the spectra are still queued under their indices
+    assert os.path.getsize(store.path) == size and store.pending_rows == 3
+    monkeypatch.undo()
+    assert store.append(wavelengths, spectra[0]) == 6
+    assert store.flush() == 4
+    np.testing.assert_array_equal(read_store(store.path)["intensities"], np.vstack([spectra, spectra[:1]]))
+
+
+def test_background_writer_flushes(tmp_path):
+    wavelengths, spectra = make_spectra(5)
+    writer = SpectrumWriter(flush_interval_s=60, chunk_rows=2)
+    try:
+        for row in spectra:
+            writer.append(tmp_path / "run.spx", wavelengths, row)
+        # Full chunks are written by the worker; flush() writes the rest
+        writer.flush(tmp_path / "run.spx")
+        assert len(read_store(tmp_path / "run.spx")["intensities"]) == 5
+    finally:
+        writer.close()
+    stats = writer.get_stats()
+    assert stats["appended"] == stats["written"] == 5 and not stats["running"]
+
+
+def test_save_and_export_endpoints(spectrometer, tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    monkeypatch.setattr(api, "spectrometer", spectrometer)
+    monkeypatch.setattr(api, "SPECTRA_DIR", tmp_path)
+    monkeypatch.setattr(api, "spectrum_writer", SpectrumWriter(flush_interval_s=60))
+    monkeypatch.setattr(api, "spectra_catalog", None)
+    client = TestClient(api.app)
+
+    for _ in range(3):
+        body = client.post("/save/spectrum?filename=series").json()
+    assert body["filename"] == "series.spx" and body["index"] == 2
+    assert client.post("/save/spectrum?filename=single&format=csv").json()["filename"] == "single.csv"
+
+    listing = client.get("/spectra?sort=filename&order=asc").json()
+    assert [(s["filename"], s["index"]) for s in listing["spectra"]] == [
+        ("series.spx", 0), ("series.spx", 1), ("series.spx", 2), ("single.csv", 0)]
+
+    csv = client.get("/spectra/series.spx/csv").text.splitlines()
+    assert csv[0] == "Wavelength,Intensity_0,Intensity_1,Intensity_2"
+    assert len(csv) == 1 + spectrometer.camera.state["width"]
+    assert client.get("/spectra/series.spx/csv?index=7").status_code == 400
+    assert client.get("/spectra/series.spx").content[:4] == b"SPX1"
+    api.spectrum_writer.close()
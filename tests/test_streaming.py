@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Tests for the binary spectrum stream"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from streaming import (
+    HEADER, KIND_AXIS, KIND_SPECTRUM, FLAG_MAXIMUM_READOUT, StreamSubscriber,
+    decode_message, encode_axis_message, encode_spectrum_message
+)
+
+
+def test_spectrum_message_round_trip():
+    intensities = np.linspace(0, 1000, 5496)
+    message = encode_spectrum_message(intensities, seq=7, axis_id=3, timestamp=123.5,
+                                      exposure_ms=12.5, gain=100, flags=FLAG_MAXIMUM_READOUT)
+    assert HEADER.size == 40
+    assert len(message) == HEADER.size + 4 * intensities.size
+
+    header, values = decode_message(message)
+    assert header == {"kind": KIND_SPECTRUM, "flags": FLAG_MAXIMUM_READOUT, "seq": 7,
+                      "timestamp": 123.5, "exposure_ms": 12.5, "gain": 100,
+                      "count": intensities.size, "axis_id": 3}
+    assert values.dtype == np.float32
+    np.testing.assert_allclose(values, intensities, rtol=1e-6)
+
+
+def test_axis_message_keeps_full_precision():
+    wavelengths = 400.0 + np.arange(100) * 0.0123456789
+    header, values = decode_message(encode_axis_message(wavelengths, axis_id=2))
+    assert header["kind"] == KIND_AXIS
+    assert header["axis_id"] == 2
+    np.testing.assert_array_equal(values, wavelengths)
+
+
+def test_decode_rejects_foreign_data():
+    with pytest.raises(ValueError):
+        decode_message(b"x" * HEADER.size)
+    with pytest.raises(ValueError):
+        decode_message(b"SPEC")
+
+
+def test_subscriber_keeps_latest_spectrum_and_every_axis():
+    async def scenario():
+        subscriber = StreamSubscriber()
+        subscriber.push_spectrum(b"s1")
+        subscriber.push_spectrum(b"s2")
+        assert subscriber.dropped == 1
+        assert await subscriber.get() == b"s2"
+
+        # An axis change discards the pending spectrum for the old axis
+        subscriber.push_spectrum(b"s3")
+        subscriber.push_axis(b"a2")
+        subscriber.push_spectrum(b"s4")
+        assert await subscriber.get() == b"a2"
+        assert await subscriber.get() == b"s4"
+
+        waiter = asyncio.ensure_future(subscriber.get())
+        await asyncio.sleep(0)
+        subscriber.close()
+        assert await waiter is None
+
+    asyncio.run(scenario())
+
+
+def test_websocket_streams_axis_then_spectra(spectrometer, monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    monkeypatch.setattr(api, "spectrometer", spectrometer)
+    monkeypatch.setattr(api, "streamer", None)
+    client = TestClient(api.app)
+
+    with client.websocket_connect("/ws/spectrum") as websocket:
+        axis_header, axis = decode_message(websocket.receive_bytes())
+        assert axis_header["kind"] == KIND_AXIS
+        np.testing.assert_array_equal(axis, spectrometer.get_wavelength_axis())
+
+        seqs = []
+        for _ in range(3):
+            header, intensities = decode_message(websocket.receive_bytes())
+            assert header["kind"] == KIND_SPECTRUM
+            assert header["axis_id"] == axis_header["axis_id"]
+            assert header["exposure_ms"] == pytest.approx(1.0)
+            assert intensities.size == axis.size
+            seqs.append(header["seq"])
+        assert seqs == sorted(seqs)
+        assert spectrometer.camera.is_continuous
+
+        # A calibration change resends the axis before the next spectrum
+        spectrometer.set_wavelength_calibration([500.0, 0.25])
+        header, values = decode_message(websocket.receive_bytes())
+        while header["kind"] != KIND_AXIS:
+            header, values = decode_message(websocket.receive_bytes())
+        assert header["axis_id"] > axis_header["axis_id"]
+        np.testing.assert_allclose(values, 500.0 + 0.25 * np.arange(axis.size))
+
+
+def test_last_unsubscribe_stops_streaming(spectrometer):
+    from streaming import SpectrumStreamer
+
+    async def scenario():
+        streamer = SpectrumStreamer(spectrometer)
+        first, second = streamer.subscribe(), streamer.subscribe()
+        for subscriber in (first, second):
+            header, _ = decode_message(await subscriber.get())
+            assert header["kind"] == KIND_AXIS
+            header, _ = decode_message(await subscriber.get())
+            assert header["kind"] == KIND_SPECTRUM
+        assert spectrometer.camera.is_continuous
+
+        await streamer.unsubscribe(first)
+        assert streamer.running
+        await streamer.unsubscribe(second)
+        return streamer
+
+    streamer = asyncio.run(scenario())
+    # The last client leaving stops the task and the continuous capture it started
+    assert not streamer.running
+    assert not spectrometer.camera.is_continuous
+    assert streamer.get_stats()["frames"] >= 1